@@ -5,10 +5,12 @@ Handles conversation logging with automatic anonymization
 import asyncio
 import logging
 from typing import Dict, Any, Optional, List
+from uuid import UUID
 from .anonymizer_service import anonymize_log_entry
 from .models import LogEntry
 from .database_service import get_database_service
 from .database_service_external import get_database_service_external
+from .cost_reconciler import get_cost_reconciler
 from shared.config import settings
 
 # Configure logging
@@ -64,6 +66,25 @@ async def save_log_entry(log_entry: LogEntry) -> Dict[str, Any]:
         logger.error(f"Error saving log entry: {e}", exc_info=True)
         return {"success": False, "error": str(e)}
 
+def enqueue_generation_cost(generation_id: Optional[str], user_id: UUID, log_id: Optional[str] = None) -> None:
+    """
+    Schedules background reconciliation of an OpenRouter generation's cost.
+    Once OpenRouter publishes the cost, it is deducted from the user's balance and,
+    if `log_id` is given, added to that log entry's total_cost.
+    """
+    get_cost_reconciler().enqueue(generation_id, user_id=user_id, log_id=log_id)
+
+def start_cost_reconciler() -> None:
+    """
+    Starts the cost reconciler on the running event loop of a long-lived process, so it
+    also takes over costs queued by processes that stopped before reconciling them.
+    """
+    get_cost_reconciler().start()
+
+async def drain_cost_reconciler(timeout: float = 30.0) -> None:
+    """Flushes pending cost reconciliations, e.g. on shutdown."""
+    await get_cost_reconciler().drain(timeout=timeout)
+
 def save_log_entry_sync(log_entry: LogEntry) -> Dict[str, Any]:
     """Synchronous version of save_log_entry."""
     return asyncio.run(save_log_entry(log_entry))
@@ -0,0 +1,341 @@
+"""
+Cost Reconciler for Agent Logger
+Resolves OpenRouter generation costs in the background and applies them to
+log entries and user balances, so LLM steps don't wait on cost accounting.
+
+Jobs are processed in memory by the process that queued them, but every job is
+also kept in Redis, together with a lease held by that process. When a process
+stops (a restart, or a short-lived `asyncio.run`), its leases expire and the
+reconciler of any other process (API, triggers, ...) takes the jobs over.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from uuid import UUID, uuid4
+
+import httpx
+
+from shared.config import settings
+from shared.redis.keys import RedisKeys
+from shared.redis.redis_client import get_redis_client
+from user import client as user_client
+from .database_service import get_database_service
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# OpenRouter needs a moment before /generation returns stats for a new id.
+INITIAL_DELAY_S = 2.0
+BACKOFF_BASE_S = 2.0
+BACKOFF_MAX_S = 60.0
+MAX_ATTEMPTS = 8
+BATCH_SIZE = 25
+# A job whose lease is not renewed for this long is taken over by another process.
+LEASE_S = 300
+# How often leases are renewed and abandoned jobs are looked for.
+RECOVERY_INTERVAL_S = 60.0
+
+
+class GenerationNotReady(Exception):
+    """Raised when OpenRouter has not published the stats for a generation yet."""
+    pass
+
+
+@dataclass(eq=False)
+class CostJob:
+    """A single generation whose cost still has to be applied."""
+    generation_id: str
+    user_id: UUID
+    log_id: Optional[str] = None
+    attempts: int = 0
+    not_before: float = field(default_factory=lambda: time.monotonic() + INITIAL_DELAY_S)
+    cost: Optional[float] = None
+    charged: bool = False
+    logged: bool = False
+
+    def schedule_retry(self) -> bool:
+        """Pushes the job back with exponential backoff. Returns False when it should be dropped."""
+        self.attempts += 1
+        if self.attempts >= MAX_ATTEMPTS:
+            return False
+        delay = min(BACKOFF_BASE_S * (2 ** (self.attempts - 1)), BACKOFF_MAX_S)
+        self.not_before = time.monotonic() + delay
+        return True
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "generation_id": self.generation_id,
+            "user_id": str(self.user_id),
+            "log_id": self.log_id,
+            "attempts": self.attempts,
+            "cost": self.cost,
+            "charged": self.charged,
+            "logged": self.logged,
+        })
+
+    @classmethod
+    def from_json(cls, raw: str) -> "CostJob":
+        data: Dict[str, Any] = json.loads(raw)
+        return cls(
+            generation_id=data["generation_id"],
+            user_id=UUID(data["user_id"]),
+            log_id=data.get("log_id"),
+            attempts=data.get("attempts", 0),
+            not_before=time.monotonic(),
+            cost=data.get("cost"),
+            charged=data.get("charged", False),
+            logged=data.get("logged", False),
+        )
+
+
+class CostReconciler:
+    """
+    Per-process background worker that batches generation cost lookups.
+
+    Jobs are kept in memory and processed by a single task on the event loop
+    that enqueued them. Costs are fetched concurrently per batch, balance
+    deductions are summed per user and log updates are summed per log entry.
+    Each job is mirrored to Redis (see the module docstring); without Redis the
+    reconciler keeps working from memory only.
+    """
+
+    def __init__(self):
+        self._pending: List[CostJob] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._http: Optional[httpx.AsyncClient] = None
+        self._owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._next_recovery = 0.0
+
+    def start(self) -> None:
+        """Starts the worker on the running event loop, so jobs abandoned by other processes are picked up."""
+        self._ensure_worker()
+
+    def enqueue(self, generation_id: Optional[str], user_id: UUID, log_id: Optional[str] = None) -> None:
+        """
+        Schedules cost reconciliation for a generation. Must be called from a running event loop.
+        The cost is deducted from the user's balance and added to the log entry's total_cost.
+        """
+        if not generation_id:
+            return
+        self._ensure_worker()
+        job = CostJob(generation_id=generation_id, user_id=user_id, log_id=log_id)
+        self._persist(job)
+        self._pending.append(job)
+        self._wakeup.set()
+        logger.debug(f"Queued cost reconciliation for generation {generation_id} (log: {log_id})")
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def drain(self, timeout: float = 30.0) -> None:
+        """Processes all pending jobs immediately, waiting at most `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            now = time.monotonic()
+            for job in self._pending:
+                job.not_before = min(job.not_before, now)
+            self._wakeup.set()
+            await asyncio.sleep(0.2)
+        if self._pending:
+            logger.warning(f"Cost reconciler drain timed out with {len(self._pending)} pending jobs.")
+
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # A new event loop (e.g. a fresh asyncio.run) cannot reuse loop-bound primitives.
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._http = None
+            self._worker = None
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url="https://openrouter.ai/api/v1",
+                headers={"Authorization": f"Bearer {settings.OPENROUTER_API_KEY}"},
+                timeout=30,
+            )
+        return self._http
+
+    def _persist(self, job: CostJob) -> None:
+        """Stores the job's state in Redis and (re)takes its lease."""
+        try:
+            pipe = get_redis_client().pipeline()
+            pipe.hset(RedisKeys.COST_RECONCILER_JOBS, job.generation_id, job.to_json())
+            pipe.set(RedisKeys.get_cost_reconciler_lease_key(job.generation_id), self._owner, ex=LEASE_S)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not persist cost job {job.generation_id}; it is only kept in memory: {e}")
+
+    def _forget(self, job: CostJob) -> None:
+        try:
+            pipe = get_redis_client().pipeline()
+            pipe.hdel(RedisKeys.COST_RECONCILER_JOBS, job.generation_id)
+            pipe.delete(RedisKeys.get_cost_reconciler_lease_key(job.generation_id))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not remove finished cost job {job.generation_id} from Redis: {e}")
+
+    def _renew_and_recover(self) -> List[CostJob]:
+        """Renews the leases of this process's jobs and claims persisted jobs whose lease has expired."""
+        redis_client = get_redis_client()
+        own = {job.generation_id for job in self._pending}
+        pipe = redis_client.pipeline()
+        for generation_id in own:
+            pipe.set(RedisKeys.get_cost_reconciler_lease_key(generation_id), self._owner, ex=LEASE_S)
+        pipe.execute()
+
+        recovered = []
+        for generation_id, raw in redis_client.hgetall(RedisKeys.COST_RECONCILER_JOBS).items():
+            if generation_id in own:
+                continue
+            if not redis_client.set(RedisKeys.get_cost_reconciler_lease_key(generation_id), self._owner, nx=True, ex=LEASE_S):
+                continue
+            try:
+                recovered.append(CostJob.from_json(raw))
+            except (ValueError, KeyError, TypeError) as e:
+                logger.error(f"Dropping unreadable cost job {generation_id}: {e}")
+                redis_client.hdel(RedisKeys.COST_RECONCILER_JOBS, generation_id)
+        return recovered
+
+    async def _recover(self) -> None:
+        self._next_recovery = time.monotonic() + RECOVERY_INTERVAL_S
+        try:
+            recovered = await asyncio.to_thread(self._renew_and_recover)
+        except Exception as e:
+            logger.warning(f"Could not renew or recover cost jobs from Redis: {e}")
+            return
+        if recovered:
+            logger.info(f"Took over {len(recovered)} cost reconciliation job(s) abandoned by other processes.")
+            self._pending.extend(recovered)
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now >= self._next_recovery:
+                await self._recover()
+            due = [job for job in self._pending if job.not_before <= now][:BATCH_SIZE]
+            if not due:
+                timeout = max(0.0, self._next_recovery - now)
+                if self._pending:
+                    timeout = min(timeout, max(0.0, min(job.not_before for job in self._pending) - now))
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            for job in due:
+                self._pending.remove(job)
+            try:
+                await self._process_batch(due)
+            except Exception as e:
+                logger.error(f"Unexpected error while reconciling a batch of {len(due)} costs: {e}", exc_info=True)
+
+    async def _process_batch(self, jobs: List[CostJob]) -> None:
+        to_fetch = [job for job in jobs if job.cost is None]
+        results = await asyncio.gather(
+            *(self._fetch_cost(job.generation_id) for job in to_fetch), return_exceptions=True
+        )
+        for job, result in zip(to_fetch, results):
+            if isinstance(result, Exception) and not isinstance(result, GenerationNotReady):
+                logger.warning(f"Could not retrieve cost for generation {job.generation_id}: {result}")
+            elif not isinstance(result, Exception):
+                job.cost = result
+
+        resolved = [job for job in jobs if job.cost is not None]
+        await self._charge_users(resolved)
+        await self._update_logs(resolved)
+
+        for job in jobs:
+            if job.cost is None:
+                self._retry_or_drop(job, reason="cost not available")
+            elif not job.charged:
+                self._retry_or_drop(job, reason="balance deduction failed")
+            elif job.log_id and not job.logged:
+                # The log row may not have been written yet.
+                self._retry_or_drop(job, reason=f"log entry {job.log_id} not updated")
+            else:
+                self._forget(job)
+
+    async def _fetch_cost(self, generation_id: str) -> float:
+        response = await self._get_http_client().get("/generation", params={"id": generation_id})
+        if response.status_code == 404:
+            raise GenerationNotReady(generation_id)
+        response.raise_for_status()
+        generation_data = response.json().get("data") or {}
+        if "total_cost" not in generation_data:
+            raise GenerationNotReady(generation_id)
+        logger.info(f"Received cost for generation {generation_id}: {generation_data['total_cost']}")
+        return float(generation_data["total_cost"] or 0.0)
+
+    async def _charge_users(self, jobs: List[CostJob]) -> None:
+        per_user: Dict[UUID, List[CostJob]] = defaultdict(list)
+        for job in jobs:
+            if not job.charged:
+                per_user[job.user_id].append(job)
+
+        for user_id, user_jobs in per_user.items():
+            total = sum(job.cost for job in user_jobs)
+            try:
+                if total > 0:
+                    logger.info(f"Deducting {total} from balance of user {user_id} for {len(user_jobs)} generation(s).")
+                    await asyncio.to_thread(user_client.deduct_from_balance, user_id, total)
+                for job in user_jobs:
+                    job.charged = True
+                    # Recorded right away, so a process taking the job over doesn't charge it again.
+                    if job.log_id and not job.logged:
+                        self._persist(job)
+            except Exception as e:
+                logger.error(f"Failed to deduct {total} from balance of user {user_id}: {e}", exc_info=True)
+
+    async def _update_logs(self, jobs: List[CostJob]) -> None:
+        per_log: Dict[str, List[CostJob]] = defaultdict(list)
+        for job in jobs:
+            if job.log_id and not job.logged:
+                per_log[job.log_id].append(job)
+
+        db_service = get_database_service()
+        for log_id, log_jobs in per_log.items():
+            total = sum(job.cost for job in log_jobs)
+            try:
+                updated = await asyncio.to_thread(db_service.add_cost_to_log_entry, log_id, total)
+            except Exception as e:
+                logger.error(f"Failed to add cost to log entry {log_id}: {e}", exc_info=True)
+                updated = False
+            if updated:
+                for job in log_jobs:
+                    job.logged = True
+
+    def _retry_or_drop(self, job: CostJob, reason: str) -> None:
+        if job.schedule_retry():
+            self._persist(job)
+            self._pending.append(job)
+            self._wakeup.set()
+        else:
+            self._forget(job)
+            logger.error(
+                f"Giving up on cost reconciliation for generation {job.generation_id} after "
+                f"{job.attempts} attempts ({reason}). Cost: {job.cost}, charged: {job.charged}, logged: {job.logged}"
+            )
+
+
+_cost_reconciler = None
+
+def get_cost_reconciler() -> CostReconciler:
+    """Get the global cost reconciler instance (lazy initialization)"""
+    global _cost_reconciler
+    if _cost_reconciler is None:
+        _cost_reconciler = CostReconciler()
+    return _cost_reconciler
@@ -57,7 +57,8 @@ class DatabaseService:
                     'total_tokens': "ALTER TABLE logs ADD COLUMN total_tokens INTEGER",
                     'total_cost': "ALTER TABLE logs ADD COLUMN total_cost REAL",
                     'user_id': "ALTER TABLE logs ADD COLUMN user_id TEXT",
-                    'model': "ALTER TABLE logs ADD COLUMN model TEXT"
+                    'model': "ALTER TABLE logs ADD COLUMN model TEXT",
+                    'cache_hit': "ALTER TABLE logs ADD COLUMN cache_hit BOOLEAN DEFAULT FALSE"
                 }
 
                 for col, statement in migrations.items():
@@ -118,7 +119,7 @@ class DatabaseService:
             'id', 'reference_string', 'log_type', 'workflow_id', 'workflow_instance_id',
             'workflow_name', 'step_id', 'step_instance_id', 'step_name', 'messages',
             'needs_review', 'feedback', 'start_time', 'end_time', 'anonymized',
-            'prompt_tokens', 'completion_tokens', 'total_tokens', 'total_cost', 'user_id', 'model'
+            'prompt_tokens', 'completion_tokens', 'total_tokens', 'total_cost', 'user_id', 'model', 'cache_hit'
         ]
         
         # Select only the columns that exist in the old table
@@ -147,8 +148,8 @@ class DatabaseService:
             with sqlite3.connect(self.db_path) as conn:
                 conn.execute(
                     """
-                    INSERT INTO logs (id, reference_string, log_type, workflow_id, workflow_instance_id, workflow_name, step_id, step_instance_id, step_name, messages, needs_review, feedback, start_time, end_time, anonymized, prompt_tokens, completion_tokens, total_tokens, total_cost, user_id, model)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    INSERT INTO logs (id, reference_string, log_type, workflow_id, workflow_instance_id, workflow_name, step_id, step_instance_id, step_name, messages, needs_review, feedback, start_time, end_time, anonymized, prompt_tokens, completion_tokens, total_tokens, total_cost, user_id, model, cache_hit)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                     """,
                     (
                         log_entry.id,
@@ -172,6 +173,7 @@ class DatabaseService:
                         log_entry.total_cost,
                         log_entry.user_id,
                         log_entry.model,
+                        log_entry.cache_hit,
                     )
                 )
                 conn.commit()
@@ -197,8 +199,8 @@ class DatabaseService:
             with sqlite3.connect(self.db_path) as conn:
                 conn.execute(
                     """
-                    INSERT INTO logs (id, reference_string, log_type, workflow_id, workflow_instance_id, workflow_name, step_id, step_instance_id, step_name, messages, needs_review, feedback, start_time, end_time, anonymized, prompt_tokens, completion_tokens, total_tokens, total_cost, user_id, model)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    INSERT INTO logs (id, reference_string, log_type, workflow_id, workflow_instance_id, workflow_name, step_id, step_instance_id, step_name, messages, needs_review, feedback, start_time, end_time, anonymized, prompt_tokens, completion_tokens, total_tokens, total_cost, user_id, model, cache_hit)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                     ON CONFLICT(id) DO UPDATE SET
                         reference_string = excluded.reference_string,
                         log_type = excluded.log_type,
@@ -217,9 +219,10 @@ class DatabaseService:
                         prompt_tokens = excluded.prompt_tokens,
                         completion_tokens = excluded.completion_tokens,
                         total_tokens = excluded.total_tokens,
-                        total_cost = excluded.total_cost,
+                        total_cost = COALESCE(excluded.total_cost, logs.total_cost),
                         user_id = excluded.user_id,
-                        model = excluded.model
+                        model = excluded.model,
+                        cache_hit = excluded.cache_hit
                     """,
                     (
                         log_entry.id,
@@ -243,6 +246,7 @@ class DatabaseService:
                         log_entry.total_cost,
                         log_entry.user_id,
                         log_entry.model,
+                        log_entry.cache_hit,
                     )
                 )
                 conn.commit()
@@ -253,6 +257,23 @@ class DatabaseService:
             logger.error(f"Failed to upsert log entry {log_entry.id}: {e}", exc_info=True)
             raise
 
+    def add_cost_to_log_entry(self, log_id: str, cost: float) -> bool:
+        """
+        Atomically adds a cost to the total_cost of an existing log entry.
+        Returns False if the log entry does not exist (yet).
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.execute(
+                    "UPDATE logs SET total_cost = COALESCE(total_cost, 0) + ? WHERE id = ?",
+                    (cost, log_id),
+                )
+                conn.commit()
+                return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"Failed to add cost to log entry {log_id}: {e}", exc_info=True)
+            raise
+
     def get_log_entry(self, log_id: str, user_id: str) -> Optional[LogEntry]:
         """
         Retrieve a log entry from the database, filtered by user.
@@ -455,6 +476,7 @@ class DatabaseService:
         log_data['completion_tokens'] = log_data.get('completion_tokens')
         log_data['total_tokens'] = log_data.get('total_tokens')
         log_data['total_cost'] = log_data.get('total_cost')
+        log_data['cache_hit'] = bool(log_data.get('cache_hit'))
         
         return LogEntry.model_validate(log_data)
 
@@ -42,5 +42,7 @@ class LogEntry(BaseModel):
     total_tokens: Optional[int] = None
     total_cost: Optional[float] = None
     model: Optional[str] = None
+    # True when the LLM call was answered from the LLM response cache (nothing was generated or charged)
+    cache_hit: bool = False
 
     model_config = {"extra": "allow"}
@@ -23,7 +23,8 @@ CREATE TABLE IF NOT EXISTS logs (
     total_tokens INTEGER,
     total_cost REAL,
     user_id TEXT,
-    model TEXT
+    model TEXT,
+    cache_hit BOOLEAN DEFAULT FALSE
 );
 
 -- Index on start_time for chronological queries
@@ -0,0 +1,137 @@
+import asyncio
+import sys
+import os
+from unittest.mock import MagicMock, AsyncMock, patch
+from uuid import uuid4
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+from agentlogger.src import cost_reconciler
+from agentlogger.src.cost_reconciler import CostJob, CostReconciler, GenerationNotReady
+from shared.redis.keys import RedisKeys
+
+
+class FakeRedis:
+    """The subset of redis-py used by the reconciler; pipelines run immediately."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.values = {}
+
+    def pipeline(self):
+        return self
+
+    def execute(self):
+        pass
+
+    def hset(self, name, key, value):
+        self.hashes.setdefault(name, {})[key] = value
+
+    def hgetall(self, name):
+        return dict(self.hashes.get(name, {}))
+
+    def hdel(self, name, key):
+        self.hashes.get(name, {}).pop(key, None)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.values:
+            return False
+        self.values[key] = value
+        return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+@pytest.fixture(autouse=True)
+def no_delays(monkeypatch):
+    monkeypatch.setattr(cost_reconciler, "INITIAL_DELAY_S", 0.0)
+    monkeypatch.setattr(cost_reconciler, "BACKOFF_BASE_S", 0.01)
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(cost_reconciler, "get_redis_client", lambda: redis)
+    return redis
+
+
+@patch('agentlogger.src.cost_reconciler.get_database_service')
+@patch('agentlogger.src.cost_reconciler.user_client')
+def test_costs_are_batched_per_user_and_per_log(mock_user_client, mock_get_db, fake_redis):
+    """Two generations of one agent step result in one deduction and one log update."""
+    mock_db = MagicMock()
+    mock_db.add_cost_to_log_entry.return_value = True
+    mock_get_db.return_value = mock_db
+    user_id = uuid4()
+
+    async def run():
+        reconciler = CostReconciler()
+        reconciler._fetch_cost = AsyncMock(side_effect=[0.25, 0.5])
+        reconciler.enqueue("gen-1", user_id=user_id, log_id="log-1")
+        reconciler.enqueue("gen-2", user_id=user_id, log_id="log-1")
+        await reconciler.drain(timeout=2)
+        return reconciler
+
+    reconciler = asyncio.run(run())
+
+    assert reconciler.pending_count() == 0
+    mock_user_client.deduct_from_balance.assert_called_once_with(user_id, 0.75)
+    mock_db.add_cost_to_log_entry.assert_called_once_with("log-1", 0.75)
+    # Finished jobs are no longer persisted.
+    assert fake_redis.hgetall(RedisKeys.COST_RECONCILER_JOBS) == {}
+
+
+@patch('agentlogger.src.cost_reconciler.get_database_service')
+@patch('agentlogger.src.cost_reconciler.user_client')
+def test_unavailable_cost_is_retried_without_double_charging(mock_user_client, mock_get_db):
+    """A generation that isn't published yet is retried; a missing log row doesn't re-charge the user."""
+    mock_db = MagicMock()
+    mock_db.add_cost_to_log_entry.side_effect = [False, True]
+    mock_get_db.return_value = mock_db
+    user_id = uuid4()
+
+    async def run():
+        reconciler = CostReconciler()
+        reconciler._fetch_cost = AsyncMock(side_effect=[GenerationNotReady("gen-1"), 0.1])
+        reconciler.enqueue("gen-1", user_id=user_id, log_id="log-1")
+        await reconciler.drain(timeout=2)
+        return reconciler
+
+    reconciler = asyncio.run(run())
+
+    assert reconciler.pending_count() == 0
+    assert reconciler._fetch_cost.await_count == 2
+    mock_user_client.deduct_from_balance.assert_called_once_with(user_id, 0.1)
+    assert mock_db.add_cost_to_log_entry.call_count == 2
+
+
+@patch('agentlogger.src.cost_reconciler.get_database_service')
+@patch('agentlogger.src.cost_reconciler.user_client')
+def test_jobs_abandoned_by_another_process_are_taken_over(mock_user_client, mock_get_db, fake_redis):
+    """A job persisted by a stopped process, whose lease expired, is finished without charging twice."""
+    mock_db = MagicMock()
+    mock_db.add_cost_to_log_entry.return_value = True
+    mock_get_db.return_value = mock_db
+    user_id = uuid4()
+    # Charged before the other process stopped, but the log entry was never updated.
+    abandoned = CostJob(generation_id="gen-1", user_id=user_id, log_id="log-1", cost=0.3, charged=True)
+    fake_redis.hset(RedisKeys.COST_RECONCILER_JOBS, "gen-1", abandoned.to_json())
+    # Still leased by a live process: left alone.
+    leased = CostJob(generation_id="gen-2", user_id=user_id)
+    fake_redis.hset(RedisKeys.COST_RECONCILER_JOBS, "gen-2", leased.to_json())
+    fake_redis.set(RedisKeys.get_cost_reconciler_lease_key("gen-2"), "other-process")
+
+    async def run():
+        reconciler = CostReconciler()
+        reconciler._fetch_cost = AsyncMock()
+        reconciler.start()
+        await asyncio.sleep(0.1)
+        await reconciler.drain(timeout=2)
+
+    asyncio.run(run())
+
+    mock_user_client.deduct_from_balance.assert_not_called()
+    mock_db.add_cost_to_log_entry.assert_called_once_with("log-1", 0.3)
+    assert list(fake_redis.hgetall(RedisKeys.COST_RECONCILER_JOBS)) == ["gen-2"]
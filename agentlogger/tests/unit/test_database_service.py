@@ -0,0 +1,33 @@
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+from agentlogger.src.database_service import DatabaseService
+from agentlogger.src.models import LogEntry
+
+
+def test_cache_hit_is_stored_and_read_back(tmp_path):
+    db = DatabaseService(str(tmp_path / "agentlogger.db"))
+    db.upsert_log_entry(LogEntry(id="hit", user_id="u1", log_type="custom_llm", model="m", cache_hit=True))
+    db.create_log_entry(LogEntry(id="miss", user_id="u1", log_type="custom_llm", model="m"))
+
+    assert db.get_log_entry("hit", "u1").cache_hit is True
+    assert db.get_log_entry("miss", "u1").cache_hit is False
+
+
+def test_existing_database_gets_the_cache_hit_column(tmp_path):
+    path = str(tmp_path / "agentlogger.db")
+    schema_path = os.path.join(os.path.dirname(__file__), '../../src/schema.sql')
+    with open(schema_path) as f:
+        create_table = f.read().split(';')[0]
+    # The logs table as it was before the column was added.
+    create_table = create_table.replace(",\n    cache_hit BOOLEAN DEFAULT FALSE", "")
+    with sqlite3.connect(path) as conn:
+        conn.execute(create_table)
+        conn.execute("INSERT INTO logs (id, log_type, start_time, user_id) VALUES ('old', 'workflow', '2024-01-01T00:00:00+00:00', 'u1')")
+
+    db = DatabaseService(path)
+
+    assert db.get_log_entry("old", "u1").cache_hit is False
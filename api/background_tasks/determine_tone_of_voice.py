@@ -1,9 +1,11 @@
 import asyncio
 import logging
 import json
+from typing import Any, Dict, List
 from uuid import UUID
 from qdrant_client import models
 
+from shared.config import settings
 from shared.qdrant.qdrant_client import get_payload_field_distribution, get_diverse_set_by_filter
 from shared.redis.redis_client import get_redis_client
 from shared.redis.keys import RedisKeys
@@ -15,10 +17,53 @@ logger = logging.getLogger(__name__)
 MINIMUM_EMAILS_FOR_TONE_ANALYSIS = 10
 DIVERSE_SET_LIMIT = 10
 
+
+def _load_emails_for_language(user_uuid: UUID, language: str) -> List[Dict[str, Any]]:
+    """Messages of a diverse set of the user's threads in `language` that contain a reply by the user."""
+    query_filter = models.Filter(
+        must=[
+            models.FieldCondition(key="language", match=models.MatchValue(value=language)),
+            models.FieldCondition(key="contains_user_reply", match=models.MatchValue(value=True))
+        ]
+    )
+
+    diverse_thread_payloads = get_diverse_set_by_filter(
+        user_uuid=user_uuid,
+        query_filter=query_filter,
+        limit=DIVERSE_SET_LIMIT,
+        with_content=True,
+    )
+
+    return [
+        {
+            "thread_id": thread.get("thread_id"),
+            "sender": message.get("from_"),
+            "body": message.get("body_cleaned"),
+            "language": language
+        }
+        for thread in diverse_thread_payloads or []
+        for message in thread.get("messages") or []
+    ]
+
+
+def _load_stored_profile(redis_client, profile_key: str) -> Dict[str, Any]:
+    try:
+        stored = redis_client.get(profile_key)
+        return json.loads(stored) if stored else {}
+    except (TypeError, ValueError):
+        logger.warning(f"Ignoring unreadable tone profile stored at {profile_key}.")
+        return {}
+
+
 async def determine_user_tone_of_voice(user_uuid: UUID):
     """
     Analyzes a specific user's writing style to determine their tone of voice.
     This process is user-specific, using the user's dedicated vector collection.
+
+    Eligible languages are analyzed concurrently (TONE_OF_VOICE_LANGUAGE_CONCURRENCY at a
+    time), with their LLM calls sharing one cap (TONE_OF_VOICE_LLM_CONCURRENCY). Each
+    language's profile is written to Redis as soon as it is ready; a language that fails
+    keeps the profile of the previous run, and does not affect the others.
     """
     logger.info(f"Starting tone of voice determination for user: {user_uuid}")
     redis_client = get_redis_client()
@@ -59,61 +104,61 @@ async def determine_user_tone_of_voice(user_uuid: UUID):
             redis_client.set(status_key, "failed")
             return
 
-        full_tone_profile = {}
+        # Profiles of the previous run stand in for languages that fail this time.
+        profile_key = RedisKeys.get_tone_of_voice_profile_key(user_uuid)
+        full_tone_profile = {
+            language: profile
+            for language, profile in _load_stored_profile(redis_client, profile_key).items()
+            if language in eligible_languages
+        }
+        language_slots = asyncio.Semaphore(max(1, settings.TONE_OF_VOICE_LANGUAGE_CONCURRENCY))
+        llm_slots = asyncio.Semaphore(max(1, settings.TONE_OF_VOICE_LLM_CONCURRENCY))
+        generated, failed = [], []
 
         # 3. Process each eligible language
-        for language in eligible_languages:
-            logger.info(f"Processing language '{language}' for user {user_uuid}")
-            
-            query_filter = models.Filter(
-                must=[
-                    models.FieldCondition(key="language", match=models.MatchValue(value=language)),
-                    models.FieldCondition(key="contains_user_reply", match=models.MatchValue(value=True))
-                ]
-            )
-            
-            diverse_thread_payloads = get_diverse_set_by_filter(
-                user_uuid=user_uuid,
-                query_filter=query_filter,
-                limit=DIVERSE_SET_LIMIT
-            )
-
-            if diverse_thread_payloads:
-                emails_for_analysis = [
-                    {
-                        "thread_id": thread.get("thread_id"),
-                        "sender": message.get("from_"),
-                        "body": message.get("body_cleaned"),
-                        "language": language
-                    }
-                    for thread in diverse_thread_payloads
-                    for message in thread.get("messages", [])
-                ]
-                
-                logger.info(f"Prepared {len(emails_for_analysis)} emails for '{language}' analysis for user {user_uuid}.")
-
-                tone_profile = await analyze_tone_for_language(
-                    language_emails=emails_for_analysis,
-                    user_email=user_email,
-                    language=language
-                )
-                
-                if tone_profile:
-                    logger.info(f"Generated tone profile for '{language}' for user {user_uuid}.")
-                    full_tone_profile[language] = tone_profile
-                else:
+        async def _process_language(language: str) -> None:
+            async with language_slots:
+                try:
+                    logger.info(f"Processing language '{language}' for user {user_uuid}")
+                    emails_for_analysis = await asyncio.to_thread(_load_emails_for_language, user_uuid, language)
+                    if not emails_for_analysis:
+                        logger.warning(f"Could not select diverse set of emails for '{language}' for user {user_uuid}.")
+                        return
+
+                    logger.info(f"Prepared {len(emails_for_analysis)} emails for '{language}' analysis for user {user_uuid}.")
+
+                    tone_profile = await analyze_tone_for_language(
+                        language_emails=emails_for_analysis,
+                        user_email=user_email,
+                        language=language,
+                        user_id=user_uuid,
+                        llm_slots=llm_slots,
+                    )
+                except Exception as e:
+                    logger.error(f"Tone analysis for '{language}' for user {user_uuid} failed: {e}", exc_info=True)
+                    failed.append(language)
+                    return
+
+                if not tone_profile:
                     logger.warning(f"Tone analysis for '{language}' for user {user_uuid} returned no profile.")
-                
-            else:
-                logger.warning(f"Could not select diverse set of emails for '{language}' for user {user_uuid}.")
-        
-        # 4. Store the final profile in Redis
-        profile_key = RedisKeys.get_tone_of_voice_profile_key(user_uuid)
-        if full_tone_profile:
-            logger.info(f"Saving aggregated tone profile for user {user_uuid} to Redis.")
-            redis_client.set(profile_key, json.dumps(full_tone_profile))
-        else:
+                    return
+
+                # 4. Store the profile in Redis as soon as this language is done
+                logger.info(f"Generated tone profile for '{language}' for user {user_uuid}; saving it to Redis.")
+                full_tone_profile[language] = tone_profile
+                generated.append(language)
+                redis_client.set(profile_key, json.dumps(full_tone_profile))
+
+        await asyncio.gather(*(_process_language(language) for language in eligible_languages))
+
+        if not generated:
             logger.warning(f"No tone profiles generated for user {user_uuid}. Nothing to save.")
+        if failed and not generated:
+            logger.error(f"Tone analysis failed for every language of user {user_uuid}: {failed}")
+            redis_client.set(status_key, "failed")
+            return
+        if failed:
+            logger.warning(f"Tone analysis for user {user_uuid} failed for {failed}; kept their previous profiles.")
 
         logger.info(f"Tone of voice determination completed for user {user_uuid}.")
         redis_client.set(status_key, "completed")
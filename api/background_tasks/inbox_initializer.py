@@ -1,15 +1,18 @@
 import asyncio
 import logging
 from datetime import datetime
-from langdetect import detect, LangDetectException
 from uuid import UUID
 
 from mcp_servers.imap_mcpserver.src.imap_client.client import get_recent_threads_bulk
+from mcp_servers.imap_mcpserver.src.imap_client.internals.change_tracker import sync_folder_changes
 from shared.qdrant.qdrant_client import upsert_points, generate_qdrant_point_id
+from shared.qdrant.thread_content_store import get_thread_content_store
+from shared.qdrant.sparse_vectors import SPARSE_VECTOR_NAME, document_sparse_vector
 from qdrant_client import models
 from shared.redis.redis_client import get_redis_client
 from shared.redis.keys import RedisKeys
 from shared.services.embedding_service import get_embedding
+from shared.services.language_detection import detect_languages, language_sample
 from api.background_tasks.determine_tone_of_voice import determine_user_tone_of_voice
 from shared.config import VECTORIZATION_VERSION
 
@@ -17,15 +20,9 @@ logger = logging.getLogger(__name__)
 
 BATCH_SIZE = 10
 
-def _detect_language(text: str) -> str:
-    """Detects the language of a given text."""
-    if not text or not text.strip():
-        return "unknown"
-    try:
-        return detect(text)
-    except LangDetectException:
-        logger.warning("Language detection failed for a text snippet.")
-        return "unknown"
+def _language_sample(thread) -> str:
+    """Detection sample of a thread: its cleaned bodies, or their markdown for HTML-only messages."""
+    return language_sample(msg.body_cleaned or msg.body_markdown for msg in thread.messages)
 
 async def initialize_inbox(user_uuid: UUID):
     """
@@ -47,6 +44,13 @@ async def initialize_inbox(user_uuid: UUID):
     redis_client.set(tone_status_key, "running")
     
     try:
+        # Step 0: Record the All Mail mod-sequence baseline, so label changes made while
+        # (and after) the threads are indexed are picked up by the incremental label sync.
+        try:
+            await sync_folder_changes(user_uuid, '\\All')
+        except Exception as e:
+            logger.warning(f"Could not record mailbox sync baseline for user {user_uuid}: {e}")
+
         # Step 1: Fetch threads from "Sent Mail"
         logger.info(f"Fetching sent threads for user {user_uuid}...")
         sent_threads, sent_timing = await get_recent_threads_bulk(
@@ -89,7 +93,15 @@ async def initialize_inbox(user_uuid: UUID):
             redis_client.delete(interruption_key)
             return
 
+        # Detect all languages in one pass: cached results are reused and the rest
+        # may be spread over a process pool, off the event loop.
+        thread_languages = await asyncio.to_thread(
+            detect_languages, [_language_sample(thread) for thread in recent_threads]
+        )
+
         points_batch = []
+        contents_batch = {}
+        content_store = get_thread_content_store(user_uuid)
         successful_threads = 0
 
         for i, thread in enumerate(recent_threads):
@@ -105,15 +117,21 @@ async def initialize_inbox(user_uuid: UUID):
                     embedding = get_embedding(f"embed this email thread, focus on the meaning of the conversation: {thread_markdown}", user_uuid=user_uuid)
                     point_id = generate_qdrant_point_id(thread.thread_id)
                     messages_payload = [{"from_": msg.from_, "date": msg.date, "body_cleaned": msg.body_cleaned, "type": msg.type} for msg in thread.messages]
+                    # Bodies go to the local content store; the point only keeps metadata and the content key.
+                    contents_batch[point_id] = {
+                        "thread_id": thread.thread_id,
+                        "thread_markdown": thread_markdown,
+                        "messages": messages_payload,
+                    }
                     
                     point = models.PointStruct(
                         id=point_id,
-                        vector=embedding,
+                        # The unnamed dense vector plus the BM25 sparse vector for hybrid search.
+                        vector={"": embedding, SPARSE_VECTOR_NAME: document_sparse_vector(thread_markdown)},
                         payload={
                             "thread_id": thread.thread_id,
-                            "thread_markdown": thread_markdown,
-                            "messages": messages_payload,
-                            "language": _detect_language(thread_markdown),
+                            "content_key": point_id,
+                            "language": thread_languages[i],
                             "message_count": thread.message_count,
                             "subject": thread.subject,
                             "participants": thread.participants,
@@ -132,8 +150,10 @@ async def initialize_inbox(user_uuid: UUID):
                             return
                             
                         logger.info(f"Upserting batch of {len(points_batch)} points for user {user_uuid}.")
+                        content_store.put_many(contents_batch)
                         upsert_points(user_uuid=user_uuid, points=points_batch)
                         points_batch = []
+                        contents_batch = {}
 
             except Exception as e:
                 logger.error(f"Error processing thread {thread.thread_id} for user {user_uuid}: {e}", exc_info=True)
@@ -145,6 +165,7 @@ async def initialize_inbox(user_uuid: UUID):
                 return
                 
             logger.info(f"Upserting remaining {len(points_batch)} points for user {user_uuid}.")
+            content_store.put_many(contents_batch)
             upsert_points(user_uuid=user_uuid, points=points_batch)
 
         if successful_threads == 0 and recent_threads:
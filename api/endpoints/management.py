@@ -21,7 +21,9 @@ from agentlogger.src.client import (
     get_cost_history,
 )
 
-from api.endpoints.auth import get_current_user
+from shared.services.llm_gateway import llm_gateway
+from api.endpoints.auth import get_current_user, auth_timings
+from user import client as user_client
 from api.endpoints.user import is_admin
 
 
@@ -106,3 +108,16 @@ def admin_get_costs(user_uuid: UUID):
     return CostHistoryResponse(costs=cost_entries, total_costs=total_costs)
 
 
+@router.get("/llm-gateway/metrics")
+def admin_get_llm_gateway_metrics():
+    """
+    Queue depths, scheduler wait times and rate-limit state of the LLM gateway in this
+    API process only; LLM calls made by the trigger service are paced and counted there.
+    """
+    return llm_gateway.get_metrics()
+
+
+@router.get("/auth/metrics")
+def admin_get_auth_metrics():
+    """Per-request auth overhead and auth cache hit rates in this API process."""
+    return {"get_current_user": auth_timings.snapshot(), "caches": user_client.get_auth_cache_stats()}
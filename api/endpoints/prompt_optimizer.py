@@ -1,4 +1,4 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
@@ -11,6 +11,7 @@ from fastapi import BackgroundTasks
 
 from prompt_optimizer import client as prompt_optimizer_client
 from prompt_optimizer import service, database
+from prompt_optimizer.evaluation_executor import run_is_active
 from prompt_optimizer.models import EvaluationTemplate, EvaluationTemplateCreate, EvaluationTemplateLight, EvaluationRun
 from datetime import datetime, timezone
 from api.endpoints.auth import get_current_user
@@ -227,6 +228,39 @@ async def run_evaluation(
     return created_run
 
 
+@router.post("/evaluation/runs/{run_id}/resume", response_model=EvaluationRun)
+async def resume_evaluation_run(
+    run_id: UUID,
+    background_tasks: BackgroundTasks,
+    user: User = Depends(get_current_user),
+):
+    """
+    Resumes an interrupted or failed evaluation run in the background.
+    Test cases that already completed are not evaluated (or paid for) again.
+    A run that is still being worked on (see `run_is_active`) is not resumed.
+    """
+    run = database.get_evaluation_run(run_uuid=run_id, user_id=user.uuid)
+    if not run:
+        raise HTTPException(status_code=404, detail="Evaluation run not found.")
+    if run.status == "completed":
+        raise HTTPException(status_code=409, detail="Evaluation run is already completed.")
+    if run_is_active(run):
+        raise HTTPException(status_code=409, detail="Evaluation run is already running.")
+
+    # Claim the run right away, so a second resume is rejected before the task starts.
+    run.status = "running"
+    run.progress = {**(run.progress or {}), "updated_at": datetime.now(timezone.utc).isoformat()}
+    database.update_evaluation_run(run)
+    database.update_evaluation_run_progress(run.uuid, user.uuid, run.progress)
+
+    background_tasks.add_task(
+        service.run_evaluation_and_refinement,
+        run_uuid=run.uuid,
+        user_id=user.uuid
+    )
+    return run
+
+
 @router.get("/evaluation/runs/{run_id}", response_model=EvaluationRun)
 async def get_evaluation_run_details(
     run_id: UUID,
@@ -245,6 +279,7 @@ class ListThreadsRequest(BaseModel):
     filters: Dict[str, Any]
     page: int = 1
     page_size: int = 50
+    cursor: Optional[str] = None
 
 class CollectIdsRequest(BaseModel):
     filters: Dict[str, Any]
@@ -265,7 +300,8 @@ async def list_threads_for_selection(
             filters=request.filters,
             page=request.page,
             page_size=request.page_size,
-            user_id=user.uuid
+            user_id=user.uuid,
+            cursor=request.cursor,
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 from typing import Any, Dict, List, Optional
@@ -8,11 +9,12 @@ import re
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, Request, UploadFile, File
 from pydantic import BaseModel
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, StreamingResponse
 
 import workflow.client as workflow_client
 import workflow.trigger_client as trigger_client
 import workflow.internals.runner as runner
+from workflow.internals.step_events import subscribe_step_events
 from workflow_agent.client import client as workflow_agent_client
 from workflow.models import (
     StepOutputData,
@@ -38,9 +40,6 @@ from .auth import get_current_user
 from agentlogger.src.client import upsert_and_forward_log_entry, get_log_entry
 from agentlogger.src.models import LogEntry, Message as LoggerMessage
 from user.models import User
-from mcp_servers.tone_of_voice_mcpserver.src.services.openrouter_service import (
-    openrouter_service,
-)
 
 
 logger = logging.getLogger(__name__)
@@ -65,6 +64,14 @@ class UpdateWorkflowDetailsRequest(BaseModel):
 # A simple cache for the LLM models to avoid reading the file on every request
 llm_models_cache = None
 
+# Disable proxy buffering so server-sent events reach the client immediately
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def _format_sse(event: Dict[str, Any]) -> str:
+    return f"data: {json.dumps(event, default=str)}\n\n"
+
+
 @router.get("/available-llm-models", response_model=List[Dict[str, Any]])
 async def get_available_llm_models():
     """
@@ -557,6 +564,44 @@ async def get_workflow_instance(
     return instance
 
 
+@router.get(
+    "/instances/{instance_uuid}/stream",
+    summary="Stream the progress of a workflow instance",
+)
+async def stream_workflow_instance(
+    instance_uuid: UUID, user: User = Depends(get_current_user)
+):
+    """
+    Streams LLM tokens, tool-call deltas and step completions of a running
+    workflow instance as server-sent events, ending with `workflow_finished`.
+    Clients fetch the instance afterwards for the persisted results.
+    """
+    instance = await workflow_client.get_instance(
+        instance_uuid=instance_uuid, user_id=user.uuid
+    )
+    if not instance:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Workflow instance not found"
+        )
+
+    async def event_stream():
+        async with subscribe_step_events(user.uuid, instance_uuid) as events:
+            # Re-check after subscribing, so a run that finished in between isn't missed.
+            current = await workflow_client.get_instance(instance_uuid=instance_uuid, user_id=user.uuid)
+            if current and current.status != "running":
+                yield _format_sse({"type": "workflow_finished", "status": current.status})
+                return
+            async for event in events:
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _format_sse(event)
+                if event.get("type") == "workflow_finished":
+                    return
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 #
 # Utility & Data Endpoints
 #
@@ -703,6 +748,40 @@ async def update_workflow_trigger(
 #
 # Workflow Agent Chat Endpoints
 #
+async def _log_workflow_agent_turn(
+    workflow_uuid: UUID, request: ChatRequest, chat_response: ChatStepResponse, user: User
+):
+    """Upserts the conversation's log entry after a workflow agent turn."""
+    try:
+        workflow = await workflow_client.get(uuid=workflow_uuid, user_id=user.uuid)
+        
+        existing_log = get_log_entry(request.conversation_id, user_id=str(user.uuid))
+        start_time = existing_log.start_time if existing_log else datetime.now(timezone.utc)
+        end_time = datetime.now(timezone.utc) if chat_response.is_complete else None
+
+        logger_messages = [LoggerMessage.model_validate(msg.model_dump()) for msg in chat_response.messages]
+
+        log_entry = LogEntry(
+            id=request.conversation_id,
+            user_id=str(user.uuid),
+            log_type='workflow_agent',
+            workflow_id=str(workflow_uuid),
+            workflow_name=workflow.name if workflow else "Workflow Configuration Agent",
+            step_instance_id=request.conversation_id,
+            step_name="Workflow Configuration Agent Chat",
+            messages=logger_messages,
+            start_time=start_time,
+            end_time=end_time,
+            prompt_tokens=chat_response.prompt_tokens,
+            completion_tokens=chat_response.completion_tokens,
+            total_tokens=chat_response.total_tokens,
+            # total_cost is left unset: the cost reconciler accumulates it on this log entry.
+        )
+        await upsert_and_forward_log_entry(log_entry)
+    except Exception as e:
+        logger.error(f"Failed to log workflow agent turn for conversation {request.conversation_id}: {e}", exc_info=True)
+
+
 @router.post(
     "/{workflow_uuid}/chat/step",
     response_model=ChatStepResponse,
@@ -722,43 +801,7 @@ async def workflow_agent_chat_step(
             request=request, user_id=user.uuid, workflow_uuid=workflow_uuid
         )
 
-        # --- Add Logging ---
-        try:
-            workflow = await workflow_client.get(uuid=workflow_uuid, user_id=user.uuid)
-            
-            existing_log = get_log_entry(request.conversation_id, user_id=str(user.uuid))
-            start_time = existing_log.start_time if existing_log else datetime.now(timezone.utc)
-            end_time = datetime.now(timezone.utc) if chat_response.is_complete else None
-
-            logger_messages = [LoggerMessage.model_validate(msg.model_dump()) for msg in chat_response.messages]
-
-            total_cost = None
-            if chat_response.generation_id:
-                try:
-                    total_cost = await openrouter_service.get_generation_cost(chat_response.generation_id)
-                except Exception as e:
-                    logger.error(f"Could not retrieve cost for generation {chat_response.generation_id}: {e}")
-
-            log_entry = LogEntry(
-                id=request.conversation_id,
-                user_id=str(user.uuid),
-                log_type='workflow_agent',
-                workflow_id=str(workflow_uuid),
-                workflow_name=workflow.name if workflow else "Workflow Configuration Agent",
-                step_instance_id=request.conversation_id,
-                step_name="Workflow Configuration Agent Chat",
-                messages=logger_messages,
-                start_time=start_time,
-                end_time=end_time,
-                prompt_tokens=chat_response.prompt_tokens,
-                completion_tokens=chat_response.completion_tokens,
-                total_tokens=chat_response.total_tokens,
-                total_cost=total_cost,
-            )
-            await upsert_and_forward_log_entry(log_entry)
-        except Exception as e:
-            logger.error(f"Failed to log workflow agent turn for conversation {request.conversation_id}: {e}", exc_info=True)
-        # --- End Logging ---
+        await _log_workflow_agent_turn(workflow_uuid, request, chat_response, user)
         
         return chat_response
     except HTTPException:
@@ -769,6 +812,57 @@ async def workflow_agent_chat_step(
         raise HTTPException(status_code=500, detail="An error occurred during the agent chat turn.") 
 
 
+@router.post(
+    "/{workflow_uuid}/chat/step/stream",
+    summary="Execute a single step in a workflow agent chat, streaming the LLM output",
+    tags=["Workflow Agent"],
+)
+async def workflow_agent_chat_step_stream(
+    workflow_uuid: UUID,
+    request: ChatRequest,
+    user: User = Depends(get_current_user),
+):
+    """
+    Streaming variant of the chat step endpoint (server-sent events).
+
+    Emits `token` and `tool_call_delta` events while the agent's LLM call is
+    generating, then a single `result` event carrying the ChatStepResponse
+    (or an `error` event).
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def on_delta(event: Dict[str, Any]) -> None:
+        await queue.put(event)
+
+    async def run_step() -> None:
+        try:
+            chat_response = await workflow_agent_client.run_chat_step(
+                request=request, user_id=user.uuid, workflow_uuid=workflow_uuid, on_delta=on_delta
+            )
+            await _log_workflow_agent_turn(workflow_uuid, request, chat_response, user)
+            await queue.put({"type": "result", "data": chat_response.model_dump(mode="json")})
+        except HTTPException as e:
+            await queue.put({"type": "error", "status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.error(f"Error during streamed agent chat step for workflow {workflow_uuid}: {e}", exc_info=True)
+            await queue.put({"type": "error", "status_code": 500, "detail": "An error occurred during the agent chat turn."})
+
+    async def event_stream():
+        task = asyncio.create_task(run_step())
+        try:
+            while True:
+                event = await queue.get()
+                yield _format_sse(event)
+                if event["type"] in ("result", "error"):
+                    break
+        finally:
+            # The client may disconnect early; don't leave the turn running unobserved.
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 @router.post(
     "/{workflow_uuid}/chat/submit_human_input",
     response_model=ChatStepResponse,
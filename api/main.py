@@ -58,9 +58,21 @@ async def lifespan(app: FastAPI):
 
     except Exception as e:
         logger.error(f"Error during startup status check: {e}", exc_info=True)
+
+    # Reconcile generation costs, including those left behind by other processes.
+    from agentlogger.src.client import start_cost_reconciler
+    start_cost_reconciler()
     
     yield
 
+    # Apply any generation costs that are still waiting for reconciliation.
+    from agentlogger.src.client import drain_cost_reconciler
+    await drain_cost_reconciler()
+
+    # Close MCP sessions pooled by agent steps.
+    from workflow.internals.mcp_pool import mcp_session_pool
+    await mcp_session_pool.close_all()
+
 
 app = FastAPI(lifespan=lifespan)
 
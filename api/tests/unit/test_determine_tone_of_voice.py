@@ -0,0 +1,104 @@
+import asyncio
+import json
+import os
+import sys
+from unittest.mock import MagicMock, patch
+from uuid import uuid4
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+from api.background_tasks import determine_tone_of_voice as task
+from mcp_servers.tone_of_voice_mcpserver.src.internals import tone_of_voice_analyzer as analyzer
+from shared.redis.keys import RedisKeys
+
+USER_EMAIL = "me@example.com"
+
+
+class FakeRedis:
+    def __init__(self, data=None):
+        self.data = dict(data or {})
+        self.profile_writes = []
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value):
+        self.data[key] = value
+        if key.endswith(":tone_of_voice_profile"):
+            self.profile_writes.append(json.loads(value))
+
+
+def _threads(language):
+    return [
+        {
+            "thread_id": f"{language}-{i}",
+            "messages": [
+                {"from_": "someone@example.org", "body_cleaned": f"{language} question {i}"},
+                {"from_": USER_EMAIL, "body_cleaned": f"{language} answer {i}"},
+            ],
+        }
+        for i in range(10)
+    ]
+
+
+def _run(redis, llm_response, languages=("en", "de"), user_uuid=None):
+    def diverse_set(user_uuid, query_filter, limit, with_content):
+        language = query_filter.must[0].match.value
+        return _threads(language)
+
+    with patch.object(task, "get_redis_client", return_value=redis), \
+         patch.object(task, "get_payload_field_distribution", return_value={language: 40 for language in languages}), \
+         patch.object(task, "get_diverse_set_by_filter", side_effect=diverse_set), \
+         patch.object(task, "load_app_settings", return_value=MagicMock(IMAP_USERNAME=USER_EMAIL)), \
+         patch.object(analyzer.openrouter_service, "get_llm_response", side_effect=llm_response), \
+         patch.object(task.settings, "TONE_OF_VOICE_LLM_CONCURRENCY", 4):
+        user_uuid = user_uuid or uuid4()
+        asyncio.run(task.determine_user_tone_of_voice(user_uuid))
+    return user_uuid
+
+
+def test_languages_and_baselines_run_concurrently_under_the_shared_cap():
+    in_flight, peak = 0, 0
+
+    async def llm_response(prompt, system_prompt, model, user_id=None):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return "profile" if "GOOD RESPONSE" in prompt else "generic reply"
+
+    redis = FakeRedis()
+    user_uuid = _run(redis, llm_response)
+
+    assert peak == 4
+    assert json.loads(redis.data[RedisKeys.get_tone_of_voice_profile_key(user_uuid)]) == {"en": "profile", "de": "profile"}
+    assert redis.data[RedisKeys.get_tone_of_voice_status_key(user_uuid)] == "completed"
+    # Each language is persisted as soon as it is done.
+    assert len(redis.profile_writes) == 2 and len(redis.profile_writes[0]) == 1
+
+
+def test_a_failing_language_keeps_its_previous_profile_and_spares_the_others():
+    async def llm_response(prompt, system_prompt, model, user_id=None):
+        if "de question 3" in prompt:
+            raise RuntimeError("provider error")
+        return "new profile" if "GOOD RESPONSE" in prompt else "generic reply"
+
+    user_uuid = uuid4()
+    profile_key = RedisKeys.get_tone_of_voice_profile_key(user_uuid)
+    redis = FakeRedis({profile_key: json.dumps({"de": "old profile", "fr": "no longer eligible"})})
+    _run(redis, llm_response, user_uuid=user_uuid)
+
+    assert json.loads(redis.data[profile_key]) == {"de": "old profile", "en": "new profile"}
+    assert redis.data[RedisKeys.get_tone_of_voice_status_key(user_uuid)] == "completed"
+
+
+def test_status_is_failed_when_every_language_fails():
+    async def llm_response(prompt, system_prompt, model, user_id=None):
+        raise RuntimeError("provider down")
+
+    redis = FakeRedis()
+    user_uuid = _run(redis, llm_response)
+
+    assert redis.data[RedisKeys.get_tone_of_voice_status_key(user_uuid)] == "failed"
+    assert RedisKeys.get_tone_of_voice_profile_key(user_uuid) not in redis.data
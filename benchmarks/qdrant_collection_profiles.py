@@ -0,0 +1,125 @@
+"""
+Recall and search latency of the Qdrant collection profiles.
+
+Builds one throwaway collection per profile in a running Qdrant, fills it with the
+same synthetic, clustered unit vectors (email embeddings are far from uniform, so
+clusters make quantization errors show up the way they would in practice) and runs
+the same queries against each. Recall@k is measured against exact cosine neighbours
+computed with numpy. Qdrant's local mode ignores HNSW and quantization settings, so
+this needs a server (`--url`, default QDRANT_URL or http://localhost:6333).
+
+    python benchmarks/qdrant_collection_profiles.py --points 20000 --dim 1024 --queries 200 --top-k 10
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from shared.qdrant.collection_profiles import PROFILES, CollectionProfile
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_dataset(points: int, dim: int, queries: int, clusters: int, seed: int):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    data = _unit(centers[rng.integers(clusters, size=points)] + 0.35 * rng.normal(size=(points, dim))).astype(np.float32)
+    query_vectors = _unit(centers[rng.integers(clusters, size=queries)] + 0.35 * rng.normal(size=(queries, dim))).astype(np.float32)
+    return data, query_vectors
+
+
+def exact_neighbours(data: np.ndarray, query_vectors: np.ndarray, top_k: int) -> np.ndarray:
+    scores = query_vectors @ data.T
+    return np.argsort(-scores, axis=1)[:, :top_k]
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[int(fraction * (len(ordered) - 1))]
+
+
+def _wait_until_indexed(client: QdrantClient, collection_name: str, timeout_s: float = 600.0):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if client.get_collection(collection_name=collection_name).status == models.CollectionStatus.GREEN:
+            return
+        time.sleep(0.5)
+    raise TimeoutError(f"{collection_name} was not indexed within {timeout_s}s")
+
+
+def run_profile(client: QdrantClient, profile: CollectionProfile, data, query_vectors, truth, top_k: int, batch_size: int):
+    collection_name = f"bench-profile-{profile.name}-{uuid.uuid4().hex[:8]}"
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=profile.vectors_config(data.shape[1]),
+        hnsw_config=profile.hnsw_config(),
+        quantization_config=profile.quantization_config(),
+        # Build the HNSW graph even for small synthetic sets, as production collections would.
+        optimizers_config=models.OptimizersConfigDiff(indexing_threshold=0),
+    )
+    try:
+        for start in range(0, len(data), batch_size):
+            chunk = data[start:start + batch_size]
+            client.upsert(
+                collection_name=collection_name,
+                points=models.Batch(ids=list(range(start, start + len(chunk))), vectors=chunk.tolist()),
+                wait=True,
+            )
+        _wait_until_indexed(client, collection_name)
+
+        search_params = profile.search_params()
+        latencies, hits = [], 0
+        for query, expected in zip(query_vectors, truth):
+            started = time.perf_counter()
+            response = client.query_points(
+                collection_name=collection_name,
+                query=query.tolist(),
+                limit=top_k,
+                search_params=search_params,
+                with_payload=False,
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += len({point.id for point in response.points} & set(expected.tolist()))
+        return hits / (len(query_vectors) * top_k), latencies
+    finally:
+        client.delete_collection(collection_name=collection_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=os.environ.get("QDRANT_URL", "http://localhost:6333"))
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--profiles", nargs="*", default=list(PROFILES), choices=list(PROFILES))
+    args = parser.parse_args()
+
+    data, query_vectors = make_dataset(args.points, args.dim, args.queries, args.clusters, args.seed)
+    truth = exact_neighbours(data, query_vectors, args.top_k)
+    client = QdrantClient(url=args.url)
+
+    print(f"{args.points} points x {args.dim} dims, {args.queries} queries, top_k={args.top_k} ({args.url})")
+    for name in args.profiles:
+        recall, latencies = run_profile(client, PROFILES[name], data, query_vectors, truth, args.top_k, args.batch_size)
+        print(
+            f"  {name:<18} recall@{args.top_k}={recall:.4f}  "
+            f"p50={statistics.median(latencies):7.3f}ms  p95={_percentile(latencies, 0.95):7.3f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
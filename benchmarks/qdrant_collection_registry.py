@@ -0,0 +1,101 @@
+"""
+Search latency with and without the per-process Qdrant collection registry.
+
+Without the registry every search first reads the user's embedding model (a Redis
+round trip) and calls `get_collection` before the actual search. The benchmark
+replays `search_by_vector` against a stand-in client whose calls cost a fixed
+simulated round trip, so the numbers isolate the per-call overhead the registry
+removes. Pass `--live` to search a running Qdrant instead (the collection of
+`--user-uuid` must exist).
+
+    python benchmarks/qdrant_collection_registry.py --searches 500 --qdrant-rtt-ms 1.0 --redis-rtt-ms 0.3
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+from uuid import UUID, uuid4
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from shared.qdrant import qdrant_client as qc
+
+VECTOR_SIZE = 1024
+
+
+class SimulatedQdrant:
+    """Answers like Qdrant, paying `rtt_s` per call."""
+
+    def __init__(self, rtt_s: float):
+        self.rtt_s = rtt_s
+        self.calls = 0
+
+    def _round_trip(self):
+        self.calls += 1
+        time.sleep(self.rtt_s)
+
+    def get_collection(self, collection_name):
+        self._round_trip()
+        return SimpleNamespace(config=SimpleNamespace(params=SimpleNamespace(vectors=SimpleNamespace(size=VECTOR_SIZE))))
+
+    def search(self, **kwargs):
+        self._round_trip()
+        return []
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[int(fraction * (len(ordered) - 1))]
+
+
+def _run(searches: int, user_uuid: UUID, with_registry: bool):
+    vector = [0.01] * VECTOR_SIZE
+    latencies = []
+    qc.invalidate_collection_cache()
+    for _ in range(searches):
+        if not with_registry:
+            qc.invalidate_collection_cache()
+        started = time.perf_counter()
+        qc.search_by_vector(vector, user_uuid, top_k=10)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--searches", type=int, default=300)
+    parser.add_argument("--qdrant-rtt-ms", type=float, default=1.0)
+    parser.add_argument("--redis-rtt-ms", type=float, default=0.3)
+    parser.add_argument("--live", action="store_true", help="Search the configured Qdrant instead of the simulated one.")
+    parser.add_argument("--user-uuid", type=UUID, default=None)
+    args = parser.parse_args()
+
+    user_uuid = args.user_uuid or uuid4()
+    if args.live:
+        client = qc.get_qdrant_client()
+        vector_size_lookup = qc.embedding_service.get_current_model_vector_size
+    else:
+        client = SimulatedQdrant(args.qdrant_rtt_ms / 1000)
+
+        def vector_size_lookup(user_uuid=None):
+            time.sleep(args.redis_rtt_ms / 1000)
+            return VECTOR_SIZE
+
+    with patch.object(qc, "get_qdrant_client", return_value=client), \
+         patch.object(qc.embedding_service, "get_current_model_vector_size", side_effect=vector_size_lookup):
+        results = {
+            "without registry": _run(args.searches, user_uuid, with_registry=False),
+            "with registry": _run(args.searches, user_uuid, with_registry=True),
+        }
+
+    print(f"{args.searches} searches ({'live Qdrant' if args.live else f'simulated RTT qdrant={args.qdrant_rtt_ms}ms redis={args.redis_rtt_ms}ms'})")
+    for name, latencies in results.items():
+        print(f"  {name:<17} p50={statistics.median(latencies):7.3f}ms  p95={_percentile(latencies, 0.95):7.3f}ms  mean={statistics.fmean(latencies):7.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Quality and latency of the similar-thread rerankers on a synthetic mailbox.
+
+The corpus is built from "cases": a few threads about the same order, invoice or
+person, sharing an identifier and a correspondent's address, inside a broader
+topic whose vocabulary many other threads use too. Dense vectors are simulated
+so they recover the topic well but separate cases only weakly, which is the
+failure mode of real email embeddings. Each query is a fresh thread of one case;
+the other threads of that case are the relevant results.
+
+For every query the candidates are the `--candidates` nearest threads by cosine
+(what Qdrant returns), ranked by
+- `vector order`: the search order as is (today's behaviour for non-Voyage providers),
+- `local rerank`: shared.services.reranker.local_rerank,
+- `voyage rerank-2`: only with `--voyage-api-key`, over the same previews,
+- `local + voyage head`: Voyage over the best RERANK_REMOTE_MAX_DOCUMENTS local candidates.
+
+    python benchmarks/reranking.py --cases 300 --candidates 30 --top-k 5 [--voyage-api-key KEY]
+"""
+
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from shared.config import settings
+from shared.services.reranker import local_rerank
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _words(prefix, count):
+    return [f"{prefix}{i}" for i in range(count)]
+
+
+def make_corpus(cases: int, threads_per_case: int, topics: int, dim: int, seed: int):
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    general = _words("w", 400)
+    topic_words = [_words(f"t{t}x", 40) for t in range(topics)]
+    topic_centers = np_rng.normal(size=(topics, dim))
+
+    documents, vectors, dates, case_of = [], [], [], []
+    queries = []
+    for case in range(cases):
+        topic = rng.randrange(topics)
+        identifier = f"ord-{rng.randrange(10**5, 10**6)}"
+        address = f"{rng.choice(general)}.{rng.choice(general)}@example{rng.randrange(50)}.com"
+        case_offset = np_rng.normal(size=dim)
+        case_date = NOW - timedelta(days=rng.uniform(0, 365))
+
+        def thread():
+            words = rng.choices(topic_words[topic], k=30) + rng.choices(general, k=40)
+            words += [identifier, address] if rng.random() < 0.8 else [identifier]
+            rng.shuffle(words)
+            vector = topic_centers[topic] + 0.35 * case_offset + 1.1 * np_rng.normal(size=dim)
+            return " ".join(words), vector / np.linalg.norm(vector)
+
+        for _ in range(threads_per_case):
+            text, vector = thread()
+            documents.append(text)
+            vectors.append(vector)
+            dates.append((case_date + timedelta(days=rng.uniform(-20, 20))).isoformat())
+            case_of.append(case)
+        query_text, query_vector = thread()
+        queries.append((case, query_text, query_vector))
+    return documents, np.array(vectors), dates, np.array(case_of), queries
+
+
+def ndcg(ranked_relevance, k):
+    dcg = sum(rel / math.log2(i + 2) for i, rel in enumerate(ranked_relevance[:k]))
+    ideal = sorted(ranked_relevance, reverse=True)
+    idcg = sum(rel / math.log2(i + 2) for i, rel in enumerate(ideal[:k]))
+    return dcg / idcg if idcg else 0.0
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[int(fraction * (len(ordered) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=300)
+    parser.add_argument("--threads-per-case", type=int, default=3)
+    parser.add_argument("--topics", type=int, default=12)
+    parser.add_argument("--dim", type=int, default=64)
+    parser.add_argument("--candidates", type=int, default=30)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--voyage-api-key", default=None, help="Also measure Voyage rerank-2 (costs API calls).")
+    args = parser.parse_args()
+
+    documents, vectors, dates, case_of, queries = make_corpus(args.cases, args.threads_per_case, args.topics, args.dim, args.seed)
+
+    voyage = None
+    if args.voyage_api_key:
+        import voyageai
+        voyage = voyageai.Client(api_key=args.voyage_api_key)
+
+    def vector_order(query_text, query_vector, candidates):
+        return list(range(len(candidates)))
+
+    def local(query_text, query_vector, candidates):
+        results = local_rerank(query_text, query_vector, [documents[c] for c in candidates], [vectors[c] for c in candidates], [dates[c] for c in candidates], now=NOW)
+        return [r["index"] for r in results]
+
+    def voyage_rerank(query_text, query_vector, candidates):
+        response = voyage.rerank(query_text, [documents[c] for c in candidates], model="rerank-2", top_k=args.top_k)
+        return [r.index for r in response.results]
+
+    def local_then_voyage(query_text, query_vector, candidates):
+        head = local(query_text, query_vector, candidates)[:settings.RERANK_REMOTE_MAX_DOCUMENTS]
+        response = voyage.rerank(query_text, [documents[candidates[i]] for i in head], model="rerank-2", top_k=args.top_k)
+        return [head[r.index] for r in response.results]
+
+    methods = {"vector order": vector_order, "local rerank": local}
+    if voyage:
+        methods["voyage rerank-2"] = voyage_rerank
+        methods["local + voyage head"] = local_then_voyage
+
+    scores = {name: {"ndcg": [], "recall": [], "latency": []} for name in methods}
+    for case, query_text, query_vector in queries:
+        candidates = list(np.argsort(-(vectors @ query_vector))[:args.candidates])
+        relevant = int((case_of == case).sum())
+        for name, method in methods.items():
+            started = time.perf_counter()
+            order = method(query_text, query_vector, candidates)
+            scores[name]["latency"].append((time.perf_counter() - started) * 1000)
+            ranked_relevance = [1.0 if case_of[candidates[i]] == case else 0.0 for i in order]
+            scores[name]["ndcg"].append(ndcg(ranked_relevance + [0.0] * len(candidates), args.top_k))
+            scores[name]["recall"].append(sum(ranked_relevance[:args.top_k]) / relevant)
+
+    print(f"{len(documents)} threads, {len(queries)} queries, {args.candidates} candidates, top_k={args.top_k}")
+    for name, values in scores.items():
+        print(
+            f"  {name:<20} nDCG@{args.top_k}={statistics.fmean(values['ndcg']):.3f}  "
+            f"recall@{args.top_k}={statistics.fmean(values['recall']):.3f}  "
+            f"p50={statistics.median(values['latency']):8.3f}ms  p95={_percentile(values['latency'], 0.95):8.3f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Latency of find_similar_threads on the stored-vector path and the embed-and-search path.
+
+Runs the real tool (mcp_servers/imap_mcpserver/src/tools/imap.py) and the real local
+rerank over synthetic threads. The network hops are replaced with stand-ins that
+sleep for a configurable time, so the figures show where the time goes rather than
+the speed of one particular server:
+- `stored vectors`: header-index lookup of the thread id, then one Qdrant call that
+  retrieves the thread's stored vector and searches with it,
+- `embed and search`: the fallback for threads that are not indexed, with two IMAP
+  round trips (message, then thread), one embedding call and one Qdrant search.
+Both paths then load previews and contents from the content store and rerank locally;
+the remote reranker is left out (it costs the same on both paths).
+
+    python benchmarks/similar_threads.py --queries 200 --candidates 30 --top-k 5 --imap-ms 120 --embed-ms 250 --qdrant-ms 15
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mcp_servers.imap_mcpserver.src.tools.imap import find_similar_threads
+
+TOOLS = 'mcp_servers.imap_mcpserver.src.tools.imap'
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def make_threads(count: int, dim: int, seed: int):
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    vocabulary = [f"w{i}" for i in range(500)]
+    threads = []
+    for i in range(count):
+        vector = np_rng.normal(size=dim)
+        threads.append({
+            "thread_id": f"thread-{i}",
+            "vector": (vector / np.linalg.norm(vector)).tolist(),
+            "last_message_date": (NOW - timedelta(days=rng.uniform(0, 365))).isoformat(),
+            "text": " ".join(rng.choices(vocabulary, k=120)),
+        })
+    return threads
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[int(fraction * (len(ordered) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--candidates", type=int, default=30, help="Hits returned by the Qdrant stand-in.")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--imap-ms", type=float, default=120.0, help="Simulated time of one IMAP round trip.")
+    parser.add_argument("--embed-ms", type=float, default=250.0, help="Simulated time of one embedding call.")
+    parser.add_argument("--qdrant-ms", type=float, default=15.0, help="Simulated time of one Qdrant call.")
+    parser.add_argument("--index-ms", type=float, default=1.0, help="Simulated time of one header-index lookup.")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    threads = make_threads(args.threads, args.dim, args.seed)
+    by_id = {thread["thread_id"]: thread for thread in threads}
+    rng = random.Random(args.seed)
+    indexed = True
+
+    def hits_for(source):
+        return [thread for thread in rng.sample(threads, args.candidates) if thread is not source]
+
+    async def get_thread_id_for_message_id(user_uuid, message_id):
+        await asyncio.sleep(args.index_ms / 1000)
+        return message_id if indexed else None
+
+    def find_similar_to_thread(thread_id, user_uuid, top_k, with_vectors):
+        time.sleep(args.qdrant_ms / 1000)
+        source = by_id[thread_id]
+        return {"source": source, "hits": hits_for(source)[:top_k]}
+
+    async def get_message_by_id(user_uuid, message_id):
+        await asyncio.sleep(args.imap_ms / 1000)
+        return message_id
+
+    async def get_complete_thread(user_uuid, source_message):
+        await asyncio.sleep(args.imap_ms / 1000)
+        source = by_id[source_message]
+        return SimpleNamespace(markdown=source["text"], thread_id=source["thread_id"])
+
+    def get_embedding(text, user_uuid):
+        time.sleep(args.embed_ms / 1000)
+        return threads[0]["vector"]
+
+    def search_by_vector(user_uuid, query_vector, top_k, exclude_ids, query_text, with_vectors):
+        time.sleep(args.qdrant_ms / 1000)
+        return hits_for(None)[:top_k]
+
+    async def budgeted_remote_rerank(query, documents, local_results, top_k, user_uuid):
+        return local_results[:top_k]
+
+    stand_ins = {
+        "get_context_from_headers": lambda: SimpleNamespace(user_id="bench-user"),
+        "get_thread_id_for_message_id": get_thread_id_for_message_id,
+        "find_similar_to_thread": find_similar_to_thread,
+        "get_message_by_id": get_message_by_id,
+        "get_complete_thread": get_complete_thread,
+        "get_embedding": get_embedding,
+        "generate_qdrant_point_id": lambda thread_id: thread_id,
+        "search_by_vector": search_by_vector,
+        "get_thread_previews": lambda user_uuid, hits: [hit["text"] for hit in hits],
+        "get_thread_contents": lambda user_uuid, hits: [{"thread_markdown": hit["text"]} for hit in hits],
+        "budgeted_remote_rerank": budgeted_remote_rerank,
+    }
+
+    async def measure():
+        latencies = []
+        for _ in range(args.queries):
+            message_id = rng.choice(threads)["thread_id"]
+            started = time.perf_counter()
+            await find_similar_threads.fn(messageId=message_id, top_k=args.top_k)
+            latencies.append((time.perf_counter() - started) * 1000)
+        return latencies
+
+    results = {}
+    with ExitStack() as stack:
+        for name, stand_in in stand_ins.items():
+            stack.enter_context(patch(f'{TOOLS}.{name}', stand_in))
+        for name, use_index in (("stored vectors", True), ("embed and search", False)):
+            indexed = use_index
+            results[name] = asyncio.run(measure())
+
+    print(
+        f"{args.threads} threads, {args.queries} queries, {args.candidates} candidates, top_k={args.top_k}, "
+        f"imap={args.imap_ms:g}ms embed={args.embed_ms:g}ms qdrant={args.qdrant_ms:g}ms index={args.index_ms:g}ms"
+    )
+    for name, latencies in results.items():
+        print(f"  {name:<20} p50={statistics.median(latencies):8.3f}ms  p95={_percentile(latencies, 0.95):8.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,14 +6,14 @@ import re
 import base64
 import asyncio
 import logging
+import time
 from typing import Any, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-from email_reply_parser import EmailReplyParser
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.header import decode_header
 import email.utils
-from email.utils import parseaddr
+from email.utils import parseaddr, parsedate_to_datetime
 try:
     import html2text
 except ImportError:
@@ -24,11 +24,14 @@ from mcp_servers.imap_mcpserver.src.imap_client.internals.bulk_threading import
 from mcp_servers.imap_mcpserver.src.imap_client.helpers.contextual_id import create_contextual_id
 from mcp_servers.imap_mcpserver.src.imap_client.internals.connection_manager import imap_connection, IMAPConnectionError, FolderResolver, FolderNotFoundError, acquire_imap_slot
 from mcp_servers.imap_mcpserver.src.imap_client.helpers.body_parser import extract_body_formats
+from mcp_servers.imap_mcpserver.src.imap_client.internals.signature_cache import get_cached_signature
+from mcp_servers.imap_mcpserver.src.imap_client.internals.header_index import HeaderIndex, get_header_index
 from uuid import UUID
-from typing import Callable, DefaultDict, Set
+from typing import Callable, DefaultDict, Iterator, Set
 from collections import defaultdict
 
 from shared.app_settings import AppSettings, load_app_settings
+from shared.config import settings
 
 load_dotenv(override=True)
 
@@ -59,6 +62,156 @@ def _find_uid_by_message_id(mail: imaplib.IMAP4_SSL, resolver: FolderResolver, m
     
     return None, None
 
+# Bounds the length of a single SEARCH command built from many Message-IDs.
+MESSAGE_ID_SEARCH_CHUNK_SIZE = 50
+MESSAGE_ID_SEARCH_MAX_BYTES = 8000
+# Bytes a Message-ID adds to the command besides itself: 'OR HEADER Message-ID "..." '.
+MESSAGE_ID_SEARCH_KEY_OVERHEAD = 26
+
+def _quote_imap_string(value: str) -> str:
+    """Quotes a value as an IMAP quoted string."""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def _normalize_message_id(message_id: str) -> str:
+    return (message_id or '').strip().strip('<>').strip()
+
+def _build_or_search(criteria: List[str]) -> str:
+    """Combines search keys into a single IMAP search. OR is binary, so n keys need n-1 ORs."""
+    return "OR " * (len(criteria) - 1) + " ".join(criteria)
+
+def _chunk_message_ids(message_ids: List[str]) -> Iterator[List[str]]:
+    """Splits Message-IDs into chunks whose OR-combined SEARCH stays within the size bounds."""
+    chunk: List[str] = []
+    size = 0
+    for message_id in message_ids:
+        cost = len(message_id) + MESSAGE_ID_SEARCH_KEY_OVERHEAD
+        if chunk and (len(chunk) >= MESSAGE_ID_SEARCH_CHUNK_SIZE or size + cost > MESSAGE_ID_SEARCH_MAX_BYTES):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(message_id)
+        size += cost
+    if chunk:
+        yield chunk
+
+def _iter_fetch_responses(data: List[Any]) -> Iterator[Tuple[bytes, Optional[bytes]]]:
+    """
+    Yields (metadata, literal) per message of a FETCH response. imaplib returns
+    items that follow a literal as a separate bytes element; they are appended
+    to the message's metadata.
+    """
+    meta: Optional[bytes] = None
+    literal: Optional[bytes] = None
+    for part in data or []:
+        if isinstance(part, tuple):
+            if meta is not None:
+                yield meta, literal
+            meta, literal = bytes(part[0]), part[1]
+        elif isinstance(part, (bytes, bytearray)):
+            if meta is not None:
+                yield meta + bytes(part), literal
+                meta, literal = None, None
+            else:
+                yield bytes(part), None
+    if meta is not None:
+        yield meta, literal
+
+def _search_message_ids(
+    mail: imaplib.IMAP4_SSL,
+    message_ids: List[str],
+    with_thrid: bool = False,
+) -> Dict[str, Tuple[str, Optional[str]]]:
+    """
+    Resolves Message-IDs in the currently selected mailbox.
+    Runs one OR-combined SEARCH per chunk, then one FETCH of the Message-ID headers
+    (and X-GM-THRID if `with_thrid`) to map the UIDs back. HEADER search is a substring
+    match, so mapping back by the exact header also drops false hits.
+    Returns {normalized Message-ID: (uid, thrid or None)}.
+    """
+    wanted = list(dict.fromkeys(_normalize_message_id(m) for m in message_ids if _normalize_message_id(m)))
+    fetch_items = '(UID X-GM-THRID BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])' if with_thrid else '(UID BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])'
+    found: Dict[str, Tuple[str, Optional[str]]] = {}
+    for chunk in _chunk_message_ids(wanted):
+        criteria = [f'HEADER Message-ID {_quote_imap_string(message_id)}' for message_id in chunk]
+        typ, data = mail.uid('search', None, _build_or_search(criteria))
+        if typ != 'OK' or not data or not data[0]:
+            continue
+        uid_set = b','.join(data[0].split()).decode()
+        typ, fetch_data = mail.uid('fetch', uid_set, fetch_items)
+        if typ != 'OK':
+            continue
+        chunk_ids = set(chunk)
+        for meta, literal in _iter_fetch_responses(fetch_data):
+            uid_match = re.search(rb'UID (\d+)', meta)
+            if not uid_match or literal is None:
+                continue
+            header = email.message_from_bytes(literal)
+            message_id = _normalize_message_id(header.get('Message-ID', ''))
+            if message_id in chunk_ids and message_id not in found:
+                thrid = _parse_thrid_from_meta(meta) if with_thrid else None
+                found[message_id] = (uid_match.group(1).decode(), thrid)
+    return found
+
+def _search_uids_by_message_ids(mail: imaplib.IMAP4_SSL, message_ids: List[str]) -> Dict[str, str]:
+    """Resolves Message-IDs to UIDs in the currently selected mailbox. Returns {normalized Message-ID: uid}."""
+    return {message_id: uid for message_id, (uid, _) in _search_message_ids(mail, message_ids).items()}
+
+def _resolve_message_ids(
+    mail: imaplib.IMAP4_SSL,
+    resolver: FolderResolver,
+    message_ids: List[str],
+    folder_attributes: Tuple[str, ...],
+) -> Dict[str, Tuple[str, str]]:
+    """
+    Resolves Message-IDs to (mailbox, uid). Folders are searched in order, each only
+    for the Message-IDs that are still unresolved. Returns {normalized Message-ID: (mailbox, uid)}.
+    """
+    pending = list(dict.fromkeys(_normalize_message_id(m) for m in message_ids if _normalize_message_id(m)))
+    resolved: Dict[str, Tuple[str, str]] = {}
+    for attribute in folder_attributes:
+        if not pending:
+            break
+        try:
+            mailbox = resolver.get_folder_by_attribute(attribute)
+            mail.select(f'"{mailbox}"', readonly=True)
+            found = _search_uids_by_message_ids(mail, pending)
+        except Exception as e:
+            logger.warning(f"Error resolving Message-IDs in folder {attribute}: {e}")
+            continue
+        for message_id, uid in found.items():
+            resolved[message_id] = (mailbox, uid)
+        pending = [message_id for message_id in pending if message_id not in resolved]
+    return resolved
+
+def _group_by_mailbox(resolved: Dict[str, Tuple[str, str]]) -> Dict[str, List[Tuple[str, str]]]:
+    """Groups resolved Message-IDs as {mailbox: [(message_id, uid), ...]}."""
+    groups: DefaultDict[str, List[Tuple[str, str]]] = defaultdict(list)
+    for message_id, (mailbox, uid) in resolved.items():
+        groups[mailbox].append((message_id, uid))
+    return groups
+
+def _move_uids(mail: imaplib.IMAP4_SSL, uid_set: str, destination: str) -> bool:
+    """
+    Moves a UID set out of the selected mailbox. Uses UID MOVE (RFC 6851) and falls
+    back to COPY + \\Deleted + UID EXPUNGE, so only these messages are expunged.
+    """
+    try:
+        typ, _ = mail.uid('MOVE', uid_set, f'"{destination}"')
+        if typ == 'OK':
+            return True
+    except imaplib.IMAP4.error as e:
+        logger.info(f"UID MOVE not available, falling back to COPY: {e}")
+
+    typ, _ = mail.uid('COPY', uid_set, f'"{destination}"')
+    if typ != 'OK':
+        return False
+    mail.uid('STORE', uid_set, '+FLAGS', r'(\Deleted)')
+    if 'UIDPLUS' in mail.capabilities:
+        mail.uid('EXPUNGE', uid_set)
+    else:
+        logger.warning("Server supports neither MOVE nor UIDPLUS; falling back to a mailbox-wide EXPUNGE.")
+        mail.expunge()
+    return True
+
 def _get_message_by_id_sync(message_id: str, app_settings: AppSettings) -> Optional[EmailMessage]:
     """
     Synchronous function to get a single EmailMessage by its Message-ID.
@@ -144,6 +297,19 @@ def _fetch_single_message(mail: imaplib.IMAP4_SSL, uid: str, folder: str) -> Opt
         logger.error(f"Error fetching single message {uid} from {folder}: {e}")
         return None
 
+def _get_thread_id_sync(message_id: str, app_settings: AppSettings) -> Optional[str]:
+    """Resolves a Message-ID to its X-GM-THRID with one SEARCH and one FETCH in All Mail."""
+    try:
+        with imap_connection(app_settings=app_settings) as (mail, resolver):
+            all_mail_folder = resolver.get_folder_by_attribute('\\All')
+            mail.select(f'"{all_mail_folder}"', readonly=True)
+            found = _search_message_ids(mail, [message_id], with_thrid=True)
+            _, thread_id = found.get(_normalize_message_id(message_id), (None, None))
+            return thread_id
+    except Exception as e:
+        logger.error(f"Error resolving the thread of message {message_id}: {e}")
+        return None
+
 def _get_complete_thread_sync(message_id: str, app_settings: AppSettings) -> Optional[EmailThread]:
     """Synchronous function to get complete thread. It filters out draft messages. """
     try:
@@ -464,178 +630,79 @@ def _markdown_to_html(markdown_text: str) -> str:
     html = html.replace('\n', '<br>\n')
     return html
 
-def _get_user_signature(app_settings: AppSettings) -> Tuple[Optional[str], Optional[str]]:
-    """Get user signature from recent sent emails using Gmail signature shortcut"""
-    try:
-        with imap_connection(app_settings=app_settings) as (mail, resolver):
-            # Select Gmail sent folder
-            sent_folder = resolver.get_folder_by_attribute('\\Sent')
-            mail.select(f'"{sent_folder}"', readonly=True)
-            typ, data = mail.uid('search', None, 'ALL')
-            
-            if typ != 'OK' or not data or not data[0]:
-                logger.info("No emails found in sent folder.")
-                return None, None
-            
-            email_uids = data[0].split()
-            if not email_uids:
-                return None, None
-            
-            # Get last 5 sent emails (smaller sample for Gmail shortcut)
-            latest_email_uids = email_uids[-10:]
-            logger.info(f"Analyzing last {len(latest_email_uids)} sent emails for Gmail signature.")
-            
-            html_bodies = []
-            plain_bodies = []
-            
-            for uid in latest_email_uids:
-                typ, data = mail.uid('fetch', uid, '(RFC822)')
-                if typ != 'OK':
-                    continue
-                
-                for response_part in data:
-                    if isinstance(response_part, tuple):
-                        msg = email.message_from_bytes(response_part[1])
-                        plain_body = ""
-                        html_body = ""
-                        
-                        if msg.is_multipart():
-                            for part in msg.walk():
-                                ctype = part.get_content_type()
-                                cdisp = str(part.get('Content-Disposition'))
-                                if ctype == 'text/plain' and 'attachment' not in cdisp:
-                                    plain_body = part.get_payload(decode=True).decode(part.get_content_charset() or 'utf-8', errors='ignore')
-                                elif ctype == 'text/html' and 'attachment' not in cdisp:
-                                    html_body = part.get_payload(decode=True).decode(part.get_content_charset() or 'utf-8', errors='ignore')
-                        else:
-                            plain_body = msg.get_payload(decode=True).decode(msg.get_content_charset() or 'utf-8', errors='ignore')
-                        
-                        if html_body:
-                            html_bodies.append(html_body)
-                        if plain_body:
-                            plain_bodies.append(plain_body)
-            
-            if len(html_bodies) < 2:
-                logger.info("Not enough HTML emails to detect Gmail signature.")
-                return None, None
-            
-            # Gmail signature shortcut - look for gmail_signature class
-            try:
-                from bs4 import BeautifulSoup
-                from collections import Counter
-                
-                parsed_bodies = [BeautifulSoup(html, 'lxml') for html in html_bodies]
-                
-                # Look for Gmail signature class
-                signature_candidates = []
-                for soup in parsed_bodies:
-                    gmail_sig = soup.find(class_='gmail_signature')
-                    if gmail_sig:
-                        signature_candidates.append(str(gmail_sig))
-                
-                if len(signature_candidates) >= 2:
-                    # Find most common signature
-                    most_common_sig, count = Counter(signature_candidates).most_common(1)[0]
-                    if count >= 2:
-                        logger.info(f"Found Gmail signature in {count} emails using gmail_signature class")
-                        
-                        # Extract plain text version from the same emails
-                        plain_signature = None
-                        if plain_bodies:
-                            # Simple approach: look for common trailing lines in plain text
-                            from email_reply_parser import EmailReplyParser
-                            plain_replies = []
-                            for plain_body in plain_bodies:
-                                try:
-                                    reply = EmailReplyParser.parse_reply(plain_body)
-                                    if reply != plain_body:  # If parsing removed something, it was likely a signature
-                                        # Get the removed part as potential signature
-                                        signature_part = plain_body.replace(reply, '').strip()
-                                        if signature_part:
-                                            plain_replies.append(signature_part)
-                                except:
-                                    pass
-                            
-                            if plain_replies and len(plain_replies) >= 2:
-                                most_common_plain, plain_count = Counter(plain_replies).most_common(1)[0]
-                                if plain_count >= 2:
-                                    plain_signature = most_common_plain.strip()
-                        
-                        return plain_signature, most_common_sig
-                
-                logger.info("Gmail signature shortcut did not find consistent signatures.")
-                return None, None
-                
-            except ImportError:
-                logger.warning("BeautifulSoup not available for HTML signature detection")
-                return None, None
-            
-    except IMAPConnectionError as e:
-        logger.error(f"IMAP connection error getting Gmail signature: {e}")
-        return None, None
-    except Exception as e:
-        logger.error(f"Unexpected error getting Gmail signature: {e}")
-        return None, None
-
-def _draft_reply_sync(original_message: EmailMessage, reply_body: str, app_settings: AppSettings) -> Dict[str, Any]:
-    """Synchronous function to create a draft reply"""
+def _build_reply_message(
+    original_message: EmailMessage,
+    reply_body: str,
+    from_address: str,
+    signature: Tuple[Optional[str], Optional[str]] = (None, None),
+) -> MIMEMultipart:
+    """Builds the MIME reply to `original_message`. `signature` is the (plain, html) signature to append."""
+    # Prepare reply headers
+    original_subject = original_message.subject
+    reply_subject = original_subject if original_subject.lower().startswith("re:") else f"Re: {original_subject}"
+
+    # Use Reply-To header if available, otherwise From
+    reply_to_email = original_message.from_
+    to_email = email.utils.parseaddr(reply_to_email)[1]
+
+    # Create the reply message
+    reply_message = MIMEMultipart("alternative")
+    reply_message["Subject"] = reply_subject
+    reply_message["From"] = from_address
+    reply_message["To"] = to_email
+
+    # Handle CC
+    if original_message.cc:
+        # Parse CC addresses
+        cc_emails = [
+            email_address for _, email_address 
+            in email.utils.getaddresses([original_message.cc]) 
+            if email_address
+        ]
+        if cc_emails:
+            reply_message['Cc'] = ', '.join(cc_emails)
+
+    # Add threading headers
+    if original_message.message_id:
+        reply_message["In-Reply-To"] = f"<{original_message.message_id}>"
+        reply_message["References"] = f"<{original_message.message_id}>"
+
+    reply_message["Date"] = email.utils.formatdate(localtime=True)
+
+    plain_signature, html_signature = signature
+
+    # Prepare plain part
+    full_plain_body = reply_body
+    if plain_signature:
+        full_plain_body = f"{reply_body}\n\n{plain_signature}"
+
+    # Prepare HTML part
+    html_body = _markdown_to_html(reply_body)
+    if html_signature:
+        full_html_body = f"{html_body}{html_signature}"
+    elif plain_signature:
+        html_fallback_sig = f"-- <br>{_markdown_to_html(plain_signature.replace('--', ''))}"
+        full_html_body = f"{html_body}<br><br>{html_fallback_sig}"
+    else:
+        full_html_body = html_body
+
+    # Create body parts
+    part1 = MIMEText(full_plain_body, "plain")
+    part2 = MIMEText(full_html_body, "html")
+    reply_message.attach(part1)
+    reply_message.attach(part2)
+    return reply_message
+
+def _draft_reply_sync(
+    original_message: EmailMessage,
+    reply_body: str,
+    app_settings: AppSettings,
+    signature: Tuple[Optional[str], Optional[str]] = (None, None),
+) -> Dict[str, Any]:
+    """Synchronous function to create a draft reply. `signature` is the (plain, html) signature to append."""
     try:
         with imap_connection(app_settings=app_settings) as (mail, resolver):
-            # Prepare reply headers
-            original_subject = original_message.subject
-            reply_subject = original_subject if original_subject.lower().startswith("re:") else f"Re: {original_subject}"
-            
-            # Use Reply-To header if available, otherwise From
-            reply_to_email = original_message.from_
-            to_email = email.utils.parseaddr(reply_to_email)[1]
-            
-            # Create the reply message
-            reply_message = MIMEMultipart("alternative")
-            reply_message["Subject"] = reply_subject
-            reply_message["From"] = app_settings.IMAP_USERNAME
-            reply_message["To"] = to_email
-            
-            # Handle CC
-            if original_message.cc:
-                # Parse CC addresses
-                cc_emails = [
-                    email_address for _, email_address 
-                    in email.utils.getaddresses([original_message.cc]) 
-                    if email_address
-                ]
-                if cc_emails:
-                    reply_message['Cc'] = ', '.join(cc_emails)
-            
-            # Add threading headers
-            if original_message.message_id:
-                reply_message["In-Reply-To"] = f"<{original_message.message_id}>"
-                reply_message["References"] = f"<{original_message.message_id}>"
-            
-            reply_message["Date"] = email.utils.formatdate(localtime=True)
-            
-            # Get signature (simplified for now)
-            plain_signature, html_signature = _get_user_signature(app_settings=app_settings)
-            
-            # Prepare plain part
-            full_plain_body = reply_body
-            if plain_signature:
-                full_plain_body = f"{reply_body}\n\n{plain_signature}"
-            
-            # Prepare HTML part
-            html_body = _markdown_to_html(reply_body)
-            if html_signature:
-                full_html_body = f"{html_body}{html_signature}"
-            elif plain_signature:
-                html_fallback_sig = f"-- <br>{_markdown_to_html(plain_signature.replace('--', ''))}"
-                full_html_body = f"{html_body}<br><br>{html_fallback_sig}"
-            else:
-                full_html_body = html_body
-            
-            # Create body parts
-            part1 = MIMEText(full_plain_body, "plain")
-            part2 = MIMEText(full_html_body, "html")
-            reply_message.attach(part1)
-            reply_message.attach(part2)
+            reply_message = _build_reply_message(original_message, reply_body, app_settings.IMAP_USERNAME, signature)
             
             # Find drafts folder and save
             drafts_folder = resolver.get_folder_by_attribute('\\Drafts')
@@ -656,67 +723,128 @@ def _draft_reply_sync(original_message: EmailMessage, reply_body: str, app_setti
         logger.error(error_msg, exc_info=True)
         return {"success": False, "message": error_msg}
 
+def _draft_replies_batch_sync(
+    replies: List[Tuple[str, str]],
+    app_settings: AppSettings,
+    signature: Tuple[Optional[str], Optional[str]] = (None, None),
+) -> List[Dict[str, Any]]:
+    """
+    Creates draft replies for many messages in one IMAP session.
+    `replies` is a list of (Message-ID, reply body). The originals are resolved with
+    batched searches and fetched per mailbox. Returns one result per reply, in input order.
+    """
+    results: List[Dict[str, Any]] = []
+    try:
+        with imap_connection(app_settings=app_settings) as (mail, resolver):
+            resolved = _resolve_message_ids(mail, resolver, [message_id for message_id, _ in replies], ('\\Inbox', '\\All'))
+            originals: Dict[str, EmailMessage] = {}
+            for mailbox, entries in _group_by_mailbox(resolved).items():
+                mail.select(f'"{mailbox}"', readonly=True)
+                for message_id, uid in entries:
+                    original = _fetch_single_message(mail, uid, mailbox)
+                    if original:
+                        originals[message_id] = original
+
+            drafts_folder = resolver.get_folder_by_attribute('\\Drafts')
+            logger.info(f"Saving {len(originals)} draft replies to folder: {drafts_folder}")
+            for message_id, reply_body in replies:
+                original = originals.get(_normalize_message_id(message_id))
+                if original is None:
+                    results.append({"message_id": message_id, "success": False, "message": "Message not found"})
+                    continue
+                reply_message = _build_reply_message(original, reply_body, app_settings.IMAP_USERNAME, signature)
+                result = mail.append(drafts_folder, None, None, reply_message.as_string().encode("utf-8"))
+                if result[0] == "OK":
+                    results.append({"message_id": message_id, "success": True, "message": f"Draft reply saved to {drafts_folder}."})
+                else:
+                    error_msg = f"Error creating draft reply: {result[1][0].decode() if result[1] else 'Unknown error'}"
+                    logger.error(error_msg)
+                    results.append({"message_id": message_id, "success": False, "message": error_msg})
+    except Exception as e:
+        error_msg = f"Error creating draft replies: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        results.extend(
+            {"message_id": message_id, "success": False, "message": error_msg}
+            for message_id, _ in replies[len(results):]
+        )
+    return results
+
 def _set_label_sync(message_id: str, label: str, app_settings: AppSettings) -> Dict[str, Any]:
     """Synchronous function to set a label for a message."""
+    result = _set_label_batch_sync([message_id], label, app_settings)[0]
+    return {"status": result["status"], "message": result["message"]}
+
+def _set_label_batch_sync(message_ids: List[str], label: str, app_settings: AppSettings) -> List[Dict[str, Any]]:
+    """
+    Adds a label to many messages in one IMAP session.
+    Message-IDs are resolved with batched searches and the label is stored with one
+    UID STORE per mailbox. Returns one result per Message-ID, in input order.
+    """
+    outcomes: Dict[str, Tuple[str, str]] = {}
     try:
         with imap_connection(app_settings=app_settings) as (mail, resolver):
-            # Find the message UID and mailbox
-            uid, mailbox = _find_uid_by_message_id(mail, resolver, message_id)
-            if not uid:
-                return {"status": "error", "message": "Message not found"}
-
-            # Select the mailbox before setting the label
-            mail.select(f'"{mailbox}"', readonly=False)
-            
-            # Use the UID to store the label
-            result = mail.uid('store', uid, '+X-GM-LABELS', f'("{label}")')
-            
-            if result[0] == 'OK':
-                return {"status": "success", "message": f"Label '{label}' added successfully."}
-            else:
-                return {"status": "error", "message": f"Failed to add label: {result[1][0].decode()}"}
+            resolved = _resolve_message_ids(mail, resolver, message_ids, ('\\All', '\\Inbox', '\\Sent'))
+            for mailbox, entries in _group_by_mailbox(resolved).items():
+                mail.select(f'"{mailbox}"', readonly=False)
+                uid_set = ','.join(uid for _, uid in entries)
+                typ, data = mail.uid('store', uid_set, '+X-GM-LABELS', f'({_quote_imap_string(label)})')
+                if typ == 'OK':
+                    outcome = ("success", f"Label '{label}' added successfully.")
+                else:
+                    outcome = ("error", f"Failed to add label: {data[0].decode() if data and data[0] else 'Unknown error'}")
+                for message_id, _ in entries:
+                    outcomes[message_id] = outcome
     except Exception as e:
         logger.error(f"Error setting label: {e}")
-        return {"status": "error", "message": str(e)}
+        return [{"message_id": message_id, "status": "error", "message": str(e)} for message_id in message_ids]
+
+    return _collect_batch_results(message_ids, outcomes)
 
 def _remove_from_inbox_sync(message_id: str, app_settings: AppSettings) -> Dict[str, Any]:
     """
     Synchronous function to remove Gmail message from inbox by moving it to All Mail.
-    Uses IMAP COPY + DELETE + EXPUNGE pattern to move from current mailbox to All Mail.
     """
+    result = _remove_from_inbox_batch_sync([message_id], app_settings)[0]
+    return {"status": result["status"], "message": result["message"]}
+
+def _remove_from_inbox_batch_sync(message_ids: List[str], app_settings: AppSettings) -> List[Dict[str, Any]]:
+    """
+    Moves many messages from the inbox to All Mail in one IMAP session, with a single
+    UID MOVE over the resolved UID set. Returns one result per Message-ID, in input order.
+    """
+    outcomes: Dict[str, Tuple[str, str]] = {}
     try:
         with imap_connection(app_settings=app_settings) as (mail, resolver):
-            # Find message UID and mailbox
-            uid, mailbox = _find_uid_by_message_id(mail, resolver, message_id)
-            if not uid:
-                return {"status": "error", "message": "Message not found"}
-            
             # Get the All Mail folder using resolver (language-agnostic)
             try:
                 destination = resolver.get_folder_by_attribute('\\All')
             except FolderNotFoundError:
-                return {"status": "error", "message": "All Mail folder not found - archiving not supported"}
-            
-            # Select source mailbox for modification
-            mail.select(f'"{mailbox}"', readonly=False)
-            
-            # Copy to All Mail folder (using resolver for language support)
-            typ, data = mail.uid('COPY', uid, f'"{destination}"')
-            if typ != 'OK':
-                return {"status": "error", "message": f"Remove from inbox failed - copy to {destination} failed"}
-            
-            # Mark original as deleted and expunge
-            mail.uid('STORE', uid, '+FLAGS', r'(\Deleted)')
-            mail.expunge()
-            
-            return {
-                "status": "success", 
-                "message": f"Email removed from inbox: moved from {mailbox} to {destination}"
-            }
-            
+                message = "All Mail folder not found - archiving not supported"
+                return [{"message_id": message_id, "status": "error", "message": message} for message_id in message_ids]
+            inbox = resolver.get_folder_by_attribute('\\Inbox')
+
+            mail.select(f'"{inbox}"', readonly=False)
+            found = _search_uids_by_message_ids(mail, message_ids)
+            if found:
+                if _move_uids(mail, ','.join(found.values()), destination):
+                    outcome = ("success", f"Email removed from inbox: moved from {inbox} to {destination}")
+                else:
+                    outcome = ("error", f"Remove from inbox failed - move to {destination} failed")
+                for message_id in found:
+                    outcomes[message_id] = outcome
     except Exception as e:
         logger.error(f"Error removing from inbox: {e}")
-        return {"status": "error", "message": str(e)}
+        return [{"message_id": message_id, "status": "error", "message": str(e)} for message_id in message_ids]
+
+    return _collect_batch_results(message_ids, outcomes)
+
+def _collect_batch_results(message_ids: List[str], outcomes: Dict[str, Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """Maps outcomes keyed by normalized Message-ID back to the input order."""
+    results = []
+    for message_id in message_ids:
+        status, message = outcomes.get(_normalize_message_id(message_id), ("error", "Message not found"))
+        results.append({"message_id": message_id, "status": status, "message": message})
+    return results
 
 def _get_all_folders_sync(mail: imaplib.IMAP4_SSL) -> List[str]:
     """
@@ -985,6 +1113,23 @@ async def get_message_by_id(user_uuid: UUID, message_id: str) -> Optional[EmailM
     async with acquire_imap_slot(user_uuid):
         return await asyncio.to_thread(_get_message_by_id_sync, message_id, app_settings)
 
+async def get_thread_id_for_message_id(user_uuid: UUID, message_id: str) -> Optional[str]:
+    """
+    Asynchronously resolves a Message-ID to its Gmail thread id (X-GM-THRID).
+    Answered from the local header index when it holds the message, otherwise over IMAP.
+    """
+    if settings.IMAP_HEADER_INDEX_ENABLED:
+        try:
+            index = await asyncio.to_thread(HeaderIndex, user_uuid)
+            thread_id = await asyncio.to_thread(index.get_thread_id, message_id)
+            if thread_id:
+                return thread_id
+        except Exception as e:
+            logger.warning(f"Header index lookup of message {message_id} failed for user {user_uuid}: {e}")
+    app_settings = load_app_settings(user_uuid=user_uuid)
+    async with acquire_imap_slot(user_uuid):
+        return await asyncio.to_thread(_get_thread_id_sync, message_id, app_settings)
+
 async def get_complete_thread(user_uuid: UUID, source_message: EmailMessage) -> Optional[EmailThread]:
     if not source_message or not source_message.message_id:
         return None
@@ -1006,8 +1151,10 @@ async def get_recent_sent_messages(user_uuid: UUID, count: int = 20) -> List[Ema
 
 async def draft_reply(user_uuid: UUID, original_message: EmailMessage, reply_body: str) -> Dict[str, Any]:
     app_settings = load_app_settings(user_uuid=user_uuid)
+    # Read from the cached signature profile; it is refreshed in the background when new mail is sent.
+    signature = await get_cached_signature(user_uuid, app_settings)
     async with acquire_imap_slot(user_uuid):
-        return await asyncio.to_thread(_draft_reply_sync, original_message, reply_body, app_settings)
+        return await asyncio.to_thread(_draft_reply_sync, original_message, reply_body, app_settings, signature)
 
 async def set_label(user_uuid: UUID, message_id: str, label: str) -> Dict[str, Any]:
     app_settings = load_app_settings(user_uuid=user_uuid)
@@ -1021,6 +1168,25 @@ async def remove_from_inbox(user_uuid: UUID, message_id: str) -> Dict[str, Any]:
     async with acquire_imap_slot(user_uuid):
         return await asyncio.to_thread(_remove_from_inbox_sync, message_id, app_settings)
 
+async def set_label_batch(user_uuid: UUID, message_ids: List[str], label: str) -> List[Dict[str, Any]]:
+    """Adds a label to many messages in one IMAP session. Returns one result per Message-ID."""
+    app_settings = load_app_settings(user_uuid=user_uuid)
+    async with acquire_imap_slot(user_uuid):
+        return await asyncio.to_thread(_set_label_batch_sync, message_ids, label, app_settings)
+
+async def remove_from_inbox_batch(user_uuid: UUID, message_ids: List[str]) -> List[Dict[str, Any]]:
+    """Moves many messages from the inbox to All Mail in one IMAP session. Returns one result per Message-ID."""
+    app_settings = load_app_settings(user_uuid=user_uuid)
+    async with acquire_imap_slot(user_uuid):
+        return await asyncio.to_thread(_remove_from_inbox_batch_sync, message_ids, app_settings)
+
+async def draft_replies_batch(user_uuid: UUID, replies: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """Creates draft replies for many (Message-ID, body) pairs in one IMAP session. Returns one result per reply."""
+    app_settings = load_app_settings(user_uuid=user_uuid)
+    signature = await get_cached_signature(user_uuid, app_settings)
+    async with acquire_imap_slot(user_uuid):
+        return await asyncio.to_thread(_draft_replies_batch_sync, replies, app_settings, signature)
+
 async def get_emails(user_uuid: UUID, folder_name: str, count: int = 10, filter_by_labels: Optional[List[str]] = None) -> List[EmailMessage]:
     """Asynchronous wrapper for getting emails from a folder with optional label filtering."""
     app_settings = load_app_settings(user_uuid=user_uuid)
@@ -1226,6 +1392,13 @@ def _list_headers_sync(folder_name: str, count: int, app_settings: AppSettings,
 
 
 async def list_headers(user_uuid: UUID, folder_name: str, count: int = 50, filter_by_labels: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    if settings.IMAP_HEADER_INDEX_ENABLED:
+        try:
+            index = await get_header_index(user_uuid, [folder_name])
+            page = await asyncio.to_thread(index.list_headers, [folder_name], count, filter_by_labels)
+            return page['items']
+        except Exception as e:
+            logger.warning(f"Header index unavailable for user {user_uuid}, listing over IMAP: {e}")
     app_settings = load_app_settings(user_uuid=user_uuid)
     loop = asyncio.get_running_loop()
     async with acquire_imap_slot(user_uuid):
@@ -1342,6 +1515,18 @@ def _list_headers_multi_with_counts_sync(folder_names: List[str], count: int, ap
 
 
 async def list_headers_multi_with_counts(user_uuid: UUID, folder_names: List[str], count: int = 50, filter_by_labels: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Headers of the `count` most recent messages of each folder, folder by folder and
+    not deduplicated across folders; `total` is the sum of the folders' message counts.
+    Answered from the header index when it is enabled and synced, otherwise over IMAP,
+    with the same shape either way.
+    """
+    if settings.IMAP_HEADER_INDEX_ENABLED:
+        try:
+            index = await get_header_index(user_uuid, folder_names)
+            return await asyncio.to_thread(index.list_recent_by_folder, folder_names, count, filter_by_labels)
+        except Exception as e:
+            logger.warning(f"Header index unavailable for user {user_uuid}, listing over IMAP: {e}")
     app_settings = load_app_settings(user_uuid=user_uuid)
     loop = asyncio.get_running_loop()
     async with acquire_imap_slot(user_uuid):
@@ -1413,12 +1598,60 @@ def _count_uids_sync(folder_name: str, app_settings: AppSettings, filter_by_labe
 
 
 async def count_uids(user_uuid: UUID, folder_name: str, filter_by_labels: Optional[List[str]] = None) -> int:
+    if settings.IMAP_HEADER_INDEX_ENABLED:
+        try:
+            index = await get_header_index(user_uuid, [folder_name])
+            return await asyncio.to_thread(index.count, [folder_name], filter_by_labels)
+        except Exception as e:
+            logger.warning(f"Header index unavailable for user {user_uuid}, counting over IMAP: {e}")
     app_settings = load_app_settings(user_uuid=user_uuid)
     loop = asyncio.get_running_loop()
     async with acquire_imap_slot(user_uuid):
         return await loop.run_in_executor(None, _count_uids_sync, folder_name, app_settings, filter_by_labels)
 
 
+async def list_headers_page(
+    user_uuid: UUID,
+    folder_names: List[str],
+    page_size: int = 50,
+    filter_by_labels: Optional[List[str]] = None,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    One page of headers across folders, newest first and deduplicated by Message-ID.
+    Answered from the local header index; pass `next_cursor` of a page to get the next one.
+    Without the index (disabled, or not synced yet) the page is built over IMAP from
+    `offset`, and `next_cursor` is None.
+    Returns {'items', 'total', 'next_cursor'}.
+    """
+    if settings.IMAP_HEADER_INDEX_ENABLED:
+        try:
+            index = await get_header_index(user_uuid, folder_names)
+            return await asyncio.to_thread(index.list_headers, folder_names, page_size, filter_by_labels, offset, cursor)
+        except Exception as e:
+            logger.warning(f"Header index unavailable for user {user_uuid}, listing over IMAP: {e}")
+
+    # Each folder may hold all of the newest messages, so fetch up to offset + page_size from each.
+    app_settings = load_app_settings(user_uuid=user_uuid)
+    async with acquire_imap_slot(user_uuid):
+        multi = await asyncio.to_thread(_list_headers_multi_with_counts_sync, folder_names, offset + page_size, app_settings, filter_by_labels)
+    unique: Dict[str, Dict[str, Any]] = {}
+    for header in multi.get('items', []):
+        message_id = header.get('message_id')
+        if message_id and message_id not in unique:
+            unique[message_id] = header
+
+    def _date_key(header: Dict[str, Any]) -> float:
+        try:
+            return parsedate_to_datetime(header.get('date', '')).timestamp()
+        except Exception:
+            return 0.0
+
+    items = sorted(unique.values(), key=_date_key, reverse=True)[offset:offset + page_size]
+    return {'items': items, 'total': int(multi.get('total', 0)), 'next_cursor': None}
+
+
 # --- Bulk Export (Single Connection, Deduplicate by Thread) ---
 
 def _parse_thrid_from_meta(meta_bytes: bytes) -> Optional[str]:
@@ -1438,6 +1671,97 @@ def _decode_contextual_uid(contextual_uid: str) -> Tuple[Optional[str], Optional
     except Exception:
         return None, None
 
+# Number of UIDs per X-GM-THRID FETCH command.
+THRID_FETCH_CHUNK_SIZE = 500
+
+def _fetch_thrids_for_uids(mail: imaplib.IMAP4_SSL, uids: List[str]) -> Dict[str, str]:
+    """
+    Fetches X-GM-THRID for UIDs in the selected mailbox with one FETCH per chunk.
+    UIDs are only fetched one by one for chunks whose batch FETCH failed.
+    Returns {uid: thrid}.
+    """
+    thrids: Dict[str, str] = {}
+    for start in range(0, len(uids), THRID_FETCH_CHUNK_SIZE):
+        chunk = uids[start:start + THRID_FETCH_CHUNK_SIZE]
+        parsed_any = False
+        try:
+            typ, data = mail.uid('fetch', ','.join(chunk), '(UID X-GM-THRID)')
+            if typ == 'OK':
+                for meta, _ in _iter_fetch_responses(data):
+                    uid_match = re.search(rb'UID (\d+)', meta)
+                    thrid = _parse_thrid_from_meta(meta)
+                    if uid_match and thrid:
+                        thrids[uid_match.group(1).decode()] = thrid
+                        parsed_any = True
+        except Exception as e:
+            logger.warning(f"[bulk] Batch FETCH X-GM-THRID failed for {len(chunk)} UIDs: {e}")
+        if parsed_any:
+            continue
+        for uid in chunk:
+            try:
+                typ_one, data_one = mail.uid('fetch', uid, '(UID X-GM-THRID)')
+                if typ_one != 'OK':
+                    continue
+                for meta, _ in _iter_fetch_responses(data_one):
+                    thrid = _parse_thrid_from_meta(meta)
+                    if thrid:
+                        thrids[uid] = thrid
+                        break
+            except Exception:
+                continue
+    return thrids
+
+def _fetch_message_ids_for_uids(mail: imaplib.IMAP4_SSL, uids: List[str]) -> List[str]:
+    """Fetches the Message-ID headers of UIDs in the selected mailbox with a single FETCH."""
+    if not uids:
+        return []
+    typ, data = mail.uid('fetch', ','.join(uids), '(UID BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])')
+    if typ != 'OK':
+        return []
+    message_ids = []
+    for _, literal in _iter_fetch_responses(data):
+        if literal is None:
+            continue
+        message_id = _normalize_message_id(email.message_from_bytes(literal).get('Message-ID', ''))
+        if message_id:
+            message_ids.append(message_id)
+    return message_ids
+
+def _resolve_message_id_thrids(
+    mail: imaplib.IMAP4_SSL,
+    resolver: FolderResolver,
+    message_ids: List[str],
+) -> Dict[str, str]:
+    """
+    Resolves Message-IDs to Gmail thread ids with batched OR searches. All Mail is
+    searched first; Inbox and Sent only for what remains unresolved.
+    Returns {normalized Message-ID: thrid} and logs the resolution throughput.
+    """
+    started = time.monotonic()
+    pending = list(dict.fromkeys(_normalize_message_id(m) for m in message_ids if _normalize_message_id(m)))
+    total = len(pending)
+    resolved: Dict[str, str] = {}
+    for attr in ['\\All', '\\Inbox', '\\Sent']:
+        if not pending:
+            break
+        try:
+            folder = resolver.get_folder_by_attribute(attr)
+            mail.select(f'"{folder}"', readonly=True)
+            found = _search_message_ids(mail, pending, with_thrid=True)
+        except Exception as e:
+            logger.warning(f"[bulk] Could not resolve Message-IDs in folder {attr}: {e}")
+            continue
+        for message_id, (_, thrid) in found.items():
+            if thrid:
+                resolved[message_id] = thrid
+        pending = [message_id for message_id in pending if message_id not in resolved]
+        logger.info(f"[bulk] Folder {folder}: resolved {len(found)} Message-IDs, remaining unresolved={len(pending)}")
+
+    elapsed = time.monotonic() - started
+    rate = len(resolved) / elapsed if elapsed > 0 else float(len(resolved))
+    logger.info(f"[bulk] Resolved {len(resolved)}/{total} Message-IDs in {elapsed:.2f}s ({rate:.0f} ids/s)")
+    return resolved
+
 def _resolve_thread_ids_single_connection(
     mail: imaplib.IMAP4_SSL,
     resolver: FolderResolver,
@@ -1471,155 +1795,29 @@ def _resolve_thread_ids_single_connection(
     for mailbox, uids in contextual_uids.items():
         try:
             mail.select(f'"{mailbox}"', readonly=True)
-            # Batch fetch X-GM-THRID for all uids in this mailbox
-            uid_list = ','.join(uids)
-            typ, data = mail.uid('fetch', uid_list, '(X-GM-THRID)')
-            logger.debug(f"[bulk] Batch FETCH X-GM-THRID typ={typ}, parts={len(data) if data else 0} in mailbox {mailbox}")
-            parsed_any = False
-            resolved_uids: Set[str] = set()
-            if typ == 'OK' and data:
-                # Parse results; map each UID to its thrid
-                for part in data:
-                    meta: Optional[bytes] = None
-                    if isinstance(part, tuple) and isinstance(part[0], (bytes, bytearray)):
-                        meta = part[0]
-                    elif isinstance(part, (bytes, bytearray)):
-                        meta = part
-                    if not meta:
-                        continue
-                    # Extract UID and THRID
-                    uid_match = re.search(rb'\b(\d+) \(', meta)
-                    uid_str = uid_match.group(1).decode() if uid_match else None
-                    thrid = _parse_thrid_from_meta(meta)
-                    if uid_str and thrid:
-                        parsed_any = True
-                        thrids.add(thrid)
-                        contextual_identifier = create_contextual_id(mailbox, uid_str)
-                        thrid_to_identifiers[thrid].append(contextual_identifier)
-                        resolved_uids.add(uid_str)
-            logger.debug(f"[bulk] Mailbox {mailbox}: batch parsed_any={parsed_any}, current thrids={len(thrids)}")
-            # Fallback to per-UID fetch if batch failed or parsed nothing
-            if not parsed_any:
-                for uid in uids:
-                    try:
-                        typ_one, data_one = mail.uid('fetch', uid, '(X-GM-THRID)')
-                        logger.debug(f"[bulk] Per-UID FETCH X-GM-THRID typ={typ_one} parts={len(data_one) if data_one else 0} for uid={uid} in {mailbox}")
-                        if typ_one != 'OK' or not data_one:
-                            continue
-                        meta_one: Optional[bytes] = None
-                        first = data_one[0]
-                        if isinstance(first, tuple) and isinstance(first[0], (bytes, bytearray)):
-                            meta_one = first[0]
-                        elif isinstance(first, (bytes, bytearray)):
-                            meta_one = first
-                        if not meta_one:
-                            continue
-                        thrid = _parse_thrid_from_meta(meta_one)
-                        if not thrid:
-                            continue
-                        thrids.add(thrid)
-                        contextual_identifier = create_contextual_id(mailbox, uid)
-                        thrid_to_identifiers[thrid].append(contextual_identifier)
-                        resolved_uids.add(uid)
-                    except Exception:
-                        continue
-            logger.info(f"[bulk] Mailbox {mailbox}: resolved {len(resolved_uids)}/{len(uids)} UIDs -> cumulative unique thrids={len(thrids)}")
+            uid_thrids = _fetch_thrids_for_uids(mail, uids)
+            for uid, thrid in uid_thrids.items():
+                thrids.add(thrid)
+                thrid_to_identifiers[thrid].append(create_contextual_id(mailbox, uid))
+            logger.info(f"[bulk] Mailbox {mailbox}: resolved {len(uid_thrids)}/{len(uids)} UIDs -> cumulative unique thrids={len(thrids)}")
 
             # Derive Message-IDs for unresolved UIDs to allow Message-ID-based resolution later
-            unresolved = [uid for uid in uids if uid not in resolved_uids]
+            unresolved = [uid for uid in uids if uid not in uid_thrids]
             if unresolved:
                 logger.info(f"[bulk] Mailbox {mailbox}: attempting to derive Message-IDs for {len(unresolved)} unresolved UIDs")
-                for uid in unresolved:
-                    try:
-                        typ_mid, data_mid = mail.uid('fetch', uid, '(BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])')
-                        if typ_mid != 'OK' or not data_mid:
-                            continue
-                        header_blob: Optional[bytes] = None
-                        for part in data_mid:
-                            if isinstance(part, tuple) and isinstance(part[1], (bytes, bytearray)):
-                                header_blob = part[1]
-                                break
-                        if not header_blob:
-                            continue
-                        headers_text = header_blob.decode('utf-8', errors='replace')
-                        msgid_match = re.search(r'Message-ID:\s*<([^>]+)>', headers_text, re.IGNORECASE)
-                        if msgid_match:
-                            mid = msgid_match.group(1)
-                            message_ids.append(mid)
-                    except Exception:
-                        continue
+                message_ids.extend(_fetch_message_ids_for_uids(mail, unresolved))
         except Exception as e:
             logger.error(f"Failed to resolve thread IDs in mailbox '{mailbox}': {e}")
             continue
 
-    # 3) Resolve thrids for Message-IDs in All Mail preferably
-    all_mailbox = None
-    try:
-        all_mailbox = resolver.get_folder_by_attribute('\\All')
-    except FolderNotFoundError:
-        # Fall back to Inbox and Sent search
-        all_mailbox = None
-
-    if all_mailbox and message_ids:
-        try:
-            mail.select(f'"{all_mailbox}"', readonly=True)
-            resolved_in_all = 0
-            for message_id in message_ids:
-                try:
-                    typ, data = mail.uid('search', None, f'(HEADER Message-ID "{message_id}")')
-                    if typ == 'OK' and data and data[0]:
-                        uid = data[0].split()[0].decode()
-                        # Fetch X-GM-THRID for this uid
-                        typ2, data2 = mail.uid('fetch', uid, '(X-GM-THRID)')
-                        if typ2 == 'OK' and data2 and isinstance(data2[0], tuple):
-                            meta = data2[0][0] if isinstance(data2[0][0], (bytes, bytearray)) else None
-                            if meta:
-                                thrid = _parse_thrid_from_meta(meta)
-                                if thrid:
-                                    thrids.add(thrid)
-                                    thrid_to_identifiers[thrid].append(message_id)
-                                    resolved_in_all += 1
-                except Exception as e:
-                    logger.warning(f"Search by Message-ID failed in All Mail for {message_id}: {e}")
-                    continue
-            logger.info(f"[bulk] Resolved {resolved_in_all} Message-IDs in All Mail -> cumulative unique thrids={len(thrids)}")
-        except Exception as e:
-            logger.warning(f"Could not select All Mail '{all_mailbox}': {e}")
-
-    # If some message_ids remain unresolved and All Mail was not available or failed,
-    # do a best-effort search in Inbox then Sent
-    if (not all_mailbox) and message_ids:
-        for attr in ['\\Inbox', '\\Sent']:
-            try:
-                folder = resolver.get_folder_by_attribute(attr)
-                mail.select(f'"{folder}"', readonly=True)
-                unresolved = []
-                resolved_here = 0
-                for message_id in message_ids:
-                    try:
-                        typ, data = mail.uid('search', None, f'(HEADER Message-ID "{message_id}")')
-                        if typ == 'OK' and data and data[0]:
-                            uid = data[0].split()[0].decode()
-                            typ2, data2 = mail.uid('fetch', uid, '(X-GM-THRID)')
-                            meta = None
-                            if typ2 == 'OK' and data2 and isinstance(data2[0], tuple):
-                                meta = data2[0][0] if isinstance(data2[0][0], (bytes, bytearray)) else None
-                            if meta:
-                                thrid = _parse_thrid_from_meta(meta)
-                                if thrid and thrid not in thrids:
-                                    thrids.add(thrid)
-                                    thrid_to_identifiers[thrid].append(message_id)
-                                    resolved_here += 1
-                                    continue
-                        unresolved.append(message_id)
-                    except Exception:
-                        unresolved.append(message_id)
-                message_ids = unresolved
-                logger.info(f"[bulk] Folder {folder}: resolved {resolved_here} Message-IDs, remaining unresolved={len(message_ids)}; cumulative thrids={len(thrids)}")
-                if not message_ids:
-                    break
-            except Exception:
-                continue
+    # 3) Resolve thrids for Message-IDs, in All Mail preferably
+    if message_ids:
+        resolved = _resolve_message_id_thrids(mail, resolver, message_ids)
+        for message_id in message_ids:
+            thrid = resolved.get(_normalize_message_id(message_id))
+            if thrid:
+                thrids.add(thrid)
+                thrid_to_identifiers[thrid].append(message_id)
 
     if not thrids:
         logger.warning("[bulk] No thread IDs were resolved from provided identifiers.")
@@ -1845,53 +2043,15 @@ def _export_threads_dataset_bulk_sync(
                     CHUNK = 100
                     for i in range(0, len(uids), CHUNK):
                         uid_slice = uids[i:i+CHUNK]
-                        uid_list = ','.join(uid_slice)
-                        typ, data = mail.uid('fetch', uid_list, '(X-GM-THRID)')
-                        logger.debug(f"[bulk] Batch FETCH X-GM-THRID typ={typ}, parts={len(data) if data else 0} in mailbox {mailbox}")
-                        # Parse batch results
-                        resolved_in_batch: Set[str] = set()
-                        if typ == 'OK' and data:
-                            for part in data:
-                                meta: Optional[bytes] = None
-                                if isinstance(part, tuple) and isinstance(part[0], (bytes, bytearray)):
-                                    meta = part[0]
-                                elif isinstance(part, (bytes, bytearray)):
-                                    meta = part
-                                if not meta:
-                                    continue
-                                uid_match = re.search(rb'\b(\d+) \(', meta)
-                                uid_str = uid_match.group(1).decode() if uid_match else None
-                                thrid = _parse_thrid_from_meta(meta)
-                                if uid_str and thrid and thrid not in seen_thrids:
-                                    seen_thrids.add(thrid)
-                                    batch_thrids.append(thrid)
-                                    thrid_to_identifiers[thrid].append(create_contextual_id(mailbox, uid_str))
-                                    resolved_in_batch.add(uid_str)
-                        # per-UID fallback for unresolved in slice
-                        unresolved = [uid for uid in uid_slice if uid not in resolved_in_batch]
-                        if unresolved:
-                            for uid in unresolved:
-                                try:
-                                    typ_one, data_one = mail.uid('fetch', uid, '(X-GM-THRID)')
-                                    if typ_one != 'OK' or not data_one:
-                                        continue
-                                    meta_one: Optional[bytes] = None
-                                    first = data_one[0]
-                                    if isinstance(first, tuple) and isinstance(first[0], (bytes, bytearray)):
-                                        meta_one = first[0]
-                                    elif isinstance(first, (bytes, bytearray)):
-                                        meta_one = first
-                                    if not meta_one:
-                                        continue
-                                    thrid = _parse_thrid_from_meta(meta_one)
-                                    if thrid and thrid not in seen_thrids:
-                                        seen_thrids.add(thrid)
-                                        batch_thrids.append(thrid)
-                                        thrid_to_identifiers[thrid].append(create_contextual_id(mailbox, uid))
-                                except Exception:
-                                    continue
-
-                        logger.info(f"[bulk] Mailbox {mailbox}: resolved {len(resolved_in_batch) + (len(unresolved) if unresolved else 0)} items in chunk; total unique thrids so far={len(seen_thrids)}")
+                        uid_thrids = _fetch_thrids_for_uids(mail, uid_slice)
+                        for uid in uid_slice:
+                            thrid = uid_thrids.get(uid)
+                            if thrid and thrid not in seen_thrids:
+                                seen_thrids.add(thrid)
+                                batch_thrids.append(thrid)
+                                thrid_to_identifiers[thrid].append(create_contextual_id(mailbox, uid))
+
+                        logger.info(f"[bulk] Mailbox {mailbox}: resolved {len(uid_thrids)}/{len(uid_slice)} UIDs in chunk; total unique thrids so far={len(seen_thrids)}")
 
                         # Flush when batch reaches BATCH_SIZE
                         if len(batch_thrids) >= BATCH_SIZE:
@@ -1916,70 +2076,22 @@ def _export_threads_dataset_bulk_sync(
                     logger.error(f"[bulk] Error processing mailbox {mailbox}: {e}")
                     continue
 
-            # 2) If there are Message-IDs (or derived from unresolved), resolve in All Mail and flush every BATCH_SIZE
+            # 2) Resolve Message-IDs with batched searches (All Mail first), then flush every BATCH_SIZE
             if message_ids:
-                # Define folders to search for Message-IDs, in order of preference
-                mailboxes_to_search = []
-                for attr in ['\\All', '\\Inbox', '\\Sent']:
-                    try:
-                        folder = resolver.get_folder_by_attribute(attr)
-                        mailboxes_to_search.append(folder)
-                    except FolderNotFoundError:
-                        logger.warning(f"[export_debug] Could not resolve folder for attribute '{attr}', skipping.")
-                
-                # Keep track of which message IDs have been found
-                resolved_mids = set()
-
-                for mailbox in mailboxes_to_search:
-                    remaining_mids = [mid for mid in message_ids if mid not in resolved_mids]
-                    if not remaining_mids:
-                        break
-                    
-                    try:
-                        mail.select(f'"{mailbox}"', readonly=True)
-                        batch_thrids: List[str] = []
-
-                        for mid in remaining_mids:
-                            try:
-                                typ, data = mail.uid('search', None, f'(HEADER Message-ID "{mid}")')
-                                
-                                if typ == 'OK' and data and data[0]:
-                                    uid = data[0].split()[0].decode()
-                                    
-                                    typ2, data2 = mail.uid('fetch', uid, '(X-GM-THRID)')
-                                    meta = None
-                                    
-                                    # Handle different IMAP response formats for the FETCH command
-                                    if typ2 == 'OK' and data2:
-                                        first_part = data2[0]
-                                        if isinstance(first_part, tuple) and isinstance(first_part[0], (bytes, bytearray)):
-                                            # Expected format: [(b'meta', b'data')]
-                                            meta = first_part[0]
-                                        elif isinstance(first_part, (bytes, bytearray)):
-                                            # Alternative format seen in logs: [b'meta']
-                                            meta = first_part
-
-                                    if meta:
-                                        thrid = _parse_thrid_from_meta(meta)
-                                        if thrid and thrid not in seen_thrids:
-                                            seen_thrids.add(thrid)
-                                            batch_thrids.append(thrid)
-                                            thrid_to_identifiers[thrid].append(mid)
-                                            resolved_mids.add(mid) # Mark this Message-ID as resolved
-                                
-                                # Flush on size
-                                if len(batch_thrids) >= BATCH_SIZE:
-                                    _flush_batch(batch_thrids)
-                                    batch_thrids = []
-                                    # After fetching, re-select the search mailbox
-                                    mail.select(f'"{mailbox}"', readonly=True)
-                            except Exception as e:
-                                continue
-                        
-                        if batch_thrids:
-                            _flush_batch(batch_thrids)
-                    except Exception as e:
-                        logger.warning(f"[bulk] Could not select or search mailbox '{mailbox}': {e}", exc_info=True)
+                resolved = _resolve_message_id_thrids(mail, resolver, message_ids)
+                batch_thrids: List[str] = []
+                for mid in message_ids:
+                    thrid = resolved.get(_normalize_message_id(mid))
+                    if not thrid or thrid in seen_thrids:
+                        continue
+                    seen_thrids.add(thrid)
+                    batch_thrids.append(thrid)
+                    thrid_to_identifiers[thrid].append(mid)
+                    if len(batch_thrids) >= BATCH_SIZE:
+                        _flush_batch(batch_thrids)
+                        batch_thrids = []
+                if batch_thrids:
+                    _flush_batch(batch_thrids)
 
             # Final ensure progress shows completed
             if progress_callback:
@@ -0,0 +1,304 @@
+"""
+CONDSTORE/QRESYNC change tracking for mailbox label and flag state.
+
+Every folder sync stores the folder's UIDVALIDITY and HIGHESTMODSEQ per user in
+Redis. The next sync fetches only the messages whose labels or flags changed since
+that mod-sequence (`UID FETCH 1:* (...) (CHANGEDSINCE n)`), so consumers can update
+their views incrementally instead of rescanning the folder. A changed UIDVALIDITY,
+or a missing state, is reported as `full_resync`. Expunged UIDs are only reported
+when the server supports QRESYNC (Gmail does not).
+"""
+
+from __future__ import annotations
+import asyncio
+import imaplib
+import json
+import logging
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+from uuid import UUID
+
+from mcp_servers.imap_mcpserver.src.imap_client.internals.connection_manager import (
+    imap_connection,
+    FolderResolver,
+    FolderNotFoundError,
+    acquire_imap_slot,
+)
+from mcp_servers.imap_mcpserver.src.imap_client.models import FolderChanges, MessageChange
+from shared.app_settings import AppSettings, load_app_settings
+from shared.config import settings
+from shared.redis.keys import RedisKeys
+from shared.redis.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Number of thread ids per OR-combined X-GM-THRID search.
+THREAD_SEARCH_CHUNK_SIZE = 50
+
+_TOKEN_RE = re.compile(r'"((?:[^"\\]|\\.)*)"|(\))|([^\s()"]+)')
+
+
+def parse_fetch_list(meta: str, key: str) -> Optional[List[str]]:
+    """
+    Parses a parenthesized list item of a FETCH response, e.g. `X-GM-LABELS ("\\\\Important" Work)`.
+    Quoted strings are unescaped. Returns None if the item is absent.
+    """
+    start = meta.find(f'{key} (')
+    if start == -1:
+        return None
+    values: List[str] = []
+    for match in _TOKEN_RE.finditer(meta, start + len(key) + 2):
+        quoted, closing, atom = match.groups()
+        if closing:
+            break
+        if quoted is not None:
+            values.append(re.sub(r'\\(.)', r'\1', quoted))
+        else:
+            values.append(atom)
+    return values
+
+
+def _parse_int_item(meta: str, pattern: str) -> Optional[int]:
+    match = re.search(pattern, meta)
+    return int(match.group(1)) if match else None
+
+
+def _expand_uid_set(uid_set: str) -> List[str]:
+    """Expands an IMAP UID set such as `41,43:45` into individual UIDs."""
+    uids: List[str] = []
+    for part in uid_set.split(','):
+        part = part.strip()
+        if ':' in part:
+            low, high = sorted(int(x) for x in part.split(':', 1))
+            uids.extend(str(uid) for uid in range(low, high + 1))
+        elif part.isdigit():
+            uids.append(part)
+    return uids
+
+
+def _refresh_capabilities(mail: imaplib.IMAP4_SSL) -> None:
+    """Servers often advertise CONDSTORE/QRESYNC/ENABLE only after login; imaplib keeps the greeting's list."""
+    try:
+        typ, data = mail.capability()
+        if typ == 'OK' and data and data[-1]:
+            mail.capabilities = tuple(data[-1].decode().upper().split())
+    except Exception as e:
+        logger.debug(f"Could not refresh IMAP capabilities: {e}")
+
+
+def fetch_folder_changes_sync(
+    mail: imaplib.IMAP4_SSL,
+    folder: str,
+    previous_state: Optional[Dict[str, Any]],
+) -> FolderChanges:
+    """
+    Fetches the label and flag changes of `folder` since `previous_state`.
+    Must be called on a connection that has not selected a mailbox yet, because
+    QRESYNC has to be enabled before SELECT.
+    """
+    _refresh_capabilities(mail)
+    qresync = 'QRESYNC' in mail.capabilities
+    if qresync:
+        try:
+            mail.enable('QRESYNC')
+        except Exception as e:
+            logger.info(f"Could not enable QRESYNC, continuing with CONDSTORE only: {e}")
+            qresync = False
+
+    typ, select_data = mail.select(f'"{folder}"', readonly=True)
+    if typ != 'OK':
+        raise imaplib.IMAP4.error(f"Could not select folder '{folder}'")
+    uidvalidity_data = mail.response('UIDVALIDITY')[1]
+    modseq_data = mail.response('HIGHESTMODSEQ')[1]
+    uidnext_data = mail.response('UIDNEXT')[1]
+    uidvalidity = int(uidvalidity_data[0]) if uidvalidity_data and uidvalidity_data[0] else None
+    highestmodseq = int(modseq_data[0]) if modseq_data and modseq_data[0] else None
+    uidnext = int(uidnext_data[0]) if uidnext_data and uidnext_data[0] else None
+    exists = int(select_data[0]) if select_data and select_data[0] else 0
+
+    changes = FolderChanges(
+        folder=folder, uidvalidity=uidvalidity, highestmodseq=highestmodseq, uidnext=uidnext, exists=exists
+    )
+    if highestmodseq is None:
+        logger.info(f"Folder '{folder}' does not report HIGHESTMODSEQ; CONDSTORE is not available.")
+        changes.supported = False
+        changes.full_resync = True
+        return changes
+
+    if not previous_state or previous_state.get("uidvalidity") != uidvalidity or previous_state.get("highestmodseq") is None:
+        changes.full_resync = True
+        return changes
+
+    since = int(previous_state["highestmodseq"])
+    if highestmodseq <= since:
+        return changes
+
+    modifier = f'(CHANGEDSINCE {since} VANISHED)' if qresync else f'(CHANGEDSINCE {since})'
+    typ, data = mail.uid('FETCH', '1:*', '(UID FLAGS X-GM-LABELS X-GM-THRID)', modifier)
+    if typ != 'OK':
+        raise imaplib.IMAP4.error(f"CHANGEDSINCE fetch failed for folder '{folder}'")
+
+    previous_uidnext = previous_state.get("uidnext") or 0
+    for part in data or []:
+        raw = part[0] if isinstance(part, tuple) else part
+        if not isinstance(raw, (bytes, bytearray)):
+            continue
+        meta = raw.decode('utf-8', errors='replace')
+        uid = _parse_int_item(meta, r'UID (\d+)')
+        modseq = _parse_int_item(meta, r'MODSEQ \((\d+)\)')
+        if uid is None or modseq is None:
+            continue
+        thrid = _parse_int_item(meta, r'X-GM-THRID (\d+)')
+        changes.changed.append(MessageChange(
+            uid=str(uid),
+            thread_id=str(thrid) if thrid is not None else None,
+            modseq=modseq,
+            labels=parse_fetch_list(meta, 'X-GM-LABELS') or [],
+            flags=parse_fetch_list(meta, 'FLAGS') or [],
+            is_new=uid >= previous_uidnext,
+        ))
+
+    if qresync:
+        for vanished in mail.response('VANISHED')[1] or []:
+            if vanished:
+                text = vanished.decode() if isinstance(vanished, (bytes, bytearray)) else str(vanished)
+                changes.vanished.extend(_expand_uid_set(text.replace('(EARLIER)', '').strip()))
+
+    logger.info(f"Folder '{folder}': {len(changes.changed)} changed and {len(changes.vanished)} vanished message(s) since modseq {since}")
+    return changes
+
+
+def load_sync_state(user_uuid: UUID, folder: str) -> Optional[Dict[str, Any]]:
+    try:
+        raw = get_redis_client().get(RedisKeys.get_imap_folder_sync_state_key(user_uuid, folder))
+        return json.loads(raw) if raw else None
+    except Exception as e:
+        logger.warning(f"Could not load sync state of folder '{folder}' for user {user_uuid}: {e}")
+        return None
+
+
+def save_sync_state(user_uuid: UUID, folder: str, state: Dict[str, Any]) -> None:
+    try:
+        get_redis_client().set(RedisKeys.get_imap_folder_sync_state_key(user_uuid, folder), json.dumps(state))
+    except Exception as e:
+        logger.warning(f"Could not save sync state of folder '{folder}' for user {user_uuid}: {e}")
+
+
+def fetch_thread_labels_sync(mail: imaplib.IMAP4_SSL, thread_ids: Iterable[str]) -> Dict[str, Set[str]]:
+    """
+    Collects the labels of all messages of the given threads in the selected mailbox
+    (normally All Mail), using one OR-combined X-GM-THRID search and one FETCH per chunk.
+    """
+    thread_ids = list(dict.fromkeys(thread_ids))
+    labels: Dict[str, Set[str]] = {thread_id: set() for thread_id in thread_ids}
+    for start in range(0, len(thread_ids), THREAD_SEARCH_CHUNK_SIZE):
+        chunk = thread_ids[start:start + THREAD_SEARCH_CHUNK_SIZE]
+        criteria = [f'X-GM-THRID {thread_id}' for thread_id in chunk]
+        query = "OR " * (len(criteria) - 1) + " ".join(criteria)
+        typ, data = mail.uid('search', None, query)
+        if typ != 'OK' or not data or not data[0]:
+            continue
+        uid_set = b','.join(data[0].split()).decode()
+        typ, fetch_data = mail.uid('fetch', uid_set, '(UID X-GM-THRID X-GM-LABELS)')
+        if typ != 'OK':
+            continue
+        for part in fetch_data or []:
+            raw = part[0] if isinstance(part, tuple) else part
+            if not isinstance(raw, (bytes, bytearray)):
+                continue
+            meta = raw.decode('utf-8', errors='replace')
+            thrid = _parse_int_item(meta, r'X-GM-THRID (\d+)')
+            message_labels = parse_fetch_list(meta, 'X-GM-LABELS') or []
+            if thrid is None or '\\Draft' in message_labels:
+                continue
+            labels.setdefault(str(thrid), set()).update(message_labels)
+    return labels
+
+
+def _special_folder_names(resolver: FolderResolver) -> Set[str]:
+    names: Set[str] = set()
+    for attr in list(resolver.SPECIAL_USE_ATTRIBUTES) + list(resolver.FALLBACK_MAP.keys()):
+        names.add(attr)
+        try:
+            names.add(resolver.get_folder_by_attribute(attr))
+        except FolderNotFoundError:
+            continue
+    return names
+
+
+def _sync_folder_sync(
+    mail: imaplib.IMAP4_SSL,
+    resolver: FolderResolver,
+    user_uuid: UUID,
+    folder_attribute: str,
+) -> FolderChanges:
+    """Fetches the changes of a folder since its stored state and stores the new state."""
+    previous_state = load_sync_state(user_uuid, folder_attribute)
+    folder = resolver.get_folder_by_attribute(folder_attribute)
+    changes = fetch_folder_changes_sync(mail, folder, previous_state)
+    save_sync_state(user_uuid, folder_attribute, {
+        "uidvalidity": changes.uidvalidity,
+        "highestmodseq": changes.highestmodseq,
+        "uidnext": changes.uidnext,
+        "synced_at": time.time(),
+    })
+    if changes.full_resync and changes.supported:
+        logger.info(f"No usable sync state of folder '{folder}' for user {user_uuid}; recorded a new baseline.")
+    return changes
+
+
+def _sync_label_changes_sync(user_uuid: UUID, app_settings: AppSettings) -> Dict[str, Dict[str, Any]]:
+    """
+    Syncs All Mail and returns the new thread payload fields ({thread_id: {"folders", "most_recent_user_labels"}})
+    for every thread with a changed message.
+    """
+    with imap_connection(app_settings=app_settings) as (mail, resolver):
+        changes = _sync_folder_sync(mail, resolver, user_uuid, '\\All')
+        thread_ids = {change.thread_id for change in changes.changed if change.thread_id}
+        if not thread_ids:
+            return {}
+
+        special_folders = _special_folder_names(resolver)
+        payloads: Dict[str, Dict[str, Any]] = {}
+        for thread_id, thread_labels in fetch_thread_labels_sync(mail, thread_ids).items():
+            if not thread_labels:
+                continue
+            payloads[thread_id] = {
+                "folders": sorted(thread_labels),
+                "most_recent_user_labels": sorted(label for label in thread_labels if label not in special_folders),
+            }
+        return payloads
+
+
+async def sync_folder_changes(user_uuid: UUID, folder_attribute: str = '\\All') -> FolderChanges:
+    """Fetches the label and flag changes of a folder since the last call and advances the stored state."""
+    app_settings = load_app_settings(user_uuid=user_uuid)
+
+    def _sync() -> FolderChanges:
+        with imap_connection(app_settings=app_settings) as (mail, resolver):
+            return _sync_folder_sync(mail, resolver, user_uuid, folder_attribute)
+
+    async with acquire_imap_slot(user_uuid):
+        return await asyncio.to_thread(_sync)
+
+
+async def sync_label_changes(user_uuid: UUID, min_interval_s: Optional[int] = None) -> int:
+    """
+    Pushes label changes since the last sync into the Qdrant payload (`folders`,
+    `most_recent_user_labels`) of the affected threads. Runs at most once per
+    `min_interval_s` per user. Returns the number of updated threads.
+    """
+    from shared.qdrant.qdrant_client import set_thread_payloads
+
+    interval = settings.IMAP_LABEL_SYNC_INTERVAL_SECONDS if min_interval_s is None else min_interval_s
+    state = load_sync_state(user_uuid, '\\All')
+    if state and time.time() - state.get("synced_at", 0) < interval:
+        return 0
+
+    app_settings = load_app_settings(user_uuid=user_uuid)
+    async with acquire_imap_slot(user_uuid):
+        payloads = await asyncio.to_thread(_sync_label_changes_sync, user_uuid, app_settings)
+    if not payloads:
+        return 0
+    return await asyncio.to_thread(set_thread_payloads, payloads, user_uuid)
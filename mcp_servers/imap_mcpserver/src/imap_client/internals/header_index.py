@@ -0,0 +1,501 @@
+"""
+Per-user SQLite index of message headers.
+
+Folder listings, counts, label filters and pagination are answered from a local
+SQLite file per user instead of searching and fetching headers over IMAP on every
+request. IMAP is only used to refresh the index: the first refresh of a folder
+loads all headers (in the background, while requests are answered over IMAP),
+later refreshes use the CONDSTORE change feed
+(`change_tracker.fetch_folder_changes_sync`) to fetch headers of new messages and
+the labels of changed ones. Expunged messages are reconciled with one UID SEARCH
+when the folder's message count no longer matches the index.
+"""
+
+from __future__ import annotations
+import asyncio
+import base64
+import contextlib
+import email
+import fcntl
+import hashlib
+import imaplib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from email.header import decode_header, make_header
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from mcp_servers.imap_mcpserver.src.imap_client.helpers.contextual_id import create_contextual_id
+from mcp_servers.imap_mcpserver.src.imap_client.internals.change_tracker import fetch_folder_changes_sync, parse_fetch_list
+from mcp_servers.imap_mcpserver.src.imap_client.internals.connection_manager import imap_connection, acquire_imap_slot
+from shared.app_settings import load_app_settings
+from shared.config import settings
+
+logger = logging.getLogger(__name__)
+
+HEADER_FETCH_ITEMS = '(UID X-GM-THRID X-GM-LABELS BODY.PEEK[HEADER.FIELDS (MESSAGE-ID SUBJECT FROM TO DATE)])'
+HEADER_FETCH_CHUNK_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    folder TEXT PRIMARY KEY,
+    uidvalidity INTEGER,
+    highestmodseq INTEGER,
+    uidnext INTEGER,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS headers (
+    folder TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    message_id TEXT NOT NULL,
+    thread_id TEXT,
+    date_ts INTEGER NOT NULL,
+    date TEXT,
+    from_addr TEXT,
+    to_addr TEXT,
+    subject TEXT,
+    labels TEXT,
+    PRIMARY KEY (folder, uid)
+);
+CREATE TABLE IF NOT EXISTS labels (
+    folder TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    label_key TEXT NOT NULL,
+    PRIMARY KEY (folder, uid, label_key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_headers_order ON headers (date_ts DESC, folder DESC, uid DESC);
+CREATE INDEX IF NOT EXISTS idx_headers_message_id ON headers (message_id);
+CREATE INDEX IF NOT EXISTS idx_labels_key ON labels (label_key, folder, uid);
+"""
+
+
+def label_key(label: str) -> str:
+    """Normalizes a label the way Gmail's `label:` search does (case-insensitive, spaces and slashes as dashes)."""
+    return re.sub(r'[\s/]+', '-', label.lstrip('\\').strip().lower())
+
+
+def _decode(value: Optional[str]) -> str:
+    if not value:
+        return ''
+    try:
+        return str(make_header(decode_header(value)))
+    except Exception:
+        return value
+
+
+def _date_ts(value: str) -> int:
+    try:
+        return int(parsedate_to_datetime(value).timestamp())
+    except Exception:
+        return 0
+
+
+def parse_header_fetch(data: List[Any]) -> List[Dict[str, Any]]:
+    """Parses a FETCH response of HEADER_FETCH_ITEMS into header rows."""
+    rows: List[Dict[str, Any]] = []
+    for index, part in enumerate(data or []):
+        if not isinstance(part, tuple) or len(part) < 2:
+            continue
+        meta = part[0].decode('utf-8', errors='replace') if isinstance(part[0], (bytes, bytearray)) else str(part[0])
+        # Items the server sends after the literal arrive as the next, separate element.
+        following = data[index + 1] if index + 1 < len(data) else None
+        if isinstance(following, (bytes, bytearray)):
+            meta += following.decode('utf-8', errors='replace')
+        uid_match = re.search(r'UID (\d+)', meta)
+        if not uid_match:
+            continue
+        headers = email.message_from_bytes(part[1])
+        # Messages without a Message-ID are indexed (they count) but never listed.
+        message_id = (headers.get('Message-ID') or '').strip().strip('<>')
+        thrid_match = re.search(r'X-GM-THRID (\d+)', meta)
+        date = (headers.get('Date') or '').strip()
+        rows.append({
+            'uid': int(uid_match.group(1)),
+            'message_id': message_id,
+            'thread_id': thrid_match.group(1) if thrid_match else None,
+            'date_ts': _date_ts(date),
+            'date': date,
+            'from': _decode(headers.get('From')),
+            'to': _decode(headers.get('To')),
+            'subject': _decode(headers.get('Subject')),
+            'labels': parse_fetch_list(meta, 'X-GM-LABELS') or [],
+        })
+    return rows
+
+
+def _encode_cursor(row: sqlite3.Row) -> str:
+    return base64.urlsafe_b64encode(json.dumps([row['date_ts'], row['folder'], row['uid']]).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[int, str, int]:
+    date_ts, folder, uid = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    return int(date_ts), str(folder), int(uid)
+
+
+class HeaderIndex:
+    """SQLite header index of one user. Connections are opened per operation, so instances can be shared across threads."""
+
+    def __init__(self, user_uuid: UUID, db_path: Optional[str] = None):
+        self.user_uuid = user_uuid
+        self.db_path = db_path or os.path.join(settings.IMAP_HEADER_INDEX_DIR, f"{user_uuid}.sqlite3")
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Opens a connection for one operation and commits it as a single transaction."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    # --- Sync ---
+
+    def get_folder_state(self, folder: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM folders WHERE folder = ?", (folder,)).fetchone()
+            return dict(row) if row else None
+
+    def stale_folders(self, folders: Iterable[str], max_age_s: float) -> List[str]:
+        """Returns the folders that were never synced or synced longer than `max_age_s` ago."""
+        now = time.time()
+        stale = []
+        for folder in folders:
+            state = self.get_folder_state(folder)
+            if not state or now - (state.get('synced_at') or 0) > max_age_s:
+                stale.append(folder)
+        return stale
+
+    def _store_rows(self, conn: sqlite3.Connection, folder: str, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            conn.execute(
+                "INSERT OR REPLACE INTO headers (folder, uid, message_id, thread_id, date_ts, date, from_addr, to_addr, subject, labels) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (folder, row['uid'], row['message_id'], row['thread_id'], row['date_ts'], row['date'],
+                 row['from'], row['to'], row['subject'], json.dumps(row['labels'])),
+            )
+            self._store_labels(conn, folder, row['uid'], row['labels'])
+
+    def _store_labels(self, conn: sqlite3.Connection, folder: str, uid: int, labels: List[str]) -> None:
+        conn.execute("DELETE FROM labels WHERE folder = ? AND uid = ?", (folder, uid))
+        # The folder itself counts as a label, like Gmail's label: search inside that folder.
+        keys = {label_key(label) for label in labels} | {label_key(folder)}
+        conn.executemany(
+            "INSERT OR IGNORE INTO labels (folder, uid, label_key) VALUES (?, ?, ?)",
+            [(folder, uid, key) for key in keys],
+        )
+
+    def _delete_uids(self, conn: sqlite3.Connection, folder: str, uids: Iterable[int]) -> None:
+        params = [(folder, int(uid)) for uid in uids]
+        conn.executemany("DELETE FROM headers WHERE folder = ? AND uid = ?", params)
+        conn.executemany("DELETE FROM labels WHERE folder = ? AND uid = ?", params)
+
+    def _load_headers(self, mail: imaplib.IMAP4_SSL, folder: str, uids: List[int]) -> None:
+        """Fetches and stores the headers of `uids`, committing after every chunk so no write transaction spans IMAP round trips."""
+        for start in range(0, len(uids), HEADER_FETCH_CHUNK_SIZE):
+            chunk = uids[start:start + HEADER_FETCH_CHUNK_SIZE]
+            typ, data = mail.uid('fetch', ','.join(str(uid) for uid in chunk), HEADER_FETCH_ITEMS)
+            if typ != 'OK':
+                raise imaplib.IMAP4.error(f"Header fetch of {len(chunk)} messages in '{folder}' failed: {typ}")
+            rows = parse_header_fetch(data)
+            with self._connect() as conn:
+                self._store_rows(conn, folder, rows)
+
+    def _local_uids(self, folder: str) -> set:
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute("SELECT uid FROM headers WHERE folder = ?", (folder,))}
+
+    def _search_all_uids(self, mail: imaplib.IMAP4_SSL) -> List[int]:
+        typ, data = mail.uid('search', None, 'ALL')
+        if typ != 'OK':
+            raise imaplib.IMAP4.error(f"UID SEARCH ALL failed: {typ}")
+        if not data or not data[0]:
+            return []
+        return [int(uid) for uid in data[0].split()]
+
+    def refresh_folder(self, mail: imaplib.IMAP4_SSL, folder: str) -> None:
+        """
+        Brings the index of `folder` up to date. Selects the folder on `mail`.
+        IMAP is never called inside a write transaction. The folder's sync state is
+        written last, so a folder whose first load did not finish has no state and is
+        not served (see `get_header_index`). Callers serialize refreshes with `folder_lock`.
+        """
+        started = time.monotonic()
+        state = self.get_folder_state(folder)
+        changes = fetch_folder_changes_sync(mail, folder, state)
+        same_mailbox = bool(state) and state.get('uidvalidity') == changes.uidvalidity
+        local_uids = self._local_uids(folder)
+
+        if not same_mailbox:
+            # First sync, or UIDVALIDITY changed: reload the folder.
+            with self._connect() as conn:
+                conn.execute("DELETE FROM folders WHERE folder = ?", (folder,))
+                self._delete_uids(conn, folder, local_uids)
+            self._load_headers(mail, folder, self._search_all_uids(mail))
+            mode = "full"
+        elif not changes.supported:
+            # No CONDSTORE: fetch headers of new messages and refresh all labels.
+            server_uids = self._search_all_uids(mail)
+            self._load_headers(mail, folder, [uid for uid in server_uids if uid not in local_uids])
+            typ, data = mail.uid('fetch', '1:*', '(UID X-GM-LABELS)') if server_uids else ('NO', None)
+            with self._connect() as conn:
+                self._delete_uids(conn, folder, local_uids - set(server_uids))
+                if typ == 'OK':
+                    for part in data or []:
+                        raw = part[0] if isinstance(part, tuple) else part
+                        if isinstance(raw, (bytes, bytearray)):
+                            meta = raw.decode('utf-8', errors='replace')
+                            uid_match = re.search(r'UID (\d+)', meta)
+                            if uid_match:
+                                self._update_labels(conn, folder, int(uid_match.group(1)), parse_fetch_list(meta, 'X-GM-LABELS') or [])
+            mode = "labels"
+        else:
+            unknown = [int(change.uid) for change in changes.changed if int(change.uid) not in local_uids]
+            self._load_headers(mail, folder, unknown)
+            with self._connect() as conn:
+                for change in changes.changed:
+                    if int(change.uid) in local_uids:
+                        self._update_labels(conn, folder, int(change.uid), change.labels)
+                self._delete_uids(conn, folder, [int(uid) for uid in changes.vanished])
+                local_count = conn.execute("SELECT COUNT(*) FROM headers WHERE folder = ?", (folder,)).fetchone()[0]
+            if changes.exists is not None and local_count != changes.exists:
+                # Messages were expunged (or skipped): reconcile with the server's UID list.
+                server_uids = set(self._search_all_uids(mail))
+                known = self._local_uids(folder)
+                with self._connect() as conn:
+                    self._delete_uids(conn, folder, known - server_uids)
+                self._load_headers(mail, folder, sorted(server_uids - known))
+            mode = "incremental"
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO folders (folder, uidvalidity, highestmodseq, uidnext, synced_at) VALUES (?, ?, ?, ?, ?)",
+                (folder, changes.uidvalidity, changes.highestmodseq, changes.uidnext, time.time()),
+            )
+        logger.info(f"Header index: {mode} refresh of '{folder}' for user {self.user_uuid} took {time.monotonic() - started:.2f}s")
+
+    @contextlib.contextmanager
+    def folder_lock(self, folder: str) -> Iterator[None]:
+        """
+        Exclusive lock on refreshing `folder`, across threads and processes (an flock on a
+        lock file next to the index). Blocks until the current holder is done.
+        """
+        digest = hashlib.sha1(folder.encode('utf-8')).hexdigest()[:16]
+        with open(f"{self.db_path}.{digest}.lock", 'a+') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def get_thread_id(self, message_id: str) -> Optional[str]:
+        """The X-GM-THRID of an indexed message, or None when the message is not indexed."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT thread_id FROM headers WHERE message_id = ? AND thread_id IS NOT NULL LIMIT 1",
+                ((message_id or '').strip().strip('<>').strip(),),
+            ).fetchone()
+            return row['thread_id'] if row else None
+
+    def _update_labels(self, conn: sqlite3.Connection, folder: str, uid: int, labels: List[str]) -> None:
+        conn.execute("UPDATE headers SET labels = ? WHERE folder = ? AND uid = ?", (json.dumps(labels), folder, uid))
+        self._store_labels(conn, folder, uid, labels)
+
+    # --- Queries ---
+
+    @staticmethod
+    def _filter_sql(alias: str, folders: List[str], filter_by_labels: Optional[List[str]]) -> Tuple[str, List[Any]]:
+        """WHERE clause for folder and label filters. Labels match if any of them is present, like X-GM-RAW {label:a label:b}."""
+        sql = f"{alias}.folder IN ({','.join('?' * len(folders))})"
+        params: List[Any] = list(folders)
+        if filter_by_labels:
+            keys = sorted({label_key(label) for label in filter_by_labels})
+            sql += (
+                f" AND EXISTS (SELECT 1 FROM labels l WHERE l.folder = {alias}.folder AND l.uid = {alias}.uid"
+                f" AND l.label_key IN ({','.join('?' * len(keys))}))"
+            )
+            params.extend(keys)
+        return sql, params
+
+    def count(self, folders: List[str], filter_by_labels: Optional[List[str]] = None) -> int:
+        """Counts indexed messages in the folders (not deduplicated across folders)."""
+        if not folders:
+            return 0
+        where, params = self._filter_sql('h', folders, filter_by_labels)
+        with self._connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM headers h WHERE {where}", params).fetchone()[0]
+
+    def list_headers(
+        self,
+        folders: List[str],
+        limit: int,
+        filter_by_labels: Optional[List[str]] = None,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Lists headers newest first, deduplicated by Message-ID across folders.
+        Pass the returned `next_cursor` to get the following page (keyset pagination);
+        `offset` is only used without a cursor.
+        Returns {'items': [...], 'total': int, 'next_cursor': Optional[str]}.
+        """
+        if not folders or limit <= 0:
+            return {'items': [], 'total': 0, 'next_cursor': None}
+        where, params = self._filter_sql('h', folders, filter_by_labels)
+        duplicate_where, duplicate_params = self._filter_sql('d', folders, filter_by_labels)
+        # Keep one row per Message-ID: the one with the smallest (folder, uid).
+        dedup = (
+            f" AND NOT EXISTS (SELECT 1 FROM headers d WHERE d.message_id = h.message_id AND {duplicate_where}"
+            f" AND (d.folder < h.folder OR (d.folder = h.folder AND d.uid < h.uid)))"
+        )
+        base_sql = f"FROM headers h WHERE {where} AND h.message_id != ''{dedup}"
+        base_params = params + duplicate_params
+
+        page_sql = base_sql
+        page_params = list(base_params)
+        if cursor:
+            page_sql += " AND (h.date_ts, h.folder, h.uid) < (?, ?, ?)"
+            page_params.extend(_decode_cursor(cursor))
+        page_sql = f"SELECT h.* {page_sql} ORDER BY h.date_ts DESC, h.folder DESC, h.uid DESC LIMIT ?"
+        page_params.append(limit + 1)
+        if not cursor and offset:
+            page_sql += " OFFSET ?"
+            page_params.append(offset)
+
+        with self._connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) {base_sql}", base_params).fetchone()[0]
+            rows = conn.execute(page_sql, page_params).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        items = [self._row_to_item(row) for row in rows]
+        return {'items': items, 'total': total, 'next_cursor': _encode_cursor(rows[-1]) if has_more and rows else None}
+
+    def list_recent_by_folder(self, folders: List[str], count: int, filter_by_labels: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        The IMAP multi-folder listing, answered from the index: the `count` highest UIDs
+        of each folder, folder by folder in UID order, not deduplicated across folders.
+        `total` is the sum of the folders' message counts, like the per-folder SEARCH.
+        Returns {'items': [...], 'total': int}.
+        """
+        items: List[Dict[str, Any]] = []
+        total = 0
+        if count <= 0:
+            return {'items': items, 'total': self.count(folders, filter_by_labels)}
+        with self._connect() as conn:
+            for folder in folders:
+                where, params = self._filter_sql('h', [folder], filter_by_labels)
+                total += conn.execute(f"SELECT COUNT(*) FROM headers h WHERE {where}", params).fetchone()[0]
+                rows = conn.execute(
+                    f"SELECT h.* FROM headers h WHERE {where} ORDER BY h.uid DESC LIMIT ?", params + [count]
+                ).fetchall()
+                items.extend(self._row_to_item(row) for row in reversed(rows) if row['message_id'])
+        return {'items': items, 'total': total}
+
+    @staticmethod
+    def _row_to_item(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            'uid': create_contextual_id(row['folder'], str(row['uid'])),
+            'message_id': row['message_id'],
+            'thread_id': row['thread_id'],
+            'subject': row['subject'],
+            'from': row['from_addr'],
+            'to': row['to_addr'],
+            'date': row['date'],
+            'gmail_labels': json.loads(row['labels'] or '[]'),
+        }
+
+
+class HeaderIndexUnavailable(Exception):
+    """The index cannot answer for the requested folders (yet); callers fall back to IMAP."""
+    pass
+
+
+# Initial loads running in the background in this process, by (user, folder).
+_initial_loads: Dict[Tuple[str, str], asyncio.Task] = {}
+
+
+def _refresh_folders_sync(index: HeaderIndex, app_settings: Any, folders: List[str], max_age_s: float) -> List[str]:
+    """
+    Refreshes the folders one at a time under their `folder_lock`, skipping those another
+    refresh brought up to date while this one waited. Opens the IMAP connection only when
+    needed. Returns the folders that could not be refreshed.
+    """
+    failed: List[str] = []
+    with contextlib.ExitStack() as stack:
+        mail = None
+        for folder in folders:
+            try:
+                with index.folder_lock(folder):
+                    if not index.stale_folders([folder], max_age_s):
+                        continue
+                    if mail is None:
+                        mail, _ = stack.enter_context(imap_connection(app_settings=app_settings))
+                    index.refresh_folder(mail, folder)
+            except Exception as e:
+                logger.warning(f"Header index: could not refresh '{folder}' for user {index.user_uuid}: {e}")
+                failed.append(folder)
+    return failed
+
+
+async def _initial_load(index: HeaderIndex, folder: str) -> None:
+    try:
+        app_settings = load_app_settings(user_uuid=index.user_uuid)
+        async with acquire_imap_slot(index.user_uuid):
+            await asyncio.to_thread(_refresh_folders_sync, index, app_settings, [folder], settings.IMAP_HEADER_INDEX_MAX_STALENESS_SECONDS)
+    finally:
+        _initial_loads.pop((str(index.user_uuid), folder), None)
+
+
+def _start_initial_load(index: HeaderIndex, folder: str) -> None:
+    key = (str(index.user_uuid), folder)
+    task = _initial_loads.get(key)
+    if task is None or task.done():
+        logger.info(f"Header index: starting the initial load of '{folder}' for user {index.user_uuid} in the background.")
+        _initial_loads[key] = asyncio.create_task(_initial_load(index, folder))
+
+
+async def get_header_index(user_uuid: UUID, folders: List[str], max_age_s: Optional[float] = None) -> HeaderIndex:
+    """
+    Returns the user's header index after refreshing the given folders that are stale.
+
+    Folders that never completed a sync are loaded in the background (one load per
+    folder at a time) and HeaderIndexUnavailable is raised, as it is when a refresh
+    fails, so callers answer over IMAP instead of from an empty or partial index.
+    """
+    if not settings.IMAP_HEADER_INDEX_ENABLED:
+        raise HeaderIndexUnavailable("The header index is disabled.")
+    index = await asyncio.to_thread(HeaderIndex, user_uuid)
+    max_age = settings.IMAP_HEADER_INDEX_MAX_STALENESS_SECONDS if max_age_s is None else max_age_s
+    stale = await asyncio.to_thread(index.stale_folders, folders, max_age)
+    if not stale:
+        return index
+
+    states = await asyncio.to_thread(lambda: {folder: index.get_folder_state(folder) for folder in stale})
+    unsynced = [folder for folder in stale if not states[folder]]
+    if unsynced:
+        for folder in unsynced:
+            _start_initial_load(index, folder)
+        raise HeaderIndexUnavailable(f"Initial load of {unsynced} for user {user_uuid} is in progress.")
+
+    app_settings = load_app_settings(user_uuid=user_uuid)
+    async with acquire_imap_slot(user_uuid):
+        failed = await asyncio.to_thread(_refresh_folders_sync, index, app_settings, stale, max_age)
+    if failed:
+        raise HeaderIndexUnavailable(f"Could not refresh {failed} for user {user_uuid}.")
+    return index
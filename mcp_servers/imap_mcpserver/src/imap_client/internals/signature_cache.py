@@ -0,0 +1,277 @@
+"""
+Cached signature detection for draft replies.
+
+The user's signature is derived from their most recent sent emails. Detecting it
+requires downloading and parsing several messages, so the result is kept as a
+per-user profile in Redis. Drafting only reads that profile; a background refresh
+checks the Sent folder with a single STATUS command and re-detects the signature
+only when new sent mail has arrived (UIDNEXT or UIDVALIDITY changed).
+"""
+
+from __future__ import annotations
+import asyncio
+import email
+import json
+import logging
+import re
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from email_reply_parser import EmailReplyParser
+
+from mcp_servers.imap_mcpserver.src.imap_client.internals.connection_manager import imap_connection, IMAPConnectionError, acquire_imap_slot
+from shared.app_settings import AppSettings
+from shared.redis.keys import RedisKeys
+from shared.redis.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Number of most recent sent emails to inspect.
+SIGNATURE_SAMPLE_SIZE = 10
+# Minimum time between two checks of the Sent folder for new mail.
+REFRESH_MIN_INTERVAL_S = 300
+
+# Only the headers needed to decode the MIME body are fetched alongside BODY[TEXT].
+_FETCH_ITEMS = "(UID BODY.PEEK[HEADER.FIELDS (MIME-VERSION CONTENT-TYPE CONTENT-TRANSFER-ENCODING)] BODY.PEEK[TEXT])"
+
+_refresh_tasks: Dict[str, asyncio.Task] = {}
+
+
+def _extract_bodies(raw_message: bytes) -> Tuple[str, str]:
+    """Returns the (plain, html) bodies of a message, ignoring attachments."""
+    msg = email.message_from_bytes(raw_message)
+    plain_body = ""
+    html_body = ""
+    if msg.is_multipart():
+        for part in msg.walk():
+            ctype = part.get_content_type()
+            cdisp = str(part.get('Content-Disposition'))
+            if 'attachment' in cdisp:
+                continue
+            payload = part.get_payload(decode=True)
+            if payload is None:
+                continue
+            if ctype == 'text/plain':
+                plain_body = payload.decode(part.get_content_charset() or 'utf-8', errors='ignore')
+            elif ctype == 'text/html':
+                html_body = payload.decode(part.get_content_charset() or 'utf-8', errors='ignore')
+    else:
+        payload = msg.get_payload(decode=True) or b""
+        body = payload.decode(msg.get_content_charset() or 'utf-8', errors='ignore')
+        if msg.get_content_type() == 'text/html':
+            html_body = body
+        else:
+            plain_body = body
+    return plain_body, html_body
+
+
+def _split_fetch_response(data: List[Any]) -> List[bytes]:
+    """
+    Reassembles header + text literals of a multi-message FETCH response into
+    raw messages. imaplib returns one tuple per literal, so each message spans
+    two tuples (header fields, then text).
+    """
+    messages: List[bytes] = []
+    current: Optional[bytes] = None
+    for part in data:
+        if not isinstance(part, tuple):
+            continue
+        descriptor, literal = part
+        if b'HEADER.FIELDS' in descriptor.upper():
+            if current is not None:
+                messages.append(current)
+            current = literal
+        elif b'BODY[TEXT]' in descriptor.upper():
+            current = (current or b"") + b"\r\n" + literal
+    if current is not None:
+        messages.append(current)
+    return messages
+
+
+def detect_signature(html_bodies: List[str], plain_bodies: List[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Finds a consistent Gmail signature in the given bodies. Returns (plain, html)."""
+    if len(html_bodies) < 2:
+        logger.info("Not enough HTML emails to detect Gmail signature.")
+        return None, None
+
+    try:
+        from bs4 import BeautifulSoup
+    except ImportError:
+        logger.warning("BeautifulSoup not available for HTML signature detection")
+        return None, None
+
+    # Gmail signature shortcut - look for gmail_signature class
+    signature_candidates = []
+    for html in html_bodies:
+        gmail_sig = BeautifulSoup(html, 'lxml').find(class_='gmail_signature')
+        if gmail_sig:
+            signature_candidates.append(str(gmail_sig))
+
+    if len(signature_candidates) < 2:
+        logger.info("Gmail signature shortcut did not find consistent signatures.")
+        return None, None
+
+    most_common_sig, count = Counter(signature_candidates).most_common(1)[0]
+    if count < 2:
+        logger.info("Gmail signature shortcut did not find consistent signatures.")
+        return None, None
+    logger.info(f"Found Gmail signature in {count} emails using gmail_signature class")
+
+    # Extract plain text version from the same emails: the part the reply parser strips off.
+    plain_signature = None
+    plain_replies = []
+    for plain_body in plain_bodies:
+        try:
+            reply = EmailReplyParser.parse_reply(plain_body)
+            if reply != plain_body:
+                signature_part = plain_body.replace(reply, '').strip()
+                if signature_part:
+                    plain_replies.append(signature_part)
+        except Exception:
+            pass
+    if len(plain_replies) >= 2:
+        most_common_plain, plain_count = Counter(plain_replies).most_common(1)[0]
+        if plain_count >= 2:
+            plain_signature = most_common_plain.strip()
+
+    return plain_signature, most_common_sig
+
+
+def _parse_status_value(status_line: bytes, item: str) -> Optional[int]:
+    match = re.search(rf'{item} (\d+)', status_line.decode(errors='ignore'))
+    return int(match.group(1)) if match else None
+
+
+def _get_sent_folder_state_sync(app_settings: AppSettings) -> Tuple[Optional[int], Optional[int]]:
+    """Returns (UIDVALIDITY, UIDNEXT) of the Sent folder using a single STATUS command."""
+    with imap_connection(app_settings=app_settings) as (mail, resolver):
+        sent_folder = resolver.get_folder_by_attribute('\\Sent')
+        typ, data = mail.status(f'"{sent_folder}"', '(UIDVALIDITY UIDNEXT)')
+        if typ != 'OK' or not data or not data[0]:
+            return None, None
+        return _parse_status_value(data[0], 'UIDVALIDITY'), _parse_status_value(data[0], 'UIDNEXT')
+
+
+def compute_signature_profile_sync(app_settings: AppSettings, sample_size: int = SIGNATURE_SAMPLE_SIZE) -> Optional[Dict[str, Any]]:
+    """
+    Detects the signature from the tail of the Sent folder.
+
+    The last `sample_size` messages are addressed by sequence number (no SEARCH
+    over the whole folder) and fetched with one FETCH command that only peeks at
+    the MIME headers and body text.
+    """
+    try:
+        with imap_connection(app_settings=app_settings) as (mail, resolver):
+            sent_folder = resolver.get_folder_by_attribute('\\Sent')
+            typ, data = mail.select(f'"{sent_folder}"', readonly=True)
+            if typ != 'OK':
+                logger.warning(f"Could not select sent folder '{sent_folder}' for signature detection.")
+                return None
+            uidvalidity = mail.response('UIDVALIDITY')[1][0]
+            uidnext = mail.response('UIDNEXT')[1][0]
+            exists = int(data[0]) if data and data[0] else 0
+
+            plain_bodies: List[str] = []
+            html_bodies: List[str] = []
+            if exists:
+                start = max(1, exists - sample_size + 1)
+                logger.info(f"Analyzing last {exists - start + 1} sent emails for Gmail signature.")
+                typ, fetch_data = mail.fetch(f"{start}:{exists}", _FETCH_ITEMS)
+                if typ == 'OK':
+                    for raw_message in _split_fetch_response(fetch_data):
+                        plain_body, html_body = _extract_bodies(raw_message)
+                        if html_body:
+                            html_bodies.append(html_body)
+                        if plain_body:
+                            plain_bodies.append(plain_body)
+            else:
+                logger.info("No emails found in sent folder.")
+
+            plain_signature, html_signature = detect_signature(html_bodies, plain_bodies)
+            now = time.time()
+            return {
+                "plain": plain_signature,
+                "html": html_signature,
+                "uidvalidity": int(uidvalidity) if uidvalidity else None,
+                "uidnext": int(uidnext) if uidnext else None,
+                "computed_at": now,
+                "checked_at": now,
+            }
+    except IMAPConnectionError as e:
+        logger.error(f"IMAP connection error getting Gmail signature: {e}")
+    except Exception as e:
+        logger.error(f"Unexpected error getting Gmail signature: {e}", exc_info=True)
+    return None
+
+
+def load_signature_profile(user_uuid: UUID) -> Optional[Dict[str, Any]]:
+    try:
+        raw = get_redis_client().get(RedisKeys.get_signature_profile_key(user_uuid))
+        return json.loads(raw) if raw else None
+    except Exception as e:
+        logger.warning(f"Could not load signature profile for user {user_uuid}: {e}")
+        return None
+
+
+def save_signature_profile(user_uuid: UUID, profile: Dict[str, Any]) -> None:
+    try:
+        get_redis_client().set(RedisKeys.get_signature_profile_key(user_uuid), json.dumps(profile))
+    except Exception as e:
+        logger.warning(f"Could not save signature profile for user {user_uuid}: {e}")
+
+
+async def refresh_signature_profile(user_uuid: UUID, app_settings: AppSettings, force: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Re-detects the signature if the Sent folder changed since the profile was computed.
+    With `force`, the signature is re-detected unconditionally.
+    """
+    profile = load_signature_profile(user_uuid)
+    async with acquire_imap_slot(user_uuid):
+        if profile and not force:
+            try:
+                state = await asyncio.to_thread(_get_sent_folder_state_sync, app_settings)
+            except Exception as e:
+                logger.warning(f"Could not check sent folder state for user {user_uuid}: {e}")
+                return profile
+            if state == (profile.get("uidvalidity"), profile.get("uidnext")):
+                profile["checked_at"] = time.time()
+                save_signature_profile(user_uuid, profile)
+                return profile
+            logger.info(f"New sent mail for user {user_uuid}; re-detecting signature.")
+        new_profile = await asyncio.to_thread(compute_signature_profile_sync, app_settings)
+
+    if new_profile is None:
+        return profile
+    save_signature_profile(user_uuid, new_profile)
+    return new_profile
+
+
+def schedule_signature_refresh(user_uuid: UUID, app_settings: AppSettings) -> None:
+    """Starts a background refresh for the user unless one is already running."""
+    key = str(user_uuid)
+    task = _refresh_tasks.get(key)
+    if task and not task.done():
+        return
+    task = asyncio.create_task(refresh_signature_profile(user_uuid, app_settings))
+    _refresh_tasks[key] = task
+    task.add_done_callback(lambda t: _refresh_tasks.pop(key, None) if _refresh_tasks.get(key) is t else None)
+
+
+async def get_cached_signature(user_uuid: UUID, app_settings: AppSettings) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Returns the user's (plain, html) signature from the cached profile.
+
+    A stale profile is served as-is while a background refresh checks for new sent
+    mail. Only the very first call for a user, when no profile exists yet, detects
+    the signature inline.
+    """
+    profile = load_signature_profile(user_uuid)
+    if profile is None:
+        profile = await refresh_signature_profile(user_uuid, app_settings, force=True)
+        if profile is None:
+            return None, None
+    elif time.time() - profile.get("checked_at", 0) > REFRESH_MIN_INTERVAL_S:
+        schedule_signature_refresh(user_uuid, app_settings)
+    return profile.get("plain"), profile.get("html")
@@ -103,4 +103,27 @@ class EmailThread(BaseModel):
         
         return "\n".join(lines)
 
- 
\ No newline at end of file
+ 
+
+
+class MessageChange(BaseModel):
+    """Label and flag state of a message that changed since the last folder sync"""
+    uid: str
+    thread_id: Optional[str] = None
+    modseq: int
+    labels: List[str] = Field(default_factory=list)
+    flags: List[str] = Field(default_factory=list)
+    is_new: bool = False
+
+
+class FolderChanges(BaseModel):
+    """Result of a CONDSTORE sync of one folder"""
+    folder: str
+    uidvalidity: Optional[int] = None
+    highestmodseq: Optional[int] = None
+    uidnext: Optional[int] = None
+    exists: Optional[int] = None  # Number of messages in the folder
+    changed: List[MessageChange] = Field(default_factory=list)
+    vanished: List[str] = Field(default_factory=list)  # UIDs expunged since the last sync (QRESYNC only)
+    full_resync: bool = False  # No usable previous state: callers must rescan the folder
+    supported: bool = True  # False if the server does not support CONDSTORE for this folder
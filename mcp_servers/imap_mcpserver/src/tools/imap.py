@@ -6,14 +6,15 @@ import email
 import logging
 import dateutil.parser
 from email.header import decode_header
-from typing import List, Optional, Dict, Any, Union
+from typing import List, Optional, Dict, Any, Tuple, Union
 from email_reply_parser import EmailReplyParser
 
 from ..mcp_builder import mcp_builder
 from ..dependencies import get_context_from_headers
-from ..imap_client.client import get_message_by_id, get_complete_thread, draft_reply as client_draft_reply, set_label as client_set_label, get_recent_inbox_messages, get_all_labels, remove_from_inbox as client_remove_from_inbox
-from shared.qdrant.qdrant_client import semantic_search, search_by_vector, generate_qdrant_point_id
-from shared.services.embedding_service import get_embedding, rerank_documents
+from ..imap_client.client import get_message_by_id, get_complete_thread, get_thread_id_for_message_id, draft_reply as client_draft_reply, set_label as client_set_label, get_recent_inbox_messages, get_all_labels, remove_from_inbox as client_remove_from_inbox, set_label_batch as client_set_label_batch, remove_from_inbox_batch as client_remove_from_inbox_batch, draft_replies_batch as client_draft_replies_batch
+from shared.qdrant.qdrant_client import semantic_search, search_by_vector, find_similar_to_thread, generate_qdrant_point_id, get_thread_previews, get_thread_contents
+from shared.services.embedding_service import get_embedding
+from shared.services.reranker import local_rerank, budgeted_remote_rerank
 from shared.app_settings import load_app_settings
 
 # Instantiate the services that the tools will use
@@ -72,6 +73,39 @@ async def remove_from_inbox(messageId: str) -> Dict[str, Any]:
     )
     return result
 
+@mcp_builder.tool()
+async def draft_replies_batch(replies: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    """
+    Drafts replies to several emails at once and saves them in the drafts folder.
+    Each item in `replies` is an object with "messageId" and "body". It does NOT send any email.
+    The signature is included automatically. Returns one result per reply, in the same order.
+    """
+    context = get_context_from_headers()
+    pairs = [(reply.get("messageId", ""), reply.get("body", "")) for reply in replies]
+    return await client_draft_replies_batch(user_uuid=context.user_id, replies=pairs)
+
+@mcp_builder.tool()
+async def set_label_batch(messageIds: List[str], label: str) -> List[Dict[str, Any]]:
+    """
+    Adds a label to several email messages at once. Prefer this over calling set_label repeatedly.
+    The label must already exist in Gmail. Returns one result per messageId, in the same order.
+    """
+    context = get_context_from_headers()
+    if not messageIds or not label:
+        return [{"status": "error", "message": "messageIds and label are required."}]
+    return await client_set_label_batch(user_uuid=context.user_id, message_ids=messageIds, label=label)
+
+@mcp_builder.tool()
+async def remove_from_inbox_batch(messageIds: List[str]) -> List[Dict[str, Any]]:
+    """
+    Skips the inbox for several Gmail messages at once by moving them to All Mail.
+    Prefer this over calling remove_from_inbox repeatedly. Returns one result per messageId, in the same order.
+    """
+    context = get_context_from_headers()
+    if not messageIds:
+        return [{"status": "error", "message": "messageIds are required."}]
+    return await client_remove_from_inbox_batch(user_uuid=context.user_id, message_ids=messageIds)
+
 @mcp_builder.tool()
 async def get_thread_for_message_id(messageId: str) -> Dict[str, Any]:
     """
@@ -116,86 +150,123 @@ async def list_most_recent_inbox_emails(count: int = 10) -> List[Dict[str, Any]]
 # The following tools are not directly related to IMAP but are often used in the same context.
 # They can be moved to a different service/tool file later if needed.
 
-@mcp_builder.tool()
-async def find_similar_threads(messageId: str, top_k: Optional[int] = 5) -> str:
+async def _similar_hits_from_index(user_uuid, message_id: str, search_k: int) -> Optional[Tuple[List[float], str, List[Dict[str, Any]]]]:
     """
-    Finds email threads with similar content to the thread of a given email ID,
-    and returns them as a single markdown formatted string.
-    Uses vector search followed by reranking for improved relevance.
+    Fast path: resolves the message's thread id (header index, else one IMAP lookup) and
+    searches with the vectors stored for that thread. Returns (source vector, source text,
+    hits), or None when the thread is not indexed.
+    """
+    thread_id = await get_thread_id_for_message_id(user_uuid=user_uuid, message_id=message_id)
+    if not thread_id:
+        return None
+    try:
+        indexed = find_similar_to_thread(thread_id, user_uuid, top_k=search_k, with_vectors=True)
+    except Exception as e:
+        logger.warning(f"Search with the stored vectors of thread {thread_id} failed, embedding the thread instead: {e}")
+        return None
+    if indexed is None:
+        return None
+    source_text = get_thread_previews(user_uuid, [indexed["source"]])[0]
+    return indexed["source"]["vector"], source_text, indexed["hits"]
+
+async def _similar_hits_from_imap(user_uuid, message_id: str, search_k: int) -> Union[str, Tuple[List[float], str, List[Dict[str, Any]]]]:
+    """
+    Slow path for threads that are not indexed: fetches and embeds the thread, then searches.
+    Returns (source vector, source text, hits), or an error message.
     """
-    context = get_context_from_headers()
     # 1. Get the original message using the client
-    original_message = await get_message_by_id(user_uuid=context.user_id, message_id=messageId)
+    original_message = await get_message_by_id(user_uuid=user_uuid, message_id=message_id)
     if not original_message:
-        return f"## Error\n\nCould not find email with messageId: {messageId}"
+        return f"## Error\n\nCould not find email with messageId: {message_id}"
 
     # 2. Get the complete thread using the client
-    source_thread = await get_complete_thread(user_uuid=context.user_id, source_message=original_message)
+    source_thread = await get_complete_thread(user_uuid=user_uuid, source_message=original_message)
     if not source_thread:
-        return f"## Error\n\nCould not retrieve the thread for email ID {messageId} to find similar conversations."
+        return f"## Error\n\nCould not retrieve the thread for email ID {message_id} to find similar conversations."
 
     # 3. Use the thread's markdown property for embedding - it's already formatted and cleaned
     thread_markdown = source_thread.markdown
     if not thread_markdown.strip():
-        return f"## Error\n\nCould not extract any content from the source thread of email {messageId}."
+        return f"## Error\n\nCould not extract any content from the source thread of email {message_id}."
     
-    source_embedding = get_embedding(f"embed this email thread, focus on the meaning of the conversation: {thread_markdown}", user_uuid=context.user_id)
+    source_embedding = get_embedding(f"embed this email thread, focus on the meaning of the conversation: {thread_markdown}", user_uuid=user_uuid)
 
     # 4. Determine the Qdrant point ID of the source thread to exclude it from search results
     source_point_id = generate_qdrant_point_id(source_thread.thread_id)
 
-    # 5. Perform initial vector search in the 'email_threads' collection (get more results for reranking)
-    initial_search_k = max(top_k * 3, 10)  # Get 3x more results for reranking
+    # 5. Perform the hybrid search in the user's collection.
+    #    The thread text drives the BM25 side, so exact names, numbers and addresses count.
     similar_hits = search_by_vector(
-        user_uuid=context.user_id,
+        user_uuid=user_uuid,
         query_vector=source_embedding,
-        top_k=initial_search_k,
+        top_k=search_k,
         exclude_ids=[source_point_id],
+        query_text=thread_markdown,
+        with_vectors=True,
     )
+    return source_embedding, thread_markdown, similar_hits
+
+@mcp_builder.tool()
+async def find_similar_threads(messageId: str, top_k: Optional[int] = 5) -> str:
+    """
+    Finds email threads with similar content to the thread of a given email ID,
+    and returns them as a single markdown formatted string.
+    Uses hybrid (dense + BM25) vector search, then a local rerank on the returned vectors, text overlap
+    and recency, optionally refined by the embedding provider's reranker within a fixed budget.
+    """
+    context = get_context_from_headers()
+    initial_search_k = max(top_k * 3, 10)  # Get 3x more results for reranking
+
+    # Indexed threads are searched with their stored vectors; others are fetched and embedded.
+    found = await _similar_hits_from_index(context.user_id, messageId, initial_search_k)
+    if found is None:
+        found = await _similar_hits_from_imap(context.user_id, messageId, initial_search_k)
+        if isinstance(found, str):
+            return found
+    source_embedding, source_text, similar_hits = found
 
     if not similar_hits:
         return "No similar threads found."
 
-    # 6. Prepare documents for reranking using thread_markdown from vector search results
+    # 6. Prepare documents for reranking from the thread previews in the content store
+    #    (search hits carry metadata only; bodies are loaded for the final threads below)
+    previews = get_thread_previews(context.user_id, similar_hits)
     thread_contents = []
     thread_metadata = []
     
-    for hit in similar_hits:
-        thread_markdown_content = hit.get("thread_markdown", "")
-        
-        if thread_markdown_content:
-            thread_contents.append(thread_markdown_content[:5000] if len(thread_markdown_content) > 5000 else thread_markdown_content) # truncate to 5000 characters
-            # Store the hit payload as metadata for formatting
+    for hit, preview in zip(similar_hits, previews):
+        if preview:
+            thread_contents.append(preview)
+            # Store the hit payload as metadata for reranking and formatting
             thread_metadata.append(hit)
 
     if not thread_contents:
         return "No similar threads found."
 
-    # 7. Use reranker to improve ordering based on relevance
-    try:
-        reranked_results = rerank_documents(
-            query="Find similar threads to the following email and contain content that is relevant to the following email: " + source_thread.markdown,
-            documents=thread_contents,
-            top_k=top_k,
-            user_uuid=context.user_id
-        )
-    except Exception as e:
-        logger.warning(f"Reranking failed, falling back to vector search results: {e}")
-        # Fallback to original vector search results
-        reranked_results = [{"index": i} for i in range(min(len(thread_contents), top_k or 3))]
+    # 7. Rerank locally on the vectors Qdrant returned, text overlap and recency; the provider's
+    #    reranker (if any) only refines the head of that order, within its document and time budget
+    local_results = local_rerank(
+        query_text=source_text,
+        query_vector=source_embedding,
+        documents=thread_contents,
+        vectors=[hit.get("vector") for hit in thread_metadata],
+        dates=[hit.get("last_message_date") for hit in thread_metadata],
+    )
+    reranked_results = await budgeted_remote_rerank(
+        query="Find similar threads to the following email and contain content that is relevant to the following email: " + source_text,
+        documents=thread_contents,
+        local_results=local_results,
+        top_k=top_k or 3,
+        user_uuid=context.user_id,
+    )
 
-    # 8. Format threads using the reranked order - use the markdown directly
-    similar_threads_formatted = []
-    
-    for result in reranked_results:
-        index = result["index"]
-        if index < len(thread_metadata):
-            hit_metadata = thread_metadata[index]
-            
-            # Use the thread markdown directly since it's already well-formatted
-            thread_markdown_content = hit_metadata.get("thread_markdown", "")
-            if thread_markdown_content:
-                similar_threads_formatted.append(thread_markdown_content)
+    # 8. Load the full markdown of the reranked threads only, in reranked order
+    selected_hits = [thread_metadata[result["index"]] for result in reranked_results if result["index"] < len(thread_metadata)]
+    selected_contents = get_thread_contents(context.user_id, selected_hits)
+    similar_threads_formatted = [
+        content["thread_markdown"] for content in selected_contents
+        if content and content.get("thread_markdown")
+    ]
 
     if not similar_threads_formatted:
         return "No similar threads found."
@@ -0,0 +1,153 @@
+import contextlib
+import unittest
+from unittest.mock import MagicMock, patch
+
+from mcp_servers.imap_mcpserver.src.imap_client import client
+from mcp_servers.imap_mcpserver.src.imap_client.client import (
+    MESSAGE_ID_SEARCH_MAX_BYTES,
+    _build_or_search,
+    _chunk_message_ids,
+    _fetch_thrids_for_uids,
+    _resolve_message_id_thrids,
+    _remove_from_inbox_batch_sync,
+    _set_label_batch_sync,
+)
+
+
+def _header_fetch(uid: int, message_id: str, thrid: str = ''):
+    meta = f'{uid} (UID {uid} {thrid}BODY[HEADER.FIELDS (MESSAGE-ID)] {{40}}'
+    return (meta.encode(), f'Message-ID: <{message_id}>\r\n\r\n'.encode())
+
+
+class FakeMailbox:
+    """Minimal IMAP double: each mailbox maps Message-IDs to UIDs."""
+
+    def __init__(self, mailboxes, move_supported=True):
+        self.mailboxes = mailboxes
+        self.move_supported = move_supported
+        self.capabilities = ('IMAP4REV1', 'UIDPLUS')
+        self.selected = None
+        self.commands = []
+
+    def select(self, mailbox, readonly=False):
+        self.selected = mailbox.strip('"')
+        return 'OK', [b'1']
+
+    def uid(self, command, *args):
+        command = command.upper()
+        self.commands.append((command, self.selected, args))
+        messages = self.mailboxes.get(self.selected, {})
+        if command == 'SEARCH':
+            uids = [str(uid) for message_id, uid in messages.items() if f'"{message_id}"' in args[1]]
+            return 'OK', [' '.join(uids).encode()]
+        if command == 'FETCH':
+            wanted = set(args[0].split(','))
+            data = []
+            for sequence, (message_id, uid) in enumerate(messages.items(), start=1):
+                if str(uid) not in wanted:
+                    continue
+                thrid = f'X-GM-THRID {uid * 1000} ' if 'X-GM-THRID' in args[1] else ''
+                if 'BODY.PEEK' in args[1]:
+                    data.extend([_header_fetch(uid, message_id, thrid), b')'])
+                else:
+                    data.append(f'{sequence} ({thrid}UID {uid})'.encode())
+            return 'OK', data
+        if command == 'MOVE' and not self.move_supported:
+            return 'BAD', [b'Unknown command']
+        return 'OK', [b'']
+
+    def expunge(self):
+        self.commands.append(('EXPUNGE', self.selected, ()))
+        return 'OK', [b'']
+
+
+class FakeResolver:
+    folders = {'\\All': '[Gmail]/All Mail', '\\Inbox': 'INBOX', '\\Sent': '[Gmail]/Sent Mail'}
+
+    def get_folder_by_attribute(self, attribute):
+        return self.folders[attribute]
+
+
+def _patch_connection(mail):
+    @contextlib.contextmanager
+    def fake_connection(app_settings=None):
+        yield mail, FakeResolver()
+    return patch.object(client, 'imap_connection', fake_connection)
+
+
+class TestBulkMutations(unittest.TestCase):
+
+    def test_or_search_nests_binary_ors(self):
+        self.assertEqual(_build_or_search(['A']), 'A')
+        self.assertEqual(_build_or_search(['A', 'B', 'C']), 'OR OR A B C')
+
+    def test_set_label_batch_uses_one_search_and_one_store(self):
+        mail = FakeMailbox({'[Gmail]/All Mail': {'a@x': 11, 'b@x': 12}})
+        with _patch_connection(mail):
+            results = _set_label_batch_sync(['<a@x>', 'b@x', 'missing@x'], 'Urgent', MagicMock())
+
+        self.assertEqual([r['status'] for r in results], ['success', 'success', 'error'])
+        self.assertEqual(results[0]['message_id'], '<a@x>')
+        self.assertEqual(results[2]['message'], 'Message not found')
+        stores = [c for c in mail.commands if c[0] == 'STORE']
+        self.assertEqual(len(stores), 1)
+        self.assertEqual(stores[0][2], ('11,12', '+X-GM-LABELS', '("Urgent")'))
+        searches = [c for c in mail.commands if c[0] == 'SEARCH' and c[1] == '[Gmail]/All Mail']
+        self.assertEqual(len(searches), 1)
+
+    def test_remove_from_inbox_batch_moves_uid_set(self):
+        mail = FakeMailbox({'INBOX': {'a@x': 3, 'b@x': 5}})
+        with _patch_connection(mail):
+            results = _remove_from_inbox_batch_sync(['a@x', 'b@x'], MagicMock())
+
+        self.assertTrue(all(r['status'] == 'success' for r in results))
+        moves = [c for c in mail.commands if c[0] == 'MOVE']
+        self.assertEqual(moves, [('MOVE', 'INBOX', ('3,5', '"[Gmail]/All Mail"'))])
+        self.assertNotIn('EXPUNGE', [c[0] for c in mail.commands])
+
+    def test_remove_from_inbox_batch_falls_back_to_uid_expunge(self):
+        mail = FakeMailbox({'INBOX': {'a@x': 3}}, move_supported=False)
+        with _patch_connection(mail):
+            results = _remove_from_inbox_batch_sync(['a@x'], MagicMock())
+
+        self.assertEqual(results[0]['status'], 'success')
+        commands = [c[0] for c in mail.commands]
+        self.assertIn('COPY', commands)
+        # Only the moved UIDs are expunged, never the whole mailbox
+        self.assertIn(('EXPUNGE', 'INBOX', ('3',)), mail.commands)
+        self.assertNotIn(('EXPUNGE', 'INBOX', ()), mail.commands)
+
+
+class TestMessageIdResolution(unittest.TestCase):
+
+    def test_chunks_are_bounded_by_count_and_bytes(self):
+        chunks = list(_chunk_message_ids([f'{i}@x' for i in range(120)]))
+        self.assertEqual([len(c) for c in chunks], [50, 50, 20])
+        long_ids = ['x' * 1000 + f'{i}@x' for i in range(20)]
+        for chunk in _chunk_message_ids(long_ids):
+            self.assertLessEqual(sum(len(m) + 26 for m in chunk), MESSAGE_ID_SEARCH_MAX_BYTES)
+
+    def test_resolves_in_all_mail_and_falls_back_only_for_remainder(self):
+        all_mail = {f'{i}@x': i + 1 for i in range(120)}
+        mail = FakeMailbox({'[Gmail]/All Mail': all_mail, 'INBOX': {'late@x': 7}})
+        ids = [f'<{i}@x>' for i in range(120)] + ['late@x']
+
+        resolved = _resolve_message_id_thrids(mail, FakeResolver(), ids)
+
+        self.assertEqual(len(resolved), 121)
+        self.assertEqual(resolved['0@x'], '1000')
+        self.assertEqual(resolved['late@x'], '7000')
+        searches = [c for c in mail.commands if c[0] == 'SEARCH']
+        self.assertEqual([c[1] for c in searches], ['[Gmail]/All Mail'] * 3 + ['INBOX'])
+        # The fallback search only carries the one unresolved Message-ID
+        self.assertEqual(searches[-1][2][1], 'HEADER Message-ID "late@x"')
+
+    def test_thrids_for_uids_use_uid_not_sequence_number(self):
+        mail = FakeMailbox({'INBOX': {'a@x': 31, 'b@x': 32}})
+        mail.select('INBOX')
+        self.assertEqual(_fetch_thrids_for_uids(mail, ['31', '32', '99']), {'31': '31000', '32': '32000'})
+        self.assertEqual(len([c for c in mail.commands if c[0] == 'FETCH']), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+from mcp_servers.imap_mcpserver.src.imap_client.internals.change_tracker import (
+    fetch_folder_changes_sync,
+    fetch_thread_labels_sync,
+    parse_fetch_list,
+)
+
+
+class FakeCondstoreMailbox:
+    """IMAP double that reports a fixed mailbox state and records the commands it receives."""
+
+    def __init__(self, uidvalidity=7, highestmodseq=120, uidnext=50, fetch_data=None, capabilities=('IMAP4REV1', 'CONDSTORE')):
+        self.state = {'UIDVALIDITY': uidvalidity, 'HIGHESTMODSEQ': highestmodseq, 'UIDNEXT': uidnext}
+        self.fetch_data = fetch_data or []
+        self.capabilities = capabilities
+        self.commands = []
+
+    def capability(self):
+        return 'OK', [' '.join(self.capabilities).encode()]
+
+    def select(self, mailbox, readonly=False):
+        return 'OK', [b'10']
+
+    def response(self, code):
+        value = self.state.get(code)
+        return code, [str(value).encode()] if value is not None else [None]
+
+    def uid(self, command, *args):
+        self.commands.append((command.upper(), args))
+        if command.upper() == 'SEARCH':
+            return 'OK', [b'1 2']
+        return 'OK', self.fetch_data
+
+
+class TestChangeTracker(unittest.TestCase):
+
+    def test_parse_fetch_list_handles_quoted_labels(self):
+        meta = '3 (UID 40 MODSEQ (130) FLAGS (\\Seen) X-GM-LABELS ("\\\\Important" "My Label" Work) X-GM-THRID 99)'
+        self.assertEqual(parse_fetch_list(meta, 'X-GM-LABELS'), ['\\Important', 'My Label', 'Work'])
+        self.assertEqual(parse_fetch_list(meta, 'FLAGS'), ['\\Seen'])
+        self.assertIsNone(parse_fetch_list(meta, 'X-GM-MSGID'))
+
+    def test_missing_state_records_a_baseline_without_fetching(self):
+        mail = FakeCondstoreMailbox()
+        changes = fetch_folder_changes_sync(mail, '[Gmail]/All Mail', None)
+
+        self.assertTrue(changes.full_resync)
+        self.assertEqual((changes.uidvalidity, changes.highestmodseq, changes.uidnext), (7, 120, 50))
+        self.assertEqual(mail.commands, [])
+
+    def test_unchanged_modseq_issues_no_fetch(self):
+        mail = FakeCondstoreMailbox()
+        changes = fetch_folder_changes_sync(mail, 'INBOX', {'uidvalidity': 7, 'highestmodseq': 120, 'uidnext': 50})
+
+        self.assertFalse(changes.full_resync)
+        self.assertEqual(changes.changed, [])
+        self.assertEqual(mail.commands, [])
+
+    def test_changedsince_fetch_returns_only_changed_messages(self):
+        mail = FakeCondstoreMailbox(fetch_data=[
+            b'3 (UID 40 MODSEQ (118) FLAGS (\\Seen) X-GM-LABELS ("\\\\Inbox" Work) X-GM-THRID 99)',
+            b'9 (UID 51 MODSEQ (120) FLAGS () X-GM-LABELS () X-GM-THRID 100)',
+        ])
+        changes = fetch_folder_changes_sync(mail, 'INBOX', {'uidvalidity': 7, 'highestmodseq': 110, 'uidnext': 50})
+
+        self.assertEqual(mail.commands, [('FETCH', ('1:*', '(UID FLAGS X-GM-LABELS X-GM-THRID)', '(CHANGEDSINCE 110)'))])
+        self.assertEqual([c.uid for c in changes.changed], ['40', '51'])
+        self.assertEqual(changes.changed[0].labels, ['\\Inbox', 'Work'])
+        self.assertEqual(changes.changed[0].thread_id, '99')
+        self.assertFalse(changes.changed[0].is_new)
+        self.assertTrue(changes.changed[1].is_new)
+
+    def test_uidvalidity_change_requires_full_resync(self):
+        mail = FakeCondstoreMailbox(uidvalidity=8)
+        changes = fetch_folder_changes_sync(mail, 'INBOX', {'uidvalidity': 7, 'highestmodseq': 110})
+        self.assertTrue(changes.full_resync)
+        self.assertEqual(mail.commands, [])
+
+    def test_thread_labels_are_merged_per_thread(self):
+        mail = FakeCondstoreMailbox(fetch_data=[
+            b'1 (UID 1 X-GM-THRID 99 X-GM-LABELS ("\\\\Inbox"))',
+            b'2 (UID 2 X-GM-THRID 99 X-GM-LABELS (Work))',
+        ])
+        labels = fetch_thread_labels_sync(mail, ['99', '100'])
+
+        self.assertEqual(labels, {'99': {'\\Inbox', 'Work'}, '100': set()})
+        self.assertEqual(mail.commands[0], ('SEARCH', (None, 'OR X-GM-THRID 99 X-GM-THRID 100')))
+
+
+if __name__ == '__main__':
+    unittest.main()
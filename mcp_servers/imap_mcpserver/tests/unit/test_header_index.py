@@ -0,0 +1,234 @@
+import asyncio
+import contextlib
+import os
+import tempfile
+import threading
+import unittest
+import uuid
+from unittest.mock import MagicMock, patch
+
+from mcp_servers.imap_mcpserver.src.imap_client.internals import header_index
+from mcp_servers.imap_mcpserver.src.imap_client.internals.header_index import HeaderIndex, HeaderIndexUnavailable, label_key
+
+
+def _fetch_part(uid, message_id, date, labels, thrid=None):
+    label_list = ' '.join(f'"{label}"' for label in labels)
+    meta = f'{uid} (UID {uid} X-GM-THRID {thrid or uid * 10} X-GM-LABELS ({label_list}) BODY[HEADER.FIELDS (MESSAGE-ID SUBJECT FROM TO DATE)] {{100}}'
+    headers = f'Message-ID: <{message_id}>\r\nSubject: Mail {uid}\r\nFrom: a@x\r\nTo: b@x\r\nDate: {date}\r\n\r\n'
+    return (meta.encode(), headers.encode())
+
+
+class FakeIndexMailbox:
+    """IMAP double holding one folder's messages: {uid: (message_id, date, labels)}."""
+
+    def __init__(self, messages, uidvalidity=1, highestmodseq=10):
+        self.messages = dict(messages)
+        self.uidvalidity = uidvalidity
+        self.highestmodseq = highestmodseq
+        self.changed_uids = []
+        self.commands = []
+
+    def capability(self):
+        return 'OK', [b'IMAP4REV1 CONDSTORE']
+
+    def select(self, mailbox, readonly=False):
+        return 'OK', [str(len(self.messages)).encode()]
+
+    def response(self, code):
+        state = {'UIDVALIDITY': self.uidvalidity, 'HIGHESTMODSEQ': self.highestmodseq, 'UIDNEXT': max(self.messages, default=0) + 1}
+        return code, [str(state[code]).encode()]
+
+    def uid(self, command, *args):
+        command = command.upper()
+        self.commands.append((command, args))
+        if command == 'SEARCH':
+            return 'OK', [' '.join(str(uid) for uid in sorted(self.messages)).encode()]
+        if command == 'FETCH' and len(args) == 3:
+            data = []
+            for uid in self.changed_uids:
+                labels = ' '.join(f'"{label}"' for label in self.messages[uid][2])
+                data.append(f'{uid} (UID {uid} MODSEQ ({self.highestmodseq}) FLAGS () X-GM-LABELS ({labels}) X-GM-THRID {uid * 10})'.encode())
+            return 'OK', data
+        if command == 'FETCH':
+            data = []
+            for uid in (int(u) for u in args[0].split(',')):
+                message_id, date, labels = self.messages[uid]
+                data.extend([_fetch_part(uid, message_id, date, labels), b')'])
+            return 'OK', data
+        return 'OK', [b'']
+
+
+class TestHeaderIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.index = HeaderIndex(uuid.uuid4(), db_path=os.path.join(self.tmpdir.name, 'index.sqlite3'))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _messages(self, count):
+        return {uid: (f'{uid}@x', f'Mon, {uid:02d} Jan 2024 10:00:00 +0000', ['\\Inbox', 'Work' if uid % 2 else 'Home'])
+                for uid in range(1, count + 1)}
+
+    def test_label_key_matches_gmail_label_search(self):
+        self.assertEqual(label_key('\\Inbox'), 'inbox')
+        self.assertEqual(label_key('My Clients/Acme'), 'my-clients-acme')
+
+    def test_full_load_then_incremental_refresh_fetches_only_new_headers(self):
+        mail = FakeIndexMailbox(self._messages(5))
+        self.index.refresh_folder(mail, 'INBOX')
+        self.assertEqual(self.index.count(['INBOX']), 5)
+
+        mail.messages[6] = ('6@x', 'Sat, 06 Jan 2024 10:00:00 +0000', ['\\Inbox', 'Work'])
+        mail.messages[2] = ('2@x', mail.messages[2][1], ['Work'])
+        mail.highestmodseq = 12
+        mail.changed_uids = [2, 6]
+        mail.commands = []
+        self.index.refresh_folder(mail, 'INBOX')
+
+        header_fetches = [args for command, args in mail.commands if command == 'FETCH' and len(args) == 2]
+        self.assertEqual([args[0] for args in header_fetches], ['6'])
+        self.assertEqual(self.index.count(['INBOX'], ['home']), 1)
+        self.assertEqual(self.index.count(['INBOX'], ['work']), 5)
+
+    def test_expunged_messages_are_reconciled(self):
+        mail = FakeIndexMailbox(self._messages(4))
+        self.index.refresh_folder(mail, 'INBOX')
+
+        del mail.messages[3]
+        mail.highestmodseq = 11
+        self.index.refresh_folder(mail, 'INBOX')
+        self.assertEqual(self.index.count(['INBOX']), 3)
+
+    def test_keyset_pages_are_newest_first_and_deduplicated(self):
+        self.index.refresh_folder(FakeIndexMailbox(self._messages(5)), 'INBOX')
+        # The same message also lives in a second folder
+        self.index.refresh_folder(FakeIndexMailbox({9: ('5@x', 'Fri, 05 Jan 2024 10:00:00 +0000', ['Work'])}), 'Archive')
+
+        first = self.index.list_headers(['INBOX', 'Archive'], limit=2)
+        self.assertEqual(first['total'], 5)
+        self.assertEqual([item['message_id'] for item in first['items']], ['5@x', '4@x'])
+        second = self.index.list_headers(['INBOX', 'Archive'], limit=2, cursor=first['next_cursor'])
+        self.assertEqual([item['message_id'] for item in second['items']], ['3@x', '2@x'])
+        last = self.index.list_headers(['INBOX', 'Archive'], limit=2, cursor=second['next_cursor'])
+        self.assertEqual([item['message_id'] for item in last['items']], ['1@x'])
+        self.assertIsNone(last['next_cursor'])
+
+    def test_recent_by_folder_matches_the_imap_listing(self):
+        """Per folder, like the IMAP path: `count` highest UIDs each, duplicates kept, total summed."""
+        self.index.refresh_folder(FakeIndexMailbox(self._messages(5)), 'INBOX')
+        self.index.refresh_folder(FakeIndexMailbox({9: ('5@x', 'Fri, 05 Jan 2024 10:00:00 +0000', ['Work'])}), 'Archive')
+
+        result = self.index.list_recent_by_folder(['INBOX', 'Archive'], count=2)
+        self.assertEqual([item['message_id'] for item in result['items']], ['4@x', '5@x', '5@x'])
+        self.assertEqual(result['total'], 6)
+        filtered = self.index.list_recent_by_folder(['INBOX', 'Archive'], count=2, filter_by_labels=['Home'])
+        self.assertEqual([item['message_id'] for item in filtered['items']], ['2@x', '4@x'])
+        self.assertEqual(filtered['total'], 2)
+
+    def test_label_filter_matches_any_label(self):
+        self.index.refresh_folder(FakeIndexMailbox(self._messages(5)), 'INBOX')
+        result = self.index.list_headers(['INBOX'], limit=10, filter_by_labels=['Home'])
+        self.assertEqual([item['message_id'] for item in result['items']], ['4@x', '2@x'])
+        self.assertEqual(self.index.count(['INBOX'], ['Home', 'Work']), 5)
+
+    def test_thread_id_lookup_by_message_id(self):
+        self.index.refresh_folder(FakeIndexMailbox(self._messages(3)), 'INBOX')
+        self.assertEqual(self.index.get_thread_id('<2@x>'), '20')
+        self.assertIsNone(self.index.get_thread_id('missing@x'))
+
+    def test_interrupted_first_load_leaves_the_folder_unsynced(self):
+        mail = FakeIndexMailbox(self._messages(5))
+        original_uid = mail.uid
+
+        def failing_header_fetch(command, *args):
+            if command.upper() == 'FETCH' and len(args) == 2:
+                return 'NO', [b'server error']
+            return original_uid(command, *args)
+
+        mail.uid = failing_header_fetch
+        with self.assertRaises(Exception):
+            self.index.refresh_folder(mail, 'INBOX')
+        self.assertIsNone(self.index.get_folder_state('INBOX'))
+        self.assertEqual(self.index.stale_folders(['INBOX'], 3600), ['INBOX'])
+
+    def test_headers_are_committed_per_chunk(self):
+        mail = FakeIndexMailbox(self._messages(5))
+        original_uid = mail.uid
+        fetched = []
+
+        def fetch_then_fail(command, *args):
+            if command.upper() == 'FETCH' and len(args) == 2:
+                if fetched:
+                    raise OSError("connection reset")
+                fetched.append(args[0])
+            return original_uid(command, *args)
+
+        mail.uid = fetch_then_fail
+        with patch.object(header_index, 'HEADER_FETCH_CHUNK_SIZE', 2), self.assertRaises(OSError):
+            self.index.refresh_folder(mail, 'INBOX')
+        # The first chunk survived the failure of the second one.
+        self.assertEqual(self.index.count(['INBOX']), 2)
+
+
+class TestGetHeaderIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.mail = FakeIndexMailbox({uid: (f'{uid}@x', f'Mon, {uid:02d} Jan 2024 10:00:00 +0000', ['\\Inbox']) for uid in range(1, 4)})
+        self.connections = 0
+        # Holds IMAP connections until a test releases them, so loads cannot finish early.
+        self.imap_released = threading.Event()
+
+        @contextlib.contextmanager
+        def imap_connection(app_settings=None):
+            self.connections += 1
+            self.imap_released.wait(5)
+            yield self.mail, None
+
+        @contextlib.asynccontextmanager
+        async def acquire_imap_slot(user_uuid):
+            yield
+
+        self.patches = [
+            patch.object(header_index.settings, 'IMAP_HEADER_INDEX_DIR', self.tmpdir.name),
+            patch.object(header_index.settings, 'IMAP_HEADER_INDEX_ENABLED', True),
+            patch.object(header_index, 'imap_connection', imap_connection),
+            patch.object(header_index, 'acquire_imap_slot', acquire_imap_slot),
+            patch.object(header_index, 'load_app_settings', MagicMock()),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.tmpdir.cleanup()
+
+    def test_unsynced_folder_is_loaded_once_in_the_background(self):
+        user_uuid = uuid.uuid4()
+
+        async def run():
+            # Concurrent requests before the first load: all fall back, one load runs.
+            results = await asyncio.gather(
+                *(header_index.get_header_index(user_uuid, ['INBOX']) for _ in range(3)), return_exceptions=True
+            )
+            self.assertTrue(all(isinstance(result, HeaderIndexUnavailable) for result in results))
+            self.imap_released.set()
+            await asyncio.gather(*header_index._initial_loads.values())
+            return await header_index.get_header_index(user_uuid, ['INBOX'])
+
+        index = asyncio.run(run())
+        self.assertEqual(index.count(['INBOX']), 3)
+        self.assertEqual(self.connections, 1)
+
+    def test_disabled_index_is_never_used(self):
+        with patch.object(header_index.settings, 'IMAP_HEADER_INDEX_ENABLED', False):
+            with self.assertRaises(HeaderIndexUnavailable):
+                asyncio.run(header_index.get_header_index(uuid.uuid4(), ['INBOX']))
+        self.assertEqual(self.connections, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
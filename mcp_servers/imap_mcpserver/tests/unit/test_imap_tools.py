@@ -1,111 +1,149 @@
 import sys
 import os
+from contextlib import ExitStack
+from types import SimpleNamespace
 from unittest.mock import patch, AsyncMock, MagicMock
 import pytest
 
 # Add project root to the Python path to allow for correct module imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../..')))
 
-# Create a mock for the entire qdrant_client module to prevent it from running its connection logic on import.
-# This is necessary because the connection is initiated at the module level.
-mock_qdrant_module = MagicMock()
-sys.modules['shared.qdrant.qdrant_client'] = mock_qdrant_module
-
-# Now that the problematic module is mocked, we can safely import the app
 from mcp_servers.imap_mcpserver.src.tools.imap import find_similar_threads
 
+TOOLS = 'mcp_servers.imap_mcpserver.src.tools.imap'
+
+HITS = [
+    {"thread_id": "thread-a", "vector": [0.1, 0.2], "last_message_date": "2026-01-01T00:00:00+00:00"},
+    {"thread_id": "thread-b", "vector": [0.2, 0.1], "last_message_date": "2026-01-02T00:00:00+00:00"},
+]
+
+
+def _patch_tools(stack: ExitStack) -> SimpleNamespace:
+    """Patches every dependency of find_similar_threads with a mock that lets the fast path succeed."""
+    mocks = SimpleNamespace(
+        get_context_from_headers=MagicMock(return_value=SimpleNamespace(user_id="user-1")),
+        get_thread_id_for_message_id=AsyncMock(return_value="thread-src"),
+        find_similar_to_thread=MagicMock(return_value={
+            "source": {"thread_id": "thread-src", "vector": [0.3, 0.3]},
+            "hits": HITS,
+        }),
+        get_message_by_id=AsyncMock(),
+        get_complete_thread=AsyncMock(),
+        get_embedding=MagicMock(return_value=[0.4, 0.4]),
+        generate_qdrant_point_id=MagicMock(return_value="point-src"),
+        search_by_vector=MagicMock(return_value=HITS),
+        get_thread_previews=MagicMock(side_effect=lambda user_uuid, hits: [f"preview of {hit['thread_id']}" for hit in hits]),
+        local_rerank=MagicMock(return_value=[{"index": 0}, {"index": 1}]),
+        budgeted_remote_rerank=AsyncMock(return_value=[{"index": 1}, {"index": 0}]),
+        get_thread_contents=MagicMock(side_effect=lambda user_uuid, hits: [{"thread_markdown": f"# {hit['thread_id']}"} for hit in hits]),
+    )
+    for name, mock in vars(mocks).items():
+        stack.enter_context(patch(f'{TOOLS}.{name}', mock))
+    return mocks
+
+
 @pytest.mark.asyncio
-async def test_find_similar_threads_success():
-    with patch('mcp_servers.imap_mcpserver.src.tools.imap.get_message_by_id', new_callable=AsyncMock) as mock_get_message_by_id, \
-         patch('mcp_servers.imap_mcpserver.src.tools.imap.get_complete_thread', new_callable=AsyncMock) as mock_get_complete_thread, \
-         patch('mcp_servers.imap_mcpserver.src.tools.imap.get_embedding') as mock_get_embedding, \
-         patch('mcp_servers.imap_mcpserver.src.tools.imap.generate_qdrant_point_id') as mock_generate_qdrant_point_id, \
-         patch('mcp_servers.imap_mcpserver.src.tools.imap.search_by_vector') as mock_search_by_vector, \
-         patch('mcp_servers.imap_mcpserver.src.tools.imap.rerank_documents') as mock_rerank_documents:
-
-        # 1. Setup mocks
-        mock_message = MagicMock()
-        mock_get_message_by_id.return_value = mock_message
-
-        mock_thread = MagicMock()
-        mock_thread.markdown = "This is the source thread markdown."
-        mock_thread.thread_id = "thread-123"
-        mock_get_complete_thread.return_value = mock_thread
-
-        mock_get_embedding.return_value = [0.1, 0.2, 0.3]
-        mock_generate_qdrant_point_id.return_value = "qdrant-id-123"
-
-        mock_search_results = [
-            {"thread_markdown": "Similar thread 1 markdown"},
-            {"thread_markdown": "Similar thread 2 markdown"},
-        ]
-        mock_search_by_vector.return_value = mock_search_results
-
-        mock_reranked_results = [
-            {"index": 1},
-            {"index": 0},
-        ]
-        mock_rerank_documents.return_value = mock_reranked_results
-
-        # 2. Call the function
-        result = await find_similar_threads.fn(messageId="test-message-id", top_k=2)
-
-        # 3. Assertions
-        mock_get_message_by_id.assert_awaited_once_with("test-message-id")
-        mock_get_complete_thread.assert_awaited_once_with(mock_message)
-        
-        mock_get_embedding.assert_called_once_with(f"embed this email thread, focus on the meaning of the conversation: {mock_thread.markdown}")
-        
-        mock_generate_qdrant_point_id.assert_called_once_with("thread-123")
-        
-        mock_search_by_vector.assert_called_once_with(
-            collection_name="email_threads",
-            query_vector=[0.1, 0.2, 0.3],
-            top_k=10,  # max(2 * 3, 10)
-            exclude_ids=["qdrant-id-123"],
+async def test_indexed_thread_is_searched_with_its_stored_vectors():
+    with ExitStack() as stack:
+        mocks = _patch_tools(stack)
+
+        result = await find_similar_threads.fn(messageId="msg-1", top_k=2)
+
+        mocks.get_thread_id_for_message_id.assert_awaited_once_with(user_uuid="user-1", message_id="msg-1")
+        mocks.find_similar_to_thread.assert_called_once_with("thread-src", "user-1", top_k=10, with_vectors=True)
+        # Neither IMAP nor the embedding provider is needed for an indexed thread
+        mocks.get_message_by_id.assert_not_awaited()
+        mocks.get_complete_thread.assert_not_awaited()
+        mocks.get_embedding.assert_not_called()
+        mocks.search_by_vector.assert_not_called()
+
+        local_kwargs = mocks.local_rerank.call_args.kwargs
+        assert local_kwargs["query_vector"] == [0.3, 0.3]
+        assert local_kwargs["query_text"] == "preview of thread-src"
+        assert local_kwargs["documents"] == ["preview of thread-a", "preview of thread-b"]
+        assert local_kwargs["vectors"] == [[0.1, 0.2], [0.2, 0.1]]
+        assert mocks.budgeted_remote_rerank.await_args.kwargs["top_k"] == 2
+
+        assert result == (
+            "Here are 2 similar threads, ordered by relevance:\n\n"
+            "# thread-b\n\n---\n\n# thread-a"
         )
 
-        mock_rerank_documents.assert_called_once_with(
-            query="Find similar threads to the following email and contain content that is relevant to the following email: " + mock_thread.markdown,
-            documents=["Similar thread 1 markdown", "Similar thread 2 markdown"],
-            top_k=2
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("index_miss", ["no_thread_id", "not_indexed", "search_failed"])
+async def test_thread_missing_from_the_index_is_fetched_and_embedded(index_miss):
+    with ExitStack() as stack:
+        mocks = _patch_tools(stack)
+        if index_miss == "no_thread_id":
+            mocks.get_thread_id_for_message_id.return_value = None
+        elif index_miss == "not_indexed":
+            mocks.find_similar_to_thread.return_value = None
+        else:
+            mocks.find_similar_to_thread.side_effect = RuntimeError("qdrant unavailable")
+        message = MagicMock()
+        mocks.get_message_by_id.return_value = message
+        mocks.get_complete_thread.return_value = SimpleNamespace(markdown="Source thread markdown", thread_id="thread-src")
+
+        result = await find_similar_threads.fn(messageId="msg-1", top_k=2)
+
+        mocks.get_message_by_id.assert_awaited_once_with(user_uuid="user-1", message_id="msg-1")
+        mocks.get_complete_thread.assert_awaited_once_with(user_uuid="user-1", source_message=message)
+        mocks.get_embedding.assert_called_once_with(
+            "embed this email thread, focus on the meaning of the conversation: Source thread markdown",
+            user_uuid="user-1",
         )
-        
-        assert "similar_threads" in result
-        assert len(result["similar_threads"]) == 2
-        assert result["similar_threads"][0] == "Similar thread 2 markdown"
-        assert result["similar_threads"][1] == "Similar thread 1 markdown"
-        assert "llm_instructions" in result
+        mocks.generate_qdrant_point_id.assert_called_once_with("thread-src")
+        mocks.search_by_vector.assert_called_once_with(
+            user_uuid="user-1",
+            query_vector=[0.4, 0.4],
+            top_k=10,
+            exclude_ids=["point-src"],
+            query_text="Source thread markdown",
+            with_vectors=True,
+        )
+        local_kwargs = mocks.local_rerank.call_args.kwargs
+        assert local_kwargs["query_vector"] == [0.4, 0.4]
+        assert local_kwargs["query_text"] == "Source thread markdown"
+        assert result.startswith("Here are 2 similar threads")
+
 
 @pytest.mark.asyncio
-async def test_find_similar_threads_no_message():
-    with patch('mcp_servers.imap_mcpserver.src.tools.imap.get_message_by_id', new_callable=AsyncMock) as mock_get_message_by_id:
-        mock_get_message_by_id.return_value = None
+async def test_unknown_message_returns_an_error():
+    with ExitStack() as stack:
+        mocks = _patch_tools(stack)
+        mocks.get_thread_id_for_message_id.return_value = None
+        mocks.get_message_by_id.return_value = None
+
+        result = await find_similar_threads.fn(messageId="missing", top_k=2)
 
-        result = await find_similar_threads.fn(messageId="non-existent-id")
+        assert result == "## Error\n\nCould not find email with messageId: missing"
+        mocks.search_by_vector.assert_not_called()
+        mocks.local_rerank.assert_not_called()
 
-        mock_get_message_by_id.assert_awaited_once_with("non-existent-id")
-        assert result == {"error": "Could not find email with messageId: non-existent-id"}
 
 @pytest.mark.asyncio
-async def test_find_similar_threads_no_similar_found():
-    with patch('mcp_servers.imap_mcpserver.src.tools.imap.get_message_by_id', new_callable=AsyncMock) as mock_get_message_by_id, \
-         patch('mcp_servers.imap_mcpserver.src.tools.imap.get_complete_thread', new_callable=AsyncMock) as mock_get_complete_thread, \
-         patch('mcp_servers.imap_mcpserver.src.tools.imap.get_embedding') as mock_get_embedding, \
-         patch('mcp_servers.imap_mcpserver.src.tools.imap.generate_qdrant_point_id'), \
-         patch('mcp_servers.imap_mcpserver.src.tools.imap.search_by_vector') as mock_search_by_vector:
+async def test_unretrievable_thread_returns_an_error():
+    with ExitStack() as stack:
+        mocks = _patch_tools(stack)
+        mocks.get_thread_id_for_message_id.return_value = None
+        mocks.get_message_by_id.return_value = MagicMock()
+        mocks.get_complete_thread.return_value = None
 
-        mock_message = MagicMock()
-        mock_get_message_by_id.return_value = mock_message
+        result = await find_similar_threads.fn(messageId="msg-1", top_k=2)
 
-        mock_thread = MagicMock()
-        mock_thread.markdown = "Source thread"
-        mock_thread.thread_id = "thread-456"
-        mock_get_complete_thread.return_value = mock_thread
-        mock_get_embedding.return_value = [0.4, 0.5, 0.6]
+        assert result.startswith("## Error\n\nCould not retrieve the thread for email ID msg-1")
+        mocks.get_embedding.assert_not_called()
 
-        mock_search_by_vector.return_value = []
 
-        result = await find_similar_threads.fn(messageId="test-id")
+@pytest.mark.asyncio
+async def test_no_hits_returns_a_message():
+    with ExitStack() as stack:
+        mocks = _patch_tools(stack)
+        mocks.find_similar_to_thread.return_value = {"source": {"thread_id": "thread-src", "vector": [0.3, 0.3]}, "hits": []}
+
+        result = await find_similar_threads.fn(messageId="msg-1", top_k=2)
 
-        assert result == {"similar_threads": [], "llm_instructions": "No similar threads found."} 
\ No newline at end of file
+        assert result == "No similar threads found."
+        mocks.local_rerank.assert_not_called()
+        mocks.get_thread_contents.assert_not_called()
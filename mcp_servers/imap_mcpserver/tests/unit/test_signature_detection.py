@@ -1,9 +1,14 @@
+import asyncio
+import contextlib
+import json
 import unittest
 import logging
 import email
+import uuid
 from unittest.mock import patch, MagicMock
 from bs4 import BeautifulSoup
-from mcp_servers.imap_mcpserver.src.imap_client.client import _get_user_signature
+from mcp_servers.imap_mcpserver.src.imap_client.internals import signature_cache
+from mcp_servers.imap_mcpserver.src.imap_client.internals.signature_cache import compute_signature_profile_sync, get_cached_signature
 
 logging.basicConfig(level=logging.INFO)
 
@@ -52,113 +57,124 @@ class TestGmailSignatureDetection(unittest.TestCase):
         msg.add_alternative(html_body, subtype='html')
         return msg.as_bytes()
 
-    @patch('mcp_servers.imap_mcpserver.src.imap_client.client.imaplib.IMAP4_SSL')
-    def test_gmail_signature_detection(self, mock_imap_ssl):
-        """Test signature detection with a gmail signature."""
-        # Arrange
-        signature_plain = "Hendrik Cornelissen\nInvestment Team\n\nCell: +1 650 495-6150\nplugandplaytechcenter.com"
+    def create_fetch_response(self, messages):
+        """Builds the data of a FETCH (UID BODY.PEEK[HEADER.FIELDS ...] BODY.PEEK[TEXT]) response."""
+        data = []
+        for seq, (plain_body, html_body) in enumerate(messages, start=1):
+            raw = self.create_mock_email_bytes(plain_body, html_body)
+            header, _, text = raw.partition(b'\n\n')
+            data.append((f'{seq} (UID {seq} BODY[HEADER.FIELDS (MIME-VERSION CONTENT-TYPE CONTENT-TRANSFER-ENCODING)] {{123}}'.encode(), header + b'\n\n'))
+            data.append((b' BODY[TEXT] {123}', text))
+            data.append(b')')
+        return data
+
+    def mock_connection(self, mock_mail):
+        @contextlib.contextmanager
+        def fake_imap_connection(app_settings=None):
+            resolver = MagicMock()
+            resolver.get_folder_by_attribute.return_value = '[Gmail]/Sent Mail'
+            yield mock_mail, resolver
+        return patch.object(signature_cache, 'imap_connection', fake_imap_connection)
 
+    def create_mock_mail(self, messages):
         mock_mail = MagicMock()
-        mock_imap_ssl.return_value = mock_mail
-        mock_mail.select.return_value = ('OK', None)
-        mock_mail.uid.side_effect = [
-            ('OK', [b'1 2 3']),  # search results
-            ('OK', [(b'1 (RFC822 {123}', self.create_mock_email_bytes(
-                f"Hello team,\n\nHere is the report.\n\n{signature_plain}",
-                f'<html><body><p>Hello team,</p><p>Here is the report.</p>{self.gmail_signature_html}</body></html>'
-            ))]),
-            ('OK', [(b'2 (RFC822 {123}', self.create_mock_email_bytes(
-                f"Hi,\n\nPlease review this document.\n\n{signature_plain}",
-                f'<html><body><p>Hi,</p><p>Please review this document.</p>{self.gmail_signature_html}</body></html>'
-            ))]),
-            ('OK', [(b'3 (RFC822 {123}', self.create_mock_email_bytes(
-                f"Team,\n\nFYI.\n\n{signature_plain}",
-                f'<html><body><p>Team,</p><p>FYI.</p>{self.gmail_signature_html}</body></html>'
-            ))])
-        ]
+        mock_mail.select.return_value = ('OK', [str(len(messages)).encode()])
+        mock_mail.response.side_effect = lambda code: (code, [b'7' if code == 'UIDVALIDITY' else b'42'])
+        mock_mail.fetch.return_value = ('OK', self.create_fetch_response(messages))
+        return mock_mail
+
+    def test_gmail_signature_detection(self):
+        """Test signature detection with a gmail signature, fetched in a single FETCH command."""
+        # Arrange
+        signature_plain = "Hendrik Cornelissen\nInvestment Team\n\nCell: +1 650 495-6150\nplugandplaytechcenter.com"
+        mock_mail = self.create_mock_mail([
+            (f"Hello team,\n\nHere is the report.\n\n{signature_plain}",
+             f'<html><body><p>Hello team,</p><p>Here is the report.</p>{self.gmail_signature_html}</body></html>'),
+            (f"Hi,\n\nPlease review this document.\n\n{signature_plain}",
+             f'<html><body><p>Hi,</p><p>Please review this document.</p>{self.gmail_signature_html}</body></html>'),
+            (f"Team,\n\nFYI.\n\n{signature_plain}",
+             f'<html><body><p>Team,</p><p>FYI.</p>{self.gmail_signature_html}</body></html>'),
+        ])
 
         # Act
-        plain_signature, html_signature = _get_user_signature()
+        with self.mock_connection(mock_mail):
+            profile = compute_signature_profile_sync(app_settings=MagicMock())
 
         # Assert
+        mock_mail.fetch.assert_called_once()
+        self.assertEqual(mock_mail.fetch.call_args[0][0], '1:3')
+        self.assertIn('BODY.PEEK[TEXT]', mock_mail.fetch.call_args[0][1])
+        mock_mail.uid.assert_not_called()  # no SEARCH over the whole folder
+        self.assertEqual((profile["uidvalidity"], profile["uidnext"]), (7, 42))
+
+        html_signature = profile["html"]
         self.assertIsNotNone(html_signature)
         self.assertIn('gmail_signature', html_signature)
         self.assertIn('Hendrik Cornelissen', html_signature)
         self.assertIn('Investment Team', html_signature)
-        
+
         # Check if plain signature was detected (it's OK if it's None for Gmail shortcut)
-        if plain_signature:
-            self.assertIn('Hendrik Cornelissen', plain_signature)
-        
+        if profile["plain"]:
+            self.assertIn('Hendrik Cornelissen', profile["plain"])
+
         # Normalize HTML comparison
         soup_expected = BeautifulSoup(self.expected_extracted_signature, 'lxml')
         soup_actual = BeautifulSoup(html_signature, 'lxml')
         self.assertEqual(str(soup_expected), str(soup_actual))
 
-    @patch('mcp_servers.imap_mcpserver.src.imap_client.client.imaplib.IMAP4_SSL')
-    def test_gmail_signature_detection_no_emails(self, mock_imap_ssl):
+    def test_gmail_signature_detection_no_emails(self):
         """Test Gmail signature detection when no emails are found."""
-        # Arrange
-        mock_mail = MagicMock()
-        mock_imap_ssl.return_value = mock_mail
-        
-        # Mock empty response
-        mock_mail.select.return_value = ('OK', None)
-        mock_mail.uid.return_value = ('OK', [b''])
-        
-        # Act
-        plain_signature, html_signature = _get_user_signature()
+        mock_mail = self.create_mock_mail([])
+        mock_mail.select.return_value = ('OK', [b'0'])
 
-        # Assert
-        self.assertIsNone(plain_signature)
-        self.assertIsNone(html_signature)
+        with self.mock_connection(mock_mail):
+            profile = compute_signature_profile_sync(app_settings=MagicMock())
 
-    @patch('mcp_servers.imap_mcpserver.src.imap_client.client.imaplib.IMAP4_SSL')
-    def test_gmail_signature_detection_connection_failure(self, mock_imap_ssl):
+        mock_mail.fetch.assert_not_called()
+        self.assertIsNone(profile["plain"])
+        self.assertIsNone(profile["html"])
+
+    def test_gmail_signature_detection_connection_failure(self):
         """Test Gmail signature detection when IMAP connection fails."""
-        # Arrange
-        mock_imap_ssl.side_effect = Exception("Connection failed")
-        
-        # Act
-        plain_signature, html_signature = _get_user_signature()
+        @contextlib.contextmanager
+        def failing_connection(app_settings=None):
+            raise Exception("Connection failed")
+            yield
 
-        # Assert
-        self.assertIsNone(plain_signature)
-        self.assertIsNone(html_signature)
+        with patch.object(signature_cache, 'imap_connection', failing_connection):
+            profile = compute_signature_profile_sync(app_settings=MagicMock())
 
-    @patch('mcp_servers.imap_mcpserver.src.imap_client.client.imaplib.IMAP4_SSL')
-    def test_gmail_signature_detection_no_gmail_signature_class(self, mock_imap_ssl):
+        self.assertIsNone(profile)
+
+    def test_gmail_signature_detection_no_gmail_signature_class(self):
         """Test Gmail signature detection when emails don't have gmail_signature class."""
-        # Arrange
-        mock_mail = MagicMock()
-        mock_imap_ssl.return_value = mock_mail
-        
-        # Mock responses with HTML but no gmail_signature class
         html_without_signature = '<html><body><p>Hello team,</p><p>Here is the report.</p><div>Regular footer</div></body></html>'
-        
-        mock_mail.select.return_value = ('OK', None)
-        mock_mail.uid.side_effect = [
-            ('OK', [b'1 2 3']),
-            ('OK', [(b'1 (RFC822 {123}', self.create_mock_email_bytes(
-                "Hello team,\n\nHere is the report.",
-                html_without_signature
-            ))]),
-            ('OK', [(b'2 (RFC822 {123}', self.create_mock_email_bytes(
-                "Hi,\n\nPlease review this document.",  
-                html_without_signature
-            ))]),
-            ('OK', [(b'3 (RFC822 {123}', self.create_mock_email_bytes(
-                "Team,\n\nFYI.",
-                html_without_signature
-            ))])
-        ]
-        
-        # Act
-        plain_signature, html_signature = _get_user_signature()
+        mock_mail = self.create_mock_mail([
+            ("Hello team,\n\nHere is the report.", html_without_signature),
+            ("Hi,\n\nPlease review this document.", html_without_signature),
+            ("Team,\n\nFYI.", html_without_signature),
+        ])
 
-        # Assert
-        self.assertIsNone(plain_signature)
-        self.assertIsNone(html_signature)
+        with self.mock_connection(mock_mail):
+            profile = compute_signature_profile_sync(app_settings=MagicMock())
+
+        self.assertIsNone(profile["plain"])
+        self.assertIsNone(profile["html"])
+
+    @patch.object(signature_cache, 'schedule_signature_refresh')
+    @patch.object(signature_cache, 'compute_signature_profile_sync')
+    @patch.object(signature_cache, 'get_redis_client')
+    def test_cached_signature_is_served_without_imap(self, mock_get_redis, mock_compute, mock_schedule):
+        """A fresh cached profile is returned without touching IMAP or scheduling a refresh."""
+        profile = {"plain": "-- \nHendrik", "html": "<div>Hendrik</div>", "uidvalidity": 7, "uidnext": 42}
+        profile["checked_at"] = signature_cache.time.time()
+        mock_get_redis.return_value.get.return_value = json.dumps(profile)
+
+        result = asyncio.run(get_cached_signature(uuid.uuid4(), MagicMock()))
+
+        self.assertEqual(result, ("-- \nHendrik", "<div>Hendrik</div>"))
+        mock_compute.assert_not_called()
+        mock_schedule.assert_not_called()
 
 if __name__ == '__main__':
-    unittest.main() 
\ No newline at end of file
+    unittest.main()
@@ -1,17 +1,55 @@
+import asyncio
 import logging
 import random
 from collections import defaultdict
 from typing import List, Dict, Optional, Any
 
+from shared.config import settings
 from ..services.openrouter_service import openrouter_service
 
 logger = logging.getLogger(__name__)
 
 
-async def analyze_tone_for_language(language_emails: List[Dict], user_email: str, language: str) -> Optional[str]:
+async def _generate_baseline(segment: Dict, llm_slots: asyncio.Semaphore, user_id: Optional[Any]) -> Dict:
+    """Pairs the user's reply to a segment with a generic AI reply to the same context."""
+    thread_context = segment['context']
+    user_response = segment['response'] # The "good" example
+
+    # Format context for the prompt
+    context_str = f"From: {thread_context[0]['sender']}\n\n{thread_context[0]['body']}"
+
+    # Generate a baseline AI response (the "bad" example)
+    baseline_prompt = f"Based on the following email thread, write a reply."
+    async with llm_slots:
+        baseline_response = await openrouter_service.get_llm_response(
+            prompt=context_str,
+            system_prompt=baseline_prompt,
+            model="google/gemini-2.5-flash",
+            user_id=user_id,
+        )
+
+    return {
+        "context": context_str,
+        "good_example": user_response['body'],
+        "bad_example": baseline_response
+    }
+
+
+async def analyze_tone_for_language(
+    language_emails: List[Dict],
+    user_email: str,
+    language: str,
+    user_id: Optional[Any] = None,
+    llm_slots: Optional[asyncio.Semaphore] = None,
+) -> Optional[str]:
     """
     Analyzes the user's tone of voice for a single language and returns only the profile string.
+    The baseline replies are generated concurrently. `llm_slots` caps the LLM calls in flight;
+    pass the same semaphore when analyzing several languages at once so they share the cap.
     """
+    if llm_slots is None:
+        llm_slots = asyncio.Semaphore(max(1, settings.TONE_OF_VOICE_LLM_CONCURRENCY))
+
     if len(language_emails) < 10:
         logger.info(f"Skipping tone analysis for language '{language}' due to insufficient emails ({len(language_emails)} < 10).")
         return None
@@ -53,27 +91,9 @@ async def analyze_tone_for_language(language_emails: List[Dict], user_email: str
     
     logger.info(f"Selected {len(selected_segments)} segments for language '{language}' to analyze tone.")
 
-    few_shot_examples = []
-    for segment in selected_segments:
-        thread_context = segment['context']
-        user_response = segment['response'] # The "good" example
-
-        # Format context for the prompt
-        context_str = f"From: {thread_context[0]['sender']}\n\n{thread_context[0]['body']}"
-        
-        # Generate a baseline AI response (the "bad" example)
-        baseline_prompt = f"Based on the following email thread, write a reply."
-        baseline_response = await openrouter_service.get_llm_response(
-            prompt=context_str, 
-            system_prompt=baseline_prompt, 
-            model="google/gemini-2.5-flash"
-        )
-        
-        few_shot_examples.append({
-            "context": context_str,
-            "good_example": user_response['body'],
-            "bad_example": baseline_response
-        })
+    few_shot_examples = await asyncio.gather(
+        *(_generate_baseline(segment, llm_slots, user_id) for segment in selected_segments)
+    )
 
     # Final prompt to define the tone
     examples_str = "\n===\n".join([f"CONTEXT:\n{ex['context']}\n\nGOOD RESPONSE (USER):\n{ex['good_example']}\n\nPOOR RESPONSE (GENERIC AI):\n{ex['bad_example']}" for ex in few_shot_examples])
@@ -107,11 +127,13 @@ async def analyze_tone_for_language(language_emails: List[Dict], user_email: str
     )
 
     # Call LLM to get the final tone profile for the language
-    tone_analysis_result = await openrouter_service.get_llm_response(
-        prompt=examples_str,
-        system_prompt=tone_system_prompt,
-        model="google/gemini-2.5-flash"
-    )
+    async with llm_slots:
+        tone_analysis_result = await openrouter_service.get_llm_response(
+            prompt=examples_str,
+            system_prompt=tone_system_prompt,
+            model="google/gemini-2.5-flash",
+            user_id=user_id,
+        )
     
     return tone_analysis_result
 
@@ -1,9 +1,9 @@
 import httpx
 import logging
 from shared.config import settings
-from typing import Dict, Any
-import asyncio
-import json
+from shared.services.llm_gateway import llm_gateway
+from shared.services.llm_rate_limiter import LLMPriority
+from typing import Dict, Any, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -23,9 +23,17 @@ class OpenRouterService:
             timeout=120  # Generous timeout for model generation
         )
 
-    async def get_llm_response(self, prompt: str, system_prompt: str, model: str) -> Dict[str, Any]:
+    async def get_llm_response(
+        self,
+        prompt: str,
+        system_prompt: str,
+        model: str,
+        user_id: Optional[Any] = None,
+        priority: LLMPriority = LLMPriority.BACKGROUND,
+    ) -> Dict[str, Any]:
         """
         Gets a response from a specified LLM on OpenRouter with a given prompt.
+        Tone analysis runs in the background, so it yields to interactive traffic by default.
         """
         json_payload = {
             "model": model,
@@ -34,9 +42,13 @@ class OpenRouterService:
                 {"role": "user", "content": prompt},
             ],
         }
-        try:
+        async def _post() -> httpx.Response:
             response = await self.client.post("/chat/completions", json=json_payload)
             response.raise_for_status()
+            return response
+
+        try:
+            response = await llm_gateway.run_rate_limited(model, _post, user_id=user_id, priority=priority)
             return response.json()
         except httpx.HTTPStatusError as e:
             logger.error(f"HTTPStatusError calling OpenRouter: {e}")
@@ -47,34 +59,5 @@ class OpenRouterService:
             logger.error(f"Response body: {response.text}")
             raise
 
-    async def get_generation_cost(self, generation_id: str) -> float:
-        """
-        Retrieves the cost of a specific generation from OpenRouter.
-        """
-        try:
-            # Add a small delay to allow for the generation stats to be processed.
-            await asyncio.sleep(2)
-
-            response = await self.client.get(f"/generation?id={generation_id}")
-            response.raise_for_status()
-            data = response.json()
-            
-            logger.info(f"Received cost data for generation {generation_id}: {json.dumps(data)}")
-
-            # The cost is nested inside the 'data' object.
-            generation_data = data.get("data", {})
-            return generation_data.get("total_cost", 0.0)
-            
-        except httpx.HTTPStatusError as e:
-            logger.error(f"HTTPStatusError getting generation cost for id {generation_id}: {e}")
-            logger.error(f"Response: {e.response.text}")
-            raise
-        except (KeyError, IndexError, json.JSONDecodeError) as e:
-            logger.error(f"Error parsing generation cost response for id {generation_id}: {e}")
-            # Use 'response' in a conditional check as it may not be defined if the request fails early
-            if 'response' in locals() and hasattr(response, 'text'):
-                logger.error(f"Response body: {response.text}")
-            raise
-
 # Create a singleton instance to be used by other modules
 openrouter_service = OpenRouterService() 
\ No newline at end of file
@@ -5,17 +5,11 @@ from uuid import UUID
 
 from shared.config import settings, ALLOWED_FRONTEND_ORIGINS
 from user import client as user_client
-import mysql.connector
+from shared.mysql.mysql_client import get_pooled_connection
 
 
 def _get_db_connection():
-    return mysql.connector.connect(
-        host='db',
-        user=settings.MYSQL_USER,
-        password=settings.MYSQL_PASSWORD,
-        database=settings.MYSQL_DATABASE,
-        port=3306,
-    )
+    return get_pooled_connection()
 
 
 def initialize_stripe_client():
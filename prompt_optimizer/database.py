@@ -1,27 +1,20 @@
 import json
 import logging
-from typing import List, Optional
+from typing import Dict, List, Optional
 from uuid import UUID
 
 import mysql.connector
 
-from shared.config import settings
+from shared.mysql.mysql_client import get_pooled_connection
 from .models import EvaluationTemplate, EvaluationTemplateLight, EvaluationRun
 from datetime import timezone, datetime
 
 logger = logging.getLogger(__name__)
 
 def get_db_connection():
-    """Establishes a connection to the MySQL database."""
+    """Borrows a connection from the shared MySQL pool; closing it returns it to the pool."""
     try:
-        conn = mysql.connector.connect(
-            host='db',
-            user=settings.MYSQL_USER,
-            password=settings.MYSQL_PASSWORD,
-            database=settings.MYSQL_DATABASE,
-            port=3306
-        )
-        return conn
+        return get_pooled_connection()
     except mysql.connector.Error as err:
         logger.error(f"Error connecting to database: {err}")
         raise
@@ -297,6 +290,8 @@ def get_evaluation_run(run_uuid: UUID, user_id: UUID) -> Optional[EvaluationRun]
                     row['summary_report'] = json.loads(row['summary_report'])
                 if row.get('detailed_results'):
                     row['detailed_results'] = json.loads(row['detailed_results'])
+                if row.get('progress'):
+                    row['progress'] = json.loads(row['progress'])
 
                 # Convert created_at to timezone-aware if it's not
                 if row.get('created_at') and row['created_at'].tzinfo is None:
@@ -309,3 +304,70 @@ def get_evaluation_run(run_uuid: UUID, user_id: UUID) -> Optional[EvaluationRun]
         raise
     finally:
         conn.close()
+
+
+def update_evaluation_run_progress(run_uuid: UUID, user_id: UUID, progress: dict) -> None:
+    """Writes the live progress of a run without touching its results."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            sql = "UPDATE evaluation_runs SET progress = %s WHERE uuid = %s AND user_id = %s"
+            cursor.execute(sql, (json.dumps(progress), str(run_uuid), str(user_id)))
+            conn.commit()
+    except mysql.connector.Error as err:
+        logger.error(f"Error updating progress of evaluation run {run_uuid}: {err}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+# --- Evaluation Case Result Functions ---
+
+def save_evaluation_case_result(
+    run_uuid: UUID,
+    phase: str,
+    case_key: str,
+    result: dict,
+    cost: Optional[float] = None,
+    duration_ms: Optional[int] = None,
+) -> None:
+    """Persists a single completed test case of a run. Saving the same case twice overwrites it."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            sql = """
+            INSERT INTO evaluation_case_results (run_uuid, phase, case_key, result, cost, duration_ms)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE result = VALUES(result), cost = VALUES(cost), duration_ms = VALUES(duration_ms)
+            """
+            cursor.execute(sql, (str(run_uuid), phase, case_key, json.dumps(result), cost, duration_ms))
+            conn.commit()
+    except mysql.connector.Error as err:
+        logger.error(f"Error saving case {case_key} of evaluation run {run_uuid}: {err}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def list_evaluation_case_results(run_uuid: UUID, phase: str) -> Dict[str, dict]:
+    """Returns the completed cases of a run phase as {case_key: {'result', 'cost', 'duration_ms'}}."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor(dictionary=True) as cursor:
+            sql = "SELECT case_key, result, cost, duration_ms FROM evaluation_case_results WHERE run_uuid = %s AND phase = %s"
+            cursor.execute(sql, (str(run_uuid), phase))
+            return {
+                row['case_key']: {
+                    'result': json.loads(row['result']),
+                    'cost': row['cost'],
+                    'duration_ms': row['duration_ms'],
+                }
+                for row in cursor.fetchall()
+            }
+    except mysql.connector.Error as err:
+        logger.error(f"Error listing case results of evaluation run {run_uuid}: {err}")
+        raise
+    finally:
+        conn.close()
@@ -0,0 +1,189 @@
+"""
+Bounded, resumable execution of evaluation test cases.
+
+Each phase of a run (baseline validation, training, feedback, refined validation)
+is a list of cases evaluated by a fixed number of workers, so at most
+`concurrency` LLM calls of a run are in flight. Every case is written to
+`evaluation_case_results` the moment it completes; running the same phase of the
+same run again only evaluates the cases that are not stored yet. Progress,
+throughput and cost per case are published to the run's `progress` column.
+
+While a run is being worked on, `heartbeat` refreshes `progress.updated_at` every
+PROMPT_OPTIMIZER_RUN_HEARTBEAT_SECONDS, also during long single calls such as the
+prompt refinement. `run_is_active` tells a live run from one whose process died.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from uuid import UUID
+
+from pydantic import BaseModel
+
+from shared.config import settings
+from . import database
+
+logger = logging.getLogger(__name__)
+
+
+class CaseOutcome(BaseModel):
+    """Result of one case. Failed cases are reported but not persisted, so a resumed run retries them."""
+    result: Dict[str, Any]
+    cost: Optional[float] = None
+    failed: bool = False
+    cache_hit: bool = False
+
+
+def run_is_active(run: Any, now: Optional[datetime] = None) -> bool:
+    """
+    Whether a pending or running run has shown a sign of life within
+    PROMPT_OPTIMIZER_RUN_LEASE_SECONDS: its last heartbeat, else its start or creation.
+    """
+    if run.status not in ("pending", "running"):
+        return False
+    last_seen = (run.progress or {}).get("updated_at") or run.started_at or run.created_at
+    if isinstance(last_seen, str):
+        last_seen = datetime.fromisoformat(last_seen)
+    if last_seen.tzinfo is None:
+        last_seen = last_seen.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return (now - last_seen).total_seconds() < settings.PROMPT_OPTIMIZER_RUN_LEASE_SECONDS
+
+
+def case_key(index: int, item: Any) -> str:
+    """Stable key of a case: its position in the phase plus a hash of its content."""
+    payload = item.model_dump() if isinstance(item, BaseModel) else item
+    digest = hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return f"{index}-{digest}"
+
+
+class _PhaseStats:
+    def __init__(self, total: int, resumed: int):
+        self.total = total
+        self.resumed = resumed
+        self.completed = resumed
+        self.evaluated = 0
+        self.failed = 0
+        self.cache_hits = 0
+        self.cost = 0.0
+        self.priced = 0
+        self.case_seconds = 0.0
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = self.elapsed or (time.monotonic() - self.started)
+        return {
+            "completed": self.completed,
+            "total": self.total,
+            "resumed": self.resumed,
+            "failed": self.failed,
+            "cache_hits": self.cache_hits,
+            "cases_per_second": round(self.evaluated / elapsed, 3) if elapsed > 0 else 0.0,
+            "avg_case_seconds": round(self.case_seconds / self.evaluated, 3) if self.evaluated else 0.0,
+            "cost": round(self.cost, 6),
+            "avg_cost_per_case": round(self.cost / self.priced, 6) if self.priced else None,
+        }
+
+
+class EvaluationExecutor:
+    """Runs the phases of one evaluation run. See the module docstring."""
+
+    def __init__(self, run_uuid: UUID, user_id: UUID, concurrency: Optional[int] = None, progress_interval_s: float = 2.0):
+        self.run_uuid = run_uuid
+        self.user_id = user_id
+        self.concurrency = max(1, concurrency or settings.PROMPT_OPTIMIZER_EVAL_CONCURRENCY)
+        self.progress_interval_s = progress_interval_s
+        self.phases: Dict[str, _PhaseStats] = {}
+        self._current_phase: Optional[str] = None
+        self._last_progress = 0.0
+
+    async def run_phase(
+        self,
+        phase: str,
+        items: List[Any],
+        worker: Callable[[Any], Awaitable[CaseOutcome]],
+    ) -> List[Dict[str, Any]]:
+        """Evaluates `items` with `worker`, skipping cases already stored for this phase. Returns results in input order."""
+        keys = [case_key(index, item) for index, item in enumerate(items)]
+        stored = await asyncio.to_thread(database.list_evaluation_case_results, self.run_uuid, phase)
+        results: List[Optional[Dict[str, Any]]] = [stored[key]['result'] if key in stored else None for key in keys]
+        pending = iter([index for index, result in enumerate(results) if result is None])
+
+        stats = _PhaseStats(total=len(items), resumed=sum(1 for result in results if result is not None))
+        stats.cost = sum(stored[key]['cost'] or 0.0 for key in keys if key in stored)
+        self.phases[phase] = stats
+        self._current_phase = phase
+        if stats.resumed:
+            logger.info(f"Run {self.run_uuid}, phase '{phase}': resuming with {stats.resumed}/{stats.total} cases already done.")
+        await self._publish_progress(force=True)
+
+        async def _work() -> None:
+            for index in pending:
+                started = time.monotonic()
+                outcome = await worker(items[index])
+                duration = time.monotonic() - started
+                results[index] = outcome.result
+                stats.completed += 1
+                stats.evaluated += 1
+                stats.case_seconds += duration
+                if outcome.cost is not None:
+                    stats.cost += outcome.cost
+                    stats.priced += 1
+                if outcome.cache_hit:
+                    stats.cache_hits += 1
+                if outcome.failed:
+                    stats.failed += 1
+                else:
+                    await asyncio.to_thread(
+                        database.save_evaluation_case_result,
+                        self.run_uuid, phase, keys[index], outcome.result, outcome.cost, int(duration * 1000),
+                    )
+                await self._publish_progress()
+
+        workers = [asyncio.create_task(_work()) for _ in range(min(self.concurrency, len(items) - stats.resumed))]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for task in workers:
+                task.cancel()
+            raise
+        stats.elapsed = time.monotonic() - stats.started
+        await self._publish_progress(force=True)
+        logger.info(f"Run {self.run_uuid}, phase '{phase}' finished: {stats.to_dict()}")
+        return results
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-phase counts, throughput and cost, plus the run's total cost."""
+        phases = {phase: stats.to_dict() for phase, stats in self.phases.items()}
+        return {
+            "concurrency": self.concurrency,
+            "phases": phases,
+            "total_cost": round(sum(stats.cost for stats in self.phases.values()), 6),
+        }
+
+    async def heartbeat(self) -> None:
+        """Publishes progress every PROMPT_OPTIMIZER_RUN_HEARTBEAT_SECONDS until cancelled."""
+        while True:
+            await self._publish_progress(force=True)
+            await asyncio.sleep(settings.PROMPT_OPTIMIZER_RUN_HEARTBEAT_SECONDS)
+
+    async def _publish_progress(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_progress < self.progress_interval_s:
+            return
+        self._last_progress = now
+        progress = {
+            "phase": self._current_phase,
+            **self.summary(),
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+        try:
+            await asyncio.to_thread(database.update_evaluation_run_progress, self.run_uuid, self.user_id, progress)
+        except Exception as e:
+            # Progress is informational; a failed write must not fail the run.
+            logger.warning(f"Could not publish progress for run {self.run_uuid}: {e}")
@@ -56,6 +56,7 @@ class TestCaseResult(BaseModel):
     generated_output: Any
     is_match: bool
     comparison_details: Optional[Dict[str, Any]] = None
+    cache_hit: Optional[bool] = None
 
 
 class EvaluationRun(BaseModel):
@@ -68,6 +69,7 @@ class EvaluationRun(BaseModel):
     status: Literal["pending", "running", "completed", "failed"]
     summary_report: Optional[Dict[str, Any]] = None
     detailed_results: Optional[Dict[str, Any]] = None
+    progress: Optional[Dict[str, Any]] = None
     started_at: Optional[datetime] = None
     finished_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
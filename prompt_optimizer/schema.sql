@@ -28,6 +28,7 @@ CREATE TABLE IF NOT EXISTS evaluation_runs (
     status VARCHAR(255) NOT NULL, -- e.g., 'running', 'completed', 'failed'
     summary_report JSON, -- e.g., {"v1_accuracy": 0.85, "v2_accuracy": 0.95}
     detailed_results JSON, -- Stores an array of all test cases and the refined prompt
+    progress JSON, -- Live progress of the current phase: completed/total cases, throughput and cost per case
     started_at TIMESTAMP,
     finished_at TIMESTAMP,
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
@@ -36,3 +37,16 @@ CREATE TABLE IF NOT EXISTS evaluation_runs (
 
 -- Add an index for faster lookups of runs by user.
 CREATE INDEX idx_eval_runs_user ON evaluation_runs(user_id);
+
+-- Stores each evaluated test case as soon as it completes, so an interrupted run can resume.
+CREATE TABLE IF NOT EXISTS evaluation_case_results (
+    run_uuid CHAR(36) NOT NULL,
+    phase VARCHAR(64) NOT NULL, -- e.g., 'v1_validation', 'v1_training', 'feedback', 'v2_validation'
+    case_key VARCHAR(64) NOT NULL,
+    result JSON NOT NULL,
+    cost DOUBLE,
+    duration_ms INT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (run_uuid, phase, case_key),
+    FOREIGN KEY (run_uuid) REFERENCES evaluation_runs(uuid) ON DELETE CASCADE
+);
@@ -1,5 +1,5 @@
 import logging
-from typing import Dict, Any, List, Protocol, Optional, Tuple
+from typing import Dict, Any, List, Protocol, Optional
 from uuid import UUID
 from datetime import datetime, timezone
 import asyncio
@@ -8,17 +8,18 @@ from jinja2 import Template
 import re
 import json
 import ast
-from email.utils import parsedate_to_datetime
 from uuid import uuid4
 from shared.redis.redis_client import get_redis_client
 from shared.redis.keys import RedisKeys
 
-from mcp_servers.imap_mcpserver.src.imap_client.client import get_emails, get_all_labels, get_all_special_use_folders, get_complete_thread, EmailMessage, get_message_by_id, list_headers, count_uids, get_message_by_contextual_uid, list_recent_uids, export_threads_dataset_bulk, list_headers_multi_with_counts
+from mcp_servers.imap_mcpserver.src.imap_client.client import get_emails, get_all_labels, get_all_special_use_folders, get_complete_thread, EmailMessage, get_message_by_id, list_headers, count_uids, get_message_by_contextual_uid, list_recent_uids, export_threads_dataset_bulk, list_headers_page
 from . import database
 from shared.app_settings import load_app_settings
 
 from .models import EvaluationTemplate, EvaluationTemplateCreate, EvaluationRun, TestCaseResult, DataSourceConfig, FieldMappingConfig
-from .llm_client import call_llm, LLMClientError
+from .llm_client import call_llm, call_llm_with_usage, LLMClientError
+from .evaluation_executor import CaseOutcome, EvaluationExecutor
+from shared.services.llm_response_cache import llm_response_cache
 
 logger = logging.getLogger(__name__)
 
@@ -382,22 +383,38 @@ async def _evaluate_prompt(
     model: str,
     dataset: List[Dict[str, Any]],
     field_mapping: Dict[str, str],
-    user_id: UUID
+    user_id: UUID,
+    executor: EvaluationExecutor,
+    phase: str,
 ) -> List[TestCaseResult]:
-    """Runs a prompt against a dataset using the self-contained LLM client."""
-    
-    async def _evaluate_single_case(item: Dict[str, Any]) -> TestCaseResult:
+    """
+    Runs a prompt against a dataset using the self-contained LLM client.
+    Cases run through the executor's bounded window and are persisted as they complete,
+    so a resumed run only evaluates the cases of `phase` that are still missing.
+    """
+
+    async def _evaluate_single_case(item: Dict[str, Any]) -> CaseOutcome:
         input_data = item.get(field_mapping['input_field'])
         ground_truth = item.get(field_mapping['ground_truth_field'])
 
         if input_data is None or ground_truth is None:
             # Create a result indicating skipped so it can be filtered out later if needed
-            return TestCaseResult(input_data="", ground_truth_data="", generated_output="SKIPPED", is_match=False)
+            skipped = TestCaseResult(input_data="", ground_truth_data="", generated_output="SKIPPED", is_match=False)
+            return CaseOutcome(result=skipped.model_dump())
 
         full_prompt = f"{prompt}\n\n--- DATA ---\n{input_data}"
 
         try:
-            generated_output = await call_llm(prompt=full_prompt, model=model, user_id=user_id)
+            # With the response cache enabled, scored at temperature 0 so re-evaluating an unchanged
+            # prompt on the same snapshot is reproducible and answered from the cache.
+            llm_result = await call_llm_with_usage(
+                prompt=full_prompt,
+                model=model,
+                user_id=user_id,
+                temperature=llm_response_cache.deterministic_temperature(0.7),
+                cache=True,
+            )
+            generated_output = llm_result.content
 
             # Use our new parser to handle JSON in markdown
             actual_value = _parse_llm_output(generated_output)
@@ -417,25 +434,29 @@ async def _evaluate_prompt(
             logger.info(f"  - Actual Value   (parsed): '{actual_value}' (type: {type(actual_value).__name__})")
             logger.info(f"  - Comparison (==): {is_correct}")
 
-            return TestCaseResult(
+            result = TestCaseResult(
                 input_data=input_data,
                 ground_truth_data=ground_truth,
                 generated_output=generated_output,
-                is_match=is_correct
+                is_match=is_correct,
+                cache_hit=llm_result.cache_hit,
             )
+            return CaseOutcome(result=result.model_dump(), cost=llm_result.cost, cache_hit=llm_result.cache_hit)
         except Exception as e:
             logger.error(f"Error running LLM call for evaluation: {e}", exc_info=True)
-            return TestCaseResult(
+            result = TestCaseResult(
                 input_data=input_data,
                 ground_truth_data=ground_truth,
                 generated_output=f"ERROR: {e}",
                 is_match=False
             )
+            # Not persisted: a resumed run retries the case.
+            return CaseOutcome(result=result.model_dump(), failed=True)
 
-    tasks = [_evaluate_single_case(item) for item in dataset]
-    results = await asyncio.gather(*tasks)
-    
-    # Filter out any skipped cases if necessary, though gather preserves order
+    raw_results = await executor.run_phase(phase, dataset, _evaluate_single_case)
+    results = [TestCaseResult.model_validate(raw) for raw in raw_results]
+
+    # Filter out any skipped cases; the executor preserves dataset order
     return [res for res in results if res.generated_output != "SKIPPED"]
 
 
@@ -444,7 +465,7 @@ async def _generate_feedback(
     feedback_correct_template: Template,
     feedback_incorrect_template: Template,
     user_id: UUID
-) -> Tuple[str, str]:
+) -> CaseOutcome:
     """Generates a natural language feedback summary for a single test case."""
     if test_case.is_match:
         template = feedback_correct_template
@@ -461,9 +482,13 @@ async def _generate_feedback(
         )
     
     # Use a more capable model for feedback generation
-    feedback = await call_llm(prompt, model="google/gemini-2.5-flash", user_id=user_id)
-    logger.info(f"Generated feedback for test case: {feedback}")
-    return feedback, prompt
+    try:
+        llm_result = await call_llm_with_usage(prompt, model="google/gemini-2.5-flash", user_id=user_id)
+    except LLMClientError as e:
+        logger.error(f"Error generating feedback for test case: {e}")
+        return CaseOutcome(result={"feedback": None, "prompt": prompt}, failed=True)
+    logger.info(f"Generated feedback for test case: {llm_result.content}")
+    return CaseOutcome(result={"feedback": llm_result.content, "prompt": prompt}, cost=llm_result.cost)
 
 
 # --- New Evaluation and Refinement Service ---
@@ -473,18 +498,28 @@ async def run_evaluation_and_refinement(run_uuid: UUID, user_id: UUID):
     The main orchestration function for running an evaluation, generating feedback,
     and refining a prompt. This is designed to be run in the background.
     It receives a run_uuid for a 'pending' run and updates it.
+
+    Runs are resumable: calling this again for an interrupted or failed run skips
+    every test case (and the refined prompt) that was already persisted.
     """
     logger.info(f"Starting evaluation and refinement for run {run_uuid} and user {user_id}")
     run = None
+    heartbeat = None
     try:
-        # 1. Fetch the 'pending' run object and update its status to 'running'
+        # 1. Fetch the run object and update its status to 'running'
         run = database.get_evaluation_run(run_uuid, user_id)
         if not run:
             raise ValueError(f"Evaluation run {run_uuid} not found.")
-        
+        if run.status == "completed":
+            logger.info(f"Evaluation run {run_uuid} is already completed. Nothing to do.")
+            return
+
         run.status = "running"
-        run.started_at = datetime.now(timezone.utc)
+        run.started_at = run.started_at or datetime.now(timezone.utc)
+        run.finished_at = None
         database.update_evaluation_run(run)
+        executor = EvaluationExecutor(run.uuid, user_id)
+        heartbeat = asyncio.create_task(executor.heartbeat())
 
         template = database.get_evaluation_template(run.template_uuid, user_id)
         if not template:
@@ -493,12 +528,14 @@ async def run_evaluation_and_refinement(run_uuid: UUID, user_id: UUID):
         # The prompt and model are now self-contained in the run
         original_prompt = run.original_prompt
         original_model = run.original_model
+        field_mapping = template.field_mapping_config.model_dump()
         
         if not template.cached_data:
             raise ValueError("Cannot run evaluation on a template with no cached data.")
 
-        # 2. Split data into training (feedback) and validation (scoring) sets
-        shuffled_data = random.sample(template.cached_data, len(template.cached_data))
+        # 2. Split data into training (feedback) and validation (scoring) sets.
+        # Seeded by the run so a resumed run gets the same split.
+        shuffled_data = random.Random(str(run.uuid)).sample(template.cached_data, len(template.cached_data))
         split_point = len(shuffled_data) // 2
         training_set = shuffled_data[:split_point]
         validation_set = shuffled_data[split_point:]
@@ -515,7 +552,7 @@ async def run_evaluation_and_refinement(run_uuid: UUID, user_id: UUID):
 
         # 4. Evaluate V1 Prompt (Baseline)
         logger.info(f"Running baseline evaluation for V1 prompt on validation set...")
-        v1_results = await _evaluate_prompt(original_prompt, original_model, validation_set, template.field_mapping_config.model_dump(), user_id)
+        v1_results = await _evaluate_prompt(original_prompt, original_model, validation_set, field_mapping, user_id, executor, "v1_validation")
         v1_passed = sum(1 for r in v1_results if r.is_match)
         v1_accuracy = (v1_passed / len(v1_results)) if v1_results else 0.0
 
@@ -525,30 +562,40 @@ async def run_evaluation_and_refinement(run_uuid: UUID, user_id: UUID):
         if not training_set:
             raise ValueError("Training set is empty. Cannot generate feedback.")
         
-        logger.info(f"Generating feedback from V1 prompt performance on training set...")
-        training_run_results = await _evaluate_prompt(original_prompt, original_model, training_set, template.field_mapping_config.model_dump(), user_id)
-        
-        feedback_tasks = [_generate_feedback(case, feedback_correct_template, feedback_incorrect_template, user_id) for case in training_run_results]
-        feedback_results = await asyncio.gather(*feedback_tasks)
-
-        feedback_summaries = [feedback for feedback, prompt in feedback_results]
-        feedback_str = "\n".join(f"- {summary}" for summary in feedback_summaries)
-        logger.info(f"Generated {len(feedback_summaries)} feedback summaries.")
-
-        # 6. Step 2: Refine the Prompt to create V2
-        logger.info(f"Refining prompt to create V2...")
-        refinement_prompt = refine_prompt_template.render(
-            original_prompt=original_prompt,
-            feedback_summaries=feedback_str
-        )
-        
-        # Use the most powerful model for the refinement step
-        refined_prompt_v2 = await call_llm(refinement_prompt, model="google/gemini-2.5-pro", user_id=user_id)
-        logger.info(f"Successfully generated V2 prompt.")
+        refined_prompt_v2 = (run.detailed_results or {}).get("refined_prompt_v2")
+        if refined_prompt_v2:
+            logger.info("Reusing the V2 prompt refined before the run was interrupted.")
+        else:
+            logger.info(f"Generating feedback from V1 prompt performance on training set...")
+            training_run_results = await _evaluate_prompt(original_prompt, original_model, training_set, field_mapping, user_id, executor, "v1_training")
+
+            feedback_results = await executor.run_phase(
+                "feedback",
+                training_run_results,
+                lambda case: _generate_feedback(case, feedback_correct_template, feedback_incorrect_template, user_id),
+            )
+
+            feedback_summaries = [result["feedback"] for result in feedback_results if result.get("feedback")]
+            feedback_str = "\n".join(f"- {summary}" for summary in feedback_summaries)
+            logger.info(f"Generated {len(feedback_summaries)} feedback summaries.")
+
+            # 6. Step 2: Refine the Prompt to create V2
+            logger.info(f"Refining prompt to create V2...")
+            refinement_prompt = refine_prompt_template.render(
+                original_prompt=original_prompt,
+                feedback_summaries=feedback_str
+            )
+            
+            # Use the most powerful model for the refinement step
+            refined_prompt_v2 = await call_llm(refinement_prompt, model="google/gemini-2.5-pro", user_id=user_id)
+            logger.info(f"Successfully generated V2 prompt.")
+            # Persist right away so a resumed run does not pay for the refinement again
+            run.detailed_results = {**(run.detailed_results or {}), "refined_prompt_v2": refined_prompt_v2}
+            database.update_evaluation_run(run)
 
         # 7. Evaluate V2 Prompt (using the original model for a fair comparison)
         logger.info(f"Running evaluation for V2 prompt on validation set...")
-        v2_results = await _evaluate_prompt(refined_prompt_v2, original_model, validation_set, template.field_mapping_config.model_dump(), user_id)
+        v2_results = await _evaluate_prompt(refined_prompt_v2, original_model, validation_set, field_mapping, user_id, executor, "v2_validation")
         v2_passed = sum(1 for r in v2_results if r.is_match)
         v2_accuracy = (v2_passed / len(v2_results)) if v2_results else 0.0
         logger.info(f"V2 Prompt Accuracy: {v2_accuracy:.2%}")
@@ -562,6 +609,7 @@ async def run_evaluation_and_refinement(run_uuid: UUID, user_id: UUID):
             "total_cases": len(validation_set),
             "v1_passed": v1_passed,
             "v2_passed": v2_passed,
+            "execution": executor.summary(),
         }
         # Store the refined prompt and the detailed results for V2
         run.detailed_results = {
@@ -580,6 +628,9 @@ async def run_evaluation_and_refinement(run_uuid: UUID, user_id: UUID):
             database.update_evaluation_run(run)
         # The exception will be handled by the background task runner
         raise
+    finally:
+        if heartbeat:
+            heartbeat.cancel()
 
 
 async def list_threads(
@@ -587,63 +638,33 @@ async def list_threads(
     filters: Dict[str, Any],
     page: int,
     page_size: int,
-    user_id: UUID
+    user_id: UUID,
+    cursor: Optional[str] = None,
 ) -> Dict[str, Any]:
     """Lists lightweight thread anchors for selection, with basic pagination and filters.
 
-    For IMAP, compute exact page slice per folder using batched header FETCH and single IMAP connection per request.
+    For IMAP, pages are answered from the local header index (newest first, deduplicated by
+    Message-ID). Pass the returned `next_cursor` to page forward without offsets.
     """
     if source_id != "imap_emails":
         raise ValueError(f"Unknown data source: {source_id}")
 
     folder_names: List[str] = filters.get("folder_names") or ["INBOX"]
     filter_by_labels: List[str] | None = filters.get("filter_by_labels") or None
-
-    # We fetch up to page_size per folder (bounded), not page*page_size, then slice overall
-    total_needed = (max(page, 1)) * max(page_size, 1)
-    folders_count = max(len(folder_names), 1)
-    per_folder_fetch = -(-total_needed // folders_count) # Ceiling division
+    page_size = max(page_size, 1)
 
     try:
-        # Use single-connection, multi-folder batched listing
-        from mcp_servers.imap_mcpserver.src.imap_client.client import list_headers_multi_with_counts
-        multi = await list_headers_multi_with_counts(
+        result = await list_headers_page(
             user_uuid=user_id,
             folder_names=folder_names,
-            count=per_folder_fetch,
+            page_size=page_size,
             filter_by_labels=filter_by_labels,
+            offset=(max(page, 1) - 1) * page_size,
+            cursor=cursor,
         )
-        all_items = multi.get('items', [])
-
-        # Deduplicate by message_id
-        dedup: Dict[str, Dict[str, Any]] = {}
-        for h in all_items:
-            mid = h.get('message_id')
-            if mid and mid not in dedup:
-                dedup[mid] = h
-        unique_items = list(dedup.values())
-
-        # Sort by parsed date desc
-        def _parse_date_safe(d: str):
-            try:
-                dt = parsedate_to_datetime(d)
-                # If the datetime is naive, make it offset-aware by assuming UTC.
-                if dt.tzinfo is None:
-                    return dt.replace(tzinfo=timezone.utc)
-                return dt
-            except Exception:
-                return None
-        
-        fallback_date = datetime.min.replace(tzinfo=timezone.utc)
-        unique_items.sort(key=lambda m: (_parse_date_safe(m.get('date', '')) or fallback_date), reverse=True)
-
-        # Global page slice across combined list
-        start = (max(page, 1) - 1) * max(page_size, 1)
-        end = start + max(page_size, 1)
-        page_items = unique_items[start:end]
 
         items = []
-        for h in page_items:
+        for h in result.get('items', []):
             items.append({
                 "uid": h.get('uid', ''),
                 "id": h.get('message_id', ''),
@@ -655,8 +676,7 @@ async def list_threads(
                 "labels": h.get('gmail_labels', []),
             })
 
-        total = int(multi.get('total', 0))
-        return {"items": items, "total": total}
+        return {"items": items, "total": int(result.get('total', 0)), "next_cursor": result.get('next_cursor')}
     except Exception as e:
         logger.error(f"Error listing threads for source {source_id}: {e}", exc_info=True)
         raise
@@ -702,27 +722,15 @@ async def collect_thread_ids(
     if remaining == 0:
         return []
 
-    # Distribute the target across folders
-    per_folder = max(1, remaining // max(len(folder_names), 1))
-
     try:
-        from mcp_servers.imap_mcpserver.src.imap_client.client import list_headers_multi_with_counts
-        result = await list_headers_multi_with_counts(
+        result = await list_headers_page(
             user_uuid=user_id,
             folder_names=folder_names,
-            count=min(per_folder * 2, 500),
+            page_size=remaining,
             filter_by_labels=filter_by_labels,
         )
-        items = result.get('items', [])
-        unique_ids: List[str] = []
-        seen: set[str] = set()
-        for it in items:
-            mid = it.get('message_id')
-            if mid and mid not in seen:
-                seen.add(mid)
-                unique_ids.append(mid)
-                if len(unique_ids) >= remaining:
-                    break
+        # The index already deduplicates by Message-ID
+        unique_ids: List[str] = [it['message_id'] for it in result.get('items', []) if it.get('message_id')]
         return unique_ids
     except Exception as e:
         logger.error(f"Failed to collect Message-IDs: {e}", exc_info=True)
@@ -0,0 +1,129 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import patch
+from uuid import uuid4
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+from prompt_optimizer.evaluation_executor import CaseOutcome, EvaluationExecutor, case_key, run_is_active
+
+
+class FakeCaseStore:
+    """In-memory stand-in for the evaluation_case_results table and the progress column."""
+
+    def __init__(self):
+        self.rows = {}
+        self.progress = []
+
+    def save(self, run_uuid, phase, key, result, cost=None, duration_ms=None):
+        self.rows[(run_uuid, phase, key)] = {'result': result, 'cost': cost, 'duration_ms': duration_ms}
+
+    def list(self, run_uuid, phase):
+        return {key: row for (run, p, key), row in self.rows.items() if run == run_uuid and p == phase}
+
+    def update_progress(self, run_uuid, user_id, progress):
+        self.progress.append(progress)
+
+
+def _patch_database(store):
+    return patch.multiple(
+        'prompt_optimizer.evaluation_executor.database',
+        save_evaluation_case_result=store.save,
+        list_evaluation_case_results=store.list,
+        update_evaluation_run_progress=store.update_progress,
+    )
+
+
+def test_concurrency_is_bounded_and_results_keep_input_order():
+    """No more than `concurrency` cases run at once, each is persisted, and throughput and cost are reported."""
+    store = FakeCaseStore()
+    in_flight = 0
+    peak = 0
+
+    async def worker(item):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01 * (item % 3))
+        in_flight -= 1
+        return CaseOutcome(result={'value': item * 2}, cost=0.5)
+
+    executor = EvaluationExecutor(uuid4(), uuid4(), concurrency=3)
+    with _patch_database(store):
+        results = asyncio.run(executor.run_phase('v1_validation', list(range(10)), worker))
+
+    assert [r['value'] for r in results] == [i * 2 for i in range(10)]
+    assert peak == 3
+    assert len(store.rows) == 10
+    summary = executor.summary()['phases']['v1_validation']
+    assert summary['completed'] == 10
+    assert summary['avg_cost_per_case'] == 0.5
+    assert summary['cases_per_second'] > 0
+    assert store.progress[-1]['phase'] == 'v1_validation'
+
+
+def test_resumed_phase_skips_persisted_cases_and_retries_failures():
+    """Only cases without a stored result are evaluated again; failed cases are never stored."""
+    store = FakeCaseStore()
+    run_uuid = uuid4()
+    items = ['a', 'b', 'c']
+    store.save(run_uuid, 'v1_validation', case_key(0, 'a'), {'value': 'A'}, 0.1)
+    calls = []
+
+    async def flaky_worker(item):
+        calls.append(item)
+        return CaseOutcome(result={'value': 'ERROR'}, failed=True) if item == 'c' else CaseOutcome(result={'value': item.upper()})
+
+    async def worker(item):
+        calls.append(item)
+        return CaseOutcome(result={'value': item.upper()})
+
+    with _patch_database(store):
+        first = asyncio.run(EvaluationExecutor(run_uuid, uuid4(), concurrency=2).run_phase('v1_validation', items, flaky_worker))
+        assert sorted(calls) == ['b', 'c']
+        assert first[2] == {'value': 'ERROR'}
+
+        calls.clear()
+        executor = EvaluationExecutor(run_uuid, uuid4(), concurrency=2)
+        second = asyncio.run(executor.run_phase('v1_validation', items, worker))
+
+    assert calls == ['c']
+    assert [r['value'] for r in second] == ['A', 'B', 'C']
+    assert executor.summary()['phases']['v1_validation']['resumed'] == 2
+
+
+def test_a_run_is_active_only_while_its_heartbeat_is_fresh():
+    now = datetime.now(timezone.utc)
+
+    def run(status, updated_at=None, started_at=None):
+        progress = {'updated_at': updated_at.isoformat()} if updated_at else None
+        return SimpleNamespace(status=status, progress=progress, started_at=started_at, created_at=now - timedelta(days=1))
+
+    with patch('prompt_optimizer.evaluation_executor.settings.PROMPT_OPTIMIZER_RUN_LEASE_SECONDS', 300):
+        assert run_is_active(run('running', updated_at=now - timedelta(seconds=10)), now)
+        # A run whose process died stops sending heartbeats and may be resumed.
+        assert not run_is_active(run('running', updated_at=now - timedelta(minutes=10)), now)
+        # Before the first heartbeat the start time counts; naive database timestamps are UTC.
+        assert run_is_active(run('running', started_at=(now - timedelta(seconds=10)).replace(tzinfo=None)), now)
+        assert not run_is_active(run('pending'), now)
+        assert not run_is_active(run('failed', updated_at=now), now)
+
+
+def test_heartbeat_publishes_progress_until_cancelled():
+    store = FakeCaseStore()
+    executor = EvaluationExecutor(uuid4(), uuid4())
+
+    async def scenario():
+        heartbeat = asyncio.create_task(executor.heartbeat())
+        await asyncio.sleep(0.035)
+        heartbeat.cancel()
+
+    with _patch_database(store), \
+         patch('prompt_optimizer.evaluation_executor.settings.PROMPT_OPTIMIZER_RUN_HEARTBEAT_SECONDS', 0.01):
+        asyncio.run(scenario())
+
+    assert len(store.progress) >= 3
+    assert all('updated_at' in progress for progress in store.progress)
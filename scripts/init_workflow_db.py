@@ -162,6 +162,13 @@ def init_workflow_db():
                 cursor.execute("ALTER TABLE evaluation_runs DROP COLUMN workflow_step_uuid")
             # --- End of Decoupling Migration ---
 
+            # --- Start of Evaluation Progress Migration ---
+            cursor.execute("SELECT COUNT(*) FROM information_schema.columns WHERE table_name = 'evaluation_runs' AND column_name = 'progress' AND table_schema = %s", (settings.MYSQL_DATABASE,))
+            if cursor.fetchone()[0] == 0:
+                logger.info("Adding 'progress' column to 'evaluation_runs'...")
+                cursor.execute("ALTER TABLE evaluation_runs ADD COLUMN progress JSON")
+            # --- End of Evaluation Progress Migration ---
+
             # --- Start of User Balance Migration ---
             # First, add the column if it doesn't exist
             cursor.execute("SELECT COUNT(*) FROM information_schema.columns WHERE table_name = 'users' AND column_name = 'balance' AND table_schema = %s", (settings.MYSQL_DATABASE,))
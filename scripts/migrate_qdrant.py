@@ -0,0 +1,242 @@
+"""
+Migrations for existing per-user Qdrant collections.
+
+Collections created by current code already have everything these commands add;
+the commands bring collections created by older versions up to date. Each one is
+idempotent and can be re-run safely.
+
+    python scripts/migrate_qdrant.py payload-indexes [--dry-run]
+    python scripts/migrate_qdrant.py externalize-content [--dry-run] [--batch-size 128]
+    python scripts/migrate_qdrant.py apply-profile [--profile quantized] [--dry-run]
+    python scripts/migrate_qdrant.py copy-to-shared [--dry-run] [--batch-size 256]
+
+`copy-to-shared` prepares a switch to QDRANT_STORAGE_MODE=shared: it copies every
+per-user collection into the shared collection and leaves the originals in place,
+so the switch can be rolled back. Run it again right before switching to pick up
+threads indexed in between; copies overwrite by id.
+"""
+
+import argparse
+import logging
+import os
+import sys
+from uuid import UUID
+
+from qdrant_client import models
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from shared.qdrant.collection_profiles import CollectionProfile, get_collection_profile
+from shared.config import settings
+from shared.qdrant.qdrant_client import (
+    CONTENT_PAYLOAD_FIELDS,
+    PAYLOAD_INDEXES,
+    TENANT_FIELD,
+    _ensure_collection_exists,
+    _vector_size_of,
+    ensure_payload_indexes,
+    get_qdrant_client,
+    invalidate_collection_cache,
+    tenant_point_id,
+)
+from shared.qdrant.thread_content_store import get_thread_content_store
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+USER_COLLECTION_PREFIX = "user-"
+
+
+def list_user_collections(client):
+    return sorted(c.name for c in client.get_collections().collections if c.name.startswith(USER_COLLECTION_PREFIX))
+
+
+def migrate_payload_indexes(client, dry_run: bool = False) -> int:
+    """Adds the keyword/bool payload indexes used for filtering and faceting. Returns the number of collections changed."""
+    changed = 0
+    for collection_name in list_user_collections(client):
+        payload_schema = client.get_collection(collection_name=collection_name).payload_schema or {}
+        missing = [field for field in PAYLOAD_INDEXES if field not in payload_schema]
+        if not missing:
+            logger.info(f"{collection_name}: payload indexes up to date.")
+            continue
+        if dry_run:
+            logger.info(f"{collection_name}: would index {missing}.")
+        else:
+            ensure_payload_indexes(client, collection_name, payload_schema)
+        changed += 1
+    return changed
+
+
+def user_uuid_of(collection_name: str) -> UUID:
+    return UUID(hex=collection_name[len(USER_COLLECTION_PREFIX):])
+
+
+def migrate_externalize_content(client, dry_run: bool = False, batch_size: int = 128) -> int:
+    """
+    Moves thread bodies out of point payloads into the local thread content store,
+    leaving a `content_key` behind. Returns the number of points migrated.
+    """
+    migrated = 0
+    for collection_name in list_user_collections(client):
+        store = get_thread_content_store(user_uuid_of(collection_name))
+        legacy_filter = models.Filter(must_not=[models.IsEmptyCondition(is_empty=models.PayloadField(key="thread_markdown"))])
+        collection_migrated = 0
+        next_offset = None
+        while True:
+            points, next_offset = client.scroll(
+                collection_name=collection_name,
+                scroll_filter=legacy_filter,
+                limit=batch_size,
+                # In a real run the migrated points drop out of the filter, so keep reading from the start.
+                offset=next_offset if dry_run else None,
+                with_payload=CONTENT_PAYLOAD_FIELDS + ["thread_id"],
+                with_vectors=False,
+            )
+            if not points:
+                break
+            collection_migrated += len(points)
+            if not dry_run:
+                store.put_many({
+                    str(point.id): {
+                        "thread_id": point.payload.get("thread_id"),
+                        "thread_markdown": point.payload.get("thread_markdown") or "",
+                        "messages": point.payload.get("messages") or [],
+                    }
+                    for point in points
+                })
+                operations = [
+                    models.SetPayloadOperation(set_payload=models.SetPayload(payload={"content_key": str(point.id)}, points=[point.id]))
+                    for point in points
+                ]
+                operations.append(models.DeletePayloadOperation(
+                    delete_payload=models.DeletePayload(keys=CONTENT_PAYLOAD_FIELDS, points=[point.id for point in points])
+                ))
+                client.batch_update_points(collection_name=collection_name, update_operations=operations, wait=True)
+            if dry_run and not next_offset:
+                break
+        logger.info(f"{collection_name}: {'would move' if dry_run else 'moved'} {collection_migrated} thread bodies to the content store.")
+        migrated += collection_migrated
+    return migrated
+
+
+def _profile_differences(collection_info, profile: CollectionProfile):
+    """Names the settings of a collection that differ from `profile`; empty when it already matches."""
+    params = collection_info.config.params
+    hnsw = collection_info.config.hnsw_config
+    vectors = params.vectors if not isinstance(params.vectors, dict) else next(iter(params.vectors.values()), None)
+    differences = []
+    if vectors is not None and bool(vectors.on_disk) != profile.vectors_on_disk:
+        differences.append(f"on_disk={profile.vectors_on_disk}")
+    if profile.hnsw_m is not None and hnsw.m != profile.hnsw_m:
+        differences.append(f"m={profile.hnsw_m}")
+    if profile.hnsw_ef_construct is not None and hnsw.ef_construct != profile.hnsw_ef_construct:
+        differences.append(f"ef_construct={profile.hnsw_ef_construct}")
+    if (collection_info.config.quantization_config is not None) != profile.quantized:
+        differences.append("int8 quantization" if profile.quantized else "no quantization")
+    return differences
+
+
+def migrate_apply_profile(client, profile: CollectionProfile, dry_run: bool = False) -> int:
+    """
+    Moves collections to the storage, HNSW and quantization settings of `profile`.
+    Qdrant rebuilds the index and quantized vectors in the background; searches keep
+    working meanwhile. Returns the number of collections changed.
+    """
+    changed = 0
+    for collection_name in list_user_collections(client):
+        differences = _profile_differences(client.get_collection(collection_name=collection_name), profile)
+        if not differences:
+            logger.info(f"{collection_name}: already on profile '{profile.name}'.")
+            continue
+        if dry_run:
+            logger.info(f"{collection_name}: would apply {differences}.")
+        else:
+            client.update_collection(
+                collection_name=collection_name,
+                vectors_config={"": models.VectorParamsDiff(on_disk=profile.vectors_on_disk)},
+                hnsw_config=profile.hnsw_config(),
+                quantization_config=profile.quantization_config() or models.Disabled.DISABLED,
+            )
+            logger.info(f"{collection_name}: applied {differences}.")
+        changed += 1
+    return changed
+
+
+def migrate_copy_to_shared(client, dry_run: bool = False, batch_size: int = 256) -> int:
+    """
+    Copies the points of every per-user collection into the shared collection, tagged
+    with their owner and under tenant-namespaced ids. Returns the number of points copied.
+    """
+    shared_collection = settings.QDRANT_SHARED_COLLECTION_NAME
+    copied = 0
+    for collection_name in list_user_collections(client):
+        user_uuid = user_uuid_of(collection_name)
+        vector_size = _vector_size_of(client.get_collection(collection_name=collection_name))
+        if not dry_run:
+            _ensure_collection_exists(client, shared_collection, vector_size)
+        collection_copied = 0
+        next_offset = None
+        while True:
+            points, next_offset = client.scroll(
+                collection_name=collection_name,
+                limit=batch_size,
+                offset=next_offset,
+                with_payload=True,
+                with_vectors=True,
+            )
+            if points and not dry_run:
+                client.upsert(
+                    collection_name=shared_collection,
+                    points=[
+                        models.PointStruct(
+                            id=tenant_point_id(user_uuid, str(point.id)),
+                            vector=point.vector,
+                            payload={**(point.payload or {}), TENANT_FIELD: str(user_uuid)},
+                        )
+                        for point in points
+                    ],
+                    wait=True,
+                )
+            collection_copied += len(points)
+            if not next_offset:
+                break
+        logger.info(f"{collection_name}: {'would copy' if dry_run else 'copied'} {collection_copied} point(s) to '{shared_collection}'.")
+        copied += collection_copied
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate existing user collections in Qdrant.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    payload_indexes = subparsers.add_parser("payload-indexes", help="Add the payload indexes to collections that lack them.")
+    payload_indexes.add_argument("--dry-run", action="store_true")
+    externalize = subparsers.add_parser("externalize-content", help="Move thread bodies from point payloads to the local content store.")
+    externalize.add_argument("--dry-run", action="store_true")
+    externalize.add_argument("--batch-size", type=int, default=128)
+    apply_profile = subparsers.add_parser("apply-profile", help="Move collections to a storage profile (quantization, on-disk vectors, HNSW).")
+    apply_profile.add_argument("--profile", default=None, help="Profile name; defaults to QDRANT_COLLECTION_PROFILE.")
+    apply_profile.add_argument("--dry-run", action="store_true")
+    copy_to_shared = subparsers.add_parser("copy-to-shared", help="Copy per-user collections into the shared multitenant collection.")
+    copy_to_shared.add_argument("--dry-run", action="store_true")
+    copy_to_shared.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    client = get_qdrant_client()
+    if args.command == "payload-indexes":
+        changed = migrate_payload_indexes(client, dry_run=args.dry_run)
+        logger.info(f"{'Would migrate' if args.dry_run else 'Migrated'} {changed} collection(s).")
+    elif args.command == "externalize-content":
+        migrated = migrate_externalize_content(client, dry_run=args.dry_run, batch_size=args.batch_size)
+        logger.info(f"{'Would migrate' if args.dry_run else 'Migrated'} {migrated} point(s).")
+    elif args.command == "apply-profile":
+        changed = migrate_apply_profile(client, get_collection_profile(args.profile), dry_run=args.dry_run)
+        logger.info(f"{'Would migrate' if args.dry_run else 'Migrated'} {changed} collection(s).")
+    elif args.command == "copy-to-shared":
+        copied = migrate_copy_to_shared(client, dry_run=args.dry_run, batch_size=args.batch_size)
+        logger.info(f"{'Would copy' if args.dry_run else 'Copied'} {copied} point(s).")
+    invalidate_collection_cache()
+
+
+if __name__ == "__main__":
+    main()
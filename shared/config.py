@@ -37,6 +37,12 @@ class Settings(BaseSettings):
     EMBEDDING_OPENAI_API_KEY: Optional[str] = None
     EMBEDDING_VOYAGE_API_KEY: Optional[str] = None
     QDRANT_NAMESPACE_UUID: str = 'a1b2c3d4-e5f6-7890-1234-567890abcdef' # For deterministic UUID generation for Qdrant points
+    QDRANT_COLLECTION_CACHE_TTL_SECONDS: float = Field(default=300.0, env="QDRANT_COLLECTION_CACHE_TTL_SECONDS") # How long a process trusts that a collection exists
+    QDRANT_COLLECTION_PROFILE: str = Field(default="quantized", env="QDRANT_COLLECTION_PROFILE") # Storage profile of new user collections, see shared/qdrant/collection_profiles.py; "quantized_on_disk" is opt-in
+    QDRANT_HYBRID_SEARCH_ENABLED: bool = Field(default=True, env="QDRANT_HYBRID_SEARCH_ENABLED") # Fuse dense and BM25 sparse results (RRF) in collections that have the sparse vector
+    QDRANT_STORAGE_MODE: str = Field(default="per_user", env="QDRANT_STORAGE_MODE") # "per_user": one collection per user; "shared": one collection partitioned by a user_id payload field
+    QDRANT_SHARED_COLLECTION_NAME: str = Field(default="threads", env="QDRANT_SHARED_COLLECTION_NAME") # Collection used when QDRANT_STORAGE_MODE is "shared"
+    THREAD_CONTENT_STORE_DIR: str = Field(default="/data/db/thread_content", env="THREAD_CONTENT_STORE_DIR") # Compressed thread bodies behind the Qdrant index, one SQLite file per user
     OPENROUTER_API_KEY: str
 
     # Stripe
@@ -51,15 +57,90 @@ class Settings(BaseSettings):
     AUTH0_ISSUER_URL: Optional[str] = None
     AUTH0_M2M_CLIENT_ID: Optional[str] = None
     AUTH0_M2M_CLIENT_SECRET: Optional[str] = None
+
+    # Per-process caches used to resolve the current user on every API request
+    AUTH0_JWKS_TTL_SECONDS: int = Field(default=3600, env="AUTH0_JWKS_TTL_SECONDS")
+    AUTH0_JWKS_MIN_REFRESH_SECONDS: int = Field(default=30, env="AUTH0_JWKS_MIN_REFRESH_SECONDS")
+    AUTH0_TOKEN_CACHE_MAX_ENTRIES: int = Field(default=10000, env="AUTH0_TOKEN_CACHE_MAX_ENTRIES")
+    USER_CACHE_TTL_SECONDS: float = Field(default=10.0, env="USER_CACHE_TTL_SECONDS")
+
     AUTH_PASSWORD: Optional[str] = None
     AUTH_SELFSET_PASSWORD: bool = False
     ADMIN_USER_IDS: str = Field(default="11111111-1111-1111-1111-111111111111,22222222-2222-2222-2222-222222222222", env="ADMIN_USER_IDS")
 
     # IMAP connection limits (per-user)
     IMAP_MAX_CONCURRENCY_PER_USER: int = Field(default=5, env="IMAP_MAX_CONCURRENCY_PER_USER")
+    # Minimum time between two CONDSTORE label/flag syncs of a user's mailbox
+    IMAP_LABEL_SYNC_INTERVAL_SECONDS: int = Field(default=300, env="IMAP_LABEL_SYNC_INTERVAL_SECONDS")
+    # Local per-user header index used for folder listings, counts and pagination
+    IMAP_HEADER_INDEX_ENABLED: bool = Field(default=True, env="IMAP_HEADER_INDEX_ENABLED")
+    IMAP_HEADER_INDEX_DIR: str = Field(default="/data/db/header_index", env="IMAP_HEADER_INDEX_DIR")
+    # Folders refreshed longer ago than this are synced with IMAP before answering
+    IMAP_HEADER_INDEX_MAX_STALENESS_SECONDS: int = Field(default=60, env="IMAP_HEADER_INDEX_MAX_STALENESS_SECONDS")
+
+    # Similar-thread reranking: local scoring first, then optionally the provider's reranker
+    # on the best RERANK_REMOTE_MAX_DOCUMENTS candidates, within a time budget
+    RERANK_REMOTE_ENABLED: bool = Field(default=True, env="RERANK_REMOTE_ENABLED")
+    RERANK_REMOTE_MAX_DOCUMENTS: int = Field(default=8, env="RERANK_REMOTE_MAX_DOCUMENTS")
+    RERANK_REMOTE_TIMEOUT_SECONDS: float = Field(default=2.0, env="RERANK_REMOTE_TIMEOUT_SECONDS")
 
     # Workflow agent tool call limits (per LLM turn)
     WORKFLOW_AGENT_MAX_PARALLEL_TOOL_CALLS: int = Field(default=5, env="WORKFLOW_AGENT_MAX_PARALLEL_TOOL_CALLS")
+
+    # Shared LLM gateway (per process)
+    LLM_GATEWAY_MAX_CONNECTIONS: int = Field(default=100, env="LLM_GATEWAY_MAX_CONNECTIONS")
+    LLM_GATEWAY_MAX_KEEPALIVE_CONNECTIONS: int = Field(default=20, env="LLM_GATEWAY_MAX_KEEPALIVE_CONNECTIONS")
+    LLM_GATEWAY_HTTP2: bool = Field(default=True, env="LLM_GATEWAY_HTTP2")
+    LLM_GATEWAY_MAX_CONCURRENCY_PER_MODEL: int = Field(default=16, env="LLM_GATEWAY_MAX_CONCURRENCY_PER_MODEL")
+    # Per-model overrides, e.g. "google/gemini-2.5-pro=4,openai/gpt-4.1=8"
+    LLM_GATEWAY_MODEL_CONCURRENCY_LIMITS: str = Field(default="", env="LLM_GATEWAY_MODEL_CONCURRENCY_LIMITS")
+    # Token-bucket pacing of LLM requests (requests per minute), per model and per user.
+    # Buckets live in each process (API, trigger service, ...), so the combined rate is
+    # these limits times the number of processes calling a model: divide accordingly.
+    LLM_RATE_LIMIT_MODEL_RPM: int = Field(default=600, env="LLM_RATE_LIMIT_MODEL_RPM")
+    # Per-model overrides, e.g. "google/gemini-2.5-pro=120"
+    LLM_RATE_LIMIT_MODEL_RPM_OVERRIDES: str = Field(default="", env="LLM_RATE_LIMIT_MODEL_RPM_OVERRIDES")
+    LLM_RATE_LIMIT_USER_RPM: int = Field(default=120, env="LLM_RATE_LIMIT_USER_RPM")
+    # Bucket capacity, expressed as seconds of refill at the configured rate
+    LLM_RATE_LIMIT_BURST_SECONDS: float = Field(default=10.0, env="LLM_RATE_LIMIT_BURST_SECONDS")
+    LLM_RATE_LIMIT_MAX_RETRIES: int = Field(default=4, env="LLM_RATE_LIMIT_MAX_RETRIES")
+    LLM_RATE_LIMIT_MAX_BACKOFF_SECONDS: float = Field(default=60.0, env="LLM_RATE_LIMIT_MAX_BACKOFF_SECONDS")
+
+    # Opt-in cache of deterministic (temperature 0) LLM completions; backend is "redis" or "disk"
+    LLM_RESPONSE_CACHE_ENABLED: bool = Field(default=False, env="LLM_RESPONSE_CACHE_ENABLED")
+    LLM_RESPONSE_CACHE_BACKEND: str = Field(default="redis", env="LLM_RESPONSE_CACHE_BACKEND")
+    LLM_RESPONSE_CACHE_PATH: str = Field(default="/data/db/llm_response_cache.sqlite3", env="LLM_RESPONSE_CACHE_PATH")
+    LLM_RESPONSE_CACHE_TTL_SECONDS: int = Field(default=7 * 24 * 3600, env="LLM_RESPONSE_CACHE_TTL_SECONDS")
+    LLM_RESPONSE_CACHE_MAX_ENTRIES: int = Field(default=20000, env="LLM_RESPONSE_CACHE_MAX_ENTRIES")
+
+    # Language detection of indexed threads: sample size, result cache and process pool for bulk runs
+    LANGUAGE_DETECTION_SAMPLE_CHARS: int = Field(default=1000, env="LANGUAGE_DETECTION_SAMPLE_CHARS")
+    LANGUAGE_DETECTION_CACHE_TTL_SECONDS: int = Field(default=90 * 24 * 3600, env="LANGUAGE_DETECTION_CACHE_TTL_SECONDS")
+    LANGUAGE_DETECTION_PROCESSES: int = Field(default=4, env="LANGUAGE_DETECTION_PROCESSES")
+    LANGUAGE_DETECTION_POOL_MIN_TEXTS: int = Field(default=300, env="LANGUAGE_DETECTION_POOL_MIN_TEXTS")
+
+    # Shared MySQL connection pool for the synchronous data layers (per process)
+    MYSQL_POOL_SIZE: int = Field(default=10, env="MYSQL_POOL_SIZE")
+    MYSQL_POOL_CHECKOUT_TIMEOUT_SECONDS: float = Field(default=10.0, env="MYSQL_POOL_CHECKOUT_TIMEOUT_SECONDS")
+    MYSQL_POOL_HEALTHCHECK_IDLE_SECONDS: float = Field(default=30.0, env="MYSQL_POOL_HEALTHCHECK_IDLE_SECONDS")
+
+    # Number of test cases of one prompt-optimizer evaluation run evaluated concurrently
+    PROMPT_OPTIMIZER_EVAL_CONCURRENCY: int = Field(default=8, env="PROMPT_OPTIMIZER_EVAL_CONCURRENCY")
+    # A running evaluation run refreshes `progress.updated_at` this often; without a refresh for
+    # PROMPT_OPTIMIZER_RUN_LEASE_SECONDS it is considered abandoned and may be resumed
+    PROMPT_OPTIMIZER_RUN_HEARTBEAT_SECONDS: float = Field(default=30.0, env="PROMPT_OPTIMIZER_RUN_HEARTBEAT_SECONDS")
+    PROMPT_OPTIMIZER_RUN_LEASE_SECONDS: float = Field(default=300.0, env="PROMPT_OPTIMIZER_RUN_LEASE_SECONDS")
+
+    # Tone-of-voice analysis: languages analyzed at once, and LLM calls in flight across them (per run)
+    TONE_OF_VOICE_LANGUAGE_CONCURRENCY: int = Field(default=3, env="TONE_OF_VOICE_LANGUAGE_CONCURRENCY")
+    TONE_OF_VOICE_LLM_CONCURRENCY: int = Field(default=8, env="TONE_OF_VOICE_LLM_CONCURRENCY")
+
+    # MCP tool catalogue cache and session pool for agent steps (per process)
+    MCP_TOOL_CACHE_TTL_SECONDS: int = Field(default=300, env="MCP_TOOL_CACHE_TTL_SECONDS")
+    MCP_SESSION_IDLE_TIMEOUT_SECONDS: int = Field(default=300, env="MCP_SESSION_IDLE_TIMEOUT_SECONDS")
+
+    # Stream LLM tokens of running workflow steps to subscribers (via Redis pub/sub)
+    WORKFLOW_STREAM_STEP_EVENTS: bool = Field(default=True, env="WORKFLOW_STREAM_STEP_EVENTS")
     
     model_config = SettingsConfigDict(env_file=(".env", ".env.local"), extra='ignore')
 
@@ -67,7 +148,7 @@ settings = Settings()
 
 # Version for the vectorization process.
 # Increment this when the logic in initialize_inbox.py or related data processing changes.
-VECTORIZATION_VERSION = "1.0"
+VECTORIZATION_VERSION = "1.1"
 
 # Allowed frontend origins for deriving Stripe success/cancel URLs from the request Origin header.
 # Configure per-environment here; not sourced from environment variables.
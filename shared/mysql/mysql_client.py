@@ -0,0 +1,164 @@
+"""
+Pooled connections to the application MySQL database.
+
+The synchronous data layers (user, payments, prompt_optimizer) borrow connections
+from one process-wide `mysql.connector` pool instead of opening a new TCP/auth
+session per query. Closing a borrowed connection returns it to the pool.
+Checkout blocks (up to a timeout) while all connections are in use, and a
+connection that sat idle longer than the health-check interval is pinged, and
+reconnected if the server dropped it, before it is handed out.
+
+Async code must not call the synchronous functions directly; `run_db` runs them
+in a worker thread so they never block the event loop.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+import mysql.connector
+from mysql.connector import pooling
+
+from shared.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+POOL_NAME = "mini_interns"
+
+
+class PooledConnection:
+    """A borrowed connection. `close()` hands it back to the pool; it is safe to call twice."""
+
+    def __init__(self, connection: Any, pool: "MySQLPool"):
+        self._connection = connection
+        self._pool = pool
+        self._closed = False
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._pool._release(self._connection)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._connection, name)
+
+    def __enter__(self) -> "PooledConnection":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class MySQLPool:
+    """Bounded pool with blocking checkout and health checks. See the module docstring."""
+
+    def __init__(
+        self,
+        size: int,
+        checkout_timeout_s: float,
+        healthcheck_idle_s: float,
+        pool_factory: Optional[Callable[[int], Any]] = None,
+    ):
+        self.size = max(1, min(size, pooling.CNX_POOL_MAXSIZE))
+        self.checkout_timeout_s = checkout_timeout_s
+        self.healthcheck_idle_s = healthcheck_idle_s
+        self._pool_factory = pool_factory or _create_connector_pool
+        self._pool: Any = None
+        self._lock = threading.Lock()
+        # mysql.connector raises immediately on an exhausted pool; the semaphore makes callers wait instead.
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._last_released: Dict[int, float] = {}
+        self.stats = {"checkouts": 0, "pings": 0, "reconnects": 0, "wait_s_max": 0.0}
+
+    def _get_pool(self) -> Any:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = self._pool_factory(self.size)
+                    logger.info(f"Created MySQL connection pool with {self.size} connections.")
+        return self._pool
+
+    def get_connection(self) -> PooledConnection:
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.checkout_timeout_s):
+            raise pooling.PoolError(f"Timed out after {self.checkout_timeout_s}s waiting for a MySQL connection")
+        try:
+            connection = self._get_pool().get_connection()
+            self._check_health(connection)
+        except BaseException:
+            self._slots.release()
+            raise
+        self.stats["checkouts"] += 1
+        self.stats["wait_s_max"] = max(self.stats["wait_s_max"], time.monotonic() - started)
+        return PooledConnection(connection, self)
+
+    def _check_health(self, connection: Any) -> None:
+        key = id(getattr(connection, "_cnx", connection))
+        last_released = self._last_released.get(key)
+        if last_released is not None and time.monotonic() - last_released < self.healthcheck_idle_s:
+            return
+        self.stats["pings"] += 1
+        try:
+            connection.ping(reconnect=False)
+        except mysql.connector.Error:
+            logger.warning("Pooled MySQL connection is stale; reconnecting.")
+            self.stats["reconnects"] += 1
+            connection.ping(reconnect=True, attempts=2, delay=0)
+
+    def _release(self, connection: Any) -> None:
+        key = id(getattr(connection, "_cnx", connection))
+        try:
+            connection.close()
+            self._last_released[key] = time.monotonic()
+        except Exception as e:
+            # A connection that cannot be reset is dropped; the next checkout pings its replacement.
+            self._last_released.pop(key, None)
+            logger.warning(f"Failed to return MySQL connection to the pool: {e}")
+        finally:
+            self._slots.release()
+
+
+def _create_connector_pool(size: int) -> pooling.MySQLConnectionPool:
+    return pooling.MySQLConnectionPool(
+        pool_name=POOL_NAME,
+        pool_size=size,
+        pool_reset_session=True,
+        host='db',
+        user=settings.MYSQL_USER,
+        password=settings.MYSQL_PASSWORD,
+        database=settings.MYSQL_DATABASE,
+        port=3306,
+    )
+
+
+_pool: Optional[MySQLPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_mysql_pool() -> MySQLPool:
+    """Returns the process-wide pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = MySQLPool(
+                    size=settings.MYSQL_POOL_SIZE,
+                    checkout_timeout_s=settings.MYSQL_POOL_CHECKOUT_TIMEOUT_SECONDS,
+                    healthcheck_idle_s=settings.MYSQL_POOL_HEALTHCHECK_IDLE_SECONDS,
+                )
+    return _pool
+
+
+def get_pooled_connection() -> PooledConnection:
+    """Borrows a connection from the shared pool. Callers close it as they would a direct connection."""
+    return get_mysql_pool().get_connection()
+
+
+async def run_db(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Runs a synchronous database function in a worker thread."""
+    return await asyncio.to_thread(func, *args, **kwargs)
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import sys
+import threading
+
+import mysql.connector
+import pytest
+from mysql.connector import pooling
+
+# Add the project root to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..')))
+
+from shared.mysql.mysql_client import MySQLPool, run_db
+
+
+class FakeConnection:
+    def __init__(self, pool, stale=False):
+        self.pool = pool
+        self.stale = stale
+        self.pings = []
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        self.pings.append(reconnect)
+        if self.stale and not reconnect:
+            raise mysql.connector.errors.InterfaceError("MySQL Connection not available.")
+        self.stale = False
+
+    def cursor(self):
+        return "cursor"
+
+    def close(self):
+        self.pool.idle.append(self)
+
+
+class FakeConnectorPool:
+    """Mimics mysql.connector's pool: hands out idle connections and fails fast when exhausted."""
+
+    def __init__(self, size):
+        self.idle = [FakeConnection(self) for _ in range(size)]
+
+    def get_connection(self):
+        if not self.idle:
+            raise pooling.PoolError("Failed getting connection; pool exhausted")
+        return self.idle.pop(0)
+
+
+def _pool(size=2, timeout=1.0, idle_s=30.0):
+    created = []
+
+    def factory(n):
+        created.append(FakeConnectorPool(n))
+        return created[0]
+    return MySQLPool(size=size, checkout_timeout_s=timeout, healthcheck_idle_s=idle_s, pool_factory=factory), created
+
+
+def test_connections_are_reused_and_only_pinged_after_idling():
+    pool, created = _pool(size=1)
+    first = pool.get_connection()
+    raw = first._connection
+    assert first.cursor() == "cursor"
+    first.close()
+    first.close()  # closing twice must not free a second slot
+
+    second = pool.get_connection()
+    assert second._connection is raw
+    # Pinged on first checkout only; the quick reuse skips the health check.
+    assert raw.pings == [False]
+    assert len(created) == 1
+    second.close()
+
+
+def test_stale_connection_is_reconnected_on_checkout():
+    pool, created = _pool(size=1, idle_s=0.0)
+    pool.get_connection().close()
+    raw = created[0].idle[0]
+    raw.stale = True
+
+    pool.get_connection().close()
+    assert raw.pings[-2:] == [False, True]
+    assert pool.stats["reconnects"] == 1
+
+
+def test_checkout_waits_for_a_free_connection_instead_of_failing():
+    pool, _ = _pool(size=1, timeout=2.0)
+    held = pool.get_connection()
+    threading.Timer(0.05, held.close).start()
+    pool.get_connection().close()
+
+
+def test_checkout_times_out_when_the_pool_stays_exhausted():
+    pool, _ = _pool(size=1, timeout=0.05)
+    held = pool.get_connection()
+    with pytest.raises(pooling.PoolError):
+        pool.get_connection()
+    held.close()
+    pool.get_connection().close()
+
+
+def test_run_db_runs_off_the_event_loop():
+    loop_thread = threading.get_ident()
+
+    async def main():
+        return await run_db(threading.get_ident)
+
+    assert asyncio.run(main()) != loop_thread
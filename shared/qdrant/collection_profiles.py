@@ -0,0 +1,97 @@
+"""
+Storage profiles for per-user Qdrant collections.
+
+A profile decides how a collection's vectors are stored and indexed:
+
+- `full_precision`: float32 vectors in RAM and Qdrant's default HNSW settings
+  (how collections were created before profiles existed).
+- `quantized`: float32 vectors in RAM plus an int8 scalar-quantized copy that
+  searches run on, rescored against the originals. Faster search, a bit more RAM.
+- `quantized_on_disk`: the int8 copy stays in RAM, the float32 originals move to
+  disk and are only read to rescore the oversampled candidates. Roughly a quarter
+  of the vector memory of `full_precision`.
+
+New collections use QDRANT_COLLECTION_PROFILE, `quantized` by default. Moving
+the originals to disk trades rescoring latency for memory, so `quantized_on_disk`
+is opt-in. `scripts/migrate_qdrant.py apply-profile` moves existing collections
+to a profile.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from qdrant_client import models
+
+from shared.config import settings
+from shared.qdrant.sparse_vectors import SPARSE_VECTOR_NAME
+
+
+@dataclass(frozen=True)
+class CollectionProfile:
+    name: str
+    quantized: bool
+    vectors_on_disk: bool
+    # HNSW graph degree and build-time beam width; None keeps Qdrant's defaults (16 / 100).
+    hnsw_m: Optional[int] = None
+    hnsw_ef_construct: Optional[int] = None
+    # Search-time beam width; None lets Qdrant use ef_construct.
+    hnsw_ef: Optional[int] = None
+    # Candidates fetched from the int8 index per requested hit, before rescoring.
+    oversampling: float = 2.0
+
+    def vectors_config(self, vector_size: int) -> models.VectorParams:
+        return models.VectorParams(size=vector_size, distance=models.Distance.COSINE, on_disk=self.vectors_on_disk)
+
+    def sparse_vectors_config(self) -> Dict[str, models.SparseVectorParams]:
+        """The BM25 sparse vector used by hybrid search; Qdrant applies IDF at query time."""
+        return {
+            SPARSE_VECTOR_NAME: models.SparseVectorParams(
+                index=models.SparseIndexParams(on_disk=self.vectors_on_disk),
+                modifier=models.Modifier.IDF,
+            )
+        }
+
+    def hnsw_config(self, multitenant: bool = False) -> Optional[models.HnswConfigDiff]:
+        """
+        For a multitenant collection every search is filtered to one tenant, so no global
+        graph is built (m=0); Qdrant builds one graph per tenant value instead (payload_m).
+        """
+        if multitenant:
+            return models.HnswConfigDiff(m=0, payload_m=self.hnsw_m or 16, ef_construct=self.hnsw_ef_construct)
+        if self.hnsw_m is None and self.hnsw_ef_construct is None:
+            return None
+        return models.HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+
+    def quantization_config(self) -> Optional[models.ScalarQuantization]:
+        if not self.quantized:
+            return None
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+
+    def search_params(self) -> Optional[models.SearchParams]:
+        if not self.quantized and self.hnsw_ef is None:
+            return None
+        quantization = models.QuantizationSearchParams(rescore=True, oversampling=self.oversampling) if self.quantized else None
+        return models.SearchParams(hnsw_ef=self.hnsw_ef, quantization=quantization)
+
+
+PROFILES: Dict[str, CollectionProfile] = {
+    profile.name: profile
+    for profile in (
+        CollectionProfile(name="full_precision", quantized=False, vectors_on_disk=False),
+        # Collections hold hundreds to a few thousand threads: a slightly sparser graph with a
+        # wider build beam keeps recall while cutting graph memory; hnsw_ef restores search breadth.
+        CollectionProfile(name="quantized", quantized=True, vectors_on_disk=False, hnsw_m=12, hnsw_ef_construct=128, hnsw_ef=96),
+        CollectionProfile(name="quantized_on_disk", quantized=True, vectors_on_disk=True, hnsw_m=12, hnsw_ef_construct=128, hnsw_ef=96),
+    )
+}
+
+
+def get_collection_profile(name: Optional[str] = None) -> CollectionProfile:
+    """Returns the named profile, or the configured default. Unknown names raise ValueError."""
+    profile_name = name or settings.QDRANT_COLLECTION_PROFILE
+    try:
+        return PROFILES[profile_name]
+    except KeyError:
+        raise ValueError(f"Unknown Qdrant collection profile '{profile_name}'. Known profiles: {', '.join(PROFILES)}")
@@ -1,4 +1,6 @@
 import logging
+import threading
+import time
 from functools import lru_cache
 from typing import List, Dict, Any, Optional
 import httpx
@@ -11,6 +13,9 @@ from qdrant_client import QdrantClient, models
 from qdrant_client.http.models import PointStruct
 from shared.config import settings
 from shared.services.embedding_service import get_embedding, embedding_service
+from shared.qdrant.thread_content_store import PREVIEW_CHARS, get_thread_content_store
+from shared.qdrant.collection_profiles import get_collection_profile
+from shared.qdrant.sparse_vectors import SPARSE_VECTOR_NAME, query_sparse_vector
 
 logger = logging.getLogger(__name__)
 
@@ -44,21 +49,195 @@ def _get_user_collection_name(user_uuid: UUID) -> str:
     # Qdrant collection names must be valid RFC 1123 hostnames, so no underscores.
     return f"user-{str(user_uuid).replace('-', '')}"
 
+# With QDRANT_STORAGE_MODE "shared", all users' threads live in one collection and
+# every point carries its owner in this payload field. The field is a tenant index,
+# so Qdrant co-locates each user's points and builds one HNSW graph per user; every
+# read is filtered on it. Point ids are namespaced by user, since thread ids are only
+# unique per mailbox. All users must use embedding models with the same vector size.
+TENANT_FIELD = "user_id"
+
+def _is_shared_mode() -> bool:
+    return settings.QDRANT_STORAGE_MODE == "shared"
+
+def _get_collection_name(user_uuid: UUID) -> str:
+    """The collection holding a user's points in the configured storage mode."""
+    return settings.QDRANT_SHARED_COLLECTION_NAME if _is_shared_mode() else _get_user_collection_name(user_uuid)
+
+def tenant_point_id(user_uuid: UUID, point_id: str) -> str:
+    """Id of a user's point in the shared collection."""
+    return str(uuid.uuid5(uuid.UUID(settings.QDRANT_NAMESPACE_UUID), f"{user_uuid}:{point_id}"))
+
+def _point_id(user_uuid: UUID, point_id: str) -> str:
+    """Id under which a point (as generated by `generate_qdrant_point_id`) is stored in the configured mode."""
+    return tenant_point_id(user_uuid, point_id) if _is_shared_mode() else point_id
+
+def _tenant_filter(user_uuid: UUID, query_filter: Optional[models.Filter] = None) -> Optional[models.Filter]:
+    """Restricts `query_filter` to the user's points in shared mode; per-user collections need no restriction."""
+    if not _is_shared_mode():
+        return query_filter
+    must = [models.FieldCondition(key=TENANT_FIELD, match=models.MatchValue(value=str(user_uuid)))]
+    if query_filter is not None:
+        must.append(query_filter)
+    return models.Filter(must=must)
+
+def _to_tenant_points(points: List[models.PointStruct], user_uuid: UUID) -> List[models.PointStruct]:
+    if not _is_shared_mode():
+        return points
+    return [
+        models.PointStruct(
+            id=tenant_point_id(user_uuid, str(point.id)),
+            vector=point.vector,
+            payload={**(point.payload or {}), TENANT_FIELD: str(user_uuid)},
+        )
+        for point in points
+    ]
+
+# Payload fields that searches filter or facet on, indexed in every user collection.
+PAYLOAD_INDEXES = {
+    "language": models.PayloadSchemaType.KEYWORD,
+    "contains_user_reply": models.PayloadSchemaType.BOOL,
+}
+
+# Upper bound on distinct values returned by a facet query.
+FACET_LIMIT = 1000
+
+# Thread bodies live in the local thread content store, not in the point payload.
+# Points indexed before that change still carry them; searches never return them.
+CONTENT_PAYLOAD_FIELDS = ["thread_markdown", "messages"]
+_METADATA_PAYLOAD = models.PayloadSelectorExclude(exclude=CONTENT_PAYLOAD_FIELDS)
+
+# Hybrid search fetches this many candidates per requested hit from each of the
+# dense and sparse indexes before fusing them with reciprocal-rank fusion.
+HYBRID_PREFETCH_FACTOR = 4
+HYBRID_MIN_PREFETCH = 20
+
+class _CollectionRegistry:
+    """
+    Per-process memo of collections known to exist, with their vector size.
+
+    Every search and upsert used to look up the user's embedding model (Redis) and
+    call `get_collection` first. Known collections skip both. Entries are dropped by
+    `recreate_collection` (which also runs on an embedding-model change), when a call
+    against the collection fails, and after QDRANT_COLLECTION_CACHE_TTL_SECONDS, which
+    bounds how long another process's recreate can go unnoticed.
+    """
+
+    def __init__(self, ttl_s: float):
+        self.ttl_s = ttl_s
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, collection_name: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(collection_name)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[1] > self.ttl_s:
+                del self._entries[collection_name]
+                return None
+            return entry
+
+    def get(self, collection_name: str) -> Optional[int]:
+        entry = self._entry(collection_name)
+        return entry[0] if entry else None
+
+    def has_sparse_vector(self, collection_name: str) -> bool:
+        """Whether the collection has the BM25 sparse vector (collections created before hybrid search do not)."""
+        entry = self._entry(collection_name)
+        return bool(entry and entry[2])
+
+    def remember(self, collection_name: str, vector_size: int, has_sparse_vector: bool = False) -> None:
+        with self._lock:
+            self._entries[collection_name] = (vector_size, time.monotonic(), has_sparse_vector)
+
+    def forget(self, collection_name: str) -> None:
+        with self._lock:
+            self._entries.pop(collection_name, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_collection_registry = _CollectionRegistry(settings.QDRANT_COLLECTION_CACHE_TTL_SECONDS)
+
+def _vector_size_of(collection_info) -> Optional[int]:
+    """Reads the dense vector size from a collection's config, for single or named vectors."""
+    vectors = collection_info.config.params.vectors
+    if isinstance(vectors, dict):
+        vectors = next(iter(vectors.values()), None)
+    size = getattr(vectors, "size", None)
+    return size if isinstance(size, int) else None
+
+def _dense_vector_of(vector) -> Optional[List[float]]:
+    """The dense vector of a returned point; collections with the sparse vector return named vectors ("" is the dense one)."""
+    return vector.get("") if isinstance(vector, dict) else vector
+
+def _has_sparse_vector(collection_info) -> bool:
+    sparse_vectors = getattr(collection_info.config.params, "sparse_vectors", None)
+    return isinstance(sparse_vectors, dict) and SPARSE_VECTOR_NAME in sparse_vectors
+
+def _payload_indexes_for(collection_name: str) -> Dict[str, Any]:
+    if collection_name != settings.QDRANT_SHARED_COLLECTION_NAME:
+        return PAYLOAD_INDEXES
+    return {TENANT_FIELD: models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD, is_tenant=True), **PAYLOAD_INDEXES}
+
+def ensure_payload_indexes(client: QdrantClient, collection_name: str, payload_schema: Optional[Dict[str, Any]] = None) -> List[str]:
+    """
+    Creates the PAYLOAD_INDEXES that `payload_schema` (a collection's current indexes) lacks,
+    plus the tenant index for the shared collection.
+    Returns the fields that were indexed; failures are logged, since searches still work unindexed.
+    """
+    created = []
+    for field_name, field_schema in _payload_indexes_for(collection_name).items():
+        if payload_schema and field_name in payload_schema:
+            continue
+        try:
+            client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=field_schema,
+                wait=True,
+            )
+            created.append(field_name)
+        except Exception as e:
+            logger.warning(f"Could not create payload index '{field_name}' on collection '{collection_name}': {e}")
+    if created:
+        logger.info(f"Created payload indexes {created} on collection '{collection_name}'.")
+    return created
+
 def _ensure_collection_exists(client: QdrantClient, collection_name: str, vector_size: int):
     """Ensures a collection exists, creating it if necessary."""
+    if _collection_registry.get(collection_name) is not None:
+        return
     try:
-        client.get_collection(collection_name=collection_name)
-        logger.info(f"Collection '{collection_name}' already exists.")
+        collection_info = client.get_collection(collection_name=collection_name)
+        existing_size = _vector_size_of(collection_info) or vector_size
+        if existing_size != vector_size:
+            logger.warning(
+                f"Collection '{collection_name}' has vector size {existing_size}, but the embedding model "
+                f"produces {vector_size}. The collection must be recreated and re-indexed."
+            )
+        logger.debug(f"Collection '{collection_name}' already exists.")
+        # Collections created before the payload indexes existed get them on first use.
+        payload_schema = getattr(collection_info, "payload_schema", None)
+        ensure_payload_indexes(client, collection_name, payload_schema if isinstance(payload_schema, dict) else None)
+        _collection_registry.remember(collection_name, existing_size, _has_sparse_vector(collection_info))
     except Exception as e:
         # Check if it's a "not found" type error, in which case we should create the collection
         if "not found" in str(e).lower() or "doesn't exist" in str(e).lower():
-            logger.info(f"Collection '{collection_name}' not found. Creating...")
+            profile = get_collection_profile()
+            logger.info(f"Collection '{collection_name}' not found. Creating with profile '{profile.name}'...")
             try:
                 client.create_collection(
                     collection_name=collection_name,
-                    vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE),
+                    vectors_config=profile.vectors_config(vector_size),
+                    sparse_vectors_config=profile.sparse_vectors_config(),
+                    hnsw_config=profile.hnsw_config(multitenant=collection_name == settings.QDRANT_SHARED_COLLECTION_NAME),
+                    quantization_config=profile.quantization_config(),
                 )
                 logger.info(f"Collection '{collection_name}' created.")
+                ensure_payload_indexes(client, collection_name)
             except Exception as create_error:
                 # If creation fails because collection already exists (race condition), that's fine
                 if "already exists" in str(create_error).lower():
@@ -66,15 +245,53 @@ def _ensure_collection_exists(client: QdrantClient, collection_name: str, vector
                 else:
                     logger.error(f"Failed to create collection '{collection_name}': {create_error}")
                     raise
+            _collection_registry.remember(collection_name, vector_size, has_sparse_vector=True)
         else:
             logger.error(f"Unexpected error checking collection '{collection_name}': {e}")
             raise
 
+def _ensure_user_collection(client: QdrantClient, user_uuid: UUID) -> tuple:
+    """
+    Returns the user's collection name and vector size, making sure the collection exists.
+    Known collections are answered from the registry without touching Redis or Qdrant.
+    """
+    collection_name = _get_collection_name(user_uuid)
+    vector_size = _collection_registry.get(collection_name)
+    if vector_size is None:
+        vector_size = embedding_service.get_current_model_vector_size(user_uuid=user_uuid)
+        _ensure_collection_exists(client, collection_name, vector_size)
+        vector_size = _collection_registry.get(collection_name) or vector_size
+    return collection_name, vector_size
+
+def invalidate_collection_cache(user_uuid: Optional[UUID] = None) -> None:
+    """Forgets what this process knows about a user's collection, or about all collections."""
+    if user_uuid is None:
+        _collection_registry.clear()
+    else:
+        _collection_registry.forget(_get_collection_name(user_uuid))
+
 def recreate_collection(user_uuid: UUID):
-    """Deletes and recreates a user-specific collection to ensure it's empty."""
+    """
+    Deletes and recreates a user-specific collection to ensure it's empty.
+    In shared mode only the user's points are deleted from the shared collection.
+    """
     client = get_qdrant_client()
-    collection_name = _get_user_collection_name(user_uuid)
+    collection_name = _get_collection_name(user_uuid)
     vector_size = embedding_service.get_current_model_vector_size(user_uuid=user_uuid)
+    _collection_registry.forget(collection_name)
+    try:
+        get_thread_content_store(user_uuid).clear()
+    except Exception as e:
+        logger.warning(f"Could not clear the thread content store of user {user_uuid}: {e}")
+    if _is_shared_mode():
+        _ensure_collection_exists(client, collection_name, vector_size)
+        client.delete(
+            collection_name=collection_name,
+            points_selector=models.FilterSelector(filter=_tenant_filter(user_uuid)),
+            wait=True,
+        )
+        logger.warning(f"Deleted the points of user {user_uuid} from shared collection '{collection_name}'.")
+        return
     try:
         logger.warning(f"Deleting collection '{collection_name}' for user {user_uuid}...")
         client.delete_collection(collection_name=collection_name)
@@ -90,19 +307,28 @@ def get_qdrant_client():
     """
     return qdrant_client
 
+def _dense_only(points: List[models.PointStruct]) -> List[models.PointStruct]:
+    """Drops the sparse vector of points bound for a collection created before hybrid search."""
+    return [
+        point.model_copy(update={"vector": point.vector.get("")}) if isinstance(point.vector, dict) else point
+        for point in points
+    ]
+
 def upsert_points(points: List[models.PointStruct], user_uuid: UUID):
     """
     Upserts a list of points into a user-specific Qdrant collection.
     """
     client = get_qdrant_client()
-    collection_name = _get_user_collection_name(user_uuid)
+    collection_name = _get_collection_name(user_uuid)
     
     if not points:
         return
+    points = _to_tenant_points(points, user_uuid)
 
     try:
-        vector_size = embedding_service.get_current_model_vector_size(user_uuid=user_uuid)
-        _ensure_collection_exists(client, collection_name, vector_size)
+        _ensure_user_collection(client, user_uuid)
+        if not _collection_registry.has_sparse_vector(collection_name):
+            points = _dense_only(points)
         
         # Use upload_points which has built-in retry logic and better batch handling
         client.upload_points(
@@ -115,16 +341,113 @@ def upsert_points(points: List[models.PointStruct], user_uuid: UUID):
         )
         logger.info(f"Upserted {len(points)} points to collection '{collection_name}'. Status: completed")
     except Exception as e:
+        _collection_registry.forget(collection_name)
         logger.error(f"Error upserting points to Qdrant collection '{collection_name}': {e}", exc_info=True)
         raise Exception("Failed to upsert points to Qdrant.") from e
 
+def set_thread_payloads(payloads: Dict[str, Dict[str, Any]], user_uuid: UUID) -> int:
+    """
+    Updates payload fields of indexed threads, keyed by thread id, without touching
+    their vectors or other fields. Threads that are not indexed are skipped.
+    Returns the number of points updated.
+    """
+    client = get_qdrant_client()
+    collection_name = _get_collection_name(user_uuid)
+    if not payloads:
+        return 0
+
+    point_ids = {_point_id(user_uuid, generate_qdrant_point_id(thread_id)): thread_id for thread_id in payloads}
+    try:
+        existing = client.retrieve(
+            collection_name=collection_name,
+            ids=list(point_ids),
+            with_payload=False,
+            with_vectors=False,
+        )
+    except Exception as e:
+        logger.info(f"Could not look up threads in collection '{collection_name}' (it might not exist): {e}")
+        return 0
+
+    operations = [
+        models.SetPayloadOperation(
+            set_payload=models.SetPayload(payload=payloads[point_ids[str(point.id)]], points=[point.id])
+        )
+        for point in existing
+    ]
+    if not operations:
+        return 0
+    try:
+        client.batch_update_points(collection_name=collection_name, update_operations=operations, wait=True)
+        logger.info(f"Updated payload of {len(operations)} thread(s) in collection '{collection_name}'.")
+        return len(operations)
+    except Exception as e:
+        logger.error(f"Error updating thread payloads in Qdrant collection '{collection_name}': {e}", exc_info=True)
+        raise Exception("Failed to update thread payloads in Qdrant.") from e
+
+def content_key_of(payload: Dict[str, Any]) -> str:
+    """The thread content store key of a point payload."""
+    return payload.get("content_key") or generate_qdrant_point_id(payload["thread_id"])
+
+def _load_legacy_contents(client: QdrantClient, user_uuid: UUID, content_keys: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Reads bodies of points indexed before the content store existed from their payload,
+    and copies them into the store so the next lookup is local.
+    """
+    stored_ids = {_point_id(user_uuid, key): key for key in content_keys}
+    try:
+        points = client.retrieve(
+            collection_name=_get_collection_name(user_uuid),
+            ids=list(stored_ids),
+            with_payload=CONTENT_PAYLOAD_FIELDS + ["thread_id"],
+            with_vectors=False,
+        )
+    except Exception as e:
+        logger.warning(f"Could not read legacy thread payloads for user {user_uuid}: {e}")
+        return {}
+    contents = {
+        stored_ids[str(point.id)]: {
+            "thread_id": point.payload.get("thread_id"),
+            "thread_markdown": point.payload.get("thread_markdown") or "",
+            "messages": point.payload.get("messages") or [],
+        }
+        for point in points
+        if point.payload and point.payload.get("thread_markdown")
+    }
+    if contents:
+        get_thread_content_store(user_uuid).put_many(contents)
+    return contents
+
+def get_thread_previews(user_uuid: UUID, payloads: List[Dict[str, Any]]) -> List[str]:
+    """Returns the markdown preview (the part rerankers read) of each hit, in order; '' when unavailable."""
+    keys = [content_key_of(payload) for payload in payloads]
+    previews = get_thread_content_store(user_uuid).get_previews(keys)
+    missing = [key for key in keys if key not in previews]
+    if missing:
+        legacy = _load_legacy_contents(get_qdrant_client(), user_uuid, missing)
+        previews.update({key: content["thread_markdown"][:PREVIEW_CHARS] for key, content in legacy.items()})
+    return [previews.get(key, "") for key in keys]
+
+def get_thread_contents(user_uuid: UUID, payloads: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+    """Returns `{"thread_markdown", "messages"}` of each hit, in order; None when unavailable."""
+    keys = [content_key_of(payload) for payload in payloads]
+    contents = get_thread_content_store(user_uuid).get_contents(keys)
+    missing = [key for key in keys if key not in contents]
+    if missing:
+        contents.update(_load_legacy_contents(get_qdrant_client(), user_uuid, missing))
+    return [contents.get(key) for key in keys]
+
+def _with_contents(user_uuid: UUID, payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    contents = get_thread_contents(user_uuid, payloads)
+    return [{**payload, **{field: (content or {}).get(field) for field in CONTENT_PAYLOAD_FIELDS}} for payload, content in zip(payloads, contents)]
+
 def count_points(user_uuid: UUID) -> int:
     """Counts the number of points in a user-specific Qdrant collection."""
     qdrant_client = get_qdrant_client()
-    collection_name = _get_user_collection_name(user_uuid)
+    collection_name = _get_collection_name(user_uuid)
     try:
         count_result = qdrant_client.count(
             collection_name=collection_name,
+            count_filter=_tenant_filter(user_uuid),
             exact=False
         )
         return count_result.count
@@ -132,32 +455,87 @@ def count_points(user_uuid: UUID) -> int:
         # This can happen if the collection doesn't exist.
         return 0
 
+def _use_hybrid(collection_name: str, query_text: Optional[str]) -> bool:
+    return bool(
+        settings.QDRANT_HYBRID_SEARCH_ENABLED
+        and query_text
+        and _collection_registry.has_sparse_vector(collection_name)
+    )
+
+def _hybrid_search(
+    client: QdrantClient,
+    collection_name: str,
+    query_vector: List[float],
+    sparse_vector: models.SparseVector,
+    query_filter: Optional[models.Filter],
+    limit: int,
+    with_vectors: bool = False,
+) -> List[models.ScoredPoint]:
+    """
+    Runs the dense and the BM25 sparse search in one request and fuses their rankings
+    server-side with reciprocal-rank fusion. Scores of the hits are RRF scores.
+    """
+    prefetch_limit = max(limit * HYBRID_PREFETCH_FACTOR, HYBRID_MIN_PREFETCH)
+    prefetch = [
+        models.Prefetch(
+            query=query_vector,
+            filter=query_filter,
+            limit=prefetch_limit,
+            params=get_collection_profile().search_params(),
+        )
+    ]
+    if sparse_vector.indices:
+        prefetch.append(models.Prefetch(query=sparse_vector, using=SPARSE_VECTOR_NAME, filter=query_filter, limit=prefetch_limit))
+    response = client.query_points(
+        collection_name=collection_name,
+        prefetch=prefetch,
+        query=models.FusionQuery(fusion=models.Fusion.RRF),
+        limit=limit,
+        with_payload=_METADATA_PAYLOAD,
+        with_vectors=[""] if with_vectors else False,
+    )
+    return response.points
+
+def _hits_of(search_result: List[models.ScoredPoint], with_vectors: bool = False) -> List[Dict[str, Any]]:
+    hits = [{"score": hit.score, **hit.payload} for hit in search_result]
+    if with_vectors:
+        for hit, point in zip(hits, search_result):
+            hit["vector"] = _dense_vector_of(point.vector)
+    return hits
+
 def semantic_search(
-    query: str, user_uuid: UUID, top_k: int = 5
+    query: str, user_uuid: UUID, top_k: int = 5, with_content: bool = False
 ) -> List[Dict[str, Any]]:
     """
     Performs a semantic search in a user-specific Qdrant collection.
+    Collections with the BM25 sparse vector are searched hybrid (dense + lexical, fused with RRF).
+    Hits carry the point metadata; `with_content` adds `thread_markdown` and `messages` from the content store.
     """
     client = get_qdrant_client()
-    collection_name = _get_user_collection_name(user_uuid)
+    collection_name = _get_collection_name(user_uuid)
     
     query_vector = get_embedding(query, user_uuid=user_uuid)
 
-    qdrant_filter = models.Filter()
+    qdrant_filter = _tenant_filter(user_uuid, models.Filter())
 
     try:
-        vector_size = embedding_service.get_current_model_vector_size(user_uuid=user_uuid)
-        _ensure_collection_exists(client, collection_name, vector_size)
+        _ensure_user_collection(client, user_uuid)
 
-        search_result = client.search(
-            collection_name=collection_name,
-            query_vector=query_vector,
-            query_filter=qdrant_filter,
-            limit=top_k,
-            with_payload=True,
-        )
-        return [{"score": hit.score, **hit.payload} for hit in search_result]
+        if _use_hybrid(collection_name, query):
+            search_result = _hybrid_search(client, collection_name, query_vector, query_sparse_vector(query), qdrant_filter, top_k)
+        else:
+            search_result = client.search(
+                collection_name=collection_name,
+                query_vector=query_vector,
+                query_filter=qdrant_filter,
+                limit=top_k,
+                with_payload=_METADATA_PAYLOAD,
+                search_params=get_collection_profile().search_params(),
+            )
+        hits = [{"score": hit.score, **hit.payload} for hit in search_result]
+        return _with_contents(user_uuid, hits) if with_content else hits
     except Exception as e:
+        _collection_registry.forget(collection_name)
         logger.error(f"Error querying Qdrant: {e}")
         raise Exception("Failed to query Qdrant.") from e
 
@@ -166,56 +544,137 @@ def search_by_vector(
     user_uuid: UUID,
     top_k: int = 5,
     exclude_ids: Optional[List[str]] = None,
+    with_content: bool = False,
+    query_text: Optional[str] = None,
+    with_vectors: bool = False,
 ) -> List[Dict[str, Any]]:
     """
     Performs a vector search in a user-specific Qdrant collection, with an option to exclude specific point IDs.
+    With `query_text`, collections with the BM25 sparse vector are searched hybrid (fused with RRF).
+    Hits carry the point metadata; `with_content` adds `thread_markdown` and `messages` from the content store,
+    `with_vectors` adds the dense vector of each hit under `vector` (for local reranking).
     """
     client = get_qdrant_client()
-    collection_name = _get_user_collection_name(user_uuid)
+    collection_name = _get_collection_name(user_uuid)
 
     qdrant_filter = None
     if exclude_ids:
         qdrant_filter = models.Filter(
             must_not=[
-                models.HasIdCondition(has_id=exclude_ids)
+                models.HasIdCondition(has_id=[_point_id(user_uuid, point_id) for point_id in exclude_ids])
             ]
         )
+    qdrant_filter = _tenant_filter(user_uuid, qdrant_filter)
 
     try:
-        vector_size = embedding_service.get_current_model_vector_size(user_uuid=user_uuid)
-        _ensure_collection_exists(client, collection_name, vector_size)
+        _ensure_user_collection(client, user_uuid)
 
-        search_result = client.search(
-            collection_name=collection_name,
-            query_vector=query_vector,
-            query_filter=qdrant_filter,
-            limit=top_k,
-            with_payload=True,
-        )
-        return [{"score": hit.score, **hit.payload} for hit in search_result]
+        if _use_hybrid(collection_name, query_text):
+            search_result = _hybrid_search(client, collection_name, query_vector, query_sparse_vector(query_text), qdrant_filter, top_k, with_vectors)
+        else:
+            search_result = client.search(
+                collection_name=collection_name,
+                query_vector=query_vector,
+                query_filter=qdrant_filter,
+                limit=top_k,
+                with_payload=_METADATA_PAYLOAD,
+                with_vectors=with_vectors,
+                search_params=get_collection_profile().search_params(),
+            )
+        hits = _hits_of(search_result, with_vectors)
+        return _with_contents(user_uuid, hits) if with_content else hits
     except Exception as e:
+        _collection_registry.forget(collection_name)
         logger.error(f"Error querying Qdrant with vector: {e}")
         raise Exception("Failed to query Qdrant by vector.") from e
 
+def find_similar_to_thread(
+    thread_id: str,
+    user_uuid: UUID,
+    top_k: int = 5,
+    with_vectors: bool = False,
+) -> Optional[Dict[str, Any]]:
+    """
+    Searches with the vectors already stored for an indexed thread, so the thread does not
+    have to be fetched and embedded again. Collections with the BM25 sparse vector are
+    searched hybrid with the thread's stored sparse vector.
+    Returns `{"source": payload and dense "vector" of the thread, "hits": [...]}` with the
+    thread itself excluded from the hits, or None when the thread is not indexed.
+    """
+    client = get_qdrant_client()
+    collection_name = _get_collection_name(user_uuid)
+    point_id = _point_id(user_uuid, generate_qdrant_point_id(thread_id))
+
+    try:
+        _ensure_user_collection(client, user_uuid)
+        points = client.retrieve(
+            collection_name=collection_name,
+            ids=[point_id],
+            with_payload=_METADATA_PAYLOAD,
+            with_vectors=True,
+        )
+        if not points:
+            return None
+        source = points[0]
+        dense_vector = _dense_vector_of(source.vector)
+        sparse_vector = source.vector.get(SPARSE_VECTOR_NAME) if isinstance(source.vector, dict) else None
+        qdrant_filter = _tenant_filter(user_uuid, models.Filter(must_not=[models.HasIdCondition(has_id=[point_id])]))
+
+        if sparse_vector is not None and settings.QDRANT_HYBRID_SEARCH_ENABLED:
+            search_result = _hybrid_search(client, collection_name, dense_vector, sparse_vector, qdrant_filter, top_k, with_vectors)
+        else:
+            search_result = client.search(
+                collection_name=collection_name,
+                query_vector=dense_vector,
+                query_filter=qdrant_filter,
+                limit=top_k,
+                with_payload=_METADATA_PAYLOAD,
+                with_vectors=with_vectors,
+                search_params=get_collection_profile().search_params(),
+            )
+        return {
+            "source": {**source.payload, "vector": dense_vector},
+            "hits": _hits_of(search_result, with_vectors),
+        }
+    except Exception as e:
+        _collection_registry.forget(collection_name)
+        logger.error(f"Error searching Qdrant with the stored vectors of thread {thread_id}: {e}")
+        raise Exception("Failed to query Qdrant by stored thread vector.") from e
+
+def _facet_counts(client: QdrantClient, collection_name: str, field_name: str, facet_filter: Optional[models.Filter] = None) -> Dict[str, int]:
+    """Counts the values of an indexed payload field server-side."""
+    response = client.facet(collection_name=collection_name, key=field_name, facet_filter=facet_filter, limit=FACET_LIMIT, exact=True)
+    return {hit.value: hit.count for hit in response.hits if hit.value not in (None, "")}
+
 def get_payload_field_distribution(field_name: str, user_uuid: UUID) -> Dict[str, int]:
     """
-    Scans a user-specific collection and returns the distribution of values for a specific payload field.
+    Returns the distribution of values for a specific payload field in a user-specific collection.
     This is useful for getting counts of categorical data, like 'language'.
+    Indexed fields are counted server-side with a facet query; other fields (or a
+    server without facet support) fall back to scrolling the whole collection.
     """
     client = get_qdrant_client()
-    collection_name = _get_user_collection_name(user_uuid)
+    collection_name = _get_collection_name(user_uuid)
     counter = Counter()
     next_offset = None  # Initialize offset for the first call
 
     try:
-        vector_size = embedding_service.get_current_model_vector_size(user_uuid=user_uuid)
-        _ensure_collection_exists(client, collection_name, vector_size)
+        _ensure_user_collection(client, user_uuid)
+
+        if field_name in PAYLOAD_INDEXES:
+            try:
+                distribution = _facet_counts(client, collection_name, field_name, _tenant_filter(user_uuid))
+                logger.info(f"Facet distribution of '{field_name}' in '{collection_name}': {distribution}")
+                return distribution
+            except Exception as e:
+                logger.warning(f"Facet query for '{field_name}' in '{collection_name}' failed, falling back to a scroll: {e}")
 
         logger.info(f"Starting scroll to get distribution of '{field_name}' in '{collection_name}'...")
         while True:
             # Use the scroll method with the current offset
             points_batch, next_offset = client.scroll(
                 collection_name=collection_name,
+                scroll_filter=_tenant_filter(user_uuid),
                 limit=256,
                 offset=next_offset,
                 with_payload=[field_name],
@@ -236,6 +695,7 @@ def get_payload_field_distribution(field_name: str, user_uuid: UUID) -> Dict[str
         return dict(counter)
 
     except Exception as e:
+        _collection_registry.forget(collection_name)
         logger.error(f"Error getting payload field distribution for '{field_name}' in '{collection_name}': {e}")
         return {}
 
@@ -243,29 +703,31 @@ def get_diverse_set_by_filter(
     query_filter: models.Filter, 
     user_uuid: UUID,
     limit: int = 10, 
-    candidates: int = 100
+    candidates: int = 100,
+    with_content: bool = False,
 ) -> List[Dict[str, Any]]:
     """
     Selects a diverse set of documents from a user-specific collection that match a given filter.
     It uses a Maximal Marginal Relevance (MMR) like approach to ensure the selected
     documents are topically different from each other.
+    Candidates are fetched without their bodies; `with_content` loads them for the selected set only.
     """
     client = get_qdrant_client()
-    collection_name = _get_user_collection_name(user_uuid)
-    vector_size = embedding_service.get_current_model_vector_size(user_uuid=user_uuid)
+    collection_name = _get_collection_name(user_uuid)
 
     try:
-        _ensure_collection_exists(client, collection_name, vector_size)
+        _, vector_size = _ensure_user_collection(client, user_uuid)
         # 1. Fetch a pool of candidate documents using a random vector to get a good starting sample
         random_vector = np.random.rand(vector_size).tolist()
         
         candidate_hits = client.search(
             collection_name=collection_name,
             query_vector=random_vector,
-            query_filter=query_filter,
+            query_filter=_tenant_filter(user_uuid, query_filter),
             limit=candidates,
             with_vectors=True,
-            with_payload=True
+            with_payload=_METADATA_PAYLOAD,
+            search_params=get_collection_profile().search_params(),
         )
 
         if not candidate_hits:
@@ -274,10 +736,11 @@ def get_diverse_set_by_filter(
 
         if len(candidate_hits) < limit:
             logger.warning(f"Found fewer candidates ({len(candidate_hits)}) than requested limit ({limit}). Returning all candidates.")
-            return [hit.payload for hit in candidate_hits]
+            payloads = [hit.payload for hit in candidate_hits]
+            return _with_contents(user_uuid, payloads) if with_content else payloads
 
         # 2. Use a diversification algorithm (MMR-like) to select a diverse set
-        candidate_vectors = np.array([hit.vector for hit in candidate_hits])
+        candidate_vectors = np.array([_dense_vector_of(hit.vector) for hit in candidate_hits])
         
         # Normalize vectors for cosine similarity calculation
         candidate_vectors /= np.linalg.norm(candidate_vectors, axis=1, keepdims=True)
@@ -314,9 +777,10 @@ def get_diverse_set_by_filter(
         
         # 3. Return the payloads of the selected diverse hits
         diverse_payloads = [candidate_hits[i].payload for i in selected_indices]
-        return diverse_payloads
+        return _with_contents(user_uuid, diverse_payloads) if with_content else diverse_payloads
 
     except Exception as e:
+        _collection_registry.forget(collection_name)
         logger.error(f"Error getting diverse set from '{collection_name}': {e}", exc_info=True)
         return []
 
@@ -0,0 +1,69 @@
+"""
+BM25-style sparse vectors for hybrid (dense + lexical) search.
+
+Dense embeddings capture what a thread is about but blur exact tokens: names,
+order and invoice numbers, email addresses. Each indexed thread therefore also
+gets a sparse vector of its terms, stored in the collection as the named sparse
+vector SPARSE_VECTOR_NAME. Documents carry BM25 term-frequency weights computed
+here; the collection's IDF modifier lets Qdrant apply the inverse document
+frequency at query time, so no corpus statistics have to be kept locally.
+Query vectors weigh every distinct term 1.
+"""
+
+import re
+import zlib
+from collections import Counter
+from typing import List
+
+from qdrant_client import models
+
+SPARSE_VECTOR_NAME = "bm25"
+
+# BM25 parameters. Document lengths are normalised against a fixed average,
+# since the real average per collection is not known at index time.
+BM25_K1 = 1.2
+BM25_B = 0.75
+BM25_AVG_DOC_LENGTH = 256.0
+
+# Email addresses are kept whole (and also split into their parts below), so an
+# exact address matches more strongly than its pieces.
+_EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_WORD_PATTERN = re.compile(r"\w+")
+_MAX_TOKEN_LENGTH = 64
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word and email-address tokens of `text`."""
+    text = (text or "").lower()
+    tokens = _EMAIL_PATTERN.findall(text)
+    tokens.extend(_WORD_PATTERN.findall(text))
+    return [token for token in tokens if len(token) <= _MAX_TOKEN_LENGTH]
+
+
+def _term_index(token: str) -> int:
+    # Qdrant sparse indices are uint32; CRC32 is stable across processes and releases.
+    return zlib.crc32(token.encode("utf-8"))
+
+
+def _to_sparse_vector(weights: dict) -> models.SparseVector:
+    merged: Counter = Counter()
+    for token, weight in weights.items():
+        # Hash collisions are rare; when they happen, the terms share one weight.
+        merged[_term_index(token)] += weight
+    indices = sorted(merged)
+    return models.SparseVector(indices=indices, values=[float(merged[index]) for index in indices])
+
+
+def document_sparse_vector(text: str) -> models.SparseVector:
+    """BM25 term-frequency weights of a document; IDF is applied by Qdrant."""
+    counts = Counter(tokenize(text))
+    length_norm = 1 - BM25_B + BM25_B * sum(counts.values()) / BM25_AVG_DOC_LENGTH
+    return _to_sparse_vector({
+        token: tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+        for token, tf in counts.items()
+    })
+
+
+def query_sparse_vector(text: str) -> models.SparseVector:
+    """Weight 1 for every distinct query term."""
+    return _to_sparse_vector({token: 1.0 for token in set(tokenize(text))})
@@ -0,0 +1,81 @@
+import importlib
+import os
+import sys
+from types import ModuleType, SimpleNamespace
+from unittest.mock import MagicMock, patch
+from uuid import uuid4
+
+import pytest
+from qdrant_client import models
+
+# Add the project root to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..')))
+
+# Some test modules replace the Qdrant module with a MagicMock at import time; load the real one.
+if not isinstance(sys.modules.get('shared.qdrant.qdrant_client'), (ModuleType, type(None))):
+    del sys.modules['shared.qdrant.qdrant_client']
+qc = importlib.import_module('shared.qdrant.qdrant_client')
+
+from shared.qdrant.collection_profiles import PROFILES, get_collection_profile
+
+_spec = importlib.util.spec_from_file_location(
+    'migrate_qdrant', os.path.join(os.path.dirname(__file__), '..', '..', '..', '..', 'scripts', 'migrate_qdrant.py')
+)
+migrate_qdrant = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(migrate_qdrant)
+
+
+def test_profiles_build_the_expected_configs():
+    full = PROFILES['full_precision']
+    assert full.quantization_config() is None
+    assert full.hnsw_config() is None
+    assert full.search_params() is None
+    assert full.vectors_config(1024).on_disk is False
+
+    on_disk = PROFILES['quantized_on_disk']
+    assert on_disk.vectors_config(1024).on_disk is True
+    assert on_disk.quantization_config().scalar.type == models.ScalarType.INT8
+    assert on_disk.quantization_config().scalar.always_ram is True
+    assert on_disk.search_params().quantization.rescore is True
+    assert on_disk.hnsw_config().m == 12
+
+    with pytest.raises(ValueError):
+        get_collection_profile('nope')
+
+
+def test_new_collections_are_created_with_the_configured_profile():
+    qc.invalidate_collection_cache()
+    client = MagicMock()
+    client.get_collection.side_effect = Exception("Collection not found")
+    client.search.return_value = []
+    with patch.object(qc, 'get_qdrant_client', return_value=client), \
+         patch.object(qc.embedding_service, 'get_current_model_vector_size', return_value=1024), \
+         patch.object(qc.settings, 'QDRANT_COLLECTION_PROFILE', 'quantized_on_disk'):
+        qc.search_by_vector([0.1] * 1024, uuid4())
+
+    create_kwargs = client.create_collection.call_args.kwargs
+    assert create_kwargs['vectors_config'].on_disk is True
+    assert create_kwargs['quantization_config'] == PROFILES['quantized_on_disk'].quantization_config()
+    assert client.search.call_args.kwargs['search_params'].quantization.rescore is True
+
+
+def test_apply_profile_only_updates_collections_that_differ():
+    def info(on_disk, m, quantized):
+        return SimpleNamespace(config=SimpleNamespace(
+            params=SimpleNamespace(vectors=SimpleNamespace(size=1024, on_disk=on_disk)),
+            hnsw_config=SimpleNamespace(m=m, ef_construct=128),
+            quantization_config=object() if quantized else None,
+        ))
+
+    client = MagicMock()
+    client.get_collections.return_value = SimpleNamespace(collections=[SimpleNamespace(name='user-a'), SimpleNamespace(name='user-b')])
+    client.get_collection.side_effect = lambda collection_name: {
+        'user-a': info(on_disk=None, m=16, quantized=False),
+        'user-b': info(on_disk=True, m=12, quantized=True),
+    }[collection_name]
+
+    changed = migrate_qdrant.migrate_apply_profile(client, PROFILES['quantized_on_disk'])
+
+    assert changed == 1
+    client.update_collection.assert_called_once()
+    assert client.update_collection.call_args.kwargs['collection_name'] == 'user-a'
@@ -0,0 +1,89 @@
+import importlib
+import os
+import sys
+from types import ModuleType, SimpleNamespace
+from unittest.mock import MagicMock, patch
+from uuid import uuid4
+
+# Add the project root to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..')))
+
+# Some test modules replace the Qdrant module with a MagicMock at import time; load the real one.
+if not isinstance(sys.modules.get('shared.qdrant.qdrant_client'), (ModuleType, type(None))):
+    del sys.modules['shared.qdrant.qdrant_client']
+qc = importlib.import_module('shared.qdrant.qdrant_client')
+
+
+def _collection_info(size):
+    return SimpleNamespace(config=SimpleNamespace(params=SimpleNamespace(vectors=SimpleNamespace(size=size))))
+
+
+def _fake_client(size=1024):
+    client = MagicMock()
+    client.get_collection.return_value = _collection_info(size)
+    client.search.return_value = []
+    return client
+
+
+def test_known_collection_skips_model_lookup_and_get_collection():
+    qc.invalidate_collection_cache()
+    client = _fake_client()
+    user_uuid = uuid4()
+    with patch.object(qc, 'get_qdrant_client', return_value=client), \
+         patch.object(qc, 'get_embedding', return_value=[0.1] * 1024), \
+         patch.object(qc.embedding_service, 'get_current_model_vector_size', return_value=1024) as vector_size:
+        for _ in range(3):
+            qc.semantic_search('hello', user_uuid)
+            qc.search_by_vector([0.1] * 1024, user_uuid)
+
+    assert vector_size.call_count == 1
+    assert client.get_collection.call_count == 1
+    assert client.search.call_count == 6
+
+
+def test_recreate_and_failures_invalidate_the_registry():
+    qc.invalidate_collection_cache()
+    client = _fake_client()
+    user_uuid = uuid4()
+    collection_name = qc._get_user_collection_name(user_uuid)
+    with patch.object(qc, 'get_qdrant_client', return_value=client), \
+         patch.object(qc.embedding_service, 'get_current_model_vector_size', return_value=1024):
+        qc.search_by_vector([0.1] * 1024, user_uuid)
+        assert qc._collection_registry.get(collection_name) == 1024
+
+        # A new embedding model recreates the collection with another vector size.
+        client.get_collection.side_effect = Exception("Collection not found")
+        with patch.object(qc.embedding_service, 'get_current_model_vector_size', return_value=1536), \
+             patch.object(qc, 'get_thread_content_store'):
+            qc.recreate_collection(user_uuid)
+        assert qc._collection_registry.get(collection_name) == 1536
+
+        client.search.side_effect = Exception("boom")
+        try:
+            qc.search_by_vector([0.1] * 1536, user_uuid)
+        except Exception:
+            pass
+    assert qc._collection_registry.get(collection_name) is None
+
+
+def test_language_distribution_uses_a_facet_query():
+    qc.invalidate_collection_cache()
+    client = _fake_client()
+    client.facet.return_value = SimpleNamespace(hits=[SimpleNamespace(value='en', count=12), SimpleNamespace(value='nl', count=3)])
+    with patch.object(qc, 'get_qdrant_client', return_value=client), \
+         patch.object(qc.embedding_service, 'get_current_model_vector_size', return_value=1024):
+        assert qc.get_payload_field_distribution('language', uuid4()) == {'en': 12, 'nl': 3}
+    client.scroll.assert_not_called()
+    # The existing collection had no payload indexes yet, so they were added on first use.
+    indexed = {call.kwargs['field_name'] for call in client.create_payload_index.call_args_list}
+    assert indexed == set(qc.PAYLOAD_INDEXES)
+
+
+def test_distribution_falls_back_to_scroll_when_facet_fails():
+    qc.invalidate_collection_cache()
+    client = _fake_client()
+    client.facet.side_effect = Exception("facet not supported")
+    client.scroll.return_value = ([SimpleNamespace(payload={'language': 'en'}), SimpleNamespace(payload={'language': 'de'})], None)
+    with patch.object(qc, 'get_qdrant_client', return_value=client), \
+         patch.object(qc.embedding_service, 'get_current_model_vector_size', return_value=1024):
+        assert qc.get_payload_field_distribution('language', uuid4()) == {'en': 1, 'de': 1}
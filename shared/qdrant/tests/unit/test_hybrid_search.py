@@ -0,0 +1,99 @@
+import importlib
+import os
+import sys
+from types import ModuleType
+from unittest.mock import patch
+from uuid import uuid4
+
+from qdrant_client import QdrantClient, models
+
+# Add the project root to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..')))
+
+# Some test modules replace the Qdrant module with a MagicMock at import time; load the real one.
+if not isinstance(sys.modules.get('shared.qdrant.qdrant_client'), (ModuleType, type(None))):
+    del sys.modules['shared.qdrant.qdrant_client']
+qc = importlib.import_module('shared.qdrant.qdrant_client')
+
+from shared.qdrant.sparse_vectors import SPARSE_VECTOR_NAME, document_sparse_vector, query_sparse_vector, tokenize
+
+THREADS = {
+    "t-order": "Order 48213-B shipped. Questions? Mail jan.devries@example.com",
+    "t-budget": "Can we move the budget meeting to Thursday?",
+    "t-invoice": "Invoice for the order of last month attached.",
+}
+# The thread that names the identifiers is the dense search's worst match.
+DENSE_VECTORS = {
+    "t-budget": [1.0, 0.0, 0.0, 0.0],
+    "t-invoice": [0.9, 0.1, 0.0, 0.0],
+    "t-order": [0.6, 0.4, 0.0, 0.0],
+}
+
+
+def _points():
+    return [
+        models.PointStruct(
+            id=qc.generate_qdrant_point_id(thread_id),
+            vector={"": DENSE_VECTORS[thread_id], SPARSE_VECTOR_NAME: document_sparse_vector(text)},
+            payload={"thread_id": thread_id},
+        )
+        for thread_id, text in THREADS.items()
+    ]
+
+
+def test_tokens_keep_email_addresses_and_identifiers():
+    tokens = tokenize("Mail Jan.deVries@Example.com about order 48213-B")
+    assert "jan.devries@example.com" in tokens
+    assert {"48213", "b", "order"} <= set(tokens)
+    assert query_sparse_vector("order order").values == [1.0]
+    assert not query_sparse_vector("").indices
+
+
+def test_exact_identifiers_rank_first_with_hybrid_search():
+    client = QdrantClient(':memory:')
+    user_uuid = uuid4()
+    qc.invalidate_collection_cache()
+    with patch.object(qc, 'get_qdrant_client', return_value=client), \
+         patch.object(qc.embedding_service, 'get_current_model_vector_size', return_value=4):
+        qc.upsert_points(_points(), user_uuid)
+        hits = qc.search_by_vector(
+            [1.0, 0.0, 0.0, 0.0], user_uuid, top_k=3, query_text="48213-B jan.devries@example.com", with_vectors=True
+        )
+    qc.invalidate_collection_cache()
+
+    assert hits[0]["thread_id"] == "t-order"
+    # The dense vectors come back for local reranking; the sparse one is not needed.
+    assert all(len(hit["vector"]) == 4 for hit in hits)
+
+
+def test_collections_without_the_sparse_vector_get_dense_points():
+    client = QdrantClient(':memory:')
+    user_uuid = uuid4()
+    client.create_collection(
+        qc._get_user_collection_name(user_uuid),
+        vectors_config=models.VectorParams(size=4, distance=models.Distance.COSINE),
+    )
+    qc.invalidate_collection_cache()
+    with patch.object(qc, 'get_qdrant_client', return_value=client), \
+         patch.object(qc.embedding_service, 'get_current_model_vector_size', return_value=4):
+        qc.upsert_points(_points(), user_uuid)
+        assert qc.count_points(user_uuid) == 3
+        assert not qc._use_hybrid(qc._get_user_collection_name(user_uuid), "order")
+    qc.invalidate_collection_cache()
+
+
+def test_similar_threads_by_stored_vectors_exclude_the_source():
+    client = QdrantClient(':memory:')
+    user_uuid = uuid4()
+    qc.invalidate_collection_cache()
+    with patch.object(qc, 'get_qdrant_client', return_value=client), \
+         patch.object(qc.embedding_service, 'get_current_model_vector_size', return_value=4):
+        qc.upsert_points(_points(), user_uuid)
+        found = qc.find_similar_to_thread("t-invoice", user_uuid, top_k=5, with_vectors=True)
+        missing = qc.find_similar_to_thread("t-unknown", user_uuid)
+    qc.invalidate_collection_cache()
+
+    assert found["source"]["thread_id"] == "t-invoice"
+    assert found["source"]["vector"] is not None
+    assert {hit["thread_id"] for hit in found["hits"]} == {"t-order", "t-budget"}
+    assert missing is None
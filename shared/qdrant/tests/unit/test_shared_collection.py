@@ -0,0 +1,92 @@
+import importlib
+import os
+import sys
+from types import ModuleType
+from unittest.mock import patch
+from uuid import uuid4
+
+from qdrant_client import QdrantClient, models
+
+# Add the project root to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..')))
+
+# Some test modules replace the Qdrant module with a MagicMock at import time; load the real one.
+if not isinstance(sys.modules.get('shared.qdrant.qdrant_client'), (ModuleType, type(None))):
+    del sys.modules['shared.qdrant.qdrant_client']
+qc = importlib.import_module('shared.qdrant.qdrant_client')
+
+_spec = importlib.util.spec_from_file_location(
+    'migrate_qdrant', os.path.join(os.path.dirname(__file__), '..', '..', '..', '..', 'scripts', 'migrate_qdrant.py')
+)
+migrate_qdrant = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(migrate_qdrant)
+
+VECTOR_SIZE = 4
+
+
+def _point(thread_id, vector):
+    return models.PointStruct(
+        id=qc.generate_qdrant_point_id(thread_id),
+        vector=vector,
+        payload={"thread_id": thread_id, "language": "en", "content_key": qc.generate_qdrant_point_id(thread_id)},
+    )
+
+
+def _shared_mode(client):
+    qc.invalidate_collection_cache()
+    return [
+        patch.object(qc, 'get_qdrant_client', return_value=client),
+        patch.object(qc.embedding_service, 'get_current_model_vector_size', return_value=VECTOR_SIZE),
+        patch.object(qc.settings, 'QDRANT_STORAGE_MODE', 'shared'),
+        patch.object(qc, 'get_thread_content_store'),
+    ]
+
+
+def test_users_share_one_collection_without_seeing_each_other():
+    client = QdrantClient(':memory:')
+    alice, bob = uuid4(), uuid4()
+    patches = _shared_mode(client)
+    for p in patches:
+        p.start()
+    try:
+        # The same thread id in two mailboxes must not collide.
+        qc.upsert_points([_point("t1", [1, 0, 0, 0]), _point("t2", [0, 1, 0, 0])], alice)
+        qc.upsert_points([_point("t1", [0, 0, 1, 0])], bob)
+
+        assert [c.name for c in client.get_collections().collections] == [qc.settings.QDRANT_SHARED_COLLECTION_NAME]
+        assert qc.count_points(alice) == 2
+        assert qc.count_points(bob) == 1
+        assert qc.get_payload_field_distribution("thread_id", bob) == {"t1": 1}
+
+        assert qc.set_thread_payloads({"t1": {"language": "nl"}}, bob) == 1
+        assert qc.get_payload_field_distribution("language", alice) == {"en": 2}
+
+        qc.recreate_collection(alice)
+        assert qc.count_points(alice) == 0
+        assert qc.count_points(bob) == 1
+    finally:
+        for p in reversed(patches):
+            p.stop()
+        qc.invalidate_collection_cache()
+
+
+def test_copy_to_shared_tags_points_with_their_owner():
+    client = QdrantClient(':memory:')
+    user_uuid = uuid4()
+    user_collection = qc._get_user_collection_name(user_uuid)
+    client.create_collection(user_collection, vectors_config=models.VectorParams(size=VECTOR_SIZE, distance=models.Distance.COSINE))
+    client.upsert(user_collection, points=[_point("t1", [1, 0, 0, 0]), _point("t2", [0, 1, 0, 0])])
+
+    qc.invalidate_collection_cache()
+    try:
+        assert migrate_qdrant.migrate_copy_to_shared(client) == 2
+        shared = qc.settings.QDRANT_SHARED_COLLECTION_NAME
+        points, _ = client.scroll(shared, limit=10, with_payload=True)
+        assert {point.payload[qc.TENANT_FIELD] for point in points} == {str(user_uuid)}
+        assert {str(point.id) for point in points} == {
+            qc.tenant_point_id(user_uuid, qc.generate_qdrant_point_id(thread_id)) for thread_id in ("t1", "t2")
+        }
+        # The per-user collection is left in place.
+        assert client.count(user_collection).count == 2
+    finally:
+        qc.invalidate_collection_cache()
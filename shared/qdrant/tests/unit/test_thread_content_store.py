@@ -0,0 +1,92 @@
+import importlib
+import importlib.util
+import os
+import sys
+import tempfile
+from types import ModuleType
+from unittest.mock import patch
+from uuid import uuid4
+
+from qdrant_client import QdrantClient, models
+
+# Add the project root to the path
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from shared.qdrant.thread_content_store import PREVIEW_CHARS, ThreadContentStore
+
+# Some test modules replace the Qdrant module with a MagicMock at import time; load the real one.
+if not isinstance(sys.modules.get('shared.qdrant.qdrant_client'), (ModuleType, type(None))):
+    del sys.modules['shared.qdrant.qdrant_client']
+qc = importlib.import_module('shared.qdrant.qdrant_client')
+
+
+def _load_migration_script():
+    spec = importlib.util.spec_from_file_location('migrate_qdrant', os.path.join(PROJECT_ROOT, 'scripts', 'migrate_qdrant.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_store_roundtrip_and_previews():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = ThreadContentStore(uuid4(), db_path=os.path.join(tmpdir, 'content.sqlite3'))
+        long_markdown = 'x' * (PREVIEW_CHARS + 100)
+        store.put_many({'k1': {'thread_id': 't1', 'thread_markdown': long_markdown, 'messages': [{'body_cleaned': 'hi'}]}})
+
+        assert store.get_previews(['k1', 'missing']) == {'k1': long_markdown[:PREVIEW_CHARS]}
+        assert store.get_contents(['k1'])['k1'] == {'thread_markdown': long_markdown, 'messages': [{'body_cleaned': 'hi'}]}
+        store.clear()
+        assert store.keys() == []
+
+
+def test_migration_moves_bodies_out_of_payloads_and_lookups_stay_local():
+    user_uuid = uuid4()
+    client = QdrantClient(':memory:')
+    collection_name = qc._get_user_collection_name(user_uuid)
+    client.create_collection(collection_name, vectors_config=models.VectorParams(size=4, distance=models.Distance.COSINE))
+    legacy_points = [
+        models.PointStruct(
+            id=qc.generate_qdrant_point_id(f'thread-{i}'),
+            vector=[1.0, float(i), 0.0, 0.5],
+            payload={'thread_id': f'thread-{i}', 'thread_markdown': f'# Thread {i}', 'messages': [{'body_cleaned': f'body {i}'}], 'language': 'en'},
+        )
+        for i in range(5)
+    ]
+    client.upsert(collection_name, points=legacy_points)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = ThreadContentStore(user_uuid, db_path=os.path.join(tmpdir, 'content.sqlite3'))
+        migration = _load_migration_script()
+        with patch.object(migration, 'get_thread_content_store', return_value=store), \
+             patch.object(qc, 'get_thread_content_store', return_value=store), \
+             patch.object(qc, 'get_qdrant_client', return_value=client):
+            assert migration.migrate_externalize_content(client, dry_run=True) == 5
+            assert migration.migrate_externalize_content(client, batch_size=2) == 5
+            assert migration.migrate_externalize_content(client) == 0
+
+            points, _ = client.scroll(collection_name, limit=10, with_payload=True)
+            assert all('thread_markdown' not in p.payload and 'messages' not in p.payload for p in points)
+            assert all(p.payload['content_key'] == str(p.id) for p in points)
+
+            hits = [{'thread_id': 'thread-3'}, {'thread_id': 'thread-1'}]
+            assert qc.get_thread_previews(user_uuid, hits) == ['# Thread 3', '# Thread 1']
+            assert qc.get_thread_contents(user_uuid, hits)[1]['messages'] == [{'body_cleaned': 'body 1'}]
+
+
+def test_unmigrated_points_are_read_from_qdrant_and_copied_to_the_store():
+    user_uuid = uuid4()
+    client = QdrantClient(':memory:')
+    collection_name = qc._get_user_collection_name(user_uuid)
+    client.create_collection(collection_name, vectors_config=models.VectorParams(size=4, distance=models.Distance.COSINE))
+    client.upsert(collection_name, points=[models.PointStruct(
+        id=qc.generate_qdrant_point_id('legacy'), vector=[1.0, 0.0, 0.0, 0.0],
+        payload={'thread_id': 'legacy', 'thread_markdown': '# Legacy', 'messages': []},
+    )])
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = ThreadContentStore(user_uuid, db_path=os.path.join(tmpdir, 'content.sqlite3'))
+        with patch.object(qc, 'get_thread_content_store', return_value=store), \
+             patch.object(qc, 'get_qdrant_client', return_value=client):
+            assert qc.get_thread_contents(user_uuid, [{'thread_id': 'legacy'}])[0]['thread_markdown'] == '# Legacy'
+        assert store.keys() == [qc.generate_qdrant_point_id('legacy')]
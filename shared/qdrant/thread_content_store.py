@@ -0,0 +1,128 @@
+"""
+Local, compressed store of the email thread bodies behind the vector index.
+
+Qdrant points carry only the metadata that searches filter on or display
+(thread id, subject, language, participants, dates, ...) and a `content_key`.
+The thread markdown and the cleaned message bodies live here instead, compressed
+in one SQLite file per user, and are read only for the hits a caller uses. Each
+thread also keeps a separately compressed preview (the first PREVIEW_CHARS of its
+markdown) for rerankers, so full threads are only decompressed for final results.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from uuid import UUID
+
+from shared.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Rerankers only look at the start of a thread.
+PREVIEW_CHARS = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    content_key TEXT PRIMARY KEY,
+    thread_id TEXT,
+    preview BLOB NOT NULL,
+    content BLOB NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+# SQLite caps the number of bound parameters per statement.
+_LOOKUP_CHUNK_SIZE = 500
+
+
+def _compress(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, default=str).encode("utf-8"), 6)
+
+
+def _decompress(blob: bytes) -> Any:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class ThreadContentStore:
+    """Thread bodies of one user. Connections are opened per operation, so instances can be shared across threads."""
+
+    def __init__(self, user_uuid: UUID, db_path: Optional[str] = None):
+        self.user_uuid = user_uuid
+        self.db_path = db_path or os.path.join(settings.THREAD_CONTENT_STORE_DIR, f"{user_uuid}.sqlite3")
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Opens a connection for one operation and commits it as a single transaction."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def put_many(self, contents: Dict[str, Dict[str, Any]]) -> None:
+        """Stores `{content_key: {"thread_id", "thread_markdown", "messages"}}`, replacing existing entries."""
+        if not contents:
+            return
+        now = time.time()
+        rows = [
+            (
+                content_key,
+                content.get("thread_id"),
+                _compress((content.get("thread_markdown") or "")[:PREVIEW_CHARS]),
+                _compress({"thread_markdown": content.get("thread_markdown") or "", "messages": content.get("messages") or []}),
+                now,
+            )
+            for content_key, content in contents.items()
+        ]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO threads (content_key, thread_id, preview, content, updated_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def _select(self, column: str, content_keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(dict.fromkeys(content_keys))
+        found: Dict[str, Any] = {}
+        with self._connect() as conn:
+            for start in range(0, len(keys), _LOOKUP_CHUNK_SIZE):
+                chunk = keys[start:start + _LOOKUP_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                for key, blob in conn.execute(f"SELECT content_key, {column} FROM threads WHERE content_key IN ({placeholders})", chunk):
+                    found[key] = _decompress(blob)
+        return found
+
+    def get_previews(self, content_keys: Iterable[str]) -> Dict[str, str]:
+        """Returns the markdown preview of each stored key; missing keys are left out."""
+        return self._select("preview", content_keys)
+
+    def get_contents(self, content_keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Returns `{"thread_markdown", "messages"}` of each stored key; missing keys are left out."""
+        return self._select("content", content_keys)
+
+    def keys(self) -> List[str]:
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute("SELECT content_key FROM threads")]
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM threads")
+        logger.info(f"Cleared thread content store of user {self.user_uuid}.")
+
+
+def get_thread_content_store(user_uuid: UUID) -> ThreadContentStore:
+    return ThreadContentStore(user_uuid)
@@ -60,6 +60,16 @@ class RedisKeys:
     def get_tone_of_voice_status_key(user_uuid: UUID) -> str:
         return f"user:{user_uuid}:tone_of_voice_status"
 
+    # --- Draft Signature (User-Specific) ---
+    @staticmethod
+    def get_signature_profile_key(user_uuid: UUID) -> str:
+        return f"user:{user_uuid}:imap:signature_profile"
+
+    # --- Mailbox Change Tracking (User-Specific) ---
+    @staticmethod
+    def get_imap_folder_sync_state_key(user_uuid: UUID, folder: str) -> str:
+        return f"user:{user_uuid}:imap:sync_state:{folder}"
+
     # --- Export Jobs (User-Specific) ---
     @staticmethod
     def get_export_status_key(user_uuid: UUID, job_id: str) -> str:
@@ -76,3 +86,32 @@ class RedisKeys:
     @staticmethod
     def get_export_progress_key(user_uuid: UUID, job_id: str) -> str:
         return f"user:{user_uuid}:export:{job_id}:progress"
+
+    # --- LLM Response Cache (Global) ---
+    @staticmethod
+    def get_llm_response_cache_key(request_hash: str) -> str:
+        return f"llm_cache:response:{request_hash}"
+
+    @staticmethod
+    def get_llm_response_cache_index_key() -> str:
+        """Sorted set of cached request hashes scored by insertion time, used for size eviction."""
+        return "llm_cache:index"
+
+    # --- Cost Reconciliation (Global) ---
+    COST_RECONCILER_JOBS = "cost_reconciler:jobs" # Hash of generation id -> pending job state
+
+    @staticmethod
+    def get_cost_reconciler_lease_key(generation_id: str) -> str:
+        """Held by the process currently reconciling the generation's cost."""
+        return f"cost_reconciler:lease:{generation_id}"
+
+    # --- Language Detection Cache (Global) ---
+    @staticmethod
+    def get_language_detection_cache_key(sample_hash: str) -> str:
+        return f"language_detection:{sample_hash}"
+
+    # --- Workflow Streaming (User-Specific) ---
+    @staticmethod
+    def get_workflow_instance_events_channel(user_uuid: UUID, instance_uuid: UUID) -> str:
+        """Pub/sub channel carrying streamed step events of a running workflow instance."""
+        return f"user:{user_uuid}:workflow_instance:{instance_uuid}:events"
@@ -0,0 +1,128 @@
+"""
+Language detection of email threads.
+
+langdetect is pure Python and its cost grows with the text it is given, so a thread
+is not detected on its full markdown (headers, quoted replies, signatures) but on a
+sample: the cleaned message bodies, without URLs and email addresses, cut to
+LANGUAGE_DETECTION_SAMPLE_CHARS characters.
+
+- Results are deterministic: langdetect's random trials are seeded with a fixed
+  value, in this process and in every pool worker.
+- Results are cached in Redis under a SHA-256 of the sample, so re-vectorizing an
+  inbox only detects threads whose bodies changed. Without Redis, detection still
+  works, just uncached.
+- Bulk runs of at least LANGUAGE_DETECTION_POOL_MIN_TEXTS uncached samples are
+  spread over a process pool of LANGUAGE_DETECTION_PROCESSES workers.
+"""
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable, List, Optional
+
+from langdetect import DetectorFactory, LangDetectException, detect
+
+from shared.config import settings
+from shared.redis.keys import RedisKeys
+from shared.redis.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_LANGUAGE = "unknown"
+
+# Seeds langdetect's random trials; set on import, so pool workers get it too.
+DETECTOR_SEED = 0
+DetectorFactory.seed = DETECTOR_SEED
+
+_URL_PATTERN = re.compile(r"https?://\S+|www\.\S+")
+_EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+
+
+def language_sample(bodies: Iterable[Optional[str]], max_chars: Optional[int] = None) -> str:
+    """The first `max_chars` characters of the bodies, without URLs and email addresses."""
+    max_chars = max_chars or settings.LANGUAGE_DETECTION_SAMPLE_CHARS
+    parts, length = [], 0
+    for body in bodies:
+        if not body:
+            continue
+        text = " ".join(_EMAIL_PATTERN.sub(" ", _URL_PATTERN.sub(" ", body)).split())
+        if not text:
+            continue
+        parts.append(text[:max_chars - length])
+        length += len(parts[-1]) + 1
+        if length >= max_chars:
+            break
+    return "\n".join(parts)
+
+
+def detect_sample(sample: str) -> str:
+    """Detects the language of one sample, uncached. Runs in pool workers, so it must stay picklable."""
+    if not sample or not sample.strip():
+        return UNKNOWN_LANGUAGE
+    try:
+        return detect(sample)
+    except LangDetectException:
+        return UNKNOWN_LANGUAGE
+
+
+def sample_hash(sample: str) -> str:
+    return hashlib.sha256(sample.encode("utf-8")).hexdigest()
+
+
+def _cached_languages(hashes: List[str]) -> List[Optional[str]]:
+    try:
+        return get_redis_client().mget([RedisKeys.get_language_detection_cache_key(h) for h in hashes])
+    except Exception as e:
+        logger.warning(f"Language detection cache unavailable, detecting without it: {e}")
+        return [None] * len(hashes)
+
+
+def _cache_languages(languages_by_hash: dict) -> None:
+    try:
+        pipe = get_redis_client().pipeline()
+        for h, language in languages_by_hash.items():
+            pipe.set(RedisKeys.get_language_detection_cache_key(h), language, ex=settings.LANGUAGE_DETECTION_CACHE_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Could not cache {len(languages_by_hash)} detected languages: {e}")
+
+
+def _detect_many(samples: List[str], processes: int) -> List[str]:
+    processes = min(processes, os.cpu_count() or 1)
+    if processes <= 1 or len(samples) < settings.LANGUAGE_DETECTION_POOL_MIN_TEXTS:
+        return [detect_sample(sample) for sample in samples]
+    # Spawned workers: the caller may be a thread of a running event loop, which must not be forked.
+    try:
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+            return list(pool.map(detect_sample, samples, chunksize=max(1, len(samples) // (processes * 4))))
+    except (BrokenProcessPool, OSError) as e:
+        logger.warning(f"Language detection pool failed, detecting in-process: {e}")
+        return [detect_sample(sample) for sample in samples]
+
+
+def detect_languages(samples: List[str], processes: Optional[int] = None, use_cache: bool = True) -> List[str]:
+    """
+    Languages of `samples` (see `language_sample`), in order. Blocking: call it from a
+    worker thread in async code. `processes` overrides LANGUAGE_DETECTION_PROCESSES.
+    """
+    if not samples:
+        return []
+    processes = settings.LANGUAGE_DETECTION_PROCESSES if processes is None else processes
+    hashes = [sample_hash(sample) for sample in samples]
+    cached = _cached_languages(hashes) if use_cache else [None] * len(samples)
+
+    # Identical samples (e.g. several threads of one newsletter) are detected once.
+    missing = {}
+    for h, sample, language in zip(hashes, samples, cached):
+        if language is None and h not in missing:
+            missing[h] = sample
+    detected = dict(zip(missing, _detect_many(list(missing.values()), processes)))
+    if use_cache and detected:
+        _cache_languages(detected)
+
+    logger.info(f"Languages of {len(samples)} samples: {len(missing)} detected, the rest reused.")
+    return [language if language is not None else detected[h] for h, language in zip(hashes, cached)]
@@ -0,0 +1,387 @@
+import asyncio
+import contextlib
+import importlib.util
+import logging
+import weakref
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from shared.config import settings
+from shared.services.llm_rate_limiter import LLMPriority, LLMRateLimiter, LLMRateLimiterMetrics, parse_retry_after
+from shared.services.llm_response_cache import cache_key, is_cacheable, llm_response_cache
+
+logger = logging.getLogger(__name__)
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+T = TypeVar("T")
+
+
+def _parse_model_limits(raw: str) -> Dict[str, int]:
+    """Parses 'model=limit,model=limit' into a dict, ignoring malformed entries."""
+    limits: Dict[str, int] = {}
+    for item in (raw or "").split(","):
+        model, sep, limit = item.strip().rpartition("=")
+        if not sep or not model:
+            continue
+        try:
+            limits[model.strip()] = max(1, int(limit))
+        except ValueError:
+            logger.warning(f"Ignoring invalid per-model limit '{item}'.")
+    return limits
+
+
+def _rate_limit_retry_after(error: BaseException) -> Optional[float]:
+    """
+    Returns the Retry-After delay of a 429 error (0.0 when the header is absent),
+    or None if the error is not a rate limit.
+    """
+    response = None
+    if isinstance(error, openai.APIStatusError):
+        response = error.response
+    elif isinstance(error, httpx.HTTPStatusError):
+        response = error.response
+    if response is None or response.status_code != 429:
+        return None
+    retry_after = parse_retry_after(response.headers.get("retry-after"))
+    return retry_after if retry_after is not None else 0.0
+
+
+# Receives streaming events: {"type": "token", "content": ...} or
+# {"type": "tool_call_delta", "index": ..., "id": ..., "name": ..., "arguments": ...}
+DeltaCallback = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class ChatCompletionStreamAccumulator:
+    """Folds streamed chunks back into a regular ChatCompletion."""
+
+    def __init__(self, model: str):
+        self.id: Optional[str] = None
+        self.model = model
+        self.created = 0
+        self.content_parts: List[str] = []
+        self.tool_calls: Dict[int, Dict[str, Any]] = {}
+        self.finish_reason: Optional[str] = None
+        self.usage: Optional[Dict[str, Any]] = None
+
+    def add(self, chunk: ChatCompletionChunk) -> List[Dict[str, Any]]:
+        """Adds a chunk and returns the delta events it contains."""
+        events: List[Dict[str, Any]] = []
+        self.id = self.id or chunk.id
+        self.created = self.created or chunk.created
+        if chunk.usage:
+            self.usage = chunk.usage.model_dump()
+        if not chunk.choices:
+            return events
+
+        choice = chunk.choices[0]
+        if choice.finish_reason:
+            self.finish_reason = choice.finish_reason
+        delta = choice.delta
+        if delta.content:
+            self.content_parts.append(delta.content)
+            events.append({"type": "token", "content": delta.content})
+        for tool_call_delta in delta.tool_calls or []:
+            tool_call = self.tool_calls.setdefault(
+                tool_call_delta.index,
+                {"id": None, "type": "function", "function": {"name": "", "arguments": ""}},
+            )
+            function = tool_call_delta.function
+            if tool_call_delta.id:
+                tool_call["id"] = tool_call_delta.id
+            if function and function.name:
+                tool_call["function"]["name"] += function.name
+            if function and function.arguments:
+                tool_call["function"]["arguments"] += function.arguments
+            events.append({
+                "type": "tool_call_delta",
+                "index": tool_call_delta.index,
+                "id": tool_call_delta.id,
+                "name": function.name if function else None,
+                "arguments": function.arguments if function else None,
+            })
+        return events
+
+    def to_completion(self) -> ChatCompletion:
+        message: Dict[str, Any] = {
+            "role": "assistant",
+            "content": "".join(self.content_parts) or None,
+        }
+        if self.tool_calls:
+            message["tool_calls"] = [self.tool_calls[index] for index in sorted(self.tool_calls)]
+        return ChatCompletion.model_validate({
+            "id": self.id or "",
+            "object": "chat.completion",
+            "created": self.created,
+            "model": self.model,
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": self.finish_reason or ("tool_calls" if self.tool_calls else "stop"),
+            }],
+            "usage": self.usage,
+        })
+
+
+class _LoopState:
+    """Client and semaphores bound to a single event loop."""
+
+    def __init__(self, client: AsyncOpenAI):
+        self.client = client
+        self.model_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+class LLMGateway:
+    """
+    Process-wide async gateway for OpenAI-compatible chat completions on OpenRouter.
+
+    All LLM traffic of a process shares one HTTP connection pool (keep-alive, and
+    HTTP/2 when the `h2` package is installed), and concurrent requests per model
+    are capped. Requests are also paced by per-model and per-user token buckets and
+    released in priority order (see `llm_rate_limiter`); 429 responses are retried
+    here with adaptive backoff instead of inside the OpenAI client. Clients,
+    semaphores and limiters are created lazily per event loop, since none of them
+    can be shared across loops.
+    """
+
+    def __init__(self):
+        self.http2 = settings.LLM_GATEWAY_HTTP2 and importlib.util.find_spec("h2") is not None
+        self.default_model_limit = max(1, settings.LLM_GATEWAY_MAX_CONCURRENCY_PER_MODEL)
+        self.model_limits = _parse_model_limits(settings.LLM_GATEWAY_MODEL_CONCURRENCY_LIMITS)
+        self.model_rpm_overrides = _parse_model_limits(settings.LLM_RATE_LIMIT_MODEL_RPM_OVERRIDES)
+        self.max_retries = max(0, settings.LLM_RATE_LIMIT_MAX_RETRIES)
+        self.metrics = LLMRateLimiterMetrics()
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+        self._limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, LLMRateLimiter]" = weakref.WeakKeyDictionary()
+
+    def _get_state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            if not settings.OPENROUTER_API_KEY:
+                raise ValueError("OPENROUTER_API_KEY not found in settings.")
+            http_client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_GATEWAY_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_GATEWAY_MAX_KEEPALIVE_CONNECTIONS,
+                ),
+                timeout=httpx.Timeout(120, connect=10),  # Generous timeout for model generation
+            )
+            client = AsyncOpenAI(
+                base_url=OPENROUTER_BASE_URL,
+                api_key=settings.OPENROUTER_API_KEY,
+                http_client=http_client,
+                max_retries=0,  # 429s are retried by the gateway's scheduler
+            )
+            state = _LoopState(client)
+            self._states[loop] = state
+            logger.info(
+                f"LLM gateway client created (http2={self.http2}, "
+                f"max_connections={settings.LLM_GATEWAY_MAX_CONNECTIONS})"
+            )
+        return state
+
+    def get_client(self) -> AsyncOpenAI:
+        """Returns the shared AsyncOpenAI client for the running event loop."""
+        return self._get_state().client
+
+    def get_model_limit(self, model: str) -> int:
+        return self.model_limits.get(model, self.default_model_limit)
+
+    def get_limiter(self) -> LLMRateLimiter:
+        """Returns the rate limiter for the running event loop."""
+        loop = asyncio.get_running_loop()
+        limiter = self._limiters.get(loop)
+        if limiter is None:
+            limiter = LLMRateLimiter(
+                model_rpm=settings.LLM_RATE_LIMIT_MODEL_RPM,
+                model_rpm_overrides=self.model_rpm_overrides,
+                user_rpm=settings.LLM_RATE_LIMIT_USER_RPM,
+                burst_seconds=settings.LLM_RATE_LIMIT_BURST_SECONDS,
+                max_backoff_s=settings.LLM_RATE_LIMIT_MAX_BACKOFF_SECONDS,
+                metrics=self.metrics,
+            )
+            self._limiters[loop] = limiter
+        return limiter
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Queue depths, wait times and rate-limit state of this process."""
+        queue_by_priority: Dict[str, int] = {}
+        queue_by_model: Dict[str, int] = {}
+        models: Dict[str, Any] = {}
+        for limiter in list(self._limiters.values()):
+            depths = limiter.queue_depths()
+            for key, count in depths["by_priority"].items():
+                queue_by_priority[key] = queue_by_priority.get(key, 0) + count
+            for key, count in depths["by_model"].items():
+                queue_by_model[key] = queue_by_model.get(key, 0) + count
+            models.update(limiter.model_states())
+        return {
+            "queue_depth": {"by_priority": queue_by_priority, "by_model": queue_by_model},
+            "models": models,
+            **self.metrics.snapshot(),
+        }
+
+    def _should_retry(self, model: str, error: BaseException, attempt: int) -> bool:
+        """Records a 429 with the limiter and tells whether the request should be retried."""
+        retry_after = _rate_limit_retry_after(error)
+        if retry_after is None:
+            return False
+        self.get_limiter().record_rate_limited(model, retry_after or None)
+        return attempt < self.max_retries
+
+    async def run_rate_limited(
+        self,
+        model: str,
+        call: Callable[[], Awaitable[T]],
+        user_id: Any = None,
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+    ) -> T:
+        """
+        Runs `call` (one request to the provider) under the scheduler: waits for a
+        rate-limit token, holds a model slot, and retries on 429 after backing off.
+        Used for requests that do not go through `chat_completion`.
+        """
+        limiter = self.get_limiter()
+        attempt = 0
+        while True:
+            await limiter.acquire(model, user_id, priority)
+            try:
+                async with self.model_slot(model):
+                    result = await call()
+            except Exception as e:
+                if self._should_retry(model, e, attempt):
+                    attempt += 1
+                    continue
+                raise
+            limiter.record_success(model)
+            return result
+
+    @contextlib.asynccontextmanager
+    async def model_slot(self, model: str):
+        """
+        Async context manager to acquire a per-model concurrency slot.
+        Ensures we do not exceed the configured number of in-flight requests per model.
+        """
+        state = self._get_state()
+        sem = state.model_semaphores.get(model)
+        if sem is None:
+            sem = asyncio.Semaphore(self.get_model_limit(model))
+            state.model_semaphores[model] = sem
+        async with sem:
+            yield
+
+    async def chat_completion(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        on_delta: Optional[DeltaCallback] = None,
+        user_id: Any = None,
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+        cache: bool = False,
+        **kwargs: Any,
+    ) -> ChatCompletion:
+        """
+        Creates a chat completion through the shared client.
+        Extra keyword arguments are passed through to `chat.completions.create`.
+        `user_id` and `priority` select the user's token bucket and scheduling class.
+
+        When `on_delta` is given the completion is streamed: tokens and tool-call
+        deltas are passed to the callback as they arrive, and the assembled
+        completion is returned as usual.
+
+        With `cache`, deterministic requests (see `llm_response_cache`) are answered
+        from the response cache when it is enabled; completions served from the
+        cache carry `cache_hit=True`.
+        """
+        if tools is not None:
+            kwargs["tools"] = tools
+        if on_delta is not None:
+            return await self._streamed_chat_completion(model, messages, on_delta, user_id=user_id, priority=priority, **kwargs)
+
+        key = None
+        if cache and llm_response_cache.enabled and is_cacheable(kwargs.get("temperature"), kwargs):
+            key = cache_key(model, messages, kwargs)
+            cached = await asyncio.to_thread(llm_response_cache.get, key)
+            if cached is not None:
+                logger.info(f"LLM response cache hit for model '{model}' (key {key[:12]})")
+                return ChatCompletion.model_validate({**cached, "cache_hit": True})
+
+        response = await self.run_rate_limited(
+            model,
+            lambda: self.get_client().chat.completions.create(model=model, messages=messages, **kwargs),
+            user_id=user_id,
+            priority=priority,
+        )
+        if key is not None and response.choices and response.choices[0].finish_reason == "stop":
+            await asyncio.to_thread(llm_response_cache.set, key, response.model_dump())
+        return response
+
+    async def stream_chat_completion(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        user_id: Any = None,
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatCompletionChunk]:
+        """
+        Streams a chat completion (server-sent events from OpenRouter) chunk by chunk.
+        The model slot is held until the stream is exhausted or closed. A 429 can only
+        arrive before the first chunk, so it is retried like any other request.
+        """
+        if tools is not None:
+            kwargs["tools"] = tools
+        limiter = self.get_limiter()
+        attempt = 0
+        while True:
+            await limiter.acquire(model, user_id, priority)
+            async with self.model_slot(model):
+                try:
+                    stream = await self.get_client().chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        stream=True,
+                        stream_options={"include_usage": True},
+                        **kwargs,
+                    )
+                except Exception as e:
+                    if self._should_retry(model, e, attempt):
+                        attempt += 1
+                        continue
+                    raise
+                limiter.record_success(model)
+                try:
+                    async for chunk in stream:
+                        yield chunk
+                finally:
+                    await stream.close()
+                return
+
+    async def _streamed_chat_completion(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        on_delta: DeltaCallback,
+        **kwargs: Any,
+    ) -> ChatCompletion:
+        accumulator = ChatCompletionStreamAccumulator(model)
+        async for chunk in self.stream_chat_completion(model, messages, **kwargs):
+            for event in accumulator.add(chunk):
+                try:
+                    await on_delta(event)
+                except Exception as e:
+                    # A slow or broken consumer must not fail the generation itself.
+                    logger.warning(f"Streaming delta callback failed: {e}")
+        return accumulator.to_completion()
+
+
+# Create a singleton instance to be used by other modules
+llm_gateway = LLMGateway()
@@ -0,0 +1,278 @@
+"""
+Priority scheduler with token buckets for LLM requests.
+
+Every request waits for a token from its model's bucket and, when the caller is
+known, from the user's bucket. Waiters are served in priority order: interactive
+work (triggers, workflow steps, agent chat) is released before background and batch
+evaluation traffic for the same model. A 429 from the provider puts the model into
+backoff (Retry-After when given, otherwise exponential) and halves its rate, which
+then recovers additively with each successful request.
+
+Buckets, backoff and metrics are per process: the API and the trigger service each
+pace their own requests, so the configured rates apply to each of them separately.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from enum import IntEnum
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Rate multiplier bounds for adaptive backoff.
+MIN_RATE_FACTOR = 0.1
+RATE_RECOVERY_STEP = 0.1
+BASE_BACKOFF_SECONDS = 1.0
+
+
+class LLMPriority(IntEnum):
+    """Lower values are served first."""
+    INTERACTIVE = 0
+    BACKGROUND = 1
+    BATCH = 2
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a Retry-After header (seconds or HTTP date) into seconds from now."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+class TokenBucket:
+    """Classic token bucket; `rate` is in tokens per second."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def time_until_available(self, now: float) -> float:
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _ModelState:
+    def __init__(self, rpm: int, burst_seconds: float):
+        self.base_rate = rpm / 60.0
+        self.bucket = TokenBucket(self.base_rate, self.base_rate * burst_seconds)
+        self.rate_factor = 1.0
+        self.backoff_until = 0.0
+        self.strikes = 0
+        self.rate_limited = 0
+
+    def time_until_available(self, now: float) -> float:
+        return max(self.backoff_until - now, self.bucket.time_until_available(now))
+
+
+class _Waiter:
+    __slots__ = ("model", "user_key", "priority", "future", "enqueued_at")
+
+    def __init__(self, model: str, user_key: Optional[str], priority: LLMPriority, future: asyncio.Future):
+        self.model = model
+        self.user_key = user_key
+        self.priority = priority
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class LLMRateLimiterMetrics:
+    """Counters shared by all limiters of a process (one limiter exists per event loop)."""
+
+    def __init__(self, window: int = 1000):
+        self.granted: Dict[str, int] = {p.name.lower(): 0 for p in LLMPriority}
+        self.wait_total_s: Dict[str, float] = {p.name.lower(): 0.0 for p in LLMPriority}
+        self.wait_max_s: Dict[str, float] = {p.name.lower(): 0.0 for p in LLMPriority}
+        self.recent_waits: Dict[str, Deque[float]] = {p.name.lower(): deque(maxlen=window) for p in LLMPriority}
+        self.rate_limited: Dict[str, int] = {}
+
+    def record_wait(self, priority: LLMPriority, wait_s: float) -> None:
+        key = priority.name.lower()
+        self.granted[key] += 1
+        self.wait_total_s[key] += wait_s
+        self.wait_max_s[key] = max(self.wait_max_s[key], wait_s)
+        self.recent_waits[key].append(wait_s)
+
+    def snapshot(self) -> Dict[str, Any]:
+        wait_times = {}
+        for key, count in self.granted.items():
+            recent = sorted(self.recent_waits[key])
+            wait_times[key] = {
+                "granted": count,
+                "avg_s": round(self.wait_total_s[key] / count, 4) if count else 0.0,
+                "max_s": round(self.wait_max_s[key], 4),
+                "p95_recent_s": round(recent[int(0.95 * (len(recent) - 1))], 4) if recent else 0.0,
+            }
+        return {"wait_times": wait_times, "rate_limited": dict(self.rate_limited)}
+
+
+class LLMRateLimiter:
+    """Token-bucket scheduler bound to one event loop. See the module docstring."""
+
+    def __init__(
+        self,
+        model_rpm: int,
+        model_rpm_overrides: Dict[str, int],
+        user_rpm: int,
+        burst_seconds: float,
+        max_backoff_s: float,
+        metrics: Optional[LLMRateLimiterMetrics] = None,
+    ):
+        self.model_rpm = model_rpm
+        self.model_rpm_overrides = model_rpm_overrides
+        self.user_rpm = user_rpm
+        self.burst_seconds = burst_seconds
+        self.max_backoff_s = max_backoff_s
+        self.metrics = metrics or LLMRateLimiterMetrics()
+        self._models: Dict[str, _ModelState] = {}
+        self._users: Dict[str, TokenBucket] = {}
+        self._queue: List[Any] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _model(self, model: str) -> _ModelState:
+        state = self._models.get(model)
+        if state is None:
+            state = _ModelState(self.model_rpm_overrides.get(model, self.model_rpm), self.burst_seconds)
+            self._models[model] = state
+        return state
+
+    def _user(self, user_key: Optional[str]) -> Optional[TokenBucket]:
+        if user_key is None or self.user_rpm <= 0:
+            return None
+        bucket = self._users.get(user_key)
+        if bucket is None:
+            rate = self.user_rpm / 60.0
+            bucket = TokenBucket(rate, rate * self.burst_seconds)
+            self._users[user_key] = bucket
+        return bucket
+
+    async def acquire(self, model: str, user_id: Any = None, priority: LLMPriority = LLMPriority.INTERACTIVE) -> float:
+        """Waits until the request may be sent. Returns the time spent waiting, in seconds."""
+        future = asyncio.get_running_loop().create_future()
+        waiter = _Waiter(model, str(user_id) if user_id is not None else None, priority, future)
+        heapq.heappush(self._queue, (int(priority), next(self._sequence), waiter))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Drop the waiter; its tokens were not taken unless the future was already resolved.
+            self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+            heapq.heapify(self._queue)
+            raise
+        wait_s = time.monotonic() - waiter.enqueued_at
+        self.metrics.record_wait(priority, wait_s)
+        return wait_s
+
+    def _dispatch(self) -> None:
+        """Grants tokens to waiters in priority order and re-arms the wake-up timer."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        blocked_models = set()
+        remaining = []
+        next_wake = float("inf")
+        for entry in sorted(self._queue):
+            waiter = entry[2]
+            if waiter.future.done():
+                continue
+            if waiter.model in blocked_models:
+                remaining.append(entry)
+                continue
+            model_state = self._model(waiter.model)
+            wait_s = model_state.time_until_available(now)
+            if wait_s > 0:
+                # Lower-priority waiters for this model must not overtake this one.
+                blocked_models.add(waiter.model)
+                next_wake = min(next_wake, wait_s)
+                remaining.append(entry)
+                continue
+            user_bucket = self._user(waiter.user_key)
+            wait_s = user_bucket.time_until_available(now) if user_bucket else 0.0
+            if wait_s > 0:
+                # A user over their budget only delays their own requests.
+                next_wake = min(next_wake, wait_s)
+                remaining.append(entry)
+                continue
+            model_state.bucket.take(now)
+            if user_bucket:
+                user_bucket.take(now)
+            waiter.future.set_result(None)
+        self._queue = remaining
+        if remaining and next_wake != float("inf"):
+            self._timer = asyncio.get_running_loop().call_later(max(next_wake, 0.001), self._dispatch)
+
+    def record_rate_limited(self, model: str, retry_after_s: Optional[float]) -> float:
+        """Puts the model into backoff after a 429 and halves its rate. Returns the backoff delay."""
+        state = self._model(model)
+        state.strikes += 1
+        state.rate_limited += 1
+        self.metrics.rate_limited[model] = self.metrics.rate_limited.get(model, 0) + 1
+        if retry_after_s is None:
+            retry_after_s = BASE_BACKOFF_SECONDS * 2 ** (state.strikes - 1) * random.uniform(1.0, 1.5)
+        delay = min(self.max_backoff_s, retry_after_s)
+        now = time.monotonic()
+        state.backoff_until = max(state.backoff_until, now + delay)
+        state.rate_factor = max(MIN_RATE_FACTOR, state.rate_factor / 2)
+        state.bucket.rate = state.base_rate * state.rate_factor
+        state.bucket.tokens = min(state.bucket.tokens, 0.0)
+        logger.warning(
+            f"LLM rate limited on model '{model}': backing off {delay:.1f}s, "
+            f"rate now {state.rate_factor:.0%} of {state.base_rate * 60:.0f} rpm"
+        )
+        self._dispatch()
+        return delay
+
+    def record_success(self, model: str) -> None:
+        state = self._model(model)
+        state.strikes = 0
+        if state.rate_factor < 1.0:
+            state.rate_factor = min(1.0, state.rate_factor + RATE_RECOVERY_STEP)
+            state.bucket.rate = state.base_rate * state.rate_factor
+
+    def queue_depths(self) -> Dict[str, Dict[str, int]]:
+        by_priority: Dict[str, int] = {}
+        by_model: Dict[str, int] = {}
+        for _, _, waiter in self._queue:
+            if waiter.future.done():
+                continue
+            by_priority[waiter.priority.name.lower()] = by_priority.get(waiter.priority.name.lower(), 0) + 1
+            by_model[waiter.model] = by_model.get(waiter.model, 0) + 1
+        return {"by_priority": by_priority, "by_model": by_model}
+
+    def model_states(self) -> Dict[str, Dict[str, float]]:
+        now = time.monotonic()
+        return {
+            model: {
+                "rate_factor": round(state.rate_factor, 2),
+                "backoff_remaining_s": round(max(0.0, state.backoff_until - now), 2),
+                "rate_limited": state.rate_limited,
+            }
+            for model, state in self._models.items()
+        }
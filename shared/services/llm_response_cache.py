@@ -0,0 +1,156 @@
+"""
+Opt-in cache for deterministic LLM completions.
+
+A completion is cached under a SHA-256 of the model, the messages and every request
+option that shapes the output (response_format, temperature, max_tokens, top_p,
+seed, ...), and only when the request is deterministic: temperature 0, no tools, no
+streaming and a single choice. Everything else bypasses the cache. Callers that can
+run at temperature 0 ask for it through `deterministic_temperature`, which keeps
+their own temperature while the cache is disabled. Entries are
+kept in Redis or in a local SQLite file, expire after a TTL and are evicted
+oldest-first once the cache holds more than the configured number of entries.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+from shared.config import settings
+from shared.redis.keys import RedisKeys
+from shared.redis.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Request options that make a completion non-reproducible or not a plain completion.
+_BYPASS_OPTIONS = ("tools", "functions", "stream", "logit_bias")
+
+
+# Request options that change the completion, so requests differing in any of them never share an entry.
+_KEY_OPTIONS = (
+    "response_format", "temperature", "max_tokens", "max_completion_tokens", "top_p", "seed",
+    "stop", "frequency_penalty", "presence_penalty",
+)
+
+
+def cache_key(model: str, messages: List[Dict[str, Any]], options: Optional[Dict[str, Any]] = None) -> str:
+    options = options or {}
+    payload = {
+        "model": model,
+        "messages": messages,
+        **{name: options.get(name) for name in _KEY_OPTIONS},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def is_cacheable(temperature: Optional[float], options: Dict[str, Any]) -> bool:
+    """Only temperature-0, single-choice, tool-free completions are reproducible enough to cache."""
+    if temperature is None or float(temperature) != 0.0:
+        return False
+    if any(options.get(name) for name in _BYPASS_OPTIONS):
+        return False
+    return int(options.get("n") or 1) == 1
+
+
+class _RedisBackend:
+    """Entries expire through Redis TTLs; a sorted set of insertion times drives size eviction."""
+
+    def get(self, key: str, ttl_s: int) -> Optional[str]:
+        return get_redis_client().get(RedisKeys.get_llm_response_cache_key(key))
+
+    def set(self, key: str, value: str, ttl_s: int, max_entries: int) -> None:
+        redis_client = get_redis_client()
+        index_key = RedisKeys.get_llm_response_cache_index_key()
+        pipe = redis_client.pipeline()
+        pipe.set(RedisKeys.get_llm_response_cache_key(key), value, ex=ttl_s)
+        pipe.zadd(index_key, {key: time.time()})
+        # Drop index entries whose values have expired
+        pipe.zremrangebyscore(index_key, "-inf", time.time() - ttl_s)
+        pipe.zcard(index_key)
+        size = pipe.execute()[-1]
+        if size > max_entries:
+            evicted = [k for k, _ in redis_client.zpopmin(index_key, size - max_entries)]
+            if evicted:
+                redis_client.delete(*(RedisKeys.get_llm_response_cache_key(k) for k in evicted))
+
+
+class _DiskBackend:
+    """SQLite file; reads refresh `accessed_at` so eviction is least-recently-used."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with sqlite3.connect(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+
+    def get(self, key: str, ttl_s: int) -> Optional[str]:
+        now = time.time()
+        with sqlite3.connect(self.path) as conn:
+            row = conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > ttl_s:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str, ttl_s: int, max_entries: int) -> None:
+        now = time.time()
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)", (key, value, now, now))
+            conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - ttl_s,))
+            size = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            if size > max_entries:
+                conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)",
+                    (size - max_entries,),
+                )
+
+
+class LLMResponseCache:
+    """Synchronous cache facade; callers run it in a thread. Failures are logged and treated as misses."""
+
+    def __init__(self, backend: Optional[str] = None, path: Optional[str] = None):
+        self.enabled = settings.LLM_RESPONSE_CACHE_ENABLED
+        self.ttl_s = settings.LLM_RESPONSE_CACHE_TTL_SECONDS
+        self.max_entries = max(1, settings.LLM_RESPONSE_CACHE_MAX_ENTRIES)
+        self._backend: Any = None
+        self._backend_name = backend or settings.LLM_RESPONSE_CACHE_BACKEND
+        self._path = path or settings.LLM_RESPONSE_CACHE_PATH
+
+    def _get_backend(self):
+        if self._backend is None:
+            self._backend = _DiskBackend(self._path) if self._backend_name == "disk" else _RedisBackend()
+        return self._backend
+
+    def deterministic_temperature(self, temperature: Optional[float]) -> Optional[float]:
+        """
+        Temperature for a call that may be cached: 0 while the cache is enabled, so it can
+        be answered from it; otherwise the caller's own `temperature`, unchanged.
+        """
+        return 0.0 if self.enabled else temperature
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            raw = self._get_backend().get(key, self.ttl_s)
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.warning(f"LLM response cache read failed: {e}")
+            return None
+
+    def set(self, key: str, response: Dict[str, Any]) -> None:
+        try:
+            self._get_backend().set(key, json.dumps(response, default=str), self.ttl_s, self.max_entries)
+        except Exception as e:
+            logger.warning(f"LLM response cache write failed: {e}")
+
+
+llm_response_cache = LLMResponseCache()
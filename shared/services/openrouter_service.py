@@ -1,8 +1,11 @@
 import httpx
 import logging
+import openai
 from shared.config import settings
-from typing import Dict, Any, List
-import asyncio
+from shared.services.llm_gateway import llm_gateway
+from shared.services.llm_rate_limiter import LLMPriority
+from openai.types.chat import ChatCompletion
+from typing import Dict, Any, List, Optional, Tuple
 import json
 
 logger = logging.getLogger(__name__)
@@ -23,7 +26,21 @@ class OpenRouterService:
             timeout=120  # Generous timeout for model generation
         )
 
-    async def get_llm_response(self, messages: List[Dict[str, str]], model: str) -> Dict[str, Any]:
+    async def _post_completion(self, json_payload: Dict[str, Any], user_id: Any, priority: LLMPriority) -> httpx.Response:
+        """Posts a completion request through the gateway's scheduler (pacing and 429 backoff)."""
+        async def _post() -> httpx.Response:
+            response = await self.client.post("/chat/completions", json=json_payload)
+            response.raise_for_status()
+            return response
+        return await llm_gateway.run_rate_limited(json_payload["model"], _post, user_id=user_id, priority=priority)
+
+    async def get_llm_response(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        user_id: Optional[Any] = None,
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+    ) -> Dict[str, Any]:
         """
         Gets a response from a specified LLM on OpenRouter with a given prompt.
         """
@@ -32,8 +49,7 @@ class OpenRouterService:
             "messages": messages
         }
         try:
-            response = await self.client.post("/chat/completions", json=json_payload)
-            response.raise_for_status()
+            response = await self._post_completion(json_payload, user_id, priority)
             return response.json()
         except httpx.HTTPStatusError as e:
             logger.error(f"HTTPStatusError calling OpenRouter: {e}")
@@ -44,64 +60,65 @@ class OpenRouterService:
             logger.error(f"Response body: {response.text}")
             raise
 
-    async def get_json_response(self, system_prompt: str, user_prompt: str, model: str) -> Dict[str, Any]:
+    async def get_json_response(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        model: str,
+        user_id: Optional[Any] = None,
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+        temperature: Optional[float] = None,
+        cache: bool = False,
+    ) -> Dict[str, Any]:
         """
         Gets a structured JSON response from a specified LLM on OpenRouter.
+        With `cache` and temperature 0, repeated requests may be answered from the LLM response cache.
+        """
+        response_json, _ = await self.get_json_completion(system_prompt, user_prompt, model, user_id, priority, temperature, cache)
+        return response_json
+
+    async def get_json_completion(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        model: str,
+        user_id: Optional[Any] = None,
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+        temperature: Optional[float] = None,
+        cache: bool = False,
+    ) -> Tuple[Dict[str, Any], ChatCompletion]:
+        """
+        Like `get_json_response`, but also returns the completion, for its usage and
+        whether it was served from the response cache (`cache_hit`).
         """
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt},
         ]
-        json_payload = {
-            "model": model,
-            "messages": messages,
-            "response_format": {"type": "json_object"},
-        }
+        options: Dict[str, Any] = {"response_format": {"type": "json_object"}}
+        if temperature is not None:
+            options["temperature"] = temperature
         try:
-            response = await self.client.post("/chat/completions", json=json_payload)
-            response.raise_for_status()
-            data = response.json()
+            response = await llm_gateway.chat_completion(
+                model=model,
+                messages=messages,
+                user_id=user_id,
+                priority=priority,
+                cache=cache,
+                **options,
+            )
             # The actual JSON content is in the 'content' field of the first choice's message
-            json_content = data.get("choices", [{}])[0].get("message", {}).get("content", "{}")
-            return json.loads(json_content)
-        except httpx.HTTPStatusError as e:
-            logger.error(f"HTTPStatusError calling OpenRouter for JSON response: {e}")
-            logger.error(f"Request body: {json.dumps(json_payload, indent=2)}")
+            json_content = response.choices[0].message.content or "{}"
+            return json.loads(json_content), response
+        except openai.APIStatusError as e:
+            logger.error(f"APIStatusError calling OpenRouter for JSON response: {e}")
+            logger.error(f"Request messages: {json.dumps(messages, indent=2)}")
             logger.error(f"Response body: {e.response.text}")
             raise
         except (KeyError, IndexError, json.JSONDecodeError) as e:
             logger.error(f"Error parsing JSON from OpenRouter response: {e}")
-            if 'response' in locals() and hasattr(response, 'text'):
-                 logger.error(f"Response body: {response.text}")
-            raise
-
-    async def get_generation_cost(self, generation_id: str) -> float:
-        """
-        Retrieves the cost of a specific generation from OpenRouter.
-        """
-        try:
-            # Add a small delay to allow for the generation stats to be processed.
-            await asyncio.sleep(2)
-
-            response = await self.client.get(f"/generation?id={generation_id}")
-            response.raise_for_status()
-            data = response.json()
-            
-            logger.info(f"Received cost data for generation {generation_id}: {json.dumps(data)}")
-
-            # The cost is nested inside the 'data' object.
-            generation_data = data.get("data", {})
-            return generation_data.get("total_cost", 0.0)
-            
-        except httpx.HTTPStatusError as e:
-            logger.error(f"HTTPStatusError getting generation cost for id {generation_id}: {e}")
-            logger.error(f"Response: {e.response.text}")
-            raise
-        except (KeyError, IndexError, json.JSONDecodeError) as e:
-            logger.error(f"Error parsing generation cost response for id {generation_id}: {e}")
-            # Use 'response' in a conditional check as it may not be defined if the request fails early
-            if 'response' in locals() and hasattr(response, 'text'):
-                logger.error(f"Response body: {response.text}")
+            if 'response' in locals():
+                 logger.error(f"Response: {response}")
             raise
 
 # Create a singleton instance to be used by other modules
@@ -0,0 +1,175 @@
+"""
+Two-stage reranking of vector search candidates.
+
+The local stage needs no provider round trip. It scores each candidate on
+- semantic similarity: cosine between the query vector and the candidate's dense
+  vector as returned by Qdrant (`with_vectors=True`),
+- lexical overlap: the IDF-weighted share of query terms the candidate contains,
+  with IDF taken over the candidate set (so terms every candidate shares count
+  little and rare identifiers count a lot),
+- recency: exponential decay on the candidate's last message date,
+combined with fixed weights. The components are used as is rather than normalised
+over the candidates: candidates come out of a similarity search, so their cosines
+sit close together, and stretching that spread would let noise outweigh overlap.
+
+The remote stage (Voyage `rerank-2`) is optional and budgeted. It only sees the
+best RERANK_REMOTE_MAX_DOCUMENTS local candidates and must answer within
+RERANK_REMOTE_TIMEOUT_SECONDS. Otherwise the local order stands.
+"""
+
+import asyncio
+import logging
+import math
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import UUID
+
+import dateutil.parser
+import numpy as np
+
+from shared.config import settings
+from shared.qdrant.sparse_vectors import tokenize
+from shared.services.embedding_service import embedding_service, rerank_documents
+
+logger = logging.getLogger(__name__)
+
+# Tuned with benchmarks/reranking.py. Recency is a tie-breaker: a similar thread is
+# not more relevant for being recent, but among equals the recent one usually is.
+SEMANTIC_WEIGHT = 0.5
+LEXICAL_WEIGHT = 0.45
+RECENCY_WEIGHT = 0.05
+RECENCY_HALF_LIFE_DAYS = 90.0
+
+
+def _semantic_scores(query_vector: Optional[Sequence[float]], vectors: Sequence[Optional[Sequence[float]]]) -> np.ndarray:
+    if query_vector is None:
+        return np.zeros(len(vectors))
+    query = np.asarray(query_vector, dtype=np.float32)
+    query /= np.linalg.norm(query) or 1.0
+    scores = np.zeros(len(vectors))
+    for i, vector in enumerate(vectors):
+        if vector is None:
+            continue
+        candidate = np.asarray(vector, dtype=np.float32)
+        scores[i] = float(candidate @ query) / (np.linalg.norm(candidate) or 1.0)
+    return scores
+
+
+def _lexical_scores(query_text: str, documents: Sequence[str]) -> np.ndarray:
+    query_terms = set(tokenize(query_text))
+    if not query_terms or not documents:
+        return np.zeros(len(documents))
+    document_terms = [set(tokenize(document)) & query_terms for document in documents]
+    document_frequency = Counter(term for terms in document_terms for term in terms)
+    n = len(documents)
+    idf = {term: math.log(1 + (n - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5)) for term in query_terms}
+    total = sum(idf.values())
+    return np.array([sum(idf[term] for term in terms) / total for terms in document_terms])
+
+
+def _parse_date(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = value if isinstance(value, datetime) else dateutil.parser.parse(str(value))
+    except (ValueError, OverflowError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _recency_scores(dates: Sequence[Any], now: datetime) -> np.ndarray:
+    scores = np.zeros(len(dates))
+    for i, value in enumerate(dates):
+        parsed = _parse_date(value)
+        if parsed is None:
+            continue
+        age_days = max(0.0, (now - parsed).total_seconds() / 86400)
+        scores[i] = 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+    return scores
+
+
+def local_rerank(
+    query_text: str,
+    query_vector: Optional[Sequence[float]],
+    documents: Sequence[str],
+    vectors: Sequence[Optional[Sequence[float]]],
+    dates: Optional[Sequence[Any]] = None,
+    top_k: Optional[int] = None,
+    now: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Ranks candidates without a provider call. `documents`, `vectors` and `dates` are
+    parallel lists. Returns `{"index", "relevance_score", "scores"}` dicts, best first,
+    in the shape `rerank_documents` returns.
+    """
+    if not documents:
+        return []
+    dates = dates if dates is not None else [None] * len(documents)
+    now = now or datetime.now(timezone.utc)
+    components = {
+        "semantic": _semantic_scores(query_vector, vectors),
+        "lexical": _lexical_scores(query_text, documents),
+        "recency": _recency_scores(dates, now),
+    }
+    combined = (
+        SEMANTIC_WEIGHT * components["semantic"]
+        + LEXICAL_WEIGHT * components["lexical"]
+        + RECENCY_WEIGHT * components["recency"]
+    )
+    # Stable sort keeps the search order among equal scores.
+    order = sorted(range(len(documents)), key=lambda i: -combined[i])
+    if top_k is not None:
+        order = order[:top_k]
+    return [
+        {
+            "index": i,
+            "relevance_score": float(combined[i]),
+            "scores": {name: float(values[i]) for name, values in components.items()},
+        }
+        for i in order
+    ]
+
+
+def remote_rerank_available(user_uuid: Optional[UUID] = None) -> bool:
+    """Remote reranking is enabled and the user's embedding provider offers it (Voyage only)."""
+    if not settings.RERANK_REMOTE_ENABLED or settings.RERANK_REMOTE_MAX_DOCUMENTS <= 0:
+        return False
+    try:
+        return embedding_service.get_current_model_info(user_uuid=user_uuid).get("provider") == "voyage"
+    except Exception as e:
+        logger.warning(f"Could not determine the embedding provider of user {user_uuid}: {e}")
+        return False
+
+
+async def budgeted_remote_rerank(
+    query: str,
+    documents: Sequence[str],
+    local_results: List[Dict[str, Any]],
+    top_k: int,
+    user_uuid: Optional[UUID] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Refines the head of the local ranking with the remote reranker, within the
+    document and time budget. Returns the local top_k when remote reranking is
+    unavailable, fails or runs out of time. Indexes refer to `documents`.
+    """
+    if not local_results or not remote_rerank_available(user_uuid):
+        return local_results[:top_k]
+    head = local_results[:settings.RERANK_REMOTE_MAX_DOCUMENTS]
+    try:
+        remote_results = await asyncio.wait_for(
+            asyncio.to_thread(rerank_documents, query, [documents[r["index"]] for r in head], top_k, user_uuid),
+            timeout=settings.RERANK_REMOTE_TIMEOUT_SECONDS,
+        )
+    except asyncio.TimeoutError:
+        logger.warning(f"Remote reranking exceeded {settings.RERANK_REMOTE_TIMEOUT_SECONDS}s; keeping the local order.")
+        return local_results[:top_k]
+    except Exception as e:
+        logger.warning(f"Remote reranking failed; keeping the local order: {e}")
+        return local_results[:top_k]
+    return [
+        {**head[result["index"]], "relevance_score": result.get("relevance_score")}
+        for result in remote_results
+        if result["index"] < len(head)
+    ][:top_k]
@@ -0,0 +1,61 @@
+import os
+import sys
+from unittest.mock import patch
+
+# Add the project root to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..')))
+
+from shared.services import language_detection
+
+ENGLISH = "Thanks for sending the invoice, I will pay it this week and let you know when it is done."
+GERMAN = "Vielen Dank für die Rechnung, ich werde sie diese Woche bezahlen und Ihnen Bescheid geben."
+
+
+class MemoryRedis:
+    def __init__(self):
+        self.data = {}
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def pipeline(self):
+        return self
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def execute(self):
+        pass
+
+
+def test_language_sample_is_a_bounded_prefix_without_urls_and_addresses():
+    sample = language_detection.language_sample(
+        [f"{ENGLISH} https://example.com/a?b=c jane.doe@example.com", None, GERMAN],
+        max_chars=120,
+    )
+
+    assert len(sample) <= 120
+    assert "example.com" not in sample
+    assert sample.startswith(ENGLISH)
+    assert GERMAN.startswith(sample.split("\n")[1])
+
+
+def test_detect_languages_is_deterministic_and_cached_by_content():
+    redis = MemoryRedis()
+    samples = [ENGLISH, GERMAN, ENGLISH, ""]
+
+    with patch.object(language_detection, "get_redis_client", return_value=redis):
+        first = language_detection.detect_languages(samples, processes=1)
+        assert first == ["en", "de", "en", "unknown"]
+        # Three distinct samples, each detected once.
+        assert len(redis.data) == 3
+
+        with patch.object(language_detection, "detect_sample", side_effect=AssertionError("not cached")):
+            assert language_detection.detect_languages(samples, processes=1) == first
+
+    assert language_detection.detect_languages(samples, processes=1, use_cache=False) == first
+
+
+def test_detect_languages_works_without_redis():
+    with patch.object(language_detection, "get_redis_client", side_effect=ConnectionError("no redis")):
+        assert language_detection.detect_languages([GERMAN], processes=1) == ["de"]
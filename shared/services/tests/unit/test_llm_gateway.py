@@ -0,0 +1,212 @@
+import asyncio
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock
+
+from openai.types.chat import ChatCompletionChunk
+
+# Add the project root to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..')))
+
+from shared.services.llm_gateway import LLMGateway
+
+
+def _chunk(delta: dict, finish_reason=None, usage=None) -> ChatCompletionChunk:
+    return ChatCompletionChunk.model_validate({
+        "id": "gen-123",
+        "object": "chat.completion.chunk",
+        "created": 1,
+        "model": "test/model",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        "usage": usage,
+    })
+
+
+class _FakeStream:
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self.close = AsyncMock()
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self._chunks:
+            yield chunk
+
+
+def test_streamed_completion_forwards_deltas_and_assembles_message():
+    """Tokens and tool-call fragments are forwarded and folded back into one completion."""
+    chunks = [
+        _chunk({"role": "assistant", "content": "Hel"}),
+        _chunk({"content": "lo"}),
+        _chunk({"tool_calls": [{"index": 0, "id": "call_1", "type": "function", "function": {"name": "imap-set_label", "arguments": "{\"la"}}]}),
+        _chunk({"tool_calls": [{"index": 0, "function": {"arguments": "bel\": \"x\"}"}}]}, finish_reason="tool_calls"),
+        _chunk({}, usage={"prompt_tokens": 5, "completion_tokens": 7, "total_tokens": 12}),
+    ]
+    stream = _FakeStream(chunks)
+    client = MagicMock()
+    client.chat.completions.create = AsyncMock(return_value=stream)
+
+    gateway = LLMGateway()
+    gateway.get_client = MagicMock(return_value=client)
+    gateway._get_state = MagicMock(return_value=MagicMock(model_semaphores={}))
+    events = []
+
+    async def on_delta(event):
+        events.append(event)
+
+    completion = asyncio.run(
+        gateway.chat_completion(model="test/model", messages=[{"role": "user", "content": "hi"}], on_delta=on_delta)
+    )
+
+    assert client.chat.completions.create.call_args.kwargs["stream"] is True
+    assert [e["content"] for e in events if e["type"] == "token"] == ["Hel", "lo"]
+    assert len([e for e in events if e["type"] == "tool_call_delta"]) == 2
+    message = completion.choices[0].message
+    assert message.content == "Hello"
+    assert message.tool_calls[0].id == "call_1"
+    assert message.tool_calls[0].function.name == "imap-set_label"
+    assert message.tool_calls[0].function.arguments == "{\"label\": \"x\"}"
+    assert completion.id == "gen-123"
+    assert completion.usage.total_tokens == 12
+    stream.close.assert_awaited_once()
+
+
+def _rate_limit_error(retry_after=None):
+    import httpx
+    import openai
+
+    headers = {"retry-after": retry_after} if retry_after is not None else {}
+    response = httpx.Response(429, headers=headers, request=httpx.Request("POST", "https://openrouter.ai/api/v1/chat/completions"))
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def test_rate_limited_request_backs_off_and_retries():
+    """A 429 puts the model into backoff (Retry-After) and halves its rate before the retry."""
+    gateway = LLMGateway()
+    gateway._get_state = MagicMock(return_value=MagicMock(model_semaphores={}))
+    call = AsyncMock(side_effect=[_rate_limit_error("0.05"), "ok"])
+
+    async def run():
+        result = await gateway.run_rate_limited("test/model", call, user_id="u1")
+        return result, gateway.get_limiter().model_states()["test/model"]
+
+    result, state = asyncio.run(run())
+
+    assert result == "ok"
+    assert call.await_count == 2
+    assert state["rate_limited"] == 1
+    assert state["rate_factor"] == 0.6  # halved, then one additive recovery step
+    assert gateway.get_metrics()["rate_limited"] == {"test/model": 1}
+
+
+def test_interactive_requests_are_released_before_batch():
+    """When the model bucket is empty, queued interactive work goes ahead of earlier batch work."""
+    from shared.services.llm_rate_limiter import LLMPriority, LLMRateLimiter
+
+    async def run():
+        limiter = LLMRateLimiter(model_rpm=600, model_rpm_overrides={}, user_rpm=0, burst_seconds=0.1, max_backoff_s=1)
+        await limiter.acquire("m")  # drains the single-token bucket
+        order = []
+
+        async def request(name, priority):
+            await limiter.acquire("m", priority=priority)
+            order.append(name)
+
+        batch = asyncio.create_task(request("batch", LLMPriority.BATCH))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(request("interactive", LLMPriority.INTERACTIVE))
+        await asyncio.sleep(0)
+        assert limiter.queue_depths()["by_priority"] == {"batch": 1, "interactive": 1}
+        await asyncio.gather(batch, interactive)
+        return order
+
+    assert asyncio.run(run()) == ["interactive", "batch"]
+
+
+def test_user_bucket_only_delays_that_user():
+    """A user over budget waits, while other users' requests for the same model go through."""
+    from shared.services.llm_rate_limiter import LLMRateLimiter
+
+    async def run():
+        limiter = LLMRateLimiter(model_rpm=6000, model_rpm_overrides={}, user_rpm=60, burst_seconds=1, max_backoff_s=1)
+        await limiter.acquire("m", user_id="busy")
+        blocked = asyncio.create_task(limiter.acquire("m", user_id="busy"))
+        other_wait = await asyncio.wait_for(limiter.acquire("m", user_id="other"), timeout=0.5)
+        assert not blocked.done()
+        blocked.cancel()
+        return other_wait
+
+    assert asyncio.run(run()) < 0.1
+
+
+def test_deterministic_completions_are_served_from_the_response_cache(tmp_path, monkeypatch):
+    """A repeated temperature-0 request is answered from the cache; other settings bypass it."""
+    from openai.types.chat import ChatCompletion
+    from shared.services import llm_gateway as gateway_module
+    from shared.services.llm_response_cache import LLMResponseCache
+
+    cache = LLMResponseCache(backend="disk", path=str(tmp_path / "cache.sqlite3"))
+    cache.enabled = True
+    monkeypatch.setattr(gateway_module, "llm_response_cache", cache)
+    completion = ChatCompletion.model_validate({
+        "id": "gen-1", "object": "chat.completion", "created": 1, "model": "test/model",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "{\"ok\": true}"}, "finish_reason": "stop"}],
+    })
+    client = MagicMock()
+    client.chat.completions.create = AsyncMock(return_value=completion)
+    gateway = LLMGateway()
+    gateway.get_client = MagicMock(return_value=client)
+    gateway._get_state = MagicMock(return_value=MagicMock(model_semaphores={}))
+    messages = [{"role": "user", "content": "classify"}]
+
+    async def run():
+        first = await gateway.chat_completion("test/model", messages, temperature=0.0, cache=True)
+        second = await gateway.chat_completion("test/model", messages, temperature=0.0, cache=True)
+        sampled = await gateway.chat_completion("test/model", messages, temperature=0.7, cache=True)
+        return first, second, sampled
+
+    first, second, sampled = asyncio.run(run())
+
+    assert not getattr(first, "cache_hit", False)
+    assert second.cache_hit is True
+    assert second.choices[0].message.content == "{\"ok\": true}"
+    assert not getattr(sampled, "cache_hit", False)
+    assert client.chat.completions.create.await_count == 2
+
+
+def test_cache_key_covers_every_option_that_shapes_the_output():
+    from shared.services.llm_response_cache import cache_key
+
+    messages = [{"role": "user", "content": "classify"}]
+    base = {"temperature": 0.0, "max_tokens": 100}
+    assert cache_key("m", messages, base) == cache_key("m", messages, {**base, "extra_body": {"usage": {"include": True}}})
+    for option, value in (("max_tokens", 200), ("top_p", 0.5), ("seed", 7), ("response_format", {"type": "json_object"})):
+        assert cache_key("m", messages, base) != cache_key("m", messages, {**base, option: value}), option
+
+
+def test_callers_keep_their_temperature_while_the_cache_is_disabled():
+    from shared.services.llm_response_cache import LLMResponseCache
+
+    cache = LLMResponseCache(backend="disk")
+    cache.enabled = False
+    assert cache.deterministic_temperature(0.7) == 0.7
+    assert cache.deterministic_temperature(None) is None
+    cache.enabled = True
+    assert cache.deterministic_temperature(0.7) == 0.0
+
+
+def test_response_cache_evicts_least_recently_used_entries(tmp_path):
+    from shared.services.llm_response_cache import LLMResponseCache
+
+    cache = LLMResponseCache(backend="disk", path=str(tmp_path / "cache.sqlite3"))
+    cache.max_entries = 2
+    cache.set("a", {"v": 1})
+    cache.set("b", {"v": 2})
+    assert cache.get("a") == {"v": 1}  # "b" is now the least recently used
+    cache.set("c", {"v": 3})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.get("c") == {"v": 3}
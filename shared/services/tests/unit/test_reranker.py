@@ -0,0 +1,69 @@
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+# Add the project root to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..')))
+
+from shared.services import reranker
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def test_local_rerank_combines_vectors_overlap_and_recency():
+    documents = [
+        "Lunch on Friday?",
+        "Your order 48213-B has shipped",
+        "Order update",
+    ]
+    vectors = [[1.0, 0.0], [0.8, 0.6], [0.9, 0.1]]
+    dates = [(NOW - timedelta(days=400)).isoformat(), (NOW - timedelta(days=2)).isoformat(), None]
+
+    results = reranker.local_rerank("where is order 48213-B", [1.0, 0.0], documents, vectors, dates, top_k=2, now=NOW)
+
+    assert [result["index"] for result in results] == [1, 2]
+    # The order number outweighs the slightly closer vectors of the other candidates.
+    assert results[0]["scores"]["semantic"] < results[1]["scores"]["semantic"]
+    assert results[0]["scores"]["lexical"] > results[1]["scores"]["lexical"]
+
+
+def test_local_rerank_without_signals_keeps_search_order():
+    results = reranker.local_rerank("", None, ["a", "b", "c"], [None, None, None])
+    assert [result["index"] for result in results] == [0, 1, 2]
+
+
+def _local_results(n):
+    return [{"index": i, "relevance_score": 1.0 - i / n, "scores": {}} for i in range(n)]
+
+
+def test_remote_stage_only_sees_the_budgeted_head():
+    documents = [f"doc {i}" for i in range(10)]
+    calls = []
+
+    def fake_rerank(query, docs, top_k, user_uuid):
+        calls.append(docs)
+        return [{"index": 2, "relevance_score": 0.9}, {"index": 0, "relevance_score": 0.5}]
+
+    with patch.object(reranker, "remote_rerank_available", return_value=True), \
+         patch.object(reranker, "rerank_documents", side_effect=fake_rerank), \
+         patch.object(reranker.settings, "RERANK_REMOTE_MAX_DOCUMENTS", 4):
+        results = asyncio.run(reranker.budgeted_remote_rerank("q", documents, _local_results(10), top_k=2))
+
+    assert calls == [documents[:4]]
+    assert [result["index"] for result in results] == [2, 0]
+
+
+def test_remote_stage_falls_back_to_local_order_on_timeout():
+    def slow_rerank(*args):
+        time.sleep(0.5)
+        return []
+
+    with patch.object(reranker, "remote_rerank_available", return_value=True), \
+         patch.object(reranker, "rerank_documents", side_effect=slow_rerank), \
+         patch.object(reranker.settings, "RERANK_REMOTE_TIMEOUT_SECONDS", 0.05):
+        results = asyncio.run(reranker.budgeted_remote_rerank("q", ["a", "b", "c"], _local_results(3), top_k=2))
+
+    assert [result["index"] for result in results] == [0, 1]
@@ -21,9 +21,14 @@ from mcp_servers.imap_mcpserver.src.imap_client.internals.connection_manager imp
     FolderNotFoundError,
     acquire_imap_slot,
 )
+from mcp_servers.imap_mcpserver.src.imap_client.internals.change_tracker import sync_label_changes
 import user.client as user_client
 from shared.security.encryption import decrypt_value
 from shared.services.openrouter_service import openrouter_service
+from shared.services.llm_response_cache import llm_response_cache
+from agentlogger.src.client import save_log_entry, start_cost_reconciler
+from agentlogger.src.models import LogEntry, Message as LoggerMessage
+from datetime import datetime, timezone
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -40,11 +45,46 @@ def set_last_uid(username: str, uid: str):
     redis_client = get_redis_client()
     redis_client.set(RedisKeys.get_last_email_uid_key(username), uid)
 
+async def log_trigger_check(user: User, workflow, trigger, system_prompt: str, user_prompt: str, completion, started_at: datetime):
+    """
+    Records a trigger's LLM check in the agent logger. Checks answered from the LLM
+    response cache are marked with `cache_hit` and carry no tokens: nothing was generated.
+    """
+    cache_hit = bool(getattr(completion, "cache_hit", False))
+    usage = None if cache_hit else completion.usage
+    log_entry = LogEntry(
+        user_id=str(user.uuid),
+        log_type='custom_llm',
+        workflow_id=str(workflow.uuid),
+        workflow_name=workflow.name,
+        step_id=str(trigger.uuid),
+        step_name="Trigger check",
+        messages=[
+            LoggerMessage(role="system", content=system_prompt),
+            LoggerMessage(role="user", content=user_prompt),
+            LoggerMessage(role="assistant", content=completion.choices[0].message.content),
+        ],
+        start_time=started_at,
+        end_time=datetime.now(timezone.utc),
+        prompt_tokens=usage.prompt_tokens if usage else None,
+        completion_tokens=usage.completion_tokens if usage else None,
+        total_tokens=usage.total_tokens if usage else None,
+        model=trigger.trigger_model,
+        cache_hit=cache_hit,
+    )
+    try:
+        await save_log_entry(log_entry)
+    except Exception as e:
+        logger.error(f"Failed to log trigger check for workflow '{workflow.name}': {e}", exc_info=True)
+
 async def main():
     """
     Main polling loop that checks for new emails and runs them against database-driven triggers for all users.
     """
     logger.info("Trigger service started.")
+    # Costs of LLM calls made by this process (trigger checks, workflow runs) are
+    # reconciled here; ones still pending at a restart are taken over from Redis.
+    start_cost_reconciler()
     
     while True:
         try:
@@ -80,6 +120,12 @@ async def main():
 
                     logger.info(f"Checking for mail for user {user.uuid} ({app_settings.IMAP_USERNAME}) in '{resolved_inbox_name}'...")
 
+                    # Push label changes into the vector index payload (throttled per user)
+                    try:
+                        await sync_label_changes(user.uuid)
+                    except Exception as e:
+                        logger.warning(f"Label sync failed for user {user.uuid}: {e}")
+
                     # Acquire a per-user IMAP slot so we don't exceed provider limits
                     async with acquire_imap_slot(user.uuid):
                         with MailBox(app_settings.IMAP_SERVER).login(
@@ -228,11 +274,18 @@ If the email does not match:
             user_prompt = f"EMAIL THREAD:\n\n{thread_context}"
 
             try:
-                response_json = await openrouter_service.get_json_response(
+                started_at = datetime.now(timezone.utc)
+                response_json, completion = await openrouter_service.get_json_completion(
                     system_prompt=system_prompt,
                     user_prompt=user_prompt,
-                    model=trigger.trigger_model
+                    model=trigger.trigger_model,
+                    user_id=user.uuid,
+                    # A yes/no routing decision: with the response cache enabled it runs at
+                    # temperature 0, so a re-polled thread is answered from the cache
+                    temperature=llm_response_cache.deterministic_temperature(None),
+                    cache=True,
                 )
+                await log_trigger_check(user, workflow, trigger, system_prompt, user_prompt, completion, started_at)
                 if not response_json.get("continue_processing"):
                     logger.info(f"LLM decided not to trigger workflow for email from '{msg.from_}'. Reason: {response_json.get('reason', 'No reason provided.')}")
                     continue
@@ -1,3 +1,4 @@
+from contextlib import contextmanager
 from typing import Optional, Dict, Any
 from user.internals.database import (
     get_or_create_default_user as get_or_create_default_user_from_db,
@@ -14,23 +15,34 @@ from user.exceptions import InsufficientBalanceError
 from uuid import uuid4, UUID
 from datetime import datetime, timezone
 from user.internals import password_auth
+from user.internals.user_cache import user_cache
 from shared.config import settings
+from shared.mysql.mysql_client import run_db
 from typing import Dict
 
 def get_or_create_default_user() -> User:
     """
     Retrieves the single, shared user record, creating it if it doesn't exist.
-    This is a passthrough to the internal database function.
+    Served from the short-lived user cache when possible.
     """
-    return get_or_create_default_user_from_db()
+    user = user_cache.get("default")
+    if user is None:
+        user = get_or_create_default_user_from_db()
+        user_cache.set("default", user)
+    return user
 
 def get_user_by_uuid(user_uuid: UUID) -> Optional[User]:
     """Retrieves a user from the database by their UUID."""
     return get_user_by_uuid_from_db(user_uuid)
 
 def find_or_create_user_by_auth0_sub(auth0_sub: str, email: Optional[str] = None) -> User:
-    """Finds a user by their Auth0 sub, creating one if they don't exist."""
-    return find_or_create_user_by_auth0_sub_in_db(auth0_sub=auth0_sub, email=email)
+    """Finds a user by their Auth0 sub, creating one if they don't exist. Served from the short-lived user cache when possible."""
+    cache_key = f"auth0:{auth0_sub}"
+    user = user_cache.get(cache_key)
+    if user is None:
+        user = find_or_create_user_by_auth0_sub_in_db(auth0_sub=auth0_sub, email=email)
+        user_cache.set(cache_key, user)
+    return user
 
 def check_user_balance(user_id: UUID):
     """
@@ -47,34 +59,37 @@ def check_user_balance(user_id: UUID):
         if user.balance <= 0:
             raise InsufficientBalanceError()
 
+@contextmanager
+def _balance_write(user_uuid: UUID):
+    """
+    Drops the cached user around a balance write: before it, and again once it has
+    committed, so a lookup racing the write cannot re-cache the old balance.
+    """
+    user_cache.invalidate(user_uuid)
+    try:
+        yield
+    finally:
+        user_cache.invalidate(user_uuid)
+
 def set_user_balance(user_uuid: UUID, new_balance: float) -> Optional[User]:
     """Updates the balance for a specific user."""
-    return set_user_balance_in_db(user_uuid, new_balance)
+    with _balance_write(user_uuid):
+        return set_user_balance_in_db(user_uuid, new_balance)
 
 def deduct_from_balance(user_uuid: UUID, cost: float) -> Optional[User]:
     """
     Deducts a cost from a user's balance if they are an Auth0 user.
+    Other users are returned unchanged; a missing user yields None rather than
+    an error, to avoid crashing a running process if the user somehow gets
+    deleted mid-operation.
     """
-    user = get_user_by_uuid_from_db(user_uuid)
-    if not user:
-        # We don't raise an error here to avoid crashing a running process
-        # if the user somehow gets deleted mid-operation.
-        return None
-
-    # Only deduct from balance for Auth0 users
-    if user.auth0_sub:
-        return deduct_from_balance_in_db(user_uuid, cost)
-    
-    return user # Return the original user object if no deduction was made
+    with _balance_write(user_uuid):
+        return deduct_from_balance_in_db(user_uuid, cost, auth0_only=True)
 
 def add_to_balance(user_uuid: UUID, amount: float) -> Optional[User]:
     """Adds an amount to a user's balance if they are an Auth0 user."""
-    user = get_user_by_uuid_from_db(user_uuid)
-    if not user:
-        return None
-    if user.auth0_sub:
-        return add_to_balance_in_db(user_uuid, amount)
-    return user
+    with _balance_write(user_uuid):
+        return add_to_balance_in_db(user_uuid, amount, auth0_only=True)
 
 def get_all_users() -> list[User]:
     """Retrieves all users."""
@@ -132,6 +147,12 @@ async def validate_auth0_token(token: str) -> Optional[Dict[str, Any]]:
     return await auth0_validator.validate_auth0_token(token)
 
 
+def get_auth_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters of the verified-token and user caches of this process."""
+    from user.internals import auth0_validator
+    return {"tokens": auth0_validator.get_token_cache_stats(), "users": user_cache.stats()}
+
+
 def find_or_create_user_from_auth0_payload(payload: Dict[str, Any]) -> User:
     """
     Extracts identity from an Auth0 payload and finds or creates a corresponding user.
@@ -145,4 +166,26 @@ def find_or_create_user_from_auth0_payload(payload: Dict[str, Any]) -> User:
     email_claim_namespace = "https://api.brewdock.com/email"
     email = payload.get(email_claim_namespace) or payload.get("email")
 
-    return find_or_create_user_by_auth0_sub_in_db(auth0_sub=auth0_sub, email=email)
\ No newline at end of file
+    return find_or_create_user_by_auth0_sub(auth0_sub=auth0_sub, email=email)
+
+# --- Async variants for event-loop callers (endpoints, workflow and agent runners) ---
+# The database layer is synchronous; these run it in a worker thread on the shared pool.
+
+async def get_user_by_uuid_async(user_uuid: UUID) -> Optional[User]:
+    return await run_db(get_user_by_uuid, user_uuid)
+
+
+async def get_or_create_default_user_async() -> User:
+    return await run_db(get_or_create_default_user)
+
+
+async def find_or_create_user_from_auth0_payload_async(payload: Dict[str, Any]) -> User:
+    return await run_db(find_or_create_user_from_auth0_payload, payload)
+
+
+async def check_user_balance_async(user_id: UUID) -> None:
+    await run_db(check_user_balance, user_id)
+
+
+async def deduct_from_balance_async(user_uuid: UUID, cost: float) -> Optional[User]:
+    return await run_db(deduct_from_balance, user_uuid, cost)
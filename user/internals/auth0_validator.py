@@ -1,52 +1,163 @@
+"""
+Validation of Auth0-issued access tokens.
+
+The JWKS is cached by key id (`kid`) and refreshed after AUTH0_JWKS_TTL_SECONDS,
+or earlier when a token names a key we have not seen (key rotation), at most once
+per AUTH0_JWKS_MIN_REFRESH_SECONDS. A failed refresh keeps serving the keys we
+already have and is retried with exponential backoff. Verified tokens are cached by their SHA-256
+until their `exp`, so repeated requests with the same token skip signature
+verification entirely.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
 import httpx
 from jose import jwt
 from jose.exceptions import JWTError, ExpiredSignatureError, JWTClaimsError
-from typing import Dict, Any, Optional
 
 from shared.config import settings
 
-# A simple in-memory cache for the JWKS
-_jwks: Optional[Dict[str, Any]] = None
+logger = logging.getLogger(__name__)
 
-async def get_jwks() -> Dict[str, Any]:
-    """
-    Fetches and caches the JSON Web Key Set (JWKS) from the Auth0 domain.
-    The JWKS contains the public keys used to verify JWTs.
-    """
-    global _jwks
-    if _jwks is None:
+
+class _JWKSCache:
+    """Public keys of the Auth0 tenant, indexed by `kid`."""
+
+    def __init__(self):
+        self.keys: Dict[str, Dict[str, Any]] = {}
+        self.fetched_at = 0.0
+        self._failures = 0
+        self._retry_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _is_stale(self, now: float) -> bool:
+        return not self.keys or now - self.fetched_at > settings.AUTH0_JWKS_TTL_SECONDS
+
+    async def _refresh(self) -> None:
         jwks_url = f"https://{settings.AUTH0_DOMAIN}/.well-known/jwks.json"
         async with httpx.AsyncClient() as client:
             response = await client.get(jwks_url)
             response.raise_for_status()
-            _jwks = response.json()
-    return _jwks
+            jwks = response.json()
+        self.keys = {key["kid"]: key for key in jwks.get("keys", []) if key.get("kid")}
+        self.fetched_at = time.monotonic()
+        logger.info(f"Fetched Auth0 JWKS with {len(self.keys)} key(s).")
+
+    async def get_key(self, kid: str) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        unknown_kid = kid not in self.keys and now - self.fetched_at > settings.AUTH0_JWKS_MIN_REFRESH_SECONDS
+        if (self._is_stale(now) or unknown_kid) and now >= self._retry_at:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                # Another request may have refreshed, or failed to, while we waited for the lock.
+                if self.fetched_at <= now and self._retry_at <= now:
+                    await self._try_refresh()
+        return self.keys.get(kid)
+
+    async def _try_refresh(self) -> None:
+        try:
+            await self._refresh()
+            self._failures = 0
+        except Exception as e:
+            self._failures += 1
+            backoff = min(
+                max(settings.AUTH0_JWKS_MIN_REFRESH_SECONDS, 1) * 2 ** (self._failures - 1),
+                settings.AUTH0_JWKS_TTL_SECONDS,
+            )
+            self._retry_at = time.monotonic() + backoff
+            logger.warning(
+                f"Could not refresh Auth0 JWKS, serving {len(self.keys)} cached key(s) and retrying in {backoff}s: {e}"
+            )
+
+
+class _VerifiedTokenCache:
+    """Decoded payloads of verified tokens, keyed by token hash and kept until `exp`."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self.key(token)
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, token: str, payload: Dict[str, Any]) -> None:
+        expires_at = payload.get("exp")
+        if not isinstance(expires_at, (int, float)):
+            return
+        key = self.key(token)
+        self._entries[key] = (payload, float(expires_at))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_jwks_cache = _JWKSCache()
+_token_cache = _VerifiedTokenCache(settings.AUTH0_TOKEN_CACHE_MAX_ENTRIES)
+
+
+async def get_jwks() -> Dict[str, Any]:
+    """Returns the cached JSON Web Key Set (JWKS), fetching it when it is missing or older than the TTL."""
+    if _jwks_cache._is_stale(time.monotonic()):
+        await _jwks_cache._refresh()
+    return {"keys": list(_jwks_cache.keys.values())}
+
+
+def get_token_cache_stats() -> Dict[str, int]:
+    return _token_cache.stats()
+
 
 async def validate_auth0_token(token: str) -> Optional[Dict[str, Any]]:
     """
     Validates a JWT access token from Auth0.
-    
-    - Fetches the JWKS from Auth0.
-    - Verifies the token's signature using the correct public key.
+
+    - Returns the cached payload if this exact token was verified before and has not expired.
+    - Otherwise looks up the signing key by `kid` and verifies the token's signature.
     - Validates the audience and issuer claims.
-    
+
     Returns the decoded payload if valid, otherwise None.
     """
+    cached = _token_cache.get(token)
+    if cached is not None:
+        return cached
+
     try:
-        jwks = await get_jwks()
         unverified_header = jwt.get_unverified_header(token)
-        rsa_key = {}
-        for key in jwks["keys"]:
-            if key["kid"] == unverified_header["kid"]:
-                rsa_key = {
-                    "kty": key["kty"],
-                    "kid": key["kid"],
-                    "use": key["use"],
-                    "n": key["n"],
-                    "e": key["e"],
-                }
-        
-        if rsa_key:
+        key = await _jwks_cache.get_key(unverified_header.get("kid"))
+        if key:
+            rsa_key = {
+                "kty": key["kty"],
+                "kid": key["kid"],
+                "use": key["use"],
+                "n": key["n"],
+                "e": key["e"],
+            }
             payload = jwt.decode(
                 token,
                 rsa_key,
@@ -54,20 +165,21 @@ async def validate_auth0_token(token: str) -> Optional[Dict[str, Any]]:
                 audience=settings.AUTH0_API_AUDIENCE,
                 issuer=f"https://{settings.AUTH0_DOMAIN}/",
             )
+            _token_cache.set(token, payload)
             return payload
 
     except ExpiredSignatureError:
-        print("[AUTH_VALIDATOR] Token has expired.")
+        logger.info("Auth0 token has expired.")
         return None
     except JWTClaimsError as e:
-        print(f"[AUTH_VALIDATOR] Token claims are invalid. This is likely an audience or issuer mismatch. Error: {e}")
+        logger.warning(f"Auth0 token claims are invalid. This is likely an audience or issuer mismatch. Error: {e}")
         return None
     except JWTError as e:
-        print(f"[AUTH_VALIDATOR] Signature validation failed: {e}")
+        logger.warning(f"Auth0 token signature validation failed: {e}")
         return None
     except Exception as e:
-        print(f"[AUTH_VALIDATOR] An unexpected error occurred during token validation: {e}")
+        logger.error(f"An unexpected error occurred during token validation: {e}")
         return None
-        
-    print("[AUTH_VALIDATOR] Could not find a matching key in JWKS.")
-    return None 
\ No newline at end of file
+
+    logger.warning("Could not find a matching key in JWKS.")
+    return None
@@ -4,20 +4,14 @@ from uuid import UUID, uuid4
 import mysql.connector
 from datetime import datetime
 
-from shared.config import settings
+from shared.mysql.mysql_client import get_pooled_connection
 from user.models import User
 
 logger = logging.getLogger(__name__)
 
 def get_db_connection():
-    """Establishes a connection to the MySQL database."""
-    return mysql.connector.connect(
-        host='db',
-        user=settings.MYSQL_USER,
-        password=settings.MYSQL_PASSWORD,
-        database=settings.MYSQL_DATABASE,
-        port=3306
-    )
+    """Borrows a connection from the shared MySQL pool; closing it returns it to the pool."""
+    return get_pooled_connection()
 
 def get_or_create_default_user() -> User:
     """
@@ -80,18 +74,22 @@ def get_or_create_default_user() -> User:
         conn.close()
 
 
+def _fetch_user(cursor, user_uuid: UUID) -> Optional[User]:
+    """Loads a user with an existing dictionary cursor, so callers can stay on one connection."""
+    query = "SELECT uuid, auth0_sub, email, is_anonymous, created_at, balance FROM users WHERE uuid = UUID_TO_BIN(%s)"
+    cursor.execute(query, (str(user_uuid),))
+    user_data = cursor.fetchone()
+    if user_data:
+        user_data['uuid'] = UUID(bytes=user_data['uuid'])
+        return User(**user_data)
+    return None
+
 def get_user_by_uuid(user_uuid: UUID) -> Optional[User]:
     """Retrieves a user from the database by their UUID."""
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     try:
-        query = "SELECT uuid, auth0_sub, email, is_anonymous, created_at, balance FROM users WHERE uuid = UUID_TO_BIN(%s)"
-        cursor.execute(query, (str(user_uuid),))
-        user_data = cursor.fetchone()
-        if user_data:
-            user_data['uuid'] = UUID(bytes=user_data['uuid'])
-            return User(**user_data)
-        return None
+        return _fetch_user(cursor, user_uuid)
     finally:
         cursor.close()
         conn.close()
@@ -172,43 +170,56 @@ def find_or_create_user_by_auth0_sub(auth0_sub: str, email: Optional[str] = None
 def set_user_balance(user_uuid: UUID, new_balance: float) -> Optional[User]:
     """Updates the balance for a specific user."""
     conn = get_db_connection()
-    cursor = conn.cursor()
+    cursor = conn.cursor(dictionary=True)
     try:
         query = "UPDATE users SET balance = %s WHERE uuid = UUID_TO_BIN(%s)"
         cursor.execute(query, (new_balance, str(user_uuid)))
+        updated = cursor.rowcount > 0
         conn.commit()
-        if cursor.rowcount > 0:
-            return get_user_by_uuid(user_uuid)
-        return None
+        return _fetch_user(cursor, user_uuid) if updated else None
     finally:
         cursor.close()
         conn.close()
 
-def deduct_from_balance(user_uuid: UUID, cost: float) -> Optional[User]:
-    """Deducts a cost from a user's balance atomically."""
+def deduct_from_balance(user_uuid: UUID, cost: float, auth0_only: bool = False) -> Optional[User]:
+    """
+    Deducts a cost from a user's balance atomically.
+    With `auth0_only`, only Auth0 users are charged and other users are returned
+    unchanged. The updated user is read back on the same connection.
+    """
     conn = get_db_connection()
-    cursor = conn.cursor()
+    cursor = conn.cursor(dictionary=True)
     try:
         query = "UPDATE users SET balance = balance - %s WHERE uuid = UUID_TO_BIN(%s)"
+        if auth0_only:
+            query += " AND auth0_sub IS NOT NULL"
         cursor.execute(query, (cost, str(user_uuid)))
+        updated = cursor.rowcount > 0
         conn.commit()
-        if cursor.rowcount > 0:
-            return get_user_by_uuid(user_uuid)
+        if updated or auth0_only:
+            return _fetch_user(cursor, user_uuid)
         return None
     finally:
         cursor.close()
         conn.close()
 
-def add_to_balance(user_uuid: UUID, amount: float) -> Optional[User]:
-    """Adds an amount to a user's balance atomically."""
+def add_to_balance(user_uuid: UUID, amount: float, auth0_only: bool = False) -> Optional[User]:
+    """
+    Adds an amount to a user's balance atomically.
+    With `auth0_only`, only Auth0 users are credited and other users are returned
+    unchanged. The updated user is read back on the same connection.
+    """
     conn = get_db_connection()
-    cursor = conn.cursor()
+    cursor = conn.cursor(dictionary=True)
     try:
         query = "UPDATE users SET balance = balance + %s WHERE uuid = UUID_TO_BIN(%s)"
+        if auth0_only:
+            query += " AND auth0_sub IS NOT NULL"
         cursor.execute(query, (amount, str(user_uuid)))
+        updated = cursor.rowcount > 0
         conn.commit()
-        if cursor.rowcount > 0:
-            return get_user_by_uuid(user_uuid)
+        if updated or auth0_only:
+            return _fetch_user(cursor, user_uuid)
         return None
     finally:
         cursor.close()
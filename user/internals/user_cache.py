@@ -0,0 +1,58 @@
+"""
+Short-lived, per-process cache of user records.
+
+The current user is resolved on every API request, and the frontend polls several
+endpoints per tab, so the default user and users looked up by Auth0 subject are
+served from memory for USER_CACHE_TTL_SECONDS. Balance changes made through
+`user.client` drop the user's entries immediately; changes made in another process
+become visible once the TTL has passed.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from uuid import UUID
+
+from shared.config import settings
+from user.models import User
+
+
+class UserCache:
+    def __init__(self, ttl_s: Optional[float] = None):
+        self.ttl_s = settings.USER_CACHE_TTL_SECONDS if ttl_s is None else ttl_s
+        self._entries: Dict[str, Tuple[User, float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[User]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+        # Callers may mutate the returned user (e.g. the admin flag); never hand out the cached instance.
+        return entry[0].model_copy()
+
+    def set(self, key: str, user: User) -> None:
+        if self.ttl_s <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (user.model_copy(), time.monotonic() + self.ttl_s)
+
+    def invalidate(self, user_uuid: UUID) -> None:
+        with self._lock:
+            for key in [key for key, (user, _) in self._entries.items() if user.uuid == user_uuid]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+user_cache = UserCache()
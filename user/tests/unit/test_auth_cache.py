@@ -0,0 +1,137 @@
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from unittest.mock import patch
+from uuid import uuid4
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+# Add the project root to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..')))
+
+from user import client as user_client
+from user.internals import auth0_validator
+from user.internals.user_cache import user_cache
+from user.models import User
+
+
+def _signing_key(kid):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    public_pem = private_key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    public = jwk.construct(public_pem, 'RS256').to_dict()
+    return pem, {**public, 'kid': kid, 'use': 'sig'}
+
+
+def _token(pem, kid, exp):
+    claims = {'sub': 'auth0|abc', 'exp': exp, 'aud': 'api', 'iss': 'https://tenant.example/'}
+    return jwt.encode(claims, pem, algorithm='RS256', headers={'kid': kid})
+
+
+class FakeJWKSEndpoint:
+    def __init__(self, keys):
+        self.keys = keys
+        self.fetches = 0
+
+    async def refresh(self, cache):
+        self.fetches += 1
+        cache.keys = {key['kid']: key for key in self.keys}
+        cache.fetched_at = time.monotonic()
+
+
+def _validate(token, endpoint):
+    cache = auth0_validator._JWKSCache()
+    with patch.object(auth0_validator, '_jwks_cache', cache), \
+         patch.object(auth0_validator._JWKSCache, '_refresh', lambda self: endpoint.refresh(self)):
+        return asyncio.run(auth0_validator.validate_auth0_token(token))
+
+
+@patch.multiple(auth0_validator.settings, AUTH0_DOMAIN='tenant.example', AUTH0_API_AUDIENCE='api', AUTH0_JWKS_MIN_REFRESH_SECONDS=0)
+def test_verified_token_is_served_from_cache_until_exp():
+    pem, public = _signing_key('k1')
+    endpoint = FakeJWKSEndpoint([public])
+    auth0_validator._token_cache.clear()
+    token = _token(pem, 'k1', int(time.time()) + 3600)
+
+    with patch.object(auth0_validator.jwt, 'decode', wraps=auth0_validator.jwt.decode) as decode:
+        assert _validate(token, endpoint)['sub'] == 'auth0|abc'
+        assert _validate(token, endpoint)['sub'] == 'auth0|abc'
+    assert decode.call_count == 1
+
+    # An entry past its `exp` is dropped rather than served.
+    auth0_validator._token_cache.set('expired-token', {'sub': 'x', 'exp': time.time() - 1})
+    assert auth0_validator._token_cache.get('expired-token') is None
+
+
+@patch.multiple(auth0_validator.settings, AUTH0_DOMAIN='tenant.example', AUTH0_API_AUDIENCE='api', AUTH0_JWKS_MIN_REFRESH_SECONDS=0)
+def test_unknown_kid_triggers_a_jwks_refresh():
+    old_pem, old_public = _signing_key('old')
+    new_pem, new_public = _signing_key('new')
+    endpoint = FakeJWKSEndpoint([old_public])
+    auth0_validator._token_cache.clear()
+    cache = auth0_validator._JWKSCache()
+
+    async def scenario():
+        with patch.object(auth0_validator, '_jwks_cache', cache), \
+             patch.object(auth0_validator._JWKSCache, '_refresh', lambda self: endpoint.refresh(self)):
+            assert await auth0_validator.validate_auth0_token(_token(old_pem, 'old', int(time.time()) + 60))
+            endpoint.keys = [old_public, new_public]  # the tenant rotated its signing key
+            await asyncio.sleep(0.01)
+            return await auth0_validator.validate_auth0_token(_token(new_pem, 'new', int(time.time()) + 60))
+
+    assert asyncio.run(scenario())['sub'] == 'auth0|abc'
+    assert endpoint.fetches == 2
+
+
+@patch.multiple(auth0_validator.settings, AUTH0_DOMAIN='tenant.example', AUTH0_API_AUDIENCE='api', AUTH0_JWKS_MIN_REFRESH_SECONDS=30)
+def test_failed_jwks_refresh_keeps_the_cached_keys_and_backs_off():
+    pem, public = _signing_key('k1')
+    auth0_validator._token_cache.clear()
+    cache = auth0_validator._JWKSCache()
+    cache.keys = {'k1': public}
+    cache.fetched_at = time.monotonic() - auth0_validator.settings.AUTH0_JWKS_TTL_SECONDS - 1
+    attempts = 0
+
+    async def failing_refresh(self):
+        nonlocal attempts
+        attempts += 1
+        raise ConnectionError("tenant unreachable")
+
+    async def scenario():
+        with patch.object(auth0_validator, '_jwks_cache', cache), \
+             patch.object(auth0_validator._JWKSCache, '_refresh', failing_refresh):
+            first = await auth0_validator.validate_auth0_token(_token(pem, 'k1', int(time.time()) + 60))
+            second = await auth0_validator.validate_auth0_token(_token(pem, 'k1', int(time.time()) + 120))
+            return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first['sub'] == second['sub'] == 'auth0|abc'
+    # The second request falls inside the backoff and does not hit the tenant again.
+    assert attempts == 1
+
+
+def test_user_cache_is_invalidated_on_balance_change():
+    user_cache.clear()
+    user = User(uuid=uuid4(), auth0_sub='auth0|abc', email='a@example.com', created_at=datetime.now(timezone.utc), balance=5.0)
+    charged = user.model_copy(update={'balance': 4.0})
+
+    with patch.object(user_client, 'find_or_create_user_by_auth0_sub_in_db', return_value=user) as lookup:
+        assert user_client.find_or_create_user_by_auth0_sub('auth0|abc').balance == 5.0
+        assert user_client.find_or_create_user_by_auth0_sub('auth0|abc').balance == 5.0
+        assert lookup.call_count == 1
+
+        def deduct_while_a_request_reads(user_uuid, cost, auth0_only):
+            # A request that reads during the write re-caches the old balance...
+            user_client.find_or_create_user_by_auth0_sub('auth0|abc')
+            lookup.return_value = charged
+            return charged
+
+        with patch.object(user_client, 'deduct_from_balance_in_db', side_effect=deduct_while_a_request_reads):
+            user_client.deduct_from_balance(user.uuid, 1.0)
+        # ...which the invalidation after the commit drops again.
+        assert user_client.find_or_create_user_by_auth0_sub('auth0|abc').balance == 4.0
+        assert lookup.call_count == 3
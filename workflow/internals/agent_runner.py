@@ -8,24 +8,20 @@ from typing import Any, Coroutine
 from uuid import UUID
 
 import httpx
-from fastmcp import Client as MCPClient
-from fastmcp.client.transports import StreamableHttpTransport
 from fastapi import HTTPException
-from openai import OpenAI
 from jsonpath_ng import parse
 
-from agentlogger.src.client import save_log_entry
+from agentlogger.src.client import save_log_entry, enqueue_generation_cost
 from agentlogger.src.models import (
     LogEntry,
     Message as LoggerMessage,
 )
-from mcp.types import Tool
 from shared.app_settings import load_app_settings
 from shared.config import settings
+from shared.services.llm_gateway import llm_gateway
+from workflow.internals.mcp_pool import mcp_session_pool, mcp_tool_cache
 from workflow.internals.output_processor import create_output_data, generate_summary
-from mcp_servers.tone_of_voice_mcpserver.src.services.openrouter_service import (
-    openrouter_service,
-)
+from workflow.internals.step_events import make_step_delta_callback
 from workflow.models import (
     CustomAgent,
     CustomAgentInstanceModel,
@@ -51,26 +47,6 @@ def _get_next_required_tool(
     return None
 
 
-def _format_mcp_tools_for_openai(
-    tools: list[Tool], server_name: str
-) -> list[dict]:
-    """Formats a list of MCP Tools into the format expected by OpenAI."""
-    formatted_tools = []
-    for tool in tools:
-        full_tool_name = f"{server_name}-{tool.name}"
-
-        formatted_tool = {
-            "type": "function",
-            "function": {
-                "name": full_tool_name,
-                "description": tool.description,
-                "parameters": tool.inputSchema,
-            },
-        }
-        formatted_tools.append(formatted_tool)
-    return formatted_tools
-
-
 async def run_agent_step(
     agent_definition: CustomAgent,
     resolved_system_prompt: str,
@@ -101,72 +77,17 @@ async def run_agent_step(
         instance.error_message = "OPENROUTER_API_KEY not found."
         return instance
 
-    llm_client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=settings.OPENROUTER_API_KEY,
-    )
-
-    mcp_clients: dict[str, MCPClient] = {}
-    servers_info = []
+    # The tool catalogue is cached per process; MCP sessions are opened lazily on the first tool call.
+    catalog = None
     try:
-        api_url = f"http://localhost:{settings.CONTAINERPORT_API}/mcp/servers"
-        async with httpx.AsyncClient() as http_client:
-            response = await http_client.get(api_url)
-            response.raise_for_status()
-            servers_info = response.json()
-
-            if servers_info:
-                headers = {
-                    "X-User-ID": str(user_id),
-                    "X-Workflow-UUID": str(workflow_instance_uuid)
-                }
-                for server_info in servers_info:
-                    server_name = server_info.get("name")
-                    server_url = server_info.get("url")
-                    if server_name and server_url:
-                        transport = StreamableHttpTransport(url=server_url, headers=headers)
-                        mcp_clients[server_name] = MCPClient(transport)
+        catalog = await mcp_tool_cache.get()
     except Exception as e:
         logger.warning(
             f"Could not discover MCP servers: {e}. This is okay if no tools are used."
         )
-        # Proceed with no clients, this will be checked later if tools are required.
-
-    logger.info(f"Discovered {len(mcp_clients)} MCP clients: {list(mcp_clients.keys())}")
-
-    all_formatted_tools = []
-    available_tool_names = set()
-
-    if mcp_clients:
-        try:
-            await asyncio.gather(
-                *(client.__aenter__() for client in mcp_clients.values())
-            )
-
-            tool_listing_tasks = [
-                client.list_tools() for client in mcp_clients.values()
-            ]
-            server_tool_results = await asyncio.gather(
-                *tool_listing_tasks, return_exceptions=True
-            )
-
-            for (server_name, _), tools_result in zip(
-                mcp_clients.items(), server_tool_results
-            ):
-                if isinstance(tools_result, Exception):
-                    logger.error(
-                        f"Failed to list tools from server '{server_name}': {tools_result}"
-                    )
-                    continue
-
-                for tool in tools_result:
-                    available_tool_names.add(f"{server_name}-{tool.name}")
-                all_formatted_tools.extend(
-                    _format_mcp_tools_for_openai(tools_result, server_name)
-                )
-        except Exception as e:
-            logger.error(f"Error communicating with MCP servers: {e}", exc_info=True)
+        # Proceed with no tools, this will be checked later if tools are required.
 
+    available_tool_names = set(catalog.openai_tools) if catalog else set()
     logger.info(f"Discovered {len(available_tool_names)} total tools from all servers.")
 
     # After attempting to discover all tools, check if any enabled tools are missing.
@@ -180,6 +101,14 @@ async def run_agent_step(
 
     if enabled_tool_ids:
         missing_tools = enabled_tool_ids - available_tool_names
+        if missing_tools:
+            # The cached catalogue may predate a newly added tool; refresh it once before failing.
+            try:
+                catalog = await mcp_tool_cache.get(force_refresh=True)
+                available_tool_names = set(catalog.openai_tools)
+            except Exception as e:
+                logger.warning(f"Could not refresh MCP tool catalogue: {e}")
+            missing_tools = enabled_tool_ids - available_tool_names
         if missing_tools:
             error_msg = f"Agent step failed because required tools are unavailable: {', '.join(missing_tools)}"
             logger.error(error_msg)
@@ -189,19 +118,21 @@ async def run_agent_step(
             return instance
 
     # Filter the tools to only those that are enabled for this agent.
-    tools = [
-        tool
-        for tool in all_formatted_tools
-        if tool["function"]["name"] in enabled_tool_ids
-    ]
+    tools = catalog.tools_for(enabled_tool_ids) if catalog else []
 
     logger.info(f"Providing {len(tools)} enabled and available tools to the LLM.")
 
-    
+    # To store cumulative token information; costs are reconciled in the background.
+    cumulative_prompt_tokens = 0
+    cumulative_completion_tokens = 0
+    cumulative_total_tokens = 0
+    generation_ids: list[str] = []
+    on_delta = make_step_delta_callback(user_id, workflow_instance_uuid, instance.uuid, agent_definition.name)
+
     try:
         # --- Balance Check ---
         logger.info(f"Checking balance for user {user_id} before running agent step.")
-        user_client.check_user_balance(user_id)
+        await user_client.check_user_balance_async(user_id)
         logger.info(f"User {user_id} has sufficient balance.")
 
         max_cycles = 10  # A reasonable limit for agent execution cycles
@@ -209,12 +140,6 @@ async def run_agent_step(
         messages_for_run = [MessageModel(role="system", content=resolved_system_prompt)]
         instance.messages.extend(messages_for_run)
 
-        # To store cumulative token and cost information
-        cumulative_prompt_tokens = 0
-        cumulative_completion_tokens = 0
-        cumulative_total_tokens = 0
-        cumulative_total_cost = 0.0
-
         logger.info(f"Starting agent execution loop for instance {instance.uuid}. Max cycles: {max_cycles}")
         for turn in range(max_cycles):
             logger.info(
@@ -222,8 +147,7 @@ async def run_agent_step(
             )
             
             logger.debug(f"Calling LLM with {len(instance.messages)} messages and {len(tools)} tools.")
-            response = await asyncio.to_thread(
-                llm_client.chat.completions.create,
+            response = await llm_gateway.chat_completion(
                 model=agent_definition.model,
                 messages=[
                     msg.model_dump(
@@ -234,6 +158,8 @@ async def run_agent_step(
                 ],
                 tools=tools,
                 tool_choice="auto" if tools else "none",
+                on_delta=on_delta,
+                user_id=user_id,
             )
             response_message = response.choices[0].message
             instance.messages.append(
@@ -245,18 +171,8 @@ async def run_agent_step(
                 cumulative_prompt_tokens += response.usage.prompt_tokens
                 cumulative_completion_tokens += response.usage.completion_tokens
                 cumulative_total_tokens += response.usage.total_tokens
-                # Cost retrieval would need a generation ID, which is available in the 'id' of the response.
-                # Assuming openrouter_service can be used here as well.
-                if response.id:
-                    try:
-                        # This assumes a similar setup as llm_runner and might need adjustment
-                        # if openrouter_service is not directly available here.
-                        # For now, let's assume we can fetch it.
-                        cost = await openrouter_service.get_generation_cost(response.id)
-                        cumulative_total_cost += cost
-                    except Exception as e:
-                        logger.error(f"Could not retrieve cost for generation {response.id}: {e}")
-
+            if response.id:
+                generation_ids.append(response.id)
 
             if not response_message.tool_calls:
                 logger.info("Agent finished execution loop.")
@@ -283,7 +199,9 @@ async def run_agent_step(
                 function_name = tool_call.function.name
                 
                 tool_results_coroutines.append(
-                    _handle_mcp_tool_call(tool_call, mcp_clients)
+                    _handle_mcp_tool_call(
+                        tool_call, catalog.servers if catalog else {}, user_id, workflow_instance_uuid
+                    )
                 )
 
             tool_results = await asyncio.gather(*tool_results_coroutines)
@@ -319,15 +237,8 @@ async def run_agent_step(
         instance.status = "failed"
         instance.error_message = str(e)
     finally:
-        # --- Cost Deduction ---
-        if cumulative_total_cost > 0:
-            logger.info(f"Deducting total cost of {cumulative_total_cost} from user {user_id}'s balance.")
-            try:
-                user_client.deduct_from_balance(user_id, cumulative_total_cost)
-            except Exception as e:
-                logger.error(f"Failed to deduct cost for user {user_id}: {e}", exc_info=True)
-
         # This block ensures that we try to log the conversation even if an error occurs during the run.
+        log_id = None
         try:
             logger.info(f"Saving conversation for agent instance {instance.uuid} to agentlogger.")
             
@@ -352,10 +263,11 @@ async def run_agent_step(
                 prompt_tokens=cumulative_prompt_tokens,
                 completion_tokens=cumulative_completion_tokens,
                 total_tokens=cumulative_total_tokens,
-                total_cost=cumulative_total_cost,
                 model=agent_definition.model,
             )
-            await save_log_entry(log_entry)
+            save_result = await save_log_entry(log_entry)
+            if save_result.get("success"):
+                log_id = log_entry.id
             logger.info(f"Successfully saved conversation for instance {instance.uuid}.")
         except Exception as e:
             logger.error(
@@ -363,12 +275,10 @@ async def run_agent_step(
                 exc_info=True,
             )
 
-        # Clean up MCP clients
-        if mcp_clients:
-            await asyncio.gather(
-                *(client.__aexit__(None, None, None) for client in mcp_clients.values()),
-                return_exceptions=True,  # To prevent one failure from stopping others
-            )
+        # --- Cost Deduction ---
+        # Costs of all turns are reconciled in the background and added to the log entry once known.
+        for generation_id in generation_ids:
+            enqueue_generation_cost(generation_id, user_id=user_id, log_id=log_id)
 
     instance.finished_at = datetime.now(timezone.utc)
     return instance
@@ -431,18 +341,28 @@ async def _resolve_tool_arguments(tool_calls: list, user_id: str) -> list:
     return tool_calls
 
 
-async def _handle_mcp_tool_call(tool_call, mcp_clients: dict[str, MCPClient]) -> str:
-    """Handles a standard tool call to an MCP server."""
+async def _handle_mcp_tool_call(
+    tool_call,
+    servers: dict[str, str],
+    user_id: UUID,
+    workflow_instance_uuid: UUID,
+) -> str:
+    """Handles a standard tool call to an MCP server, using a pooled session."""
     full_tool_name = tool_call.function.name
+    server_url = None
     try:
         server_name, short_tool_name = full_tool_name.split("-", 1)
-        if server_name not in mcp_clients:
+        if server_name not in servers:
             return f"Error: Server '{server_name}' is not available."
 
-        client = mcp_clients[server_name]
+        server_url = servers[server_name]
         function_args = json.loads(tool_call.function.arguments)
-        result = await client.call_tool(short_tool_name, function_args)
+        async with mcp_session_pool.session(server_url, user_id, workflow_instance_uuid) as client:
+            result = await client.call_tool(short_tool_name, function_args)
         return "\n".join(item.text for item in result.content)
     except Exception as e:
         logger.error(f"Error calling tool {full_tool_name}: {e}", exc_info=True)
-        return f"Error executing tool: {e}" 
\ No newline at end of file
+        if server_url and isinstance(e, (httpx.HTTPError, ConnectionError, RuntimeError)):
+            # The session may be broken; open a fresh one on the next call.
+            await mcp_session_pool.discard(server_url, user_id)
+        return f"Error executing tool: {e}"
@@ -6,15 +6,14 @@ from uuid import UUID
 
 from fastapi import HTTPException
 
-from agentlogger.src.client import save_log_entry
+from agentlogger.src.client import save_log_entry, enqueue_generation_cost
 from agentlogger.src.models import (
     LogEntry,
     Message as LoggerMessage,
 )
-from mcp_servers.tone_of_voice_mcpserver.src.services.openrouter_service import (
-    openrouter_service,
-)
+from shared.services.llm_gateway import llm_gateway
 from workflow.internals.output_processor import create_output_data, generate_summary
+from workflow.internals.step_events import make_step_delta_callback
 from workflow.models import CustomLLM, CustomLLMInstanceModel, MessageModel, StepOutputData, WorkflowModel
 from shared.config import settings
 from user import client as user_client
@@ -41,11 +40,14 @@ async def run_llm_step(
 
     if not settings.OPENROUTER_API_KEY:
         logger.error("OPENROUTER_API_KEY not found. Cannot proceed.")
-    
+
+    generation_id = None
+    prompt_tokens = completion_tokens = total_tokens = None
+
     try:
         # --- Balance Check ---
         logger.info(f"Checking balance for user {user_id} before running LLM step.")
-        user_client.check_user_balance(user_id)
+        await user_client.check_user_balance_async(user_id)
         logger.info(f"User {user_id} has sufficient balance.")
 
         logger.debug(f"LLM definition: {llm_definition.model_dump_json(indent=2)}")
@@ -59,33 +61,22 @@ async def run_llm_step(
         ]
 
         logger.info(f"Calling OpenRouter for instance {instance.uuid} with model {llm_definition.model}")
-        # Use the OpenRouter service to get the LLM response
-        response_data = await openrouter_service.get_llm_response(
-            prompt="Proceed as instructed.",
-            system_prompt=resolved_system_prompt,
+        response = await llm_gateway.chat_completion(
             model=llm_definition.model,
+            messages=[msg.model_dump(exclude_none=True, include={"role", "content"}) for msg in instance.messages],
+            on_delta=make_step_delta_callback(user_id, workflow_instance_uuid, instance.uuid, llm_definition.name),
+            user_id=user_id,
         )
         logger.info(f"Received response from OpenRouter for instance {instance.uuid}")
-        logger.debug(f"Response data: {response_data}")
+        logger.debug(f"Response data: {response}")
 
         # Extract the content and other details from the response
-        response_content = response_data["choices"][0]["message"]["content"]
-        generation_id = response_data.get("id")
-        usage = response_data.get("usage", {})
-        prompt_tokens = usage.get("prompt_tokens")
-        completion_tokens = usage.get("completion_tokens")
-        total_tokens = usage.get("total_tokens")
-        
-        # Get the cost
-        total_cost = None
-        if generation_id:
-            try:
-                total_cost = await openrouter_service.get_generation_cost(generation_id)
-                if total_cost is not None and total_cost > 0:
-                    logger.info(f"Deducting {total_cost} from balance of user {user_id}.")
-                    user_client.deduct_from_balance(user_id, total_cost)
-            except Exception as e:
-                logger.error(f"Could not retrieve cost for generation {generation_id}: {e}")
+        response_content = response.choices[0].message.content
+        generation_id = response.id
+        if response.usage:
+            prompt_tokens = response.usage.prompt_tokens
+            completion_tokens = response.usage.completion_tokens
+            total_tokens = response.usage.total_tokens
 
         # Add the response to the messages
         instance.messages.append(MessageModel(role="assistant", content=response_content))
@@ -113,6 +104,7 @@ async def run_llm_step(
         instance.error_message = str(e)
     finally:
         # This block ensures that we try to log the conversation even if an error occurs during the run.
+        log_id = None
         try:
             logger.info(f"Saving LLM conversation for instance {instance.uuid} to agentlogger.")
             
@@ -138,10 +130,11 @@ async def run_llm_step(
                 prompt_tokens=prompt_tokens,
                 completion_tokens=completion_tokens,
                 total_tokens=total_tokens,
-                total_cost=total_cost,
                 model=llm_definition.model,
             )
-            await save_log_entry(log_entry)
+            save_result = await save_log_entry(log_entry)
+            if save_result.get("success"):
+                log_id = log_entry.id
             logger.info(f"Successfully saved LLM conversation for instance {instance.uuid}.")
         except Exception as e:
             logger.error(
@@ -149,6 +142,9 @@ async def run_llm_step(
                 exc_info=True,
             )
 
+        # The cost is reconciled in the background and added to the log entry once known.
+        enqueue_generation_cost(generation_id, user_id=user_id, log_id=log_id)
+
     instance.finished_at = datetime.now(timezone.utc)
     # Return the final instance
     return instance 
\ No newline at end of file
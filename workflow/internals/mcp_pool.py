@@ -0,0 +1,216 @@
+# This file is for internal use only and should not be used directly by the end-user.
+"""
+Per-process MCP session pool and tool catalogue cache for agent steps.
+
+The tool catalogue (which servers exist and which tools they offer) almost never
+changes, so it is fetched once per TTL and kept with precomputed OpenAI-format
+tool schemas. MCP sessions are opened lazily on the first tool call and reused
+across steps for the same (server, user) until they have been idle for a while.
+"""
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+import httpx
+from fastmcp import Client as MCPClient
+from fastmcp.client.transports import StreamableHttpTransport
+from mcp.types import Tool
+
+from shared.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def format_mcp_tools_for_openai(tools: List[Tool], server_name: str) -> List[dict]:
+    """Formats a list of MCP Tools into the format expected by OpenAI."""
+    formatted_tools = []
+    for tool in tools:
+        full_tool_name = f"{server_name}-{tool.name}"
+
+        formatted_tool = {
+            "type": "function",
+            "function": {
+                "name": full_tool_name,
+                "description": tool.description,
+                "parameters": tool.inputSchema,
+            },
+        }
+        formatted_tools.append(formatted_tool)
+    return formatted_tools
+
+
+@dataclass
+class ToolCatalog:
+    """A snapshot of all MCP servers and their tools, ready to hand to the LLM."""
+    version: str
+    servers: Dict[str, str] = field(default_factory=dict)  # server name -> url
+    openai_tools: Dict[str, dict] = field(default_factory=dict)  # full tool name -> OpenAI tool schema
+    fetched_at: float = field(default_factory=time.monotonic)
+
+    def tools_for(self, tool_names: set) -> List[dict]:
+        """Returns the precomputed schemas for the given full tool names, in catalogue order."""
+        return [schema for name, schema in self.openai_tools.items() if name in tool_names]
+
+
+class MCPToolCache:
+    """
+    Caches the tool catalogue from the API's /mcp/servers endpoint.
+
+    The catalogue is refreshed after `settings.MCP_TOOL_CACHE_TTL_SECONDS` or on demand.
+    Its version is a hash of the server and tool definitions, so callers can tell
+    whether a refresh actually changed anything.
+    """
+
+    def __init__(self):
+        self._catalog: Optional[ToolCatalog] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    def invalidate(self) -> None:
+        self._catalog = None
+
+    async def get(self, force_refresh: bool = False) -> ToolCatalog:
+        seen = self._catalog
+        if not force_refresh and seen and not self._is_expired(seen):
+            return seen
+
+        async with self._get_lock():
+            # Another task may have refreshed the catalogue while we waited.
+            catalog = self._catalog
+            if catalog and catalog is not seen and not self._is_expired(catalog):
+                return catalog
+
+            servers_info = await self._fetch_servers()
+            new_catalog = self._build_catalog(servers_info)
+            if self._catalog and self._catalog.version != new_catalog.version:
+                logger.info(f"MCP tool catalogue changed: {self._catalog.version} -> {new_catalog.version}")
+            self._catalog = new_catalog
+            return new_catalog
+
+    def _is_expired(self, catalog: ToolCatalog) -> bool:
+        return time.monotonic() - catalog.fetched_at > settings.MCP_TOOL_CACHE_TTL_SECONDS
+
+    async def _fetch_servers(self) -> List[Dict[str, Any]]:
+        api_url = f"http://localhost:{settings.CONTAINERPORT_API}/mcp/servers"
+        async with httpx.AsyncClient() as http_client:
+            response = await http_client.get(api_url)
+            response.raise_for_status()
+            return response.json()
+
+    @staticmethod
+    def _build_catalog(servers_info: List[Dict[str, Any]]) -> ToolCatalog:
+        version = hashlib.sha256(json.dumps(servers_info, sort_keys=True).encode()).hexdigest()[:12]
+        catalog = ToolCatalog(version=version)
+        for server_info in servers_info or []:
+            server_name = server_info.get("name")
+            server_url = server_info.get("url")
+            if not server_name or not server_url:
+                continue
+            catalog.servers[server_name] = server_url
+            tools = [Tool.model_validate(tool) for tool in server_info.get("tools", [])]
+            for formatted_tool in format_mcp_tools_for_openai(tools, server_name):
+                catalog.openai_tools[formatted_tool["function"]["name"]] = formatted_tool
+        logger.info(
+            f"Loaded MCP tool catalogue {version}: {len(catalog.servers)} servers, {len(catalog.openai_tools)} tools."
+        )
+        return catalog
+
+
+@dataclass
+class _PooledSession:
+    client: MCPClient
+    last_used: float = field(default_factory=time.monotonic)
+    in_use: int = 0
+
+
+class MCPSessionPool:
+    """
+    Reuses connected MCP clients per (server url, user).
+
+    Sessions are opened on first use and closed once they have been idle for
+    `settings.MCP_SESSION_IDLE_TIMEOUT_SECONDS`. The X-Workflow-UUID header is
+    fixed when a session is opened; the pooled servers only require it to be present.
+    """
+
+    def __init__(self):
+        self._sessions: Dict[Tuple[str, str], _PooledSession] = {}
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Sessions are bound to the loop that opened them and cannot be reused elsewhere.
+            self._sessions = {}
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    @contextlib.asynccontextmanager
+    async def session(self, server_url: str, user_id: UUID, workflow_instance_uuid: UUID):
+        """Async context manager yielding a connected MCP client for the server and user."""
+        key = (server_url, str(user_id))
+        async with self._get_lock():
+            await self._evict_idle()
+            pooled = self._sessions.get(key)
+            if pooled is None or not pooled.client.is_connected():
+                headers = {
+                    "X-User-ID": str(user_id),
+                    "X-Workflow-UUID": str(workflow_instance_uuid),
+                }
+                client = MCPClient(StreamableHttpTransport(url=server_url, headers=headers))
+                await client.__aenter__()
+                pooled = _PooledSession(client=client)
+                self._sessions[key] = pooled
+                logger.info(f"Opened pooled MCP session for {server_url} (user {user_id}).")
+            pooled.in_use += 1
+
+        try:
+            yield pooled.client
+        finally:
+            pooled.in_use -= 1
+            pooled.last_used = time.monotonic()
+
+    async def discard(self, server_url: str, user_id: UUID) -> None:
+        """Closes and forgets a session, e.g. after a transport error."""
+        pooled = self._sessions.pop((server_url, str(user_id)), None)
+        if pooled:
+            await self._close(pooled)
+
+    async def _evict_idle(self) -> None:
+        now = time.monotonic()
+        idle_keys = [
+            key for key, pooled in self._sessions.items()
+            if pooled.in_use == 0 and now - pooled.last_used > settings.MCP_SESSION_IDLE_TIMEOUT_SECONDS
+        ]
+        for key in idle_keys:
+            logger.info(f"Evicting idle MCP session for {key[0]} (user {key[1]}).")
+            await self._close(self._sessions.pop(key))
+
+    async def close_all(self) -> None:
+        sessions, self._sessions = list(self._sessions.values()), {}
+        await asyncio.gather(*(self._close(pooled) for pooled in sessions), return_exceptions=True)
+
+    @staticmethod
+    async def _close(pooled: _PooledSession) -> None:
+        try:
+            await pooled.client.__aexit__(None, None, None)
+        except Exception as e:
+            logger.warning(f"Error while closing pooled MCP session: {e}")
+
+
+mcp_tool_cache = MCPToolCache()
+mcp_session_pool = MCPSessionPool()
@@ -0,0 +1,39 @@
+# This file is for internal use only and should not be used directly by the end-user.
+"""
+Persisted status of a running workflow instance.
+
+The runner only changes `instance.status` in memory while it runs; the status is
+written once, when the run ends, and only if it differs from what the database
+already holds. The instance row stores nothing but the status, so there is no
+intermediate progress to write along the way.
+"""
+import logging
+from uuid import UUID
+
+import workflow.internals.database as db
+from workflow.models import WorkflowInstanceModel
+
+logger = logging.getLogger(__name__)
+
+
+class RunJournal:
+    """Tracks the persisted status of one workflow instance during a run."""
+
+    def __init__(self, instance: WorkflowInstanceModel, user_id: UUID):
+        self.instance = instance
+        self.user_id = user_id
+        # The instance was just loaded, so its current status is what the database holds.
+        self._flushed_status = instance.status
+        self.flush_count = 0
+
+    @property
+    def dirty(self) -> bool:
+        return self.instance.status != self._flushed_status
+
+    async def flush(self) -> None:
+        """Writes the instance status, if it changed since the last write."""
+        if not self.dirty:
+            return
+        await db._update_workflow_instance_in_db(self.instance, self.user_id)
+        self._flushed_status = self.instance.status
+        self.flush_count += 1
@@ -9,12 +9,15 @@ from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from agentlogger.src.client import save_log_entry
 from agentlogger.src.models import LogEntry, Message
+from shared.config import settings
 import workflow.client as workflow_client
 import workflow.internals.database as db
 from workflow.internals import llm_runner
 from workflow.internals import agent_runner
 from workflow.internals import checker_runner
 from workflow.internals.output_processor import create_output_data, generate_summary
+from workflow.internals.run_journal import RunJournal
+from workflow.internals.step_events import publish_step_event
 from workflow.models import (
     CustomAgent,
     CustomLLM,
@@ -131,6 +134,21 @@ def _prepare_input(
     return prepared_config
 
 
+async def _publish_step_finished(instance: WorkflowInstanceModel, step_instance) -> None:
+    """Tells stream subscribers that a step is done, so they can fetch its final state."""
+    if not settings.WORKFLOW_STREAM_STEP_EVENTS:
+        return
+    await publish_step_event(
+        instance.user_id,
+        instance.uuid,
+        {
+            "type": "step_finished",
+            "step_instance_uuid": str(step_instance.uuid),
+            "status": step_instance.status,
+        },
+    )
+
+
 async def run_workflow(instance_uuid: UUID, user_id: UUID):
     """
     Asynchronously runs a workflow instance from start to finish.
@@ -140,12 +158,15 @@ async def run_workflow(instance_uuid: UUID, user_id: UUID):
     """
     log_entry = None
     instance = None
+    journal = None
     try:
         logger.info(f"Starting workflow run for instance {instance_uuid}")
         instance = await db._get_workflow_instance_from_db(instance_uuid, user_id=user_id)
         if not instance:
             logger.error(f"Workflow instance {instance_uuid} not found.")
             return
+        # Status changes stay in memory; the final status is written once, in the finally block.
+        journal = RunJournal(instance, user_id)
 
         workflow_def = await db._get_workflow_from_db(instance.workflow_definition_uuid, user_id=user_id)
         if not workflow_def:
@@ -153,7 +174,6 @@ async def run_workflow(instance_uuid: UUID, user_id: UUID):
             logger.error(message)
             instance.status = "failed"
             instance.error_message = message
-            await db._update_workflow_instance_in_db(instance, user_id)
             return
 
         log_entry = LogEntry(
@@ -173,7 +193,6 @@ async def run_workflow(instance_uuid: UUID, user_id: UUID):
             if current_step_index >= len(workflow_def.steps):
                 logger.info(f"Workflow {instance.uuid} completed all steps.")
                 instance.status = "completed"
-                await db._update_workflow_instance_in_db(instance, user_id)
                 break
 
             step_uuid = workflow_def.steps[current_step_index]
@@ -184,7 +203,6 @@ async def run_workflow(instance_uuid: UUID, user_id: UUID):
                 logger.error(message)
                 instance.status = "failed"
                 instance.error_message = message
-                await db._update_workflow_instance_in_db(instance, user_id)
                 break
 
             try:
@@ -202,7 +220,7 @@ async def run_workflow(instance_uuid: UUID, user_id: UUID):
                         workflow_definition=workflow_def,
                     )
                     instance.step_instances.append(llm_instance)
-                    await db._update_workflow_instance_in_db(instance, user_id)
+                    await _publish_step_finished(instance, llm_instance)
                 elif step_def.type == "custom_agent":
                     agent_instance = await agent_runner.run_agent_step(
                         agent_definition=step_def,
@@ -212,7 +230,7 @@ async def run_workflow(instance_uuid: UUID, user_id: UUID):
                         workflow_definition=workflow_def,
                     )
                     instance.step_instances.append(agent_instance)
-                    await db._update_workflow_instance_in_db(instance, user_id)
+                    await _publish_step_finished(instance, agent_instance)
                 elif step_def.type == "stop_checker":
                     # Create the instance model for the checker
                     checker_instance = StopWorkflowCheckerInstanceModel(
@@ -222,7 +240,6 @@ async def run_workflow(instance_uuid: UUID, user_id: UUID):
                         checker_definition_uuid=step_def.uuid,
                     )
                     instance.step_instances.append(checker_instance)
-                    await db._update_workflow_instance_in_db(instance, user_id)
                     
                     # Collate all previous step outputs
                     step_outputs = {}
@@ -245,7 +262,6 @@ async def run_workflow(instance_uuid: UUID, user_id: UUID):
 
                     checker_instance.status = "completed"
                     checker_instance.finished_at = datetime.now(timezone.utc)
-                    await db._update_workflow_instance_in_db(instance, user_id)
 
                     # Create a log entry for the checker step
                     checker_log_entry = LogEntry(
@@ -266,7 +282,6 @@ async def run_workflow(instance_uuid: UUID, user_id: UUID):
                     if result.should_stop:
                         logger.info(f"Workflow {instance.uuid} stopped by checker step {step_def.name} ({step_def.uuid}).")
                         instance.status = "stopped"
-                        await db._update_workflow_instance_in_db(instance, user_id)
                         break # Exit the while loop
 
                 logger.info(f"RUNNER_DEBUG: End of loop for step {step_uuid}. Total instances on workflow model: {len(instance.step_instances)}")
@@ -276,7 +291,6 @@ async def run_workflow(instance_uuid: UUID, user_id: UUID):
                 logger.error(message, exc_info=True)
                 instance.status = "failed"
                 instance.error_message = message
-                await db._update_workflow_instance_in_db(instance, user_id)
                 break  # Stop workflow on step failure
 
             current_step_index += 1
@@ -285,13 +299,21 @@ async def run_workflow(instance_uuid: UUID, user_id: UUID):
         if instance:
             instance.status = "failed"
             instance.error_message = str(e)
-            await db._update_workflow_instance_in_db(instance, user_id)
     finally:
+        if journal:
+            try:
+                await journal.flush()
+            except Exception as e:
+                logger.error(f"Failed to persist final state of workflow instance {instance_uuid}: {e}", exc_info=True)
+        if instance and settings.WORKFLOW_STREAM_STEP_EVENTS:
+            await publish_step_event(
+                user_id, instance_uuid, {"type": "workflow_finished", "status": instance.status}
+            )
         if log_entry and instance:
-            final_instance = await db._get_workflow_instance_from_db(instance_uuid, user_id=user_id)
-            summary_message = f"Workflow '{log_entry.workflow_name}' finished with status: {final_instance.status}."
-            if final_instance.error_message:
-                summary_message += f"\nError: {final_instance.error_message}"
+            # The in-memory instance is authoritative for this run; no need to read it back.
+            summary_message = f"Workflow '{log_entry.workflow_name}' finished with status: {instance.status}."
+            if instance.error_message:
+                summary_message += f"\nError: {instance.error_message}"
 
             log_entry.messages = [Message(role="system", content=summary_message)]
             log_entry.end_time = datetime.now(timezone.utc)
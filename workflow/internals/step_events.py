@@ -0,0 +1,103 @@
+# This file is for internal use only and should not be used directly by the end-user.
+"""
+Streams step events (LLM tokens, tool-call deltas, completion) of running
+workflow instances over Redis pub/sub.
+
+Workflows are executed by the triggers service, while clients follow them
+through the API, so events have to cross process boundaries. Events are
+fire-and-forget: nothing is stored, and a subscriber only sees events
+published after it subscribed.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import weakref
+from typing import Any, AsyncIterator, Dict, Optional
+from uuid import UUID
+
+import redis.asyncio as aioredis
+
+from shared.config import settings
+from shared.redis.keys import RedisKeys
+from shared.services.llm_gateway import DeltaCallback
+
+logger = logging.getLogger(__name__)
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aioredis.Redis]" = weakref.WeakKeyDictionary()
+
+
+def _get_client() -> aioredis.Redis:
+    """Async Redis clients are bound to the event loop that created them."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+        _clients[loop] = client
+    return client
+
+
+async def publish_step_event(user_id: UUID, workflow_instance_uuid: UUID, event: Dict[str, Any]) -> None:
+    """Publishes an event for a workflow instance. Failures are logged, never raised."""
+    channel = RedisKeys.get_workflow_instance_events_channel(user_id, workflow_instance_uuid)
+    try:
+        await _get_client().publish(channel, json.dumps(event, default=str))
+    except Exception as e:
+        logger.warning(f"Could not publish step event for workflow instance {workflow_instance_uuid}: {e}")
+
+
+def make_step_delta_callback(
+    user_id: UUID,
+    workflow_instance_uuid: UUID,
+    step_instance_uuid: UUID,
+    step_name: str,
+) -> Optional[DeltaCallback]:
+    """
+    Returns an `on_delta` callback for the LLM gateway that forwards deltas of one step,
+    or None when step streaming is disabled (the LLM call then doesn't stream at all).
+    """
+    if not settings.WORKFLOW_STREAM_STEP_EVENTS:
+        return None
+
+    async def on_delta(event: Dict[str, Any]) -> None:
+        await publish_step_event(
+            user_id,
+            workflow_instance_uuid,
+            {**event, "step_instance_uuid": str(step_instance_uuid), "step_name": step_name},
+        )
+
+    return on_delta
+
+
+@contextlib.asynccontextmanager
+async def subscribe_step_events(
+    user_id: UUID, workflow_instance_uuid: UUID, heartbeat_s: float = 15.0
+) -> AsyncIterator[AsyncIterator[Optional[Dict[str, Any]]]]:
+    """
+    Async context manager that subscribes to the events of a workflow instance.
+
+    The subscription is active on entry, so callers can check the instance's state
+    afterwards without missing events. The yielded iterator produces events as they
+    are published, and None every `heartbeat_s` seconds without events so callers
+    can send keep-alives.
+    """
+    channel = RedisKeys.get_workflow_instance_events_channel(user_id, workflow_instance_uuid)
+    pubsub = _get_client().pubsub()
+    await pubsub.subscribe(channel)
+
+    async def events() -> AsyncIterator[Optional[Dict[str, Any]]]:
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=heartbeat_s)
+            if message is None:
+                yield None
+                continue
+            try:
+                yield json.loads(message["data"])
+            except (TypeError, json.JSONDecodeError):
+                logger.warning(f"Ignoring malformed step event on {channel}")
+
+    try:
+        yield events()
+    finally:
+        await pubsub.unsubscribe(channel)
+        await pubsub.aclose()
@@ -0,0 +1,55 @@
+import asyncio
+import os
+import sys
+import uuid
+from unittest.mock import AsyncMock
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from workflow.internals import run_journal
+from workflow.internals.run_journal import RunJournal
+from workflow.models import WorkflowInstanceModel
+
+
+def _instance() -> WorkflowInstanceModel:
+    return WorkflowInstanceModel(
+        user_id=uuid.uuid4(),
+        workflow_definition_uuid=uuid.uuid4(),
+        status="running",
+    )
+
+
+@pytest.fixture
+def mock_update(monkeypatch):
+    mock = AsyncMock()
+    monkeypatch.setattr(run_journal.db, "_update_workflow_instance_in_db", mock)
+    return mock
+
+
+def test_only_the_final_status_is_written_once(mock_update):
+    """Intermediate status changes are not written; the last one is, once."""
+    instance = _instance()
+    journal = RunJournal(instance, instance.user_id)
+
+    async def run():
+        instance.status = "failed"
+        instance.status = "completed"
+        await journal.flush()
+        await journal.flush()  # already written
+
+    asyncio.run(run())
+
+    mock_update.assert_awaited_once_with(instance, instance.user_id)
+    assert journal.flush_count == 1
+    assert not journal.dirty
+
+
+def test_unchanged_status_is_never_written(mock_update):
+    instance = _instance()
+    journal = RunJournal(instance, instance.user_id)
+
+    asyncio.run(journal.flush())
+
+    assert mock_update.await_count == 0
@@ -242,7 +242,6 @@ async def test_agent_tool_use_with_data_pointer(test_db, monkeypatch):
     from workflow import llm_client as llm_client
     from workflow import agent_client as agent_client
     from workflow.internals import runner
-    from fastmcp import Client as MCPClient
 
     print("--- ENTERING test_agent_tool_use_with_data_pointer ---")
     user_id = uuid.uuid4()
@@ -252,12 +251,14 @@ async def test_agent_tool_use_with_data_pointer(test_db, monkeypatch):
 
     # Since this is an integration test for the AGENT's tool use, we can
     # safely mock the preceding LLM step's network call to avoid event loop
-    # issues with the global openrouter client.
+    # issues with the shared LLM gateway client.
     mock_llm_output_content = json.dumps({"messageId": message_id_to_test})
-    mock_get_llm_response = AsyncMock(return_value=mock_llm_output_content)
+    mock_llm_response = MagicMock(id=None, usage=None)
+    mock_llm_response.choices[0].message.content = mock_llm_output_content
+    mock_chat_completion = AsyncMock(return_value=mock_llm_response)
     monkeypatch.setattr(
-        "workflow.internals.llm_runner.openrouter_service.get_llm_response",
-        mock_get_llm_response
+        "workflow.internals.llm_runner.llm_gateway.chat_completion",
+        mock_chat_completion
     )
 
     # We patch the internal tool-handling function directly. This is the most
@@ -270,14 +271,9 @@ async def test_agent_tool_use_with_data_pointer(test_db, monkeypatch):
     )
 
     # We also need to patch the tool discovery to simulate the tool being available.
-    mock_http_response = MagicMock()
-    mock_http_response.raise_for_status.return_value = None
-    # Ensure that .json() is a regular method returning a list, not a mock/coroutine
-    mock_http_response.json = lambda: [{
-        "name": "imap_mcpserver",
-        "url": "http://dummy-mcp-server:8000"
-    }]
-    
+    # The /mcp/servers response already carries the tool schemas, so no MCP session is opened.
+    from workflow.internals.mcp_pool import mcp_tool_cache
+
     mock_mcp_tool_list = [
         Tool(name="set_label", description="Adds a label to an email.", inputSchema={
             "type": "object",
@@ -287,35 +283,13 @@ async def test_agent_tool_use_with_data_pointer(test_db, monkeypatch):
             }
         })
     ]
-    
-    # Create a mock for httpx.AsyncClient that returns the correct async behavior
-    mock_mcp_async_client = AsyncMock()
-    
-    # The `get` method must be an async function that returns our mock response
-    async def mock_get(*args, **kwargs):
-        return mock_http_response
-    
-    # The context manager should return an object with the mocked 'get' method
-    mock_context_manager = AsyncMock()
-    mock_context_manager.get = mock_get
-    mock_mcp_async_client.__aenter__.return_value = mock_context_manager
-    mock_mcp_async_client.__aexit__.return_value = None
-
-    # We need to return an async context manager for the MCPClient
-    # and its list_tools method must be awaitable.
-    mock_mcp_client_instance = AsyncMock()
-    mock_mcp_client_instance.list_tools.return_value = mock_mcp_tool_list
-    # Ensure the async context manager returns itself
-    mock_mcp_client_instance.__aenter__.return_value = mock_mcp_client_instance
-
-    monkeypatch.setattr(
-        "workflow.internals.agent_runner.httpx.AsyncClient", 
-        lambda: mock_mcp_async_client
-    )
-    monkeypatch.setattr(
-        "workflow.internals.agent_runner.MCPClient", 
-        lambda url: mock_mcp_client_instance
-    )
+    mock_fetch_servers = AsyncMock(return_value=[{
+        "name": "imap_mcpserver",
+        "url": "http://dummy-mcp-server:8000",
+        "tools": [tool.model_dump() for tool in mock_mcp_tool_list],
+    }])
+    mcp_tool_cache.invalidate()
+    monkeypatch.setattr(mcp_tool_cache, "_fetch_servers", mock_fetch_servers)
 
     # 1. Create Workflow
     # Step 1 (LLM): Outputs a JSON object with the messageId
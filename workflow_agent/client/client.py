@@ -1,19 +1,24 @@
 import logging
 import json
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
 from fastmcp import Client as MCPClient
 from fastmcp.client.transports import StreamableHttpTransport
 
+from agentlogger.src.client import enqueue_generation_cost
 from shared.config import settings
+from shared.services.llm_gateway import DeltaCallback
 from workflow_agent.client.internals.agent_runner import run_agent_turn
 from workflow_agent.client.models import ChatMessage, ChatStepResponse, ChatRequest
 
 logger = logging.getLogger(__name__)
 
 async def run_chat_step(
-    request: ChatRequest, user_id: UUID, workflow_uuid: UUID
+    request: ChatRequest,
+    user_id: UUID,
+    workflow_uuid: UUID,
+    on_delta: Optional[DeltaCallback] = None,
 ) -> ChatStepResponse:
     """
     Runs the next step of a chat conversation with the workflow agent.
@@ -21,6 +26,7 @@ async def run_chat_step(
 
     If the request includes `human_input`, it will first execute the
     corresponding tool call before proceeding with the normal agent turn.
+    If `on_delta` is given, LLM tokens and tool-call deltas are streamed to it.
     """
     conversation_history = request.messages
 
@@ -79,8 +85,12 @@ async def run_chat_step(
     
     # Run one turn of the agent logic (either LLM call or tool execution)
     updated_history, human_input_required, usage_stats, generation_id = await run_agent_turn(
-        conversation_history, user_id=user_id, workflow_uuid=workflow_uuid
+        conversation_history, user_id=user_id, workflow_uuid=workflow_uuid, on_delta=on_delta
     )
+
+    # --- Cost Deduction ---
+    # Reconciled in the background; the cost is added to the conversation's log entry once known.
+    enqueue_generation_cost(generation_id, user_id=user_id, log_id=request.conversation_id)
     
     # If human input is required, we stop here and let the frontend handle it.
     if human_input_required:
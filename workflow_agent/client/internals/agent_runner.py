@@ -8,10 +8,9 @@ from uuid import UUID
 from fastapi import HTTPException
 from fastmcp import Client as MCPClient
 from fastmcp.client.transports import StreamableHttpTransport
-from openai import OpenAI
-import httpx
 
 from shared.config import settings
+from shared.services.llm_gateway import DeltaCallback, llm_gateway
 from workflow_agent.client.models import ChatMessage, HumanInputRequired
 from user import client as user_client
 from user.exceptions import InsufficientBalanceError
@@ -40,29 +39,11 @@ def _format_mcp_tools_for_openai(tools) -> list[dict]:
         formatted_tools.append(formatted_tool)
     return formatted_tools
 
-async def _get_generation_cost(generation_id: str) -> float:
-    """Retrieves the cost of a specific generation from OpenRouter."""
-    if not generation_id:
-        return 0.0
-    
-    try:
-        # A small delay can help ensure the generation data is available.
-        await asyncio.sleep(2)
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://openrouter.ai/api/v1/generation?id={generation_id}",
-                headers={"Authorization": f"Bearer {settings.OPENROUTER_API_KEY}"}
-            )
-            response.raise_for_status()
-            data = response.json()
-            logger.info(f"WORKFLOW_AGENT: Received cost data for generation {generation_id}: {json.dumps(data)}")
-            return data.get("data", {}).get("total_cost", 0.0)
-    except Exception as e:
-        logger.error(f"Failed to retrieve cost for generation {generation_id}: {e}")
-        return 0.0
-
 async def run_agent_turn(
-    conversation: List[ChatMessage], user_id: UUID, workflow_uuid: UUID
+    conversation: List[ChatMessage],
+    user_id: UUID,
+    workflow_uuid: UUID,
+    on_delta: Optional[DeltaCallback] = None,
 ) -> Tuple[List[ChatMessage], HumanInputRequired | None, Optional[dict], Optional[str]]:
     """
     Runs a single turn of the workflow agent. This is a state machine driven by
@@ -70,6 +51,8 @@ async def run_agent_turn(
     - user -> call LLM
     - assistant(with tool_calls) -> execute tools
     - tool -> call LLM
+
+    If `on_delta` is given, the LLM call is streamed and its deltas are passed to it.
     """
     # Initialize usage_stats and generation_id to return in all paths
     usage_stats = None
@@ -81,11 +64,6 @@ async def run_agent_turn(
         conversation.append(ChatMessage(role="assistant", content=error_message))
         return conversation, None, usage_stats, generation_id
 
-    llm_client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key=settings.OPENROUTER_API_KEY,
-    )
-
     last_message = conversation[-1]
 
     # Pre-emptively check for human input requests to avoid creating an unnecessary MCP connection.
@@ -196,7 +174,7 @@ async def run_agent_turn(
             # --- Balance Check ---
             try:
                 logger.info(f"Checking balance for user {user_id} before running workflow agent.")
-                user_client.check_user_balance(user_id)
+                await user_client.check_user_balance_async(user_id)
                 logger.info(f"User {user_id} has sufficient balance.")
             except InsufficientBalanceError as e:
                 logger.warning(f"Blocking workflow agent for user {user_id} due to insufficient balance.")
@@ -209,12 +187,13 @@ async def run_agent_turn(
                 {"role": "system", "content": SYSTEM_PROMPT}
             ] + [msg.model_dump(exclude_none=True, include={"role", "content", "tool_calls", "tool_call_id"}) for msg in conversation]
             
-            response = await asyncio.to_thread(
-                llm_client.chat.completions.create,
+            response = await llm_gateway.chat_completion(
                 model="google/gemini-2.5-pro",
                 messages=messages_for_llm,
                 tools=formatted_tools,
                 tool_choice="auto" if formatted_tools else "none",
+                on_delta=on_delta,
+                user_id=user_id,
             )
             response_message = response.choices[0].message
             conversation.append(ChatMessage.model_validate(response_message.model_dump()))
@@ -226,15 +205,9 @@ async def run_agent_turn(
                     "completion_tokens": response.usage.completion_tokens,
                     "total_tokens": response.usage.total_tokens,
                 }
+            # The cost of this generation is reconciled in the background by the caller.
             generation_id = response.id
 
-            # --- Cost Deduction ---
-            if generation_id:
-                cost = await _get_generation_cost(generation_id)
-                if cost > 0:
-                    logger.info(f"Deducting cost of {cost} from user {user_id}'s balance for workflow agent turn.")
-                    user_client.deduct_from_balance(user_id, cost)
-
         # If the last message is from the assistant without tool calls, we do nothing.
         # The turn is considered complete.
 
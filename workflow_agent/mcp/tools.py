@@ -6,6 +6,7 @@ import json
 from pathlib import Path
 import httpx
 import asyncio
+import openai
 
 from mcp_servers.imap_mcpserver.src.imap_client.client import (
     get_all_labels,
@@ -15,6 +16,7 @@ from mcp_servers.imap_mcpserver.src.imap_client.client import (
 from mcp_servers.imap_mcpserver.src.imap_client.internals.connection_manager import IMAPConnectionError
 from mcp_servers.imap_mcpserver.src.imap_client.models import EmailMessage
 from shared.config import settings
+from shared.services.llm_gateway import llm_gateway
 
 import workflow.agent_client as agent_client
 import workflow.client as workflow_client
@@ -461,41 +463,28 @@ async def update_step_mcp_tools(
     return updated_step.model_dump()
 
 
-async def _get_llm_response(prompt: str, model: str) -> str:
+async def _get_llm_response(prompt: str, model: str, user_id: Optional[UUID] = None) -> str:
     """
     Makes a call to an LLM to get a response for a given prompt.
     """
     try:
-        # Use a generic endpoint if possible, or configure based on model provider
-        # For this temporary solution, we can hardcode the OpenRouter endpoint
-        api_url = "https://openrouter.ai/api/v1/chat/completions"
-        api_key = settings.OPENROUTER_API_KEY
-
-        if not api_key:
+        if not settings.OPENROUTER_API_KEY:
             logger.error("OpenRouter API key is not configured.")
             return "Error: LLM service not configured."
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                api_url,
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "model": model,
-                    "messages": [{"role": "user", "content": prompt}],
-                },
-                timeout=60.0,
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data["choices"][0]["message"]["content"]
-    except httpx.HTTPStatusError as e:
+        # Goes through the shared gateway so the call is paced with all other LLM traffic.
+        response = await llm_gateway.chat_completion(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            user_id=user_id,
+            timeout=60.0,
+        )
+        return response.choices[0].message.content or ""
+    except openai.APIStatusError as e:
         logger.error(
-            f"LLM API request failed with status {e.response.status_code}: {e.response.text}"
+            f"LLM API request failed with status {e.status_code}: {e.response.text}"
         )
-        return f"Error: LLM request failed with status {e.response.status_code}."
+        return f"Error: LLM request failed with status {e.status_code}."
     except Exception as e:
         logger.error(
             f"An unexpected error occurred during LLM request: {e}", exc_info=True
@@ -536,7 +525,7 @@ def _build_llm_prompt(emails: List[EmailMessage], label_name: str) -> str:
     return prompt
 
 
-async def _process_single_label(label_name: str, sample_emails: List[EmailMessage]) -> tuple[str, str | None]:
+async def _process_single_label(label_name: str, sample_emails: List[EmailMessage], user_id: Optional[UUID] = None) -> tuple[str, str | None]:
     """
     Generates a description for a single label based on sample emails.
     Returns the label name and the new description, or None if it fails.
@@ -552,7 +541,7 @@ async def _process_single_label(label_name: str, sample_emails: List[EmailMessag
     # Generate a new description using the LLM
     prompt = _build_llm_prompt(sample_emails, label_name)
     # Use a dedicated, fast model for description generation
-    new_description = await _get_llm_response(prompt, "google/gemini-2.5-flash")
+    new_description = await _get_llm_response(prompt, "google/gemini-2.5-flash", user_id=user_id)
 
     if new_description.startswith("Error:"):
         logger.error(f"Could not generate description for {label_name}: {new_description}")
@@ -589,7 +578,7 @@ async def get_email_labels_with_descriptions() -> str:
 
         # 3. Create and run description generation tasks in parallel
         tasks = [
-            _process_single_label(label_name, email_samples_by_label.get(label_name, []))
+            _process_single_label(label_name, email_samples_by_label.get(label_name, []), context.user_id)
             for label_name in available_labels
         ]
         results = await asyncio.gather(*tasks)
@@ -674,7 +663,7 @@ async def generate_label_description(label_name: str) -> str:
             )
 
         prompt = _build_llm_prompt(emails, label_name)
-        description = await _get_llm_response(prompt, "google/gemini-2.5-flash")
+        description = await _get_llm_response(prompt, "google/gemini-2.5-flash", user_id=context.user_id)
         if description.startswith("Error:"):
             return "Sorry, an error occurred while generating the description. Please try again later."
         return description